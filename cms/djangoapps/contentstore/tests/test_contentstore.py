@@ -35,6 +35,7 @@ from xmodule.modulestore.django import modulestore, loc_mapper
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.modulestore.inheritance import own_metadata
 from xmodule.modulestore.locator import BlockUsageLocator
+from xmodule.modulestore.mongo.base import metadata_cache_key
 from xmodule.modulestore.store_utilities import clone_course, delete_course
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
@@ -1885,6 +1886,7 @@ class ContentStoreTest(ModuleStoreTestCase):
         module_store = modulestore('direct')
         CourseFactory.create(org='edX', course='999', display_name='Robot Super Course')
 
+        modulestore_update_signal = module_store.modulestore_update_signal
         try:
             module_store.modulestore_update_signal = Signal(providing_args=['modulestore', 'course_id', 'location'])
 
@@ -1901,7 +1903,7 @@ class ContentStoreTest(ModuleStoreTestCase):
             module_store.create_and_save_xmodule(new_component_location)
 
         finally:
-            module_store.modulestore_update_signal = None
+            module_store.modulestore_update_signal = modulestore_update_signal
 
         self.assertTrue(self.got_signal)
 
@@ -1951,6 +1953,70 @@ class ContentStoreTest(ModuleStoreTestCase):
 
         self.assertEqual(timedelta(1), new_module.graceperiod)
 
+    def test_incremental_metadata_inheritance(self):
+        module_store = modulestore('direct')
+        import_from_xml(module_store, 'common/test/data/', ['toy'])
+        course_location = Location(['i4x', 'edX', 'toy', 'course', '2012_Fall', None])
+
+        # make sure there is a cached tree to patch
+        module_store.get_cached_metadata_inheritance_tree(course_location)
+
+        chapter = module_store.get_items(Location('i4x', 'edX', 'toy', 'chapter', None, None))[0]
+        chapter.graceperiod = timedelta(days=3)
+        module_store.update_item(chapter, self.user.id)
+
+        # the patched tree must match one computed from scratch
+        patched_tree = module_store.get_cached_metadata_inheritance_tree(course_location)
+        self.assertEqual(module_store.compute_metadata_inheritance_tree(course_location), patched_tree)
+        for child in chapter.children:
+            self.assertEqual(patched_tree[child]['graceperiod'], patched_tree[chapter.location.url()]['graceperiod'])
+
+        # a new container below the chapter is added to the tree
+        new_section_location = Location('i4x', 'edX', 'toy', 'sequential', 'new_section')
+        module_store.create_and_save_xmodule(new_section_location)
+        chapter.children.append(new_section_location.url())
+        module_store.update_item(chapter, self.user.id)
+
+        patched_tree = module_store.get_cached_metadata_inheritance_tree(course_location)
+        self.assertEqual(module_store.compute_metadata_inheritance_tree(course_location), patched_tree)
+        self.assertIn(new_section_location.url(), patched_tree)
+
+    def test_incremental_metadata_inheritance_publish(self):
+        module_store = modulestore('draft')
+        import_from_xml(module_store, 'common/test/data/', ['toy'])
+        course_location = Location(['i4x', 'edX', 'toy', 'course', '2012_Fall', None])
+        module_store.get_cached_metadata_inheritance_tree(course_location)
+
+        # deleting the draft of a published vertical, as publishing does, keeps its entry
+        vertical = module_store.get_items(Location('i4x', 'edX', 'toy', 'vertical', None, None))[0]
+        module_store.convert_to_draft(vertical.location)
+        module_store.publish(vertical.location, self.user.id)
+
+        patched_tree = module_store.get_cached_metadata_inheritance_tree(course_location)
+        self.assertIn(vertical.location.url(), patched_tree)
+        self.assertEqual(module_store.compute_metadata_inheritance_tree(course_location), patched_tree)
+
+        # as does unpublishing it
+        module_store.unpublish(vertical.location)
+        patched_tree = module_store.get_cached_metadata_inheritance_tree(course_location)
+        self.assertIn(vertical.location.url(), patched_tree)
+        self.assertEqual(module_store.compute_metadata_inheritance_tree(course_location), patched_tree)
+
+    def test_concurrent_metadata_inheritance_writes(self):
+        module_store = modulestore('direct')
+        import_from_xml(module_store, 'common/test/data/', ['toy'])
+        course_location = Location(['i4x', 'edX', 'toy', 'course', '2012_Fall', None])
+        key = metadata_cache_key(course_location)
+        tree = module_store.get_cached_metadata_inheritance_tree(course_location)
+
+        # another process writes the tree between this one reading and writing it
+        version = module_store._get_metadata_inheritance_tree_version(key)  # pylint: disable=protected-access
+        module_store.refresh_cached_metadata_inheritance_tree(course_location)
+        module_store._store_metadata_inheritance_tree(key, tree, version=version)  # pylint: disable=protected-access
+
+        # so the cached tree is dropped rather than possibly losing the other write
+        self.assertIsNone(module_store.metadata_inheritance_cache_subsystem.get(key))
+
     def test_default_metadata_inheritance(self):
         course = CourseFactory.create()
         vertical = ItemFactory.create(parent_location=course.location)
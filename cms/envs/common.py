@@ -28,7 +28,8 @@ import imp
 import sys
 import lms.envs.common
 from lms.envs.common import (
-    USE_TZ, TECH_SUPPORT_EMAIL, PLATFORM_NAME, BUGS_EMAIL, DOC_STORE_CONFIG, ALL_LANGUAGES, WIKI_ENABLED
+    USE_TZ, TECH_SUPPORT_EMAIL, PLATFORM_NAME, BUGS_EMAIL, DOC_STORE_CONFIG, ALL_LANGUAGES, WIKI_ENABLED,
+    CONTENTSERVER_DISK_CACHE
 )
 from path import path
 
@@ -557,6 +558,9 @@ TRACKING_BACKENDS = {
     }
 }
 
+# See lms/envs/common.py
+TRACKING_ASYNC_DISPATCH = None
+
 #### PASSWORD POLICY SETTINGS #####
 
 PASSWORD_MIN_LENGTH = None
@@ -0,0 +1,186 @@
+"""
+Local on-disk cache for large static assets.
+
+Assets too large for memcached are otherwise read from GridFS on every
+request. `DiskContentCache` keeps copies of them in a local directory, keyed
+by the md5 digest GridFS stores for every file, so that a re-uploaded asset
+never hits a stale copy and no invalidation is needed. The least recently
+served files are evicted once the directory grows past `max_bytes`.
+
+The directory can be shared by all the processes of a host: files are only
+ever written to a temporary name and renamed into place once complete, and
+recency is tracked through the modification time of the files.
+"""
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+
+log = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# GridFS digests are hex md5s; anything else must not become a path
+DIGEST_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+TEMP_SUFFIX = '.tmp'
+
+
+class DiskContentCache(object):
+    """
+    An LRU cache of asset data, stored as one file per md5 digest.
+    """
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def path(self, digest):
+        """
+        Return the path of the cached file for `digest`, or None if it is
+        not cached. Marks the file as recently used.
+        """
+        if not digest or not DIGEST_PATTERN.match(digest):
+            return None
+        path = os.path.join(self.directory, digest)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def stream_range(self, digest, first_byte, last_byte):
+        """
+        Yield the bytes from `first_byte` to `last_byte` (inclusive) of the
+        cached file for `digest`. Returns None if it is not cached; the file
+        is opened right away so a concurrent eviction cannot break the stream.
+        """
+        path = self.path(digest)
+        if path is None:
+            return None
+        try:
+            cached_file = open(path, 'rb')
+        except IOError:
+            return None
+        return self._read_range(cached_file, first_byte, last_byte)
+
+    @staticmethod
+    def _read_range(cached_file, first_byte, last_byte):
+        """Yield a byte range from the open file `cached_file`, then close it"""
+        try:
+            cached_file.seek(first_byte)
+            remaining = last_byte - first_byte + 1
+            while remaining > 0:
+                chunk = cached_file.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            cached_file.close()
+
+    def fill(self, digest, length, chunks):
+        """
+        Yield every chunk of `chunks` while writing them to the cache under
+        `digest`. The file is only added once all `length` bytes have been
+        written, so a client disconnecting half way leaves nothing behind.
+        """
+        if not DIGEST_PATTERN.match(digest or '') or length > self.max_bytes:
+            for chunk in chunks:
+                yield chunk
+            return
+
+        try:
+            handle, temp_path = tempfile.mkstemp(prefix=digest, suffix=TEMP_SUFFIX, dir=self.directory)
+            temp_file = os.fdopen(handle, 'wb')
+        except (IOError, OSError):
+            log.exception("Unable to create a file in the static content disk cache")
+            for chunk in chunks:
+                yield chunk
+            return
+
+        written = 0
+        try:
+            for chunk in chunks:
+                if temp_file is not None:
+                    try:
+                        temp_file.write(chunk)
+                        written += len(chunk)
+                    except (IOError, OSError):
+                        log.exception("Unable to write to the static content disk cache")
+                        temp_file.close()
+                        temp_file = None
+                yield chunk
+
+            if temp_file is not None:
+                temp_file.close()
+                temp_file = None
+                if written == length:
+                    os.rename(temp_path, os.path.join(self.directory, digest))
+                    self.evict()
+        finally:
+            if temp_file is not None:
+                temp_file.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache fits in
+        `max_bytes`. Partially written files older than an hour are removed
+        as well; they were left behind by a crashed process.
+        """
+        with self._lock:
+            entries = []
+            total = 0
+            stale = time.time() - 3600
+            for name in os.listdir(self.directory):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                if name.endswith(TEMP_SUFFIX):
+                    if stat.st_mtime < stale:
+                        self._remove(path)
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    @staticmethod
+    def _remove(path):
+        """Remove `path`, which another process may have removed already"""
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+_DISK_CACHE = {}
+
+
+def disk_cache():
+    """
+    Return the DiskContentCache configured by the CONTENTSERVER_DISK_CACHE
+    setting, or None if there is none.
+    """
+    config = getattr(settings, 'CONTENTSERVER_DISK_CACHE', None)
+    if not config:
+        return None
+    key = (config['DIRECTORY'], config['MAX_BYTES'])
+    if key not in _DISK_CACHE:
+        _DISK_CACHE[key] = DiskContentCache(config['DIRECTORY'], config['MAX_BYTES'])
+    return _DISK_CACHE[key]
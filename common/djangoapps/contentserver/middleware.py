@@ -1,13 +1,60 @@
+import re
+from calendar import timegm
+
 from django.http import (HttpResponse, HttpResponseNotModified,
     HttpResponseForbidden)
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore
-from xmodule.contentstore.content import StaticContent, XASSET_LOCATION_TAG
+from xmodule.contentstore.content import StaticContent, StaticContentStream, XASSET_LOCATION_TAG
 from xmodule.modulestore import InvalidLocationError
 from cache_toolbox.core import get_cached_content, set_cached_content
 from xmodule.exceptions import NotFoundError
 
+from contentserver.disk_cache import disk_cache
+
+# Assets smaller than this are kept in memcached; larger ones are streamed
+# from GridFS or from the local disk cache, if there is one.
+MAX_MEMCACHED_SIZE = 1048576
+
+# A single range of a `Range: bytes=...` header
+BYTE_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range_header(header_value, content_length):
+    """
+    Return the (first_byte, last_byte) pair, both inclusive, requested by
+    the `header_value` of a Range header for content of `content_length`
+    bytes.
+
+    Returns None if the header should be ignored and the whole content
+    served: it is malformed, not in bytes, or asks for several ranges,
+    which are rare enough not to be worth a multipart response. Raises
+    ValueError if the range cannot be satisfied.
+    """
+    match = BYTE_RANGE_PATTERN.match(header_value.replace(' ', ''))
+    if match is None:
+        return None
+    first, last = match.groups()
+
+    if not first:
+        # suffix range: the last N bytes
+        if not last:
+            return None
+        suffix_length = int(last)
+        if suffix_length == 0 or content_length == 0:
+            raise ValueError("Empty suffix range")
+        return max(0, content_length - suffix_length), content_length - 1
+
+    first_byte = int(first)
+    if last and int(last) < first_byte:
+        return None
+    if first_byte >= content_length:
+        raise ValueError("Range starts after the end of the content")
+    last_byte = int(last) if last else content_length - 1
+    return first_byte, min(last_byte, content_length - 1)
+
 
 class StaticContentServer(object):
     def process_request(self, request):
@@ -35,7 +82,7 @@ class StaticContentServer(object):
                 # since we fetched it from DB, let's cache it going forward, but only if it's < 1MB
                 # this is because I haven't been able to find a means to stream data out of memcached
                 if content.length is not None:
-                    if content.length < 1048576:
+                    if content.length < MAX_MEMCACHED_SIZE:
                         # since we've queried as a stream, let's read in the stream into memory to set in cache
                         content = content.copy_to_in_mem()
                         set_cached_content(content)
@@ -52,18 +99,88 @@ class StaticContentServer(object):
                         request.user, course_partial_id):
                     return HttpResponseForbidden('Unauthorized')
 
-            # convert over the DB persistent last modified timestamp to a HTTP compatible
-            # timestamp, so we can simply compare the strings
-            last_modified_at_str = content.last_modified_at.strftime("%a, %d-%b-%Y %H:%M:%S GMT")
+            # getattr b/c content cached before digests were stored doesn't have one
+            content_digest = getattr(content, 'content_digest', None)
+            last_modified_at = timegm(content.last_modified_at.utctimetuple())
+            last_modified_at_str = http_date(last_modified_at)
+            etag = '"{0}"'.format(content_digest) if content_digest else None
 
-            # see if the client has cached this content, if so then compare the
-            # timestamps, if they are the same then just return a 304 (Not Modified)
-            if 'HTTP_IF_MODIFIED_SINCE' in request.META:
-                if_modified_since = request.META['HTTP_IF_MODIFIED_SINCE']
-                if if_modified_since == last_modified_at_str:
-                    return HttpResponseNotModified()
+            if self.is_not_modified(request, content_digest, last_modified_at):
+                response = HttpResponseNotModified()
+            else:
+                response = self.content_response(request, content, etag, last_modified_at_str)
 
-            response = HttpResponse(content.stream_data(), content_type=content.content_type)
             response['Last-Modified'] = last_modified_at_str
-
+            if etag is not None:
+                response['ETag'] = etag
             return response
+
+    def is_not_modified(self, request, content_digest, last_modified_at):
+        """
+        Return True if the client's copy of the content, as described by the
+        If-None-Match or If-Modified-Since headers, is still current.
+        """
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match and content_digest:
+            # If-None-Match takes precedence over If-Modified-Since
+            return if_none_match.strip() == '*' or content_digest in parse_etags(if_none_match)
+
+        if_modified_since = request.META.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            if_modified_since = parse_http_date_safe(if_modified_since)
+            return if_modified_since is not None and last_modified_at <= if_modified_since
+        return False
+
+    def content_response(self, request, content, etag, last_modified_at_str):
+        """
+        Return a response with all of `content`, or with the byte range the
+        request asks for.
+        """
+        byte_range = None
+        if_range = request.META.get('HTTP_IF_RANGE')
+        range_applies = not if_range or if_range in (etag, last_modified_at_str)
+        if 'HTTP_RANGE' in request.META and range_applies and content.length is not None:
+            try:
+                byte_range = parse_range_header(request.META['HTTP_RANGE'], content.length)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = 'bytes */{0}'.format(content.length)
+                return response
+
+        if byte_range is None:
+            response = HttpResponse(self.stream_content(content), content_type=content.content_type)
+            if content.length is not None:
+                response['Content-Length'] = content.length
+        else:
+            first_byte, last_byte = byte_range
+            response = HttpResponse(
+                self.stream_content(content, first_byte, last_byte), content_type=content.content_type, status=206
+            )
+            response['Content-Range'] = 'bytes {0}-{1}/{2}'.format(first_byte, last_byte, content.length)
+            response['Content-Length'] = last_byte - first_byte + 1
+
+        response['Accept-Ranges'] = 'bytes'
+        return response
+
+    def stream_content(self, content, first_byte=None, last_byte=None):
+        """
+        Return an iterator over the data of `content`, or over the range from
+        `first_byte` to `last_byte`. Large assets are served from the local
+        disk cache when possible, and added to it when served in full.
+        """
+        whole = first_byte is None
+        cache = disk_cache()
+        digest = getattr(content, 'content_digest', None)
+        if cache is not None and digest and isinstance(content, StaticContentStream):
+            data = cache.stream_range(
+                digest, 0 if whole else first_byte, content.length - 1 if whole else last_byte
+            )
+            if data is not None:
+                content.close()
+                return data
+            if whole:
+                return cache.fill(digest, content.length, content.stream_data())
+
+        if whole:
+            return content.stream_data()
+        return content.stream_data_in_range(first_byte, last_byte)
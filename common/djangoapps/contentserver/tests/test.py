@@ -3,6 +3,10 @@ Tests for StaticContentServer
 """
 import copy
 import logging
+import os
+import shutil
+import tempfile
+from unittest import TestCase
 from uuid import uuid4
 from path import path
 from pymongo import MongoClient
@@ -12,6 +16,8 @@ from django.conf import settings
 from django.test.client import Client
 from django.test.utils import override_settings
 
+from contentserver.disk_cache import DiskContentCache
+from contentserver.middleware import parse_range_header
 from student.models import CourseEnrollment
 
 from xmodule.contentstore.django import contentstore, _CONTENTSTORE
@@ -134,3 +140,133 @@ class ContentStoreToyCourseTest(ModuleStoreTestCase):
         resp = self.client.get(self.url_locked)
         self.assertEqual(resp.status_code, 200) # pylint: disable=E1103
 
+    def _unlocked_data(self):
+        """The content of the unlocked asset"""
+        return self.contentstore.find(self.loc_unlocked).data
+
+    def test_range_request(self):
+        """
+        Test that a byte range of an asset is served with a 206.
+        """
+        data = self._unlocked_data()
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, data[10:20])  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes 10-19/{0}'.format(len(data)))
+        self.assertEqual(resp['Content-Length'], '10')
+
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes=-5')
+        self.assertEqual(resp.status_code, 206)  # pylint: disable=E1103
+        self.assertEqual(resp.content, data[-5:])  # pylint: disable=E1103
+
+    def test_unsatisfiable_range_request(self):
+        """
+        Test that a range past the end of an asset gets a 416.
+        """
+        length = len(self._unlocked_data())
+        resp = self.client.get(self.url_unlocked, HTTP_RANGE='bytes={0}-'.format(length))
+        self.assertEqual(resp.status_code, 416)  # pylint: disable=E1103
+        self.assertEqual(resp['Content-Range'], 'bytes */{0}'.format(length))
+
+    def test_if_none_match(self):
+        """
+        Test that the ETag is the md5 of the asset and that it can be used
+        to revalidate the client's copy.
+        """
+        resp = self.client.get(self.url_unlocked)
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+        self.assertEqual(resp['Accept-Ranges'], 'bytes')
+        etag = resp['ETag']
+        self.assertEqual(etag, '"{0}"'.format(self.contentstore.find(self.loc_unlocked).content_digest))
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_NONE_MATCH='"not-the-digest"')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+    def test_if_modified_since(self):
+        """
+        Test that If-Modified-Since is compared as a date, not as a string.
+        """
+        resp = self.client.get(self.url_unlocked)
+        last_modified = resp['Last-Modified']
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE='Sun, 06 Nov 2050 08:49:37 GMT')
+        self.assertEqual(resp.status_code, 304)  # pylint: disable=E1103
+
+        resp = self.client.get(self.url_unlocked, HTTP_IF_MODIFIED_SINCE='Sun, 06 Nov 1994 08:49:37 GMT')
+        self.assertEqual(resp.status_code, 200)  # pylint: disable=E1103
+
+
+class ParseRangeHeaderTest(TestCase):
+    """
+    Tests for parsing the Range header.
+    """
+    def test_ranges(self):
+        self.assertEqual(parse_range_header('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range_header('bytes=500-', 1000), (500, 999))
+        self.assertEqual(parse_range_header('bytes=500-5000', 1000), (500, 999))
+        self.assertEqual(parse_range_header('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range_header('bytes=-5000', 1000), (0, 999))
+
+    def test_ignored_ranges(self):
+        for header in ('bytes=0-1,5-6', 'lines=0-10', 'bytes=10-5', 'bytes=-', 'garbage'):
+            self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=1000-', 'bytes=2000-3000', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range_header(header, 1000)
+
+
+class DiskContentCacheTest(TestCase):
+    """
+    Tests for the local disk cache of large assets.
+    """
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.cache = DiskContentCache(self.directory, max_bytes=25)
+
+    def _fill(self, digest, data):
+        """Fill the cache through a streamed response of `data`"""
+        chunks = [data[index:index + 4] for index in range(0, len(data), 4)]
+        self.assertEqual(''.join(self.cache.fill(digest, len(data), iter(chunks))), data)
+
+    def test_fill_and_read(self):
+        digest = 'a' * 32
+        self.assertIsNone(self.cache.stream_range(digest, 0, 9))
+        self._fill(digest, '0123456789')
+        self.assertEqual(''.join(self.cache.stream_range(digest, 0, 9)), '0123456789')
+        self.assertEqual(''.join(self.cache.stream_range(digest, 3, 5)), '345')
+
+    def test_incomplete_fill(self):
+        digest = 'b' * 32
+        stream = self.cache.fill(digest, 10, iter(['0123', '4567', '89']))
+        next(stream)
+        stream.close()
+        self.assertIsNone(self.cache.path(digest))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_invalid_digest(self):
+        self._fill('../../etc/passwd', '0123456789')
+        self.assertIsNone(self.cache.path('../../etc/passwd'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_evicts_least_recently_used(self):
+        first, second, third = 'c' * 32, 'd' * 32, 'e' * 32
+        self._fill(first, '0123456789')
+        self._fill(second, '0123456789')
+        os.utime(os.path.join(self.directory, first), (1, 1))
+        os.utime(os.path.join(self.directory, second), (2, 2))
+        # reading the first file makes it the most recently used
+        self.assertIsNotNone(self.cache.path(first))
+
+        self._fill(third, '0123456789')
+        self.assertIsNotNone(self.cache.path(first))
+        self.assertIsNone(self.cache.path(second))
+        self.assertIsNotNone(self.cache.path(third))
@@ -1,5 +1,8 @@
 import logging
+import time
 
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.contrib.auth.models import User
 
@@ -8,7 +11,7 @@ from django.db.models.signals import post_save
 from django.utils.translation import ugettext_noop
 from student.models import CourseEnrollment
 
-from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.django import modulestore, modulestore_update_signal
 from xmodule.course_module import CourseDescriptor
 
 FORUM_ROLE_ADMINISTRATOR = ugettext_noop('Administrator')
@@ -16,6 +19,12 @@ FORUM_ROLE_MODERATOR = ugettext_noop('Moderator')
 FORUM_ROLE_COMMUNITY_TA = ugettext_noop('Community TA')
 FORUM_ROLE_STUDENT = ugettext_noop('Student')
 
+# Seconds the discussion maps of a course are cached for. Changes to the course
+# made by a process that doesn't share the cache show up after at most this long.
+DISCUSSION_MAP_CACHE_TIMEOUT = getattr(settings, 'DISCUSSION_SETTINGS', {}).get('MAP_CACHE_TIMEOUT', 60 * 60)
+
+DISCUSSION_MAP_GENERATION_KEY = u"django_comment_common.discussion_map_generation.{0}"
+
 
 @receiver(post_save, sender=CourseEnrollment)
 def assign_default_role_on_enrollment(sender, instance, **kwargs):
@@ -39,6 +48,40 @@ def assign_default_role_on_enrollment(sender, instance, **kwargs):
     assign_default_role(instance.course_id, instance.user)
 
 
+@receiver(modulestore_update_signal)
+def invalidate_discussion_maps(sender, course_id, **kwargs):
+    """
+    Move the course to a new generation, so that the discussion maps cached for
+    it are no longer read. `course_id` is "org/course", as sent by the modulestore.
+    """
+    key = DISCUSSION_MAP_GENERATION_KEY.format(course_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_discussion_map_generation(), DISCUSSION_MAP_CACHE_TIMEOUT)
+
+
+def discussion_map_generation(location):
+    """
+    Return the generation of the discussion maps of the course at `location`,
+    which changes whenever one of the course's modules is updated or deleted.
+    """
+    key = DISCUSSION_MAP_GENERATION_KEY.format(u"/".join([location.org, location.course]))
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _new_discussion_map_generation(), DISCUSSION_MAP_CACHE_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def _new_discussion_map_generation():
+    """
+    A generation for a course whose generation isn't in the cache: later than
+    any it had before, so that maps cached for those are never read again
+    """
+    return int(time.time() * 1000)
+
+
 def assign_default_role(course_id, user):
     """
     Assign forum default role 'Student' to user
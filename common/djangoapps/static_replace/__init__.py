@@ -11,6 +11,22 @@ from xmodule.contentstore.content import StaticContent
 
 log = logging.getLogger(__name__)
 
+# The urls that /static/ urls in content resolve to, by (modulestore type,
+# course_id, data directory) and then by the prefix and rest of the url. They
+# only change when static files are collected, which is done on deploy, so are
+# kept for the life of the process.
+_STATIC_URL_TABLES = {}
+
+# Most urls kept for one course, against content with no end of distinct urls
+MAX_STATIC_URL_TABLE_SIZE = 10000
+
+
+def clear_static_url_tables():
+    """
+    Forget the urls that /static/ urls have resolved to.
+    """
+    _STATIC_URL_TABLES.clear()
+
 
 def _url_replace_regex(prefix):
     """
@@ -101,7 +117,22 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
     data_directory: The directory in which course data is stored
     course_id: The course identifier used to distinguish static content for this course in studio
     static_asset_path: Path for static assets, which overrides data_directory and course_namespace, if nonempty
+
+    Outside of DEBUG, the url each /static/ url resolves to is remembered, so
+    the storage is only asked about it once per process.
     """
+    if (not static_asset_path) and course_id:
+        modulestore_type = modulestore().get_modulestore_type(course_id)
+    else:
+        modulestore_type = None
+
+    if settings.DEBUG:
+        # static files change as they are worked on
+        table = None
+    else:
+        table = _STATIC_URL_TABLES.setdefault(
+            (modulestore_type, course_id, static_asset_path or data_directory), {}
+        )
 
     def replace_static_url(match):
         original = match.group(0)
@@ -116,38 +147,14 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
         # In debug mode, if we can find the url as is,
         if settings.DEBUG and finders.find(rest, True):
             return original
-        # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
-        elif (not static_asset_path) and course_id and modulestore().get_modulestore_type(course_id) != XML_MODULESTORE_TYPE:
-            # first look in the static file pipeline and see if we are trying to reference
-            # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
-
-            exists_in_staticfiles_storage = False
-            try:
-                exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-
-            if exists_in_staticfiles_storage:
-                url = staticfiles_storage.url(rest)
-            else:
-                # if not, then assume it's courseware specific content and then look in the
-                # Mongo-backed database
-                url = StaticContent.convert_legacy_static_url_with_course_id(rest, course_id)
-        # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
-        else:
-            course_path = "/".join((static_asset_path or data_directory, rest))
-
-            try:
-                if staticfiles_storage.exists(rest):
-                    url = staticfiles_storage.url(rest)
-                else:
-                    url = staticfiles_storage.url(course_path)
-            # And if that fails, assume that it's course content, and add manually data directory
-            except Exception as err:
-                log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
-                    rest, str(err)))
-                url = "".join([prefix, course_path])
+
+        url = table.get((prefix, rest)) if table is not None else None
+        if url is None:
+            url, cacheable = _resolve_static_url(
+                prefix, rest, static_asset_path or data_directory, course_id, modulestore_type
+            )
+            if cacheable and table is not None and len(table) < MAX_STATIC_URL_TABLE_SIZE:
+                table[(prefix, rest)] = url
 
         return "".join([quote, url, quote])
 
@@ -159,3 +166,43 @@ def replace_static_urls(text, data_directory, course_id=None, static_asset_path=
         replace_static_url,
         text
     )
+
+
+def _resolve_static_url(prefix, rest, course_path_base, course_id, modulestore_type):
+    """
+    The url the static url `prefix` + `rest` in the content of `course_id`,
+    stored in a `modulestore_type` modulestore, is served at, and whether it
+    may be remembered: it may not when the storage couldn't be asked, e.g.
+    because of a transient error, and the url is only a fallback.
+    """
+    # if we're running with a MongoBacked store course_namespace is not None, then use studio style urls
+    if modulestore_type is not None and modulestore_type != XML_MODULESTORE_TYPE:
+        # first look in the static file pipeline and see if we are trying to reference
+        # a piece of static content which is in the edx-platform repo (e.g. JS associated with an xmodule)
+
+        exists_in_staticfiles_storage = False
+        cacheable = True
+        try:
+            exists_in_staticfiles_storage = staticfiles_storage.exists(rest)
+        except Exception as err:
+            log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+                rest, str(err)))
+            cacheable = False
+
+        if exists_in_staticfiles_storage:
+            return staticfiles_storage.url(rest), True
+        # if not, then assume it's courseware specific content and then look in the
+        # Mongo-backed database
+        return StaticContent.convert_legacy_static_url_with_course_id(rest, course_id), cacheable
+
+    # Otherwise, look the file up in staticfiles_storage, and append the data directory if needed
+    course_path = "/".join((course_path_base, rest))
+    try:
+        if staticfiles_storage.exists(rest):
+            return staticfiles_storage.url(rest), True
+        return staticfiles_storage.url(course_path), True
+    # And if that fails, assume that it's course content, and add manually data directory
+    except Exception as err:
+        log.warning("staticfiles_storage couldn't find path {0}: {1}".format(
+            rest, str(err)))
+        return "".join([prefix, course_path]), False
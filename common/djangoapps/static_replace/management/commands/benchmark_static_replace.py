@@ -0,0 +1,77 @@
+"""
+Compare the throughput of rewriting the /static/ urls of a large HTML fragment
+when the storage is asked about every url (uncached) and when the urls they
+resolve to are remembered from earlier rewrites (cached).
+
+    ./manage.py lms benchmark_static_replace MITx/6.002x/2012_Fall --urls 1000 --settings=aws
+"""
+import time
+from optparse import make_option
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand, CommandError
+
+from static_replace import clear_static_url_tables, replace_static_urls
+from util.benchmark import percentile
+from xmodule.modulestore.django import modulestore
+
+
+class Command(BaseCommand):
+    """
+    Rewrite a fragment with --urls static urls N times in each mode, and report
+    the median and 95th percentile time and the urls rewritten per second.
+    """
+    args = '<course_id>'
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--rewrites',
+                    action='store',
+                    type='int',
+                    dest='rewrites',
+                    default=50,
+                    help='Number of times to rewrite the fragment in each mode'),
+        make_option('--urls',
+                    action='store',
+                    type='int',
+                    dest='urls',
+                    default=500,
+                    help='Number of static urls in the fragment'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Usage: {0}".format(self.args))
+        course_id = args[0]
+        course = modulestore().get_course(course_id)
+        if course is None:
+            raise CommandError("No course {0}".format(course_id))
+
+        fragment = u''.join(
+            u'<p>Figure {0}</p><img src="/static/images/figure_{0}.png" alt="Figure {0}"/>\n'.format(index)
+            for index in range(options['urls'])
+        )
+        rewrite_args = (
+            fragment,
+            getattr(course, 'data_dir', ''),
+            course_id,
+            getattr(course, 'static_asset_path', ''),
+        )
+
+        uncached = []
+        for _ in range(options['rewrites']):
+            clear_static_url_tables()
+            uncached.append(time_rewrite(rewrite_args))
+        cached = [time_rewrite(rewrite_args) for _ in range(options['rewrites'])]
+
+        for name, latencies in (('uncached', uncached), ('cached', cached)):
+            median = percentile(latencies, 50)
+            self.stdout.write("{0:<9} {1:>5} rewrites  p50 {2:>8.1f}ms  p95 {3:>8.1f}ms  {4:>10.0f} urls/s\n".format(
+                name, len(latencies), median, percentile(latencies, 95), options['urls'] / (median / 1000)
+            ))
+
+
+def time_rewrite(rewrite_args):
+    """Rewrite the static urls of the fragment once, returning the time taken in ms"""
+    start = time.time()
+    replace_static_urls(*rewrite_args)
+    return (time.time() - start) * 1000
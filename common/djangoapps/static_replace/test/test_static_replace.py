@@ -1,8 +1,8 @@
 import re
 
-from nose.tools import assert_equals, assert_true, assert_false  # pylint: disable=E0611
+from nose.tools import assert_equals, assert_true, assert_false, with_setup  # pylint: disable=E0611
 from static_replace import (replace_static_urls, replace_course_urls,
-                            _url_replace_regex)
+                            _url_replace_regex, clear_static_url_tables)
 from mock import patch, Mock
 from xmodule.modulestore import Location
 from xmodule.modulestore.mongo import MongoModuleStore
@@ -26,6 +26,7 @@ def test_multi_replace():
     )
 
 
+@with_setup(clear_static_url_tables)
 @patch('static_replace.staticfiles_storage')
 def test_storage_url_exists(mock_storage):
     mock_storage.exists.return_value = True
@@ -36,6 +37,7 @@ def test_storage_url_exists(mock_storage):
     mock_storage.url.called_once_with('data_dir/file.png')
 
 
+@with_setup(clear_static_url_tables)
 @patch('static_replace.staticfiles_storage')
 def test_storage_url_not_exists(mock_storage):
     mock_storage.exists.return_value = False
@@ -46,6 +48,7 @@ def test_storage_url_not_exists(mock_storage):
     mock_storage.url.called_once_with('file.png')
 
 
+@with_setup(clear_static_url_tables)
 @patch('static_replace.StaticContent')
 @patch('static_replace.modulestore')
 def test_mongo_filestore(mock_modulestore, mock_static_content):
@@ -65,6 +68,7 @@ def test_mongo_filestore(mock_modulestore, mock_static_content):
     mock_static_content.convert_legacy_static_url_with_course_id.assert_called_once_with('file.png', COURSE_ID)
 
 
+@with_setup(clear_static_url_tables)
 @patch('static_replace.settings')
 @patch('static_replace.modulestore')
 @patch('static_replace.staticfiles_storage')
@@ -90,6 +94,7 @@ def test_raw_static_check():
     assert_equals(path, replace_static_urls(path, text))
 
 
+@with_setup(clear_static_url_tables)
 @patch('static_replace.staticfiles_storage')
 @patch('static_replace.modulestore')
 def test_static_url_with_query(mock_modulestore, mock_storage):
@@ -104,6 +109,62 @@ def test_static_url_with_query(mock_modulestore, mock_storage):
     assert_equals(post_text, replace_static_urls(pre_text, DATA_DIRECTORY, COURSE_ID))
 
 
+@with_setup(clear_static_url_tables, clear_static_url_tables)
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_resolved_urls_remembered(mock_modulestore, mock_storage):
+    """
+    Make sure the storage is only asked about each url once
+    """
+    mock_storage.exists.return_value = True
+    mock_storage.url.return_value = '/static/file.abc123.png'
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+
+    for _ in range(3):
+        assert_equals('"/static/file.abc123.png"', replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_ID))
+    mock_storage.exists.assert_called_once_with('file.png')
+    mock_storage.url.assert_called_once_with('file.png')
+
+    # urls of other courses are resolved separately
+    mock_storage.exists.return_value = False
+    assert_equals('"/c4x/org/other/asset/file.png"', replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, 'org/other/run'))
+
+
+@with_setup(clear_static_url_tables, clear_static_url_tables)
+@patch('static_replace.staticfiles_storage')
+@patch('static_replace.modulestore')
+def test_fallback_urls_not_remembered(mock_modulestore, mock_storage):
+    """
+    Make sure the fallback url used when the storage fails isn't kept after it recovers
+    """
+    mock_storage.exists.side_effect = Exception("S3 is unavailable")
+    mock_storage.url.return_value = '/static/file.abc123.png'
+    mock_modulestore.return_value = Mock(MongoModuleStore)
+    assert_equals('"/c4x/org/course/asset/file.png"', replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_ID))
+
+    mock_storage.exists.side_effect = None
+    mock_storage.exists.return_value = True
+    assert_equals('"/static/file.abc123.png"', replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY, COURSE_ID))
+
+
+@with_setup(clear_static_url_tables, clear_static_url_tables)
+@patch('static_replace.settings')
+@patch('static_replace.staticfiles_storage')
+def test_resolved_urls_not_remembered_in_debug(mock_storage, mock_settings):
+    """
+    Make sure static files changed while developing are seen
+    """
+    mock_settings.DEBUG = True
+    mock_settings.STATIC_URL = '/static/'
+    mock_storage.exists.return_value = True
+    mock_storage.url.return_value = '/static/file.png'
+
+    with patch('static_replace.finders.find', return_value=None):
+        replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY)
+        replace_static_urls(STATIC_SOURCE, DATA_DIRECTORY)
+    assert_equals(mock_storage.exists.call_count, 2)
+
+
 def test_regex():
     yes = ('"/static/foo.png"',
            '"/static/foo.png"',
@@ -3,7 +3,10 @@ Stub implementation of cs_comments_service for acceptance tests
 """
 
 import re
+import threading
+import time
 import urlparse
+from SocketServer import ThreadingMixIn
 from .http import StubHttpRequestHandler, StubHttpService
 
 
@@ -106,3 +109,62 @@ class StubCommentsServiceHandler(StubHttpRequestHandler):
 
 class StubCommentsService(StubHttpService):
     HANDLER_CLASS = StubCommentsServiceHandler
+
+
+class StubBenchmarkCommentsServiceHandler(StubCommentsServiceHandler):
+    """
+    Comments service handler that keeps connections open between requests, as
+    the real service does, and answers after the `latency` (in milliseconds)
+    set in the config, like a service on another host.
+    """
+    protocol_version = "HTTP/1.1"
+
+    def handle_one_request(self):
+        # The handler serves every request of its connection: forget what was
+        # read from the previous one.
+        for attr in ('request_content', 'post_dict', 'get_params', 'path_only'):
+            self.__dict__.pop(attr, None)
+        super(StubBenchmarkCommentsServiceHandler, self).handle_one_request()
+
+    def do_GET(self):
+        if self.path_only == "/benchmark_stats":
+            return self.send_json_response(self.server.stats)
+        return super(StubBenchmarkCommentsServiceHandler, self).do_GET()
+
+    def send_response(self, status_code, content=None, headers=None):
+        # The request body must be read before answering, or it would be
+        # taken for the next request on the connection.
+        self.request_content  # pylint: disable=pointless-statement
+        time.sleep(float(self.server.config.get('latency', 0)) / 1000)
+        self.server.count('requests')
+
+        headers = dict(headers or {})
+        headers['Content-Length'] = str(len(content or ''))
+        super(StubBenchmarkCommentsServiceHandler, self).send_response(status_code, content, headers)
+
+
+class StubBenchmarkCommentsService(ThreadingMixIn, StubCommentsService):
+    """
+    Comments service to measure forum views against:
+
+        python -m stubs.start comments_benchmark 4567 latency=5
+
+    Each connection is served by its own thread. GET /benchmark_stats returns
+    the number of connections opened and requests answered so far.
+    """
+    HANDLER_CLASS = StubBenchmarkCommentsServiceHandler
+    daemon_threads = True
+
+    def __init__(self, port_num=0):
+        self.stats = {'connections': 0, 'requests': 0}
+        self._stats_lock = threading.Lock()
+        super(StubBenchmarkCommentsService, self).__init__(port_num)
+
+    def count(self, stat):
+        """Add one to `stat`"""
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def process_request(self, request, client_address):
+        self.count('connections')
+        ThreadingMixIn.process_request(self, request, client_address)
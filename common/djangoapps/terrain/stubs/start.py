@@ -4,7 +4,7 @@ Command-line utility to start a stub service.
 import sys
 import time
 import logging
-from .comments import StubCommentsService
+from .comments import StubCommentsService, StubBenchmarkCommentsService
 from .xqueue import StubXQueueService
 from .youtube import StubYouTubeService
 from .ora import StubOraService
@@ -19,6 +19,7 @@ SERVICES = {
     'youtube': StubYouTubeService,
     'ora': StubOraService,
     'comments': StubCommentsService,
+    'comments_benchmark': StubBenchmarkCommentsService,
     'lti': StubLtiService,
     'video': VideoSourceHttpService,
 }
@@ -26,3 +26,19 @@ class BaseBackend(object):
     def send(self, event):
         """Send event to tracker."""
         pass
+
+    def send_batch(self, events):
+        """
+        Send a list of events to tracker. Backends that can store many
+        events at once should override this; errors should be raised so
+        that the caller can retry.
+        """
+        for event in events:
+            self.send(event)
+
+    def stop(self):
+        """
+        Send whatever the backend still holds and release its resources. The
+        backend isn't used once it is replaced.
+        """
+        pass
@@ -0,0 +1,278 @@
+"""
+Event tracker backend that buffers events in memory and ships them to
+another backend in batches, from a background thread.
+
+Wrap any backend by giving its configuration as the `backend` option::
+
+  TRACKING_BACKENDS = {
+      'mongo': {
+          'ENGINE': 'track.backends.buffered.BufferedBackend',
+          'OPTIONS': {
+              'backend': {
+                  'ENGINE': 'track.backends.mongodb.MongoBackend',
+                  'OPTIONS': {...},
+              },
+              'max_queue_size': 10000,
+              'batch_size': 100,
+              'flush_interval': 1.0,
+          }
+      }
+  }
+
+"""
+
+from __future__ import absolute_import
+
+import atexit
+import logging
+import os
+import Queue
+import threading
+import time
+import weakref
+
+from dogapi import dog_stats_api
+
+from track.backends import BaseBackend
+
+
+log = logging.getLogger(__name__)
+
+# The backends to stop on exit. Weak references, so that the backends a
+# tracker reinitialization replaced can be garbage collected.
+_BACKENDS = weakref.WeakSet()
+
+
+def _stop_all():
+    """Stop every live BufferedBackend, sending what they have queued"""
+    for backend in list(_BACKENDS):
+        backend.stop()
+
+atexit.register(_stop_all)
+
+
+class BufferedBackend(BaseBackend):
+    """
+    Event tracker backend that queues events and sends them to the wrapped
+    backend with `send_batch`, either when `batch_size` events have been
+    queued or `flush_interval` seconds after the first of them.
+
+    If the wrapped backend fails, the batch is retried with exponential
+    backoff (up to `max_backoff` seconds) rather than dropped. Events are
+    only dropped when the queue is full, as chosen by `overflow`, or when
+    they are sent after the backend was stopped; `dropped` counts them.
+
+    The flusher thread is started by the first event a process sends, so
+    that processes forked after the backend was created (e.g. by a
+    preforking server) each start their own.
+
+    """
+
+    OVERFLOW_POLICIES = ('drop_newest', 'drop_oldest', 'block')
+
+    # seconds the flusher thread may take to notice it was stopped
+    STOP_POLL_INTERVAL = 0.1
+
+    def __init__(self, backend, max_queue_size=10000, batch_size=100,
+                 flush_interval=1.0, max_backoff=60, overflow='drop_newest',
+                 block_timeout=1.0, name='buffered', **kwargs):
+        """
+        :Parameters:
+
+          - `backend`: dict with the `ENGINE` and `OPTIONS` of the
+            backend to send the events to
+          - `max_queue_size`: maximum number of events waiting to be sent
+          - `batch_size`: maximum number of events sent at once
+          - `flush_interval`: maximum seconds an event waits to be sent
+            while the wrapped backend is healthy
+          - `max_backoff`: maximum seconds between retries of a failed batch
+          - `overflow`: what to do with a new event when the queue is
+            full: `drop_newest` drops it, `drop_oldest` drops the oldest
+            queued event instead, `block` waits up to `block_timeout`
+            seconds for room before dropping it
+          - `name`: used to tag the metrics reported by this backend
+
+        """
+        super(BufferedBackend, self).__init__(**kwargs)
+
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError('Invalid overflow policy {0}'.format(overflow))
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.name = name
+
+        # Imported here since the tracker module initializes backends on import
+        from track.tracker import _instantiate_backend_from_name
+        self.backend = _instantiate_backend_from_name(backend['ENGINE'], backend.get('OPTIONS', {}))
+
+        self.queue = Queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+
+        self.sent = 0
+        self.dropped = 0
+
+        # the batch being sent (or retried) by the flusher thread
+        self._pending = []
+        # serializes writes from the flusher thread and flush()
+        self._write_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        # the flusher thread, and the process that started it
+        self._thread = None
+        self._thread_pid = None
+        self._thread_lock = threading.Lock()
+
+        _BACKENDS.add(self)
+
+    def _start_thread(self):
+        """
+        Start the flusher thread, unless this process already has. A forked
+        process doesn't have the thread of its parent, and drops the events
+        its parent had queued, which are the parent's to send.
+        """
+        with self._thread_lock:
+            if self._thread_pid == os.getpid() or self._stopped.is_set():
+                return
+            if self._thread_pid is not None:
+                self.queue = Queue.Queue(maxsize=self.queue.maxsize)
+                self._pending = []
+                self._write_lock = threading.Lock()
+            self._thread = threading.Thread(target=self._run, name='track-{0}-backend'.format(self.name))
+            self._thread.daemon = True
+            self._thread.start()
+            self._thread_pid = os.getpid()
+
+    @property
+    def queue_depth(self):
+        """Number of events waiting to be sent"""
+        return self.queue.qsize() + len(self._pending)
+
+    def send(self, event):
+        """Queue the event, applying the overflow policy if the queue is full"""
+        if self._stopped.is_set():
+            # nothing would ever send it
+            self._count_dropped()
+            return
+        if self._thread_pid != os.getpid():
+            self._start_thread()
+        try:
+            if self.overflow == 'block':
+                self.queue.put(event, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(event)
+            return
+        except Queue.Full:
+            pass
+
+        if self.overflow == 'drop_oldest':
+            # make room by discarding the oldest event; other threads may
+            # be racing for the space, in which case the new event is dropped
+            try:
+                self.queue.get_nowait()
+                self._count_dropped()
+                self.queue.put_nowait(event)
+                return
+            except (Queue.Empty, Queue.Full):
+                pass
+        self._count_dropped()
+
+    def _count_dropped(self, count=1):
+        """Record that `count` events were dropped"""
+        self.dropped += count
+        dog_stats_api.increment('track.buffered.dropped', count, tags=['backend:{0}'.format(self.name)])
+
+    def _next_batch(self):
+        """
+        Wait up to `flush_interval` for an event, then collect events until
+        there are `batch_size` of them or `flush_interval` has passed. Stops
+        collecting within STOP_POLL_INTERVAL seconds of the backend being
+        stopped, so that `stop` doesn't wait for a long `flush_interval`.
+        """
+        batch = []
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stopped.is_set():
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=min(remaining, self.STOP_POLL_INTERVAL)))
+            except Queue.Empty:
+                continue
+        return batch
+
+    def _write(self, batch):
+        """Send `batch` to the wrapped backend; raises on failure"""
+        with self._write_lock:
+            start = time.time()
+            self.backend.send_batch(batch)
+            dog_stats_api.histogram(
+                'track.send.backend.latency', (time.time() - start) * 1000, tags=['backend:{0}'.format(self.name)]
+            )
+            self.sent += len(batch)
+
+    def _run(self):
+        """Flusher thread: send batches until stopped, backing off on errors"""
+        backoff = 0
+        while not self._stopped.is_set():
+            if not self._pending:
+                self._pending = self._next_batch()
+                if not self._pending:
+                    continue
+            try:
+                self._write(self._pending)
+                self._pending = []
+                backoff = 0
+            except Exception:  # pylint: disable=broad-except
+                backoff = min(max(backoff * 2, self.flush_interval), self.max_backoff)
+                log.exception(
+                    'Error sending %d events from the buffered event tracker backend, retrying in %s seconds',
+                    len(self._pending), backoff
+                )
+                dog_stats_api.increment('track.buffered.send_error', tags=['backend:{0}'.format(self.name)])
+                self._stopped.wait(backoff)
+
+    def flush(self):
+        """
+        Send everything queued so far from the calling thread. Events that
+        cannot be sent are dropped.
+        """
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except Queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._flush_batch(batch)
+                batch = []
+        if batch:
+            self._flush_batch(batch)
+
+    def _flush_batch(self, batch):
+        """Send `batch` once, counting it as dropped if that fails"""
+        try:
+            self._write(batch)
+        except Exception:  # pylint: disable=broad-except
+            log.exception('Dropping %d events from the buffered event tracker backend', len(batch))
+            self._count_dropped(len(batch))
+
+    def stop(self, timeout=5):
+        """Stop the flusher thread and send what is left. Called on exit."""
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._thread_pid != os.getpid():
+            # nothing was sent by this process; what's queued is its parent's
+            return
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            # still sending its batch, which would be sent twice if sent from here too
+            log.warning(
+                'The flusher thread of the buffered event tracker backend did not stop within %s seconds', timeout
+            )
+        elif self._pending:
+            pending, self._pending = self._pending, []
+            self._flush_batch(pending)
+        self.flush()
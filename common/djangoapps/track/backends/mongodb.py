@@ -95,3 +95,10 @@ class MongoBackend(BaseBackend):
             # during the next event.
             msg = 'Error inserting to MongoDB event tracker backend'
             log.exception(msg)
+
+    def send_batch(self, events):
+        """
+        Insert a list of events with a single write. Unlike `send`,
+        connection errors are raised so that the caller can retry.
+        """
+        self.collection.insert(events, manipulate=False)
@@ -0,0 +1,228 @@
+from __future__ import absolute_import
+
+import gc
+import threading
+import time
+import weakref
+
+from mock import patch
+
+from django.test import TestCase
+
+from track.backends import BaseBackend
+from track.backends.buffered import BufferedBackend
+
+
+class InMemoryBackend(BaseBackend):
+    """Backend recording the batches it is sent"""
+    instances = []
+
+    def __init__(self, failures=0, **kwargs):
+        super(InMemoryBackend, self).__init__(**kwargs)
+        self.batches = []
+        self.failures = failures
+        self.unblocked = threading.Event()
+        self.unblocked.set()
+        InMemoryBackend.instances.append(self)
+
+    def send(self, event):
+        self.batches.append([event])
+
+    def send_batch(self, events):
+        self.unblocked.wait()
+        if self.failures:
+            self.failures -= 1
+            raise IOError('connection refused')
+        self.batches.append(list(events))
+
+    @property
+    def events(self):
+        return [event for batch in self.batches for event in batch]
+
+
+def wait_for(condition, timeout=5):
+    """Poll until `condition()` is true or `timeout` seconds have passed"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+class TestBufferedBackend(TestCase):
+    def make_backend(self, inner_options=None, **options):
+        backend = BufferedBackend(
+            backend={
+                'ENGINE': 'track.backends.tests.test_buffered.InMemoryBackend',
+                'OPTIONS': inner_options or {},
+            },
+            **options
+        )
+        self.addCleanup(backend.stop)
+        return backend, InMemoryBackend.instances[-1]
+
+    def test_batches_by_size(self):
+        backend, inner = self.make_backend(batch_size=3, flush_interval=60)
+        events = [{'test': index} for index in range(3)]
+        for event in events:
+            backend.send(event)
+
+        self.assertTrue(wait_for(lambda: inner.batches))
+        self.assertEqual([events], inner.batches)
+        self.assertEqual(3, backend.sent)
+        self.assertEqual(0, backend.queue_depth)
+
+    def test_batches_by_time(self):
+        backend, inner = self.make_backend(batch_size=100, flush_interval=0.05)
+        backend.send({'test': 1})
+        self.assertTrue(wait_for(lambda: inner.batches))
+        self.assertEqual([[{'test': 1}]], inner.batches)
+
+    def test_retries_with_backoff(self):
+        backend, inner = self.make_backend({'failures': 2}, flush_interval=0.01, max_backoff=0.05)
+        backend.send({'test': 1})
+        self.assertTrue(wait_for(lambda: inner.batches))
+        self.assertEqual([{'test': 1}], inner.events)
+        self.assertEqual(0, inner.failures)
+        self.assertEqual(0, backend.dropped)
+
+    def test_drops_when_full(self):
+        backend, inner = self.make_backend(max_queue_size=2, batch_size=1, flush_interval=0.01)
+        inner.unblocked.clear()
+
+        # the flusher thread picks up the first event and blocks sending it
+        backend.send({'test': 0})
+        self.assertTrue(wait_for(lambda: backend.queue.qsize() == 0))
+        for index in range(1, 5):
+            backend.send({'test': index})
+
+        self.assertEqual(2, backend.dropped)
+        self.assertEqual(3, backend.queue_depth)
+
+        inner.unblocked.set()
+        self.assertTrue(wait_for(lambda: len(inner.events) == 3))
+        self.assertEqual([{'test': 0}, {'test': 1}, {'test': 2}], inner.events)
+
+    def test_drop_oldest_when_full(self):
+        backend, inner = self.make_backend(max_queue_size=2, batch_size=1, flush_interval=0.01, overflow='drop_oldest')
+        inner.unblocked.clear()
+
+        backend.send({'test': 0})
+        self.assertTrue(wait_for(lambda: backend.queue.qsize() == 0))
+        for index in range(1, 5):
+            backend.send({'test': index})
+
+        self.assertEqual(2, backend.dropped)
+
+        inner.unblocked.set()
+        self.assertTrue(wait_for(lambda: len(inner.events) == 3))
+        self.assertEqual([{'test': 0}, {'test': 3}, {'test': 4}], inner.events)
+
+    def test_block_when_full(self):
+        backend, inner = self.make_backend(
+            max_queue_size=1, batch_size=1, flush_interval=0.01, overflow='block', block_timeout=0.01
+        )
+        inner.unblocked.clear()
+
+        backend.send({'test': 0})
+        self.assertTrue(wait_for(lambda: backend.queue.qsize() == 0))
+        backend.send({'test': 1})
+
+        # no room within block_timeout
+        start = time.time()
+        backend.send({'test': 2})
+        self.assertGreaterEqual(time.time() - start, 0.01)
+        self.assertEqual(1, backend.dropped)
+
+        # room is made while the sender is blocked
+        backend.block_timeout = 5
+        threading.Timer(0.05, inner.unblocked.set).start()
+        backend.send({'test': 3})
+        self.assertEqual(1, backend.dropped)
+        self.assertTrue(wait_for(lambda: len(inner.events) == 3))
+        self.assertEqual([{'test': 0}, {'test': 1}, {'test': 3}], inner.events)
+
+    def test_invalid_overflow(self):
+        with self.assertRaises(ValueError):
+            BufferedBackend(backend={'ENGINE': 'track.backends.tests.test_buffered.InMemoryBackend'}, overflow='ignore')
+
+    @patch('track.backends.buffered.dog_stats_api')
+    def test_latency_histogram(self, mock_stats):
+        with patch('track.backends.buffered.threading.Thread'):
+            backend, _inner = self.make_backend(name='mongo')
+            backend.send({'test': 1})
+        backend.flush()
+        name, _latency = mock_stats.histogram.call_args[0]
+        self.assertEqual('track.send.backend.latency', name)
+        self.assertEqual(['backend:mongo'], mock_stats.histogram.call_args[1]['tags'])
+
+    def test_stop_flushes(self):
+        # no flusher thread, so everything is sent by stop()
+        with patch('track.backends.buffered.threading.Thread'):
+            backend, inner = self.make_backend(batch_size=2)
+            for index in range(5):
+                backend.send({'test': index})
+        self.assertEqual(5, backend.queue_depth)
+
+        backend.stop()
+        self.assertEqual([{'test': index} for index in range(5)], inner.events)
+        self.assertEqual([2, 2, 1], [len(batch) for batch in inner.batches])
+        self.assertEqual(0, backend.queue_depth)
+
+    def test_stop_does_not_wait_for_flush_interval(self):
+        backend, inner = self.make_backend(flush_interval=60)
+        backend.send({'test': 1})
+        self.assertTrue(wait_for(lambda: backend.queue.qsize() == 0))
+
+        start = time.time()
+        backend.stop()
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual([{'test': 1}], inner.events)
+
+    def test_thread_started_by_first_event(self):
+        with patch('track.backends.buffered.threading.Thread') as mock_thread:
+            backend, _inner = self.make_backend()
+            self.assertFalse(mock_thread.called)
+            backend.send({'test': 1})
+            backend.send({'test': 2})
+        self.assertEqual(1, mock_thread.call_count)
+
+    def test_forked_process_starts_own_thread(self):
+        with patch('track.backends.buffered.threading.Thread') as mock_thread:
+            backend, inner = self.make_backend()
+            backend.send({'test': 1})
+            with patch('track.backends.buffered.os.getpid', return_value=-1):
+                backend.send({'test': 2})
+                self.assertEqual(2, mock_thread.call_count)
+                # the parent's queued event is left to the parent
+                self.assertEqual(1, backend.queue_depth)
+                backend.stop()
+        self.assertEqual([{'test': 2}], inner.events)
+
+    def test_send_after_stop_dropped(self):
+        backend, inner = self.make_backend()
+        backend.stop()
+        backend.send({'test': 1})
+        self.assertEqual(1, backend.dropped)
+        self.assertEqual(0, backend.queue_depth)
+        self.assertEqual([], inner.events)
+
+    def test_stop_leaves_batch_to_running_thread(self):
+        backend, inner = self.make_backend(batch_size=1, flush_interval=0.01)
+        inner.unblocked.clear()
+        backend.send({'test': 1})
+        self.assertTrue(wait_for(lambda: backend.queue.qsize() == 0))
+
+        # the flusher thread is still sending the batch when stop() gives up on it
+        backend.stop(timeout=0.05)
+        inner.unblocked.set()
+        self.assertTrue(wait_for(lambda: not backend._thread.is_alive()))  # pylint: disable=protected-access
+        self.assertEqual([{'test': 1}], inner.events)
+
+    def test_replaced_backend_not_kept_alive(self):
+        backend = BufferedBackend(backend={'ENGINE': 'track.backends.tests.test_buffered.InMemoryBackend'})
+        backend.send({'test': 1})
+        backend.stop()
+        ref = weakref.ref(backend)
+        del backend
+        gc.collect()
+        self.assertIsNone(ref())
@@ -0,0 +1,107 @@
+"""
+Measure the time that event tracking adds to a request by firing events
+through `track.views.server_track` and `track.views.user_track` at a steady
+rate, with the configured TRACKING_BACKENDS called directly from the request
+thread (sync) and through per-backend buffered workers (async).
+
+    ./manage.py lms benchmark_tracking --rate 500 --duration 10 --settings=aws
+"""
+import time
+from optparse import make_option
+from textwrap import dedent
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+
+from track import tracker
+from track.views import server_track, user_track
+from util.benchmark import percentile
+
+
+MODES = ('sync', 'async')
+
+
+class Command(BaseCommand):
+    """
+    Fire `rate` events per second for `duration` seconds and report the
+    p50, p99 and maximum time spent per tracking call.
+    """
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--rate',
+                    action='store',
+                    type='int',
+                    dest='rate',
+                    default=200,
+                    help='Number of events sent per second'),
+        make_option('--duration',
+                    action='store',
+                    type='float',
+                    dest='duration',
+                    default=5,
+                    help='Number of seconds to send events for'),
+        make_option('--mode',
+                    action='append',
+                    dest='modes',
+                    choices=MODES,
+                    help='Dispatch mode to measure (sync or async); may be repeated. Defaults to both.'),
+    )
+
+    def handle(self, *args, **options):
+        if options['rate'] <= 0 or options['duration'] <= 0:
+            raise CommandError("--rate and --duration must be positive")
+
+        async_options = getattr(settings, 'TRACKING_ASYNC_DISPATCH', None) or {}
+        try:
+            for mode in options['modes'] or MODES:
+                with override_settings(TRACKING_ASYNC_DISPATCH=async_options if mode == 'async' else None):
+                    tracker._initialize_backends_from_django_settings()  # pylint: disable=protected-access
+                    timings = self.fire_events(options['rate'], options['duration'])
+                    self.stop_backends()
+                self.report(mode, timings)
+        finally:
+            tracker._initialize_backends_from_django_settings()  # pylint: disable=protected-access
+
+    def fire_events(self, rate, duration):
+        """
+        Alternate between server and browser events at `rate` events per
+        second, returning the seconds spent in each call.
+        """
+        factory = RequestFactory()
+        browser_request = factory.post('/event', {
+            'page': '/courses/benchmark/tracking/now/courseware',
+            'event_type': 'benchmark_browser_event',
+            'event': '{}',
+        })
+        server_request = factory.get('/courses/benchmark/tracking/now/courseware')
+        for request in (browser_request, server_request):
+            request.user = AnonymousUser()
+
+        timings = []
+        start = time.time()
+        for index in xrange(int(rate * duration)):
+            delay = start + float(index) / rate - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+            call_start = time.time()
+            if index % 2:
+                user_track(browser_request)
+            else:
+                server_track(server_request, 'benchmark_server_event', {'index': index})
+            timings.append(time.time() - call_start)
+        return timings
+
+    def stop_backends(self):
+        """Let buffered backends send what they have queued"""
+        for backend in tracker.backends.values():
+            backend.stop()
+
+    def report(self, mode, timings):
+        """Write the percentiles of `timings`, in milliseconds"""
+        self.stdout.write("{:<6} {:>7} events  p50 {:>8.3f}ms  p99 {:>8.3f}ms  max {:>8.3f}ms\n".format(
+            mode, len(timings), percentile(timings, 50) * 1000, percentile(timings, 99) * 1000, max(timings) * 1000
+        ))
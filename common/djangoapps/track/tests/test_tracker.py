@@ -4,6 +4,7 @@ from django.test.utils import override_settings
 
 import track.tracker as tracker
 from track.backends import BaseBackend
+from track.backends.buffered import BufferedBackend
 
 
 SIMPLE_SETTINGS = {
@@ -97,6 +98,49 @@ class TestTrackerDjangoInstantiation(TestCase):
 
         self.assertEqual(len(backends), 1)
 
+    @override_settings(
+        TRACKING_BACKENDS=MULTI_SETTINGS,
+        TRACKING_ASYNC_DISPATCH={'batch_size': 1, 'flush_interval': 0.01, 'overflow': 'drop_oldest'}
+    )
+    def test_django_async_settings(self):
+        """Test that each backend gets its own buffered worker."""
+
+        backends = self._reload_backends()
+        for backend in backends.values():
+            self.addCleanup(backend.stop)
+
+        self.assertEqual(len(backends), 2)
+        for name, backend in backends.iteritems():
+            self.assertIsInstance(backend, BufferedBackend)
+            self.assertIsInstance(backend.backend, DummyBackend)
+            self.assertEqual(backend.name, name)
+            self.assertEqual(backend.overflow, 'drop_oldest')
+
+        tracker.send({})
+
+        for backend in backends.values():
+            backend.stop()
+            self.assertEqual(backend.backend.count, 1)
+
+    @override_settings(
+        TRACKING_BACKENDS=MULTI_SETTINGS,
+        TRACKING_ASYNC_DISPATCH={'batch_size': 100, 'flush_interval': 60}
+    )
+    def test_reload_stops_old_backends(self):
+        """Test that replaced backends are stopped, sending what they hold."""
+
+        old_backends = self._reload_backends().values()
+        tracker.send({})
+
+        new_backends = self._reload_backends().values()
+        for backend in new_backends:
+            self.addCleanup(backend.stop)
+
+        for backend in old_backends:
+            self.assertNotIn(backend, new_backends)
+            self.assertEqual(backend.queue_depth, 0)
+            self.assertEqual(backend.backend.count, 1)
+
     def _reload_backends(self):
         # pylint: disable=protected-access
 
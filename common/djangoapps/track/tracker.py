@@ -16,6 +16,17 @@ below::
       }
   }
 
+Sending an event calls every backend in the request thread. To keep slow
+backends out of the request, set `TRACKING_ASYNC_DISPATCH` to the options
+of a `track.backends.buffered.BufferedBackend`; every configured backend is
+then wrapped in its own buffered backend, with its own worker thread and
+bounded queue, so that sending only enqueues the event::
+
+  TRACKING_ASYNC_DISPATCH = {
+      'max_queue_size': 10000,
+      'overflow': 'drop_oldest',
+  }
+
 """
 
 import inspect
@@ -33,23 +44,37 @@ __all__ = ['send']
 
 backends = {}
 
+# Backend wrapping every other backend when TRACKING_ASYNC_DISPATCH is set
+ASYNC_BACKEND = 'track.backends.buffered.BufferedBackend'
+
 
 def _initialize_backends_from_django_settings():
     """
     Initialize the event tracking backends according to the
-    configuration in django settings
+    configuration in django settings, then stop the backends they
+    replace, sending what those still hold.
 
     """
-    backends.clear()
-
     config = getattr(settings, 'TRACKING_BACKENDS', {})
+    async_options = getattr(settings, 'TRACKING_ASYNC_DISPATCH', None)
 
+    new_backends = {}
     for name, values in config.iteritems():
         # Ignore empty values to turn-off default tracker backends
         if values:
-            engine = values['ENGINE']
-            options = values.get('OPTIONS', {})
-            backends[name] = _instantiate_backend_from_name(engine, options)
+            if async_options is not None:
+                options = dict(async_options, backend=values, name=name)
+                new_backends[name] = _instantiate_backend_from_name(ASYNC_BACKEND, options)
+            else:
+                engine = values['ENGINE']
+                options = values.get('OPTIONS', {})
+                new_backends[name] = _instantiate_backend_from_name(engine, options)
+
+    old_backends = backends.values()
+    backends.clear()
+    backends.update(new_backends)
+    for backend in old_backends:
+        backend.stop()
 
 
 def _instantiate_backend_from_name(name, options):
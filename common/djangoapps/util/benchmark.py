@@ -0,0 +1,10 @@
+"""
+Utilities for the benchmark management commands.
+"""
+
+
+def percentile(values, percent):
+    """The `percent`th percentile of `values`, by the nearest-rank method"""
+    ordered = sorted(values)
+    rank = max(0, int(round(percent / 100.0 * len(ordered))) - 1)
+    return ordered[rank]
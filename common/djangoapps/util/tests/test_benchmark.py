@@ -0,0 +1,25 @@
+"""
+Tests for benchmark.py
+"""
+
+from django.test import TestCase
+from util.benchmark import percentile
+
+
+class PercentileTest(TestCase):
+    """
+    Tests for percentile.
+    """
+    def test_nearest_rank(self):
+        values = [5, 1, 4, 2, 3, 10, 9, 8, 7, 6]
+        self.assertEqual(percentile(values, 50), 5)
+        self.assertEqual(percentile(values, 90), 9)
+        self.assertEqual(percentile(values, 99), 10)
+        self.assertEqual(percentile(values, 100), 10)
+
+    def test_low_percentiles(self):
+        self.assertEqual(percentile([3, 1, 2], 0), 1)
+        self.assertEqual(percentile([3, 1, 2], 1), 1)
+
+    def test_single_value(self):
+        self.assertEqual(percentile([7], 50), 7)
@@ -0,0 +1,86 @@
+"""
+Micro-benchmarks for calc: parse and evaluation throughput.
+
+    python benchmark.py [--samples 20] [--repeat 3]
+
+Reports, for a few typical FormulaResponse answers:
+
+- parses/s without the parse cache (the grammar is still built only once)
+- parses/s with the parse cache
+- samples/s evaluating one sample at a time, as `evaluator` does
+- samples/s evaluating all samples at once with `vectorized_evaluator`
+"""
+import argparse
+import timeit
+
+import numpy
+
+import calc
+
+EXPRESSIONS = [
+    'x + 2*y',
+    '3*x^2 - 2*x*y + sqrt(y^2 + 1)',
+    'R1 || R2 || (R3 + 10k)',
+    'sin(omega*t + phi) * exp(-t/tau)',
+]
+
+VARIABLES = ['x', 'y', 'R1', 'R2', 'R3', 'omega', 't', 'phi', 'tau']
+
+
+def rate(count, function, repeat):
+    """Return how many times per second `function` runs, doing `count` things per run"""
+    best = min(timeit.repeat(function, number=1, repeat=repeat))
+    return count / best if best else float('inf')
+
+
+def benchmark_expression(math_expr, samples, repeat):
+    """Return the four throughput figures for `math_expr`"""
+    arrays = dict((name, numpy.random.uniform(1, 10, samples)) for name in VARIABLES)
+    sample_dicts = [
+        dict((name, float(values[index])) for name, values in arrays.iteritems())
+        for index in range(samples)
+    ]
+
+    def parse_uncached():
+        """Parse with an empty cache"""
+        calc.PARSE_CACHE.clear()
+        calc.ParseAugmenter(math_expr).parse_algebra()
+
+    def parse_cached():
+        """Parse with the expression in the cache"""
+        calc.ParseAugmenter(math_expr).parse_algebra()
+
+    def evaluate_each():
+        """Evaluate one sample at a time"""
+        for variables in sample_dicts:
+            calc.evaluator(variables, {}, math_expr)
+
+    def evaluate_vectorized():
+        """Evaluate all the samples at once"""
+        calc.vectorized_evaluator(arrays, {}, math_expr)
+
+    return (
+        rate(1, parse_uncached, repeat * 10),
+        rate(1, parse_cached, repeat * 10),
+        rate(samples, evaluate_each, repeat),
+        rate(samples, evaluate_vectorized, repeat),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure calc parse and evaluation throughput")
+    parser.add_argument('--samples', type=int, default=20, help="Number of samples per evaluation")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timing runs; the best is kept")
+    args = parser.parse_args()
+
+    print "{:<36} {:>14} {:>14} {:>14} {:>14}".format(
+        'expression', 'parse/s', 'cached parse/s', 'samples/s', 'vectorized/s'
+    )
+    for math_expr in EXPRESSIONS:
+        print "{:<36} {:>14.0f} {:>14.0f} {:>14.0f} {:>14.0f}".format(
+            math_expr, *benchmark_expression(math_expr, args.samples, args.repeat)
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -2,11 +2,19 @@
 Parser and evaluator for FormulaResponse and NumericalResponse
 
 Uses pyparsing to parse. Main function as of now is evaluator().
+
+The grammar is built once, and the trees it produces are kept in a small LRU
+cache keyed by the expression, since the same answers are parsed over and
+over. `vectorized_evaluator()` evaluates an expression for whole NumPy arrays
+of variable values in one walk of the tree.
 """
 
 import math
 import operator
 import numbers
+import threading
+from collections import OrderedDict
+
 import numpy
 import scipy.constants
 import functions
@@ -61,6 +69,19 @@ DEFAULT_VARIABLES = {
     'q': scipy.constants.e  # Fund. Charge: 1.602176565e-19 (Coulombs)
 }
 
+# Functions of DEFAULT_FUNCTIONS that are not NumPy ufuncs but still accept
+# arrays; any other function is applied element by element when evaluating
+# arrays of samples.
+ARRAY_FUNCTIONS = frozenset([
+    functions.sec, functions.csc, functions.cot,
+    functions.arcsec, functions.arccsc,
+    functions.sech, functions.csch, functions.coth,
+    functions.arcsech, functions.arccsch,
+])
+
+# Number of parsed expressions kept by ParseAugmenter.parse_algebra
+PARSE_CACHE_SIZE = 1024
+
 # We eliminated the following extreme suffixes:
 #   P (1e15), E (1e18), Z (1e21), Y (1e24),
 #   f (1e-15), a (1e-18), z (1e-21), y (1e-24)
@@ -121,8 +142,8 @@ def eval_atom(parse_result):
 
     In the case of parenthesis, ignore them.
     """
-    # Find first number in the list
-    result = next(k for k in parse_result if isinstance(k, numbers.Number))
+    # Find first value in the list; it may be a number or an array of them
+    result = next(k for k in parse_result if not isinstance(k, basestring))
     return result
 
 
@@ -136,7 +157,7 @@ def eval_power(parse_result):
     # `reduce` will go from left to right; reverse the list.
     parse_result = reversed(
         [k for k in parse_result
-         if isinstance(k, numbers.Number)]  # Ignore the '^' marks.
+         if not isinstance(k, basestring)]  # Ignore the '^' marks.
     )
     # Having reversed it, raise `b` to the power of `a`.
     power = reduce(lambda a, b: b ** a, parse_result)
@@ -162,6 +183,18 @@ def eval_parallel(parse_result):
     return 1. / sum(reciprocals)
 
 
+def eval_parallel_vectorized(parse_result):
+    """
+    Like `eval_parallel`, for arrays of values: NaN where any input is zero.
+    """
+    values = [numpy.asarray(e) for e in parse_result if not isinstance(e, basestring)]
+    if len(values) == 1:
+        return parse_result[0]
+    has_zero = reduce(numpy.logical_or, [value == 0 for value in values])
+    reciprocals = [1. / value for value in values]
+    return numpy.where(has_zero, float('nan'), 1. / sum(reciprocals))
+
+
 def eval_sum(parse_result):
     """
     Add the inputs, keeping in mind their sign.
@@ -173,12 +206,12 @@ def eval_sum(parse_result):
     total = 0.0
     current_op = operator.add
     for token in parse_result:
-        if token == '+':
+        if not isinstance(token, basestring):
+            total = current_op(total, token)
+        elif token == '+':
             current_op = operator.add
         elif token == '-':
             current_op = operator.sub
-        else:
-            total = current_op(total, token)
     return total
 
 
@@ -191,12 +224,12 @@ def eval_product(parse_result):
     prod = 1.0
     current_op = operator.mul
     for token in parse_result:
-        if token == '*':
+        if not isinstance(token, basestring):
+            prod = current_op(prod, token)
+        elif token == '*':
             current_op = operator.mul
         elif token == '/':
             current_op = operator.truediv
-        else:
-            prod = current_op(prod, token)
     return prod
 
 
@@ -216,6 +249,16 @@ def add_defaults(variables, functions, case_sensitive):
     return (all_variables, all_functions)
 
 
+def apply_vectorized(function, argument):
+    """
+    Apply `function` to an array of values, calling it once per element
+    unless it is known to accept arrays.
+    """
+    if isinstance(function, numpy.ufunc) or function in ARRAY_FUNCTIONS or numpy.ndim(argument) == 0:
+        return function(argument)
+    return numpy.array([function(value) for value in argument])
+
+
 def evaluator(variables, functions, math_expr, case_sensitive=False):
     """
     Evaluate an expression; that is, take a string of math and return a float.
@@ -228,6 +271,32 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
     if math_expr.strip() == "":
         return float('nan')
 
+    return _evaluate(variables, functions, math_expr, case_sensitive, vectorized=False)
+
+
+def vectorized_evaluator(variables, functions, math_expr, case_sensitive=False):
+    """
+    Evaluate an expression for many samples at once.
+
+    Like `evaluator`, but the values of `variables` are NumPy arrays holding
+    one value per sample, all of the same length. Returns an array of the
+    results, or a single number if the expression uses no variable.
+
+    NumPy does not raise errors where Python numbers do: dividing by zero
+    gives inf, and functions outside their domain give NaN.
+    """
+    if math_expr.strip() == "":
+        return float('nan')
+
+    with numpy.errstate(all='ignore'):
+        return _evaluate(variables, functions, math_expr, case_sensitive, vectorized=True)
+
+
+def _evaluate(variables, functions, math_expr, case_sensitive, vectorized):
+    """
+    Parse and check `math_expr`, then evaluate it, with the actions for
+    NumPy arrays of samples if `vectorized`.
+    """
     # Parse the tree.
     math_interpreter = ParseAugmenter(math_expr, case_sensitive)
     math_interpreter.parse_algebra()
@@ -254,10 +323,138 @@ def evaluator(variables, functions, math_expr, case_sensitive=False):
         'product': eval_product,
         'sum': eval_sum
     }
+    if vectorized:
+        evaluate_actions.update({
+            'function': lambda x: apply_vectorized(all_functions[casify(x[0])], x[1]),
+            'parallel': eval_parallel_vectorized,
+        })
 
     return math_interpreter.reduce_tree(evaluate_actions)
 
 
+def _build_grammar():
+    """
+    Build the pyparsing grammar for algebraic expressions.
+
+    The result of parsing is a `pyparsing.ParseResult` with proper groupings
+    to reflect parenthesis and order of operations. All operators are left
+    in the tree and strings of numbers are not parsed into their floats.
+    """
+    # 0.33 or 7 or .34 or 16.
+    number_part = Word(nums)
+    inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
+    # pyparsing allows spaces between tokens--`Combine` prevents that.
+    inner_number = Combine(inner_number)
+
+    # SI suffixes and percent.
+    number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
+
+    # 0.33k or 17
+    plus_minus = Literal('+') | Literal('-')
+    number = Group(
+        Optional(plus_minus) +
+        inner_number +
+        Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
+        Optional(number_suffix)
+    )
+    number = number("number")
+
+    # Predefine recursive variables.
+    expr = Forward()
+
+    # Handle variables passed in. They must start with letters/underscores
+    # and may contain numbers afterward.
+    inner_varname = Word(alphas + "_", alphanums + "_")
+    varname = Group(inner_varname)("variable")
+
+    # Same thing for functions.
+    function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
+
+    atom = number | function | varname | "(" + expr + ")"
+    atom = Group(atom)("atom")
+
+    # Do the following in the correct order to preserve order of operation.
+    pow_term = atom + ZeroOrMore("^" + atom)
+    pow_term = Group(pow_term)("power")
+
+    par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
+    par_term = Group(par_term)("parallel")
+
+    prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
+    prod_term = Group(prod_term)("product")
+
+    sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
+    sum_term = Group(sum_term)("sum")
+
+    # Finish the recursion.
+    expr << sum_term  # pylint: disable=W0104
+    grammar = expr + stringEnd
+    grammar.streamline()
+    return grammar
+
+
+ALGEBRA_GRAMMAR = _build_grammar()
+
+
+def names_used(tree):
+    """
+    Return the sets of variable names and function names used in `tree`.
+    """
+    variables = set()
+    function_names = set()
+    nodes = [tree]
+    while nodes:
+        node = nodes.pop()
+        if not isinstance(node, ParseResults):
+            continue
+        node_name = node.getName()
+        if node_name == 'variable':
+            variables.add(node[0])
+        elif node_name == 'function':
+            function_names.add(node[0])
+        nodes.extend(node)
+    return variables, function_names
+
+
+class LRUCache(object):
+    """
+    Thread-safe mapping that keeps the `size` most recently used entries.
+    """
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the entry for `key` and mark it recently used, or None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._entries[key] = entry
+            return entry
+
+    def set(self, key, entry):
+        """Add `entry`, evicting the least recently used if full"""
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = entry
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# (tree, variables used, functions used) tuples keyed by (math_expr,
+# case_sensitive). Trees must not be modified once cached.
+PARSE_CACHE = LRUCache(PARSE_CACHE_SIZE)
+
+
 class ParseAugmenter(object):
     """
     Holds the data for a particular parse.
@@ -278,86 +475,31 @@ class ParseAugmenter(object):
         self.variables_used = set()
         self.functions_used = set()
 
-        def vpa(tokens):
-            """
-            When a variable is recognized, store it in `variables_used`.
-            """
-            varname = tokens[0][0]
-            self.variables_used.add(varname)
-
-        def fpa(tokens):
-            """
-            When a function is recognized, store it in `functions_used`.
-            """
-            varname = tokens[0][0]
-            self.functions_used.add(varname)
-
-        self.variable_parse_action = vpa
-        self.function_parse_action = fpa
-
     def parse_algebra(self):
         """
         Parse an algebraic expression into a tree.
 
         Store a `pyparsing.ParseResult` in `self.tree` with proper groupings to
-        reflect parenthesis and order of operations. Leave all operators in the
-        tree and do not parse any strings of numbers into their float versions.
+        reflect parenthesis and order of operations, and the names it uses in
+        `self.variables_used` and `self.functions_used`. See `_build_grammar`.
+
+        Trees are shared through `PARSE_CACHE`; do not modify them.
 
         Adding the groups and result names makes the `repr()` of the result
         really gross. For debugging, use something like
           print OBJ.tree.asXML()
         """
-        # 0.33 or 7 or .34 or 16.
-        number_part = Word(nums)
-        inner_number = (number_part + Optional("." + Optional(number_part))) | ("." + number_part)
-        # pyparsing allows spaces between tokens--`Combine` prevents that.
-        inner_number = Combine(inner_number)
-
-        # SI suffixes and percent.
-        number_suffix = MatchFirst(Literal(k) for k in SUFFIXES.keys())
-
-        # 0.33k or 17
-        plus_minus = Literal('+') | Literal('-')
-        number = Group(
-            Optional(plus_minus) +
-            inner_number +
-            Optional(CaselessLiteral("E") + Optional(plus_minus) + number_part) +
-            Optional(number_suffix)
-        )
-        number = number("number")
-
-        # Predefine recursive variables.
-        expr = Forward()
-
-        # Handle variables passed in. They must start with letters/underscores
-        # and may contain numbers afterward.
-        inner_varname = Word(alphas + "_", alphanums + "_")
-        varname = Group(inner_varname)("variable")
-        varname.setParseAction(self.variable_parse_action)
-
-        # Same thing for functions.
-        function = Group(inner_varname + Suppress("(") + expr + Suppress(")"))("function")
-        function.setParseAction(self.function_parse_action)
-
-        atom = number | function | varname | "(" + expr + ")"
-        atom = Group(atom)("atom")
-
-        # Do the following in the correct order to preserve order of operation.
-        pow_term = atom + ZeroOrMore("^" + atom)
-        pow_term = Group(pow_term)("power")
-
-        par_term = pow_term + ZeroOrMore('||' + pow_term)  # 5k || 4k
-        par_term = Group(par_term)("parallel")
-
-        prod_term = par_term + ZeroOrMore((Literal('*') | Literal('/')) + par_term)  # 7 * 5 / 4
-        prod_term = Group(prod_term)("product")
-
-        sum_term = Optional(plus_minus) + prod_term + ZeroOrMore(plus_minus + prod_term)  # -5 + 4 - 3
-        sum_term = Group(sum_term)("sum")
-
-        # Finish the recursion.
-        expr << sum_term  # pylint: disable=W0104
-        self.tree = (expr + stringEnd).parseString(self.math_expr)[0]
+        key = (self.math_expr, self.case_sensitive)
+        entry = PARSE_CACHE.get(key)
+        if entry is None:
+            tree = ALGEBRA_GRAMMAR.parseString(self.math_expr)[0]
+            variables, function_names = names_used(tree)
+            entry = (tree, frozenset(variables), frozenset(function_names))
+            PARSE_CACHE.set(key, entry)
+
+        self.tree, variables, function_names = entry
+        self.variables_used = set(variables)
+        self.functions_used = set(function_names)
 
     def reduce_tree(self, handle_actions, terminal_converter=None):
         """
@@ -558,3 +558,85 @@ class EvaluatorTest(unittest.TestCase):
             calc.evaluator({'r1': 5}, {}, "r1+r2")
         with self.assertRaisesRegexp(calc.UndefinedVariable, 'r1 r3'):
             calc.evaluator(variables, {}, "r1*r3", case_sensitive=True)
+
+
+class ParseCacheTest(unittest.TestCase):
+    """
+    Test that parsed expressions are cached and shared.
+    """
+    def setUp(self):
+        calc.PARSE_CACHE.clear()
+
+    def parse(self, math_expr, case_sensitive=False):
+        """Return the ParseAugmenter for `math_expr`, parsed"""
+        parser = calc.ParseAugmenter(math_expr, case_sensitive)
+        parser.parse_algebra()
+        return parser
+
+    def test_reuses_tree(self):
+        first = self.parse('x^2 + sin(y)')
+        second = self.parse('x^2 + sin(y)')
+        self.assertIs(first.tree, second.tree)
+        self.assertEqual(second.variables_used, set(['x', 'y']))
+        self.assertEqual(second.functions_used, set(['sin']))
+        self.assertIsNot(self.parse('x^2 + sin(y)', case_sensitive=True).tree, first.tree)
+
+    def test_names_in_function_arguments(self):
+        parser = self.parse('f(g(a) + b) || c')
+        self.assertEqual(parser.variables_used, set(['a', 'b', 'c']))
+        self.assertEqual(parser.functions_used, set(['f', 'g']))
+
+    def test_evicts_least_recently_used(self):
+        cache = calc.LRUCache(2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+
+    def test_parse_errors_not_cached(self):
+        with self.assertRaises(ParseException):
+            self.parse('1+.')
+        self.assertEqual(len(calc.PARSE_CACHE), 0)
+
+
+class VectorizedEvaluatorTest(unittest.TestCase):
+    """
+    Test that evaluating arrays of samples matches evaluating them one by one.
+    """
+    def assert_matches_evaluator(self, math_expr, functions=None):
+        """
+        Evaluate `math_expr` for arrays of x and y and compare the results
+        with calc.evaluator for each pair.
+        """
+        functions = functions or {}
+        xs = numpy.linspace(0.5, 5, 7)
+        # no zero, so that evaluator doesn't raise ZeroDivisionError
+        ys = numpy.linspace(-2.5, 3.5, 7)
+        results = calc.vectorized_evaluator({'x': xs, 'y': ys}, functions, math_expr)
+        self.assertEqual(numpy.shape(results), (7,))
+        for x, y, result in zip(xs, ys, results):
+            expected = calc.evaluator({'x': float(x), 'y': float(y)}, functions, math_expr)
+            self.assertAlmostEqual(expected, result, msg=math_expr)
+
+    def test_expressions(self):
+        for math_expr in ('x + 2*y', '-x^2^0.5 / y', 'x || 2 || 3k', 'sin(x) * sec(y) + sqrt(x)',
+                          'arccot(y) - fact(3)', '2.5e-1 * (x + y) + 5%', 'j*x + pi'):
+            self.assert_matches_evaluator(math_expr)
+
+    def test_user_functions(self):
+        self.assert_matches_evaluator('f(x) + y', {'f': lambda value: max(value, 1.0)})
+
+    def test_parallel_with_zero(self):
+        results = calc.vectorized_evaluator({'x': numpy.array([0.0, 1.0])}, {}, 'x || 1')
+        self.assertTrue(numpy.isnan(results[0]))
+        self.assertEqual(results[1], 0.5)
+
+    def test_constant(self):
+        self.assertEqual(calc.vectorized_evaluator({'x': numpy.array([1.0, 2.0])}, {}, '2*3'), 6)
+
+    def test_undefined_vars(self):
+        with self.assertRaisesRegexp(calc.UndefinedVariable, 'z'):
+            calc.vectorized_evaluator({'x': numpy.array([1.0])}, {}, 'x + z')
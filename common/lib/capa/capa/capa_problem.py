@@ -14,23 +14,25 @@ This is used by capa_module.
 """
 
 from datetime import datetime
+import hashlib
 import logging
 import os.path
 import re
+import time
 
 from lxml import etree
 from xml.sax.saxutils import unescape
 from copy import deepcopy
 
+from calc import LRUCache
 from capa.correctmap import CorrectMap
 import capa.inputtypes as inputtypes
 import capa.customrender as customrender
 import capa.responsetypes as responsetypes
+from capa.script_results import ProblemScript, SCRIPT_RESULTS
 from capa.util import contextualize_text, convert_files_to_filenames
 import capa.xqueue_interface as xqueue_interface
 
-from capa.safe_exec import safe_exec
-
 from pytz import UTC
 
 # extra things displayed after "show answers" is pressed
@@ -57,8 +59,39 @@ html_problem_semantics = [
     "openendedrubric",
 ]
 
+# number of parsed problems each process keeps, see TEMPLATE_CACHE
+TEMPLATE_CACHE_SIZE = 256
+
+# seconds a cached problem is used before its included files are checked for changes
+INCLUDE_CHECK_INTERVAL = 60
+
 log = logging.getLogger(__name__)
 
+
+class ProblemTemplate(object):
+    """
+    The parts of a LoncapaProblem that are the same for every learner: the
+    problem tree with its includes processed and its IDs assigned, and the
+    code of its scripts. The results of the scripts are in SCRIPT_RESULTS.
+    `includes` maps the name of each included file to a digest of the
+    contents that went into the tree, or None if it couldn't be read;
+    `includes_checked` is when they were last found unchanged.
+
+    Templates are shared, so the tree must not be modified: LoncapaProblem
+    works on a copy.
+    """
+    def __init__(self, tree, script_code, python_path, includes):
+        self.tree = tree
+        self.script_code = script_code
+        self.python_path = python_path
+        self.includes = includes
+        self.includes_checked = time.time()
+
+
+# ProblemTemplates keyed by LoncapaProblem._template_key(). Rescoring a
+# problem, or rendering it for many learners, then parses it only once.
+TEMPLATE_CACHE = LRUCache(TEMPLATE_CACHE_SIZE)
+
 #-----------------------------------------------------------------------------
 # main class for this module
 
@@ -112,7 +145,7 @@ class LoncapaProblem(object):
     Main class for capa Problems.
     """
 
-    def __init__(self, problem_text, id, capa_system, state=None, seed=None):
+    def __init__(self, problem_text, id, capa_system, state=None, seed=None, seeds=None):
         """
         Initializes capa Problem.
 
@@ -129,6 +162,9 @@ class LoncapaProblem(object):
                 - `done` (bool) indicates whether or not this problem is considered done
                 - `input_state` (dict) maps input_id to a dictionary that holds the state for that input
             seed (int): random number generator seed.
+            seeds (list): the seeds other learners get for this problem, if
+                there are few of them, so that the results of its scripts
+                can be computed ahead of time.
 
         """
 
@@ -136,6 +172,7 @@ class LoncapaProblem(object):
         self.do_reset()
         self.problem_id = id
         self.capa_system = capa_system
+        self.seeds = seeds
 
         state = state or {}
 
@@ -156,19 +193,17 @@ class LoncapaProblem(object):
         problem_text = re.sub(r"endouttext\s*/", "/text", problem_text)
         self.problem_text = problem_text
 
-        # parse problem XML file into an element tree
-        self.tree = etree.XML(problem_text)
-
-        # handle any <include file="foo"> tags
-        self._process_includes()
+        # parse the problem, or reuse the parse of another learner's copy of it
+        template = self._get_template()
+        self.tree = deepcopy(template.tree)
 
         # construct script processor context (eg for customresponse problems)
-        self.context = self._extract_context(self.tree)
+        self.context = self._extract_context(template.script_code, template.python_path)
 
-        # Pre-parse the XML tree: modifies it to add ID's and perform some in-place
-        # transformations.  This also creates the dict (self.responders) of Response
-        # instances for each question in the problem. The dict has keys = xml subtree of
-        # Response, values = Response instance
+        # Pre-parse the XML tree: performs some in-place transformations.  This
+        # also creates the dict (self.responders) of Response instances for each
+        # question in the problem. The dict has keys = xml subtree of Response,
+        # values = Response instance
         self._preprocess_problem(self.tree)
 
         if not self.student_answers:  # True when student_answers is an empty dict
@@ -526,6 +561,69 @@ class LoncapaProblem(object):
 
     # ======= Private Methods Below ========
 
+    def _template_key(self):
+        """
+        Key of this problem's ProblemTemplate: everything parsing depends on.
+        The problem id is derived from the problem's location, so it also
+        identifies the course; the filestore is where includes and python
+        libraries are read from.
+
+        The included files aren't known until the problem is parsed, so
+        they aren't part of the key: _get_template checks them instead, every
+        INCLUDE_CHECK_INTERVAL seconds.
+        """
+        text = self.problem_text
+        if isinstance(text, unicode):
+            text = text.encode('utf-8')
+        return (
+            hashlib.sha1(text).hexdigest(),
+            self.problem_id,
+            getattr(self.capa_system.filestore, 'root_path', None),
+            bool(self.capa_system.DEBUG),
+        )
+
+    def _get_template(self):
+        """
+        Return the ProblemTemplate of this problem, parsing the problem if no
+        other LoncapaProblem in this process has already done it.
+        """
+        key = self._template_key()
+        template = TEMPLATE_CACHE.get(key)
+        if (template is not None and template.includes and
+                time.time() - template.includes_checked >= INCLUDE_CHECK_INTERVAL):
+            if any(
+                    self._include_digest(filename) != digest
+                    for filename, digest in template.includes.iteritems()
+            ):
+                # an included file has changed since the problem was parsed
+                template = None
+            else:
+                template.includes_checked = time.time()
+        if template is None:
+            # parse problem XML file into an element tree
+            self.tree = etree.XML(self.problem_text)
+
+            # handle any <include file="foo"> tags
+            self._includes = {}
+            self._process_includes()
+
+            self._assign_ids(self.tree)
+            script_code, python_path = self._extract_script(self.tree)
+            template = ProblemTemplate(self.tree, script_code, python_path, self._includes)
+            TEMPLATE_CACHE.set(key, template)
+        return template
+
+    def _include_digest(self, filename):
+        """
+        Digest of the contents of the included file `filename`, or None if it
+        can't be read.
+        """
+        try:
+            with self.capa_system.filestore.open(filename) as include_file:
+                return hashlib.sha1(include_file.read()).hexdigest()
+        except Exception:  # pylint: disable=broad-except
+            return None
+
     def _process_includes(self):
         """
         Handle any <include file="foo"> tags by reading in the specified file and inserting it
@@ -539,6 +637,7 @@ class LoncapaProblem(object):
                     # open using LoncapaSystem OSFS filestore
                     ifp = self.capa_system.filestore.open(filename)
                 except Exception as err:
+                    self._includes[filename] = None
                     log.warning(
                         'Error %s in problem xml include: %s',
                         err,
@@ -555,7 +654,10 @@ class LoncapaProblem(object):
                         continue
                 try:
                     # read in and convert to XML
-                    incxml = etree.XML(ifp.read())
+                    with ifp:
+                        contents = ifp.read()
+                    self._includes[filename] = hashlib.sha1(contents).hexdigest()
+                    incxml = etree.XML(contents)
                 except Exception as err:
                     log.warning(
                         'Error %s in problem xml include: %s',
@@ -610,16 +712,13 @@ class LoncapaProblem(object):
 
         return path
 
-    def _extract_context(self, tree):
+    def _extract_script(self, tree):
         """
-        Extract content of <script>...</script> from the problem.xml file, and exec it in the
-        context of this problem.  Provides ability to randomize problems, and also set
-        variables for problem answer checking.
+        Extract content of <script>...</script> from the problem.xml file.
 
-        Problem XML goes to Python execution context. Runs everything in script tags.
+        Returns the code of all the Python scripts, and the Python path they
+        need to run.
         """
-        context = {}
-        context['seed'] = self.seed
         all_code = ''
 
         python_path = []
@@ -642,17 +741,34 @@ class LoncapaProblem(object):
             code = unescape(script.text, XMLESC)
             all_code += code
 
+        return all_code, python_path
+
+    def _extract_context(self, all_code, python_path):
+        """
+        Exec the code of the problem's scripts in the context of this problem.
+        Provides ability to randomize problems, and also set variables for
+        problem answer checking.
+
+        Problem XML goes to Python execution context. Runs everything in script tags.
+
+        The scripts' results are looked up in SCRIPT_RESULTS first, and the
+        results for the other `seeds` of the problem are computed ahead.
+        """
+        context = {}
+        context['seed'] = self.seed
+
         if all_code:
-            try:
-                safe_exec(
-                    all_code,
-                    context,
-                    random_seed=self.seed,
-                    python_path=python_path,
-                    cache=self.capa_system.cache,
-                    slug=self.problem_id,
-                    unsafely=self.capa_system.can_execute_unsafe_code(),
+            script = ProblemScript(
+                all_code, python_path,
+                unsafely=self.capa_system.can_execute_unsafe_code(),
+                slug=self.problem_id,
+            )
+            if self.seeds:
+                SCRIPT_RESULTS.precompute(
+                    script, [seed for seed in self.seeds if seed != self.seed], self.capa_system.cache
                 )
+            try:
+                context = SCRIPT_RESULTS.get(script, self.seed, self.capa_system.cache)
             except Exception as err:
                 log.exception("Error while execing script code: " + all_code)
                 msg = "Error while executing script code: %s" % str(err).replace('<', '&lt;')
@@ -761,39 +877,53 @@ class LoncapaProblem(object):
 
         return tree
 
-    def _preprocess_problem(self, tree):  # private
+    def _response_inputfields(self, tree, response):
+        """
+        Return the input and solution elements of `response`, in document order.
+        """
+        input_tags = inputtypes.registry.registered_tags()
+        return tree.xpath(
+            "|".join(['//' + response.tag + '[@id=$id]//' + x for x in (input_tags + solution_tags)]),
+            id=response.get('id')
+        )
+
+    def _assign_ids(self, tree):  # private
         """
         Assign IDs to all the responses
         Assign sub-IDs to all entries (textline, schematic, etc.)
-        Annoted correctness and value
         In-place transformation
 
-        Also create capa Response instances for each responsetype and save as self.responders
-
-        Obtain all responder answers and save as self.responder_answers dict (key = response)
+        The IDs only depend on the problem and its id, so they are assigned
+        once, in the ProblemTemplate.
         """
         response_id = 1
-        self.responders = {}
         for response in tree.xpath('//' + "|//".join(responsetypes.registry.registered_tags())):
             response_id_str = self.problem_id + "_" + str(response_id)
             # create and save ID for this response
             response.set('id', response_id_str)
             response_id += 1
 
-            answer_id = 1
-            input_tags = inputtypes.registry.registered_tags()
-            inputfields = tree.xpath(
-                "|".join(['//' + response.tag + '[@id=$id]//' + x for x in (input_tags + solution_tags)]),
-                id=response_id_str
-            )
-
             # assign one answer_id for each input type or solution type
-            for entry in inputfields:
+            answer_id = 1
+            for entry in self._response_inputfields(tree, response):
                 entry.attrib['response_id'] = str(response_id)
                 entry.attrib['answer_id'] = str(answer_id)
                 entry.attrib['id'] = "%s_%i_%i" % (self.problem_id, response_id, answer_id)
                 answer_id = answer_id + 1
 
+    def _preprocess_problem(self, tree):  # private
+        """
+        Annoted correctness and value
+        In-place transformation
+
+        Create capa Response instances for each responsetype and save as self.responders
+
+        Obtain all responder answers and save as self.responder_answers dict (key = response)
+        """
+        self.responders = {}
+        for response in tree.xpath('//' + "|//".join(responsetypes.registry.registered_tags())):
+            inputfields = self._response_inputfields(tree, response)
+
             # instantiate capa Response
             responsetype_cls = responsetypes.registry.get_class_for_tag(response.tag)
             responder = responsetype_cls(response, inputfields, self.context, self.capa_system)
@@ -36,7 +36,7 @@ from shapely.geometry import Point, MultiPoint
 from dogapi import dog_stats_api
 
 # specific library imports
-from calc import evaluator, UndefinedVariable
+from calc import evaluator, vectorized_evaluator, UndefinedVariable
 from . import correctmap
 from .registry import TagRegistry
 from datetime import datetime
@@ -2290,6 +2290,10 @@ class FormulaResponse(LoncapaResponse):
         """
         _ = self.capa_system.i18n.ugettext
 
+        out = self.tupleize_answers_vectorized(answer, var_dict_list)
+        if out is not None:
+            return out
+
         out = []
         for var_dict in var_dict_list:
             try:
@@ -2341,6 +2345,33 @@ class FormulaResponse(LoncapaResponse):
                 )
         return out
 
+    def tupleize_answers_vectorized(self, answer, var_dict_list):
+        """
+        Evaluate `answer` for all the test cases of `var_dict_list` at once,
+        returning the same list as `tupleize_answers`.
+
+        Returns None if that fails or gives a value that is not finite, since
+        plain floats raise errors where NumPy arrays give inf or NaN; the test
+        cases should then be evaluated one by one to report the error.
+        """
+        if not var_dict_list:
+            return None
+        variables = dict(
+            (name, numpy.array([var_dict[name] for var_dict in var_dict_list]))
+            for name in var_dict_list[0]
+        )
+        try:
+            results = vectorized_evaluator(variables, dict(), answer, case_sensitive=self.case_sensitive)
+            if numpy.ndim(results) == 0:
+                results = [results] * len(var_dict_list)
+            elif numpy.shape(results) != (len(var_dict_list),):
+                return None
+            if not numpy.all(numpy.isfinite(results)):
+                return None
+        except Exception:  # pylint: disable=broad-except
+            return None
+        return list(results)
+
     def randomize_variables(self, samples):
         """
         Returns a list of dictionaries mapping variables to random values in range,
@@ -0,0 +1,322 @@
+"""
+A pool of warm, sandboxed Python processes for capa's safe_exec.
+
+Every CodeJail execution starts a new sandboxed interpreter, which then has
+to import numpy, scipy, calc and the rest of the assumed imports again. The
+workers of a `SandboxPool` are started with the same CodeJail command (same
+user, same AppArmor profile, same memory limit), import those modules once,
+and then run many executions, each in a freshly forked child with the CPU
+limit of a new sandbox. See sandbox_worker.py for the worker side.
+
+Workers are recycled after `max_executions` executions, and replaced as soon
+as they die, time out or are retired, so that a warm worker is usually
+waiting for the next execution. At most `max_workers` executions run at once;
+the others wait for one of them to finish.
+
+Each execution runs in a new directory of its own, which isn't on the
+worker's sys.path, so that nothing an execution writes is seen by the next.
+"""
+import atexit
+import json
+import logging
+import os
+import resource
+import select
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+
+from codejail import jail_code
+from codejail.safe_exec import json_safe, SafeExecException
+
+log = logging.getLogger(__name__)
+
+# We'll need the code of the worker to run it in the sandbox, so read it now.
+worker_py_file = os.path.join(os.path.dirname(__file__), 'sandbox_worker.py')
+with open(worker_py_file) as worker_file:
+    WORKER_PY = worker_file.read()
+
+
+class WorkerError(Exception):
+    """A worker failed, and must not be used again"""
+    pass
+
+
+def set_worker_limits():
+    """
+    Limits of the worker process, applied before the sandbox is entered.
+
+    Only the memory limit applies to the worker as a whole; process and CPU
+    limits are applied to each execution by the worker itself.
+    """
+    vmem = jail_code.LIMITS.get('VMEM')
+    if vmem:
+        resource.setrlimit(resource.RLIMIT_AS, (vmem, vmem))
+
+
+class SandboxWorker(object):
+    """
+    One sandboxed worker process, and the directory it runs in.
+    """
+    def __init__(self, imports, max_executions, timeout):
+        self.max_executions = max_executions
+        self.timeout = timeout
+        self.executions = 0
+        self._buffer = ''
+
+        # Like CodeJail, give the sandbox a directory it can read.
+        self.homedir = tempfile.mkdtemp(prefix='codejail-pool-')
+        os.chmod(self.homedir, 0775)
+        with open(os.path.join(self.homedir, 'jailed_worker'), 'w') as worker_file:
+            worker_file.write(WORKER_PY)
+
+        self.realtime = jail_code.LIMITS.get('REALTIME') or timeout
+        config = {
+            'imports': imports,
+            'max_executions': max_executions,
+            'cpu': jail_code.LIMITS.get('CPU'),
+            'realtime': self.realtime,
+            'fsize': jail_code.LIMITS.get('FSIZE'),
+        }
+        cmd = jail_code.COMMANDS['python']['cmdline_start'] + ['jailed_worker', json.dumps(config)]
+        with open(os.devnull, 'w') as devnull:
+            self.process = subprocess.Popen(
+                cmd, preexec_fn=set_worker_limits, cwd=self.homedir, env={},
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=devnull,
+            )
+
+    @property
+    def alive(self):
+        """Can this worker run another execution?"""
+        return self.process.poll() is None and self.executions < self.max_executions
+
+    def execute(self, code, globals_dict, python_path=None):
+        """
+        Run `code` with the JSON-safe `globals_dict`, returning the result
+        dict written by the worker. Raises WorkerError if the worker fails.
+        """
+        self.executions += 1
+        job_dir = 'job-{0}'.format(self.executions)
+        paths = []
+        try:
+            # The execution's working directory, removed once it's done.
+            os.mkdir(os.path.join(self.homedir, job_dir))
+            os.chmod(os.path.join(self.homedir, job_dir), 0775)
+            for pydir in python_path or ():
+                # Copy the course's python libraries where the sandbox can
+                # read them, as CodeJail does. Their paths are relative to
+                # the working directory.
+                path = os.path.basename(pydir)
+                if os.path.isdir(pydir):
+                    shutil.copytree(pydir, os.path.join(self.homedir, job_dir, path))
+                else:
+                    shutil.copy(pydir, os.path.join(self.homedir, job_dir, path))
+                paths.append(path)
+
+            token = uuid.uuid4().hex
+            job = {'token': token, 'code': code, 'globals': globals_dict, 'cwd': job_dir, 'python_path': paths}
+            try:
+                self.process.stdin.write(json.dumps(job) + '\n')
+                self.process.stdin.flush()
+            except (IOError, OSError) as exc:
+                raise WorkerError("Couldn't send the code to the worker: {0}".format(exc))
+
+            # The worker enforces the time limit of the execution itself.
+            line = self._read_line(time.time() + self.realtime + self.timeout)
+            try:
+                result = json.loads(line)
+            except ValueError:
+                raise WorkerError("Unreadable result from the worker")
+            if not isinstance(result, dict) or result.get('token') != token:
+                raise WorkerError("Unexpected result from the worker")
+            return result
+        finally:
+            shutil.rmtree(os.path.join(self.homedir, job_dir), ignore_errors=True)
+
+    def _read_line(self, deadline):
+        """Read one line from the worker, waiting until `deadline` at most"""
+        stdout = self.process.stdout.fileno()
+        while '\n' not in self._buffer:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise WorkerError("Timed out waiting for the worker")
+            readable, _, _ = select.select([stdout], [], [], remaining)
+            if readable:
+                chunk = os.read(stdout, 65536)
+                if not chunk:
+                    raise WorkerError("The worker exited")
+                self._buffer += chunk
+        line, self._buffer = self._buffer.split('\n', 1)
+        return line
+
+    def stop(self):
+        """Stop the worker and remove its directory"""
+        try:
+            self.process.stdin.close()
+        except (IOError, OSError):
+            pass
+        if self.process.poll() is None:
+            try:
+                self.process.kill()
+            except OSError:
+                # The sandbox may run as a user we can't signal; the worker
+                # exits by itself now that its stdin is closed, at the latest
+                # once its current job reaches the realtime limit.
+                pass
+        self.process.stdout.close()
+        shutil.rmtree(self.homedir, ignore_errors=True)
+
+
+class SandboxPool(object):
+    """
+    Runs capa's sandboxed code in warm SandboxWorkers, up to `max_workers`
+    executions at once.
+    """
+    def __init__(self, imports, size=1, max_executions=100, timeout=10, max_workers=4):
+        """
+        :Parameters:
+
+          - `imports`: names of the modules each worker imports up front
+          - `size`: number of idle workers kept warm
+          - `max_executions`: number of executions after which a worker is
+            replaced
+          - `timeout`: seconds an execution may take when CodeJail has no
+            REALTIME limit, and extra seconds to wait for a worker to answer,
+            e.g. while it is still importing modules. Also the seconds an
+            execution waits for a worker when `max_workers` are busy.
+          - `max_workers`: number of executions run at once
+
+        """
+        self.imports = imports
+        self.size = size
+        self.max_executions = max_executions
+        self.timeout = timeout
+        self.max_workers = max_workers
+        self._idle = []
+        self._busy = 0
+        self._lock = threading.Lock()
+        self._worker_free = threading.Condition(self._lock)
+        atexit.register(self.stop)
+
+    def _new_worker(self):
+        """Start a worker; it gets ready while nobody is waiting for it"""
+        return SandboxWorker(self.imports, self.max_executions, self.timeout)
+
+    def warm(self):
+        """Start idle workers until there are `size` of them"""
+        with self._lock:
+            while len(self._idle) < self.size:
+                self._idle.append(self._new_worker())
+
+    def _checkout(self):
+        """
+        Take a live idle worker, or start one if there is none. Waits while
+        `max_workers` are busy, raising SafeExecException after `timeout`
+        seconds. Every checkout must be followed by a `_release`.
+        """
+        deadline = time.time() + self.timeout
+        with self._lock:
+            while self._busy >= self.max_workers:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise SafeExecException(
+                        "Couldn't execute jailed code: all {0} sandbox workers are busy".format(self.max_workers)
+                    )
+                self._worker_free.wait(remaining)
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive:
+                    return worker
+                worker.stop()
+        try:
+            return self._new_worker()
+        except Exception:
+            self._release()
+            raise
+
+    def _release(self):
+        """Let another execution have a worker"""
+        with self._lock:
+            self._busy -= 1
+            self._worker_free.notify()
+
+    def _checkin(self, worker):
+        """Keep `worker` for later if it can still be used, and keep the pool full"""
+        if not worker.alive:
+            worker.stop()
+            worker = None
+        with self._lock:
+            if worker is not None and len(self._idle) < self.size:
+                self._idle.append(worker)
+                worker = None
+        if worker is not None:
+            worker.stop()
+        self.warm()
+
+    def safe_exec(self, code, globals_dict, python_path=None, slug=None):
+        """
+        Execute `code` like `codejail.safe_exec.safe_exec`: changes to the
+        globals are visible in `globals_dict`, and errors in the code raise
+        SafeExecException.
+        """
+        worker = self._checkout()
+        try:
+            result = worker.execute(code, json_safe(globals_dict), python_path)
+        except WorkerError as exc:
+            log.warning("Sandbox worker failed running %s: %s", slug, exc)
+            worker.stop()
+            self.warm()
+            raise SafeExecException("Couldn't execute jailed code: {0}".format(exc))
+        except Exception:
+            worker.stop()
+            self.warm()
+            raise
+        else:
+            self._checkin(worker)
+        finally:
+            self._release()
+
+        if 'error' in result:
+            raise SafeExecException("Couldn't execute jailed code: {0}".format(result['error']))
+        globals_dict.update(result['globals'])
+
+    def stop(self):
+        """Stop all idle workers"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+
+
+_POOL_OPTIONS = None
+_POOL = None
+
+
+def configure(imports, **options):
+    """
+    Run sandboxed code in a SandboxPool created with `options`. The pool is
+    started the first time it is needed, once CodeJail is configured.
+    """
+    global _POOL_OPTIONS, _POOL  # pylint: disable=global-statement
+    if _POOL is not None:
+        _POOL.stop()
+        _POOL = None
+    _POOL_OPTIONS = dict(options, imports=imports)
+
+
+def get_pool():
+    """
+    Return the SandboxPool to run sandboxed code in, or None if there is
+    none or CodeJail isn't configured for Python.
+    """
+    global _POOL  # pylint: disable=global-statement
+    if _POOL_OPTIONS is None or not jail_code.is_configured('python'):
+        return None
+    if _POOL is None:
+        _POOL = SandboxPool(**_POOL_OPTIONS)
+        _POOL.warm()
+    return _POOL
@@ -4,6 +4,7 @@ from codejail.safe_exec import safe_exec as codejail_safe_exec
 from codejail.safe_exec import not_safe_exec as codejail_not_safe_exec
 from codejail.safe_exec import json_safe, SafeExecException
 from . import lazymod
+from . import pool as sandbox_pool
 from dogapi import dog_stats_api
 
 import hashlib
@@ -47,6 +48,15 @@ for name, modname in ASSUMED_IMPORTS:
 LAZY_IMPORTS = "".join(LAZY_IMPORTS)
 
 
+def configure_pool(**options):
+    """
+    Run sandboxed code in a pool of warm sandbox processes that have the
+    ASSUMED_IMPORTS already imported. `options` are passed on to
+    `capa.safe_exec.pool.SandboxPool`.
+    """
+    sandbox_pool.configure([modname for _, modname in ASSUMED_IMPORTS], **options)
+
+
 def update_hash(hasher, obj):
     """
     Update a `hashlib` hasher with a nested object.
@@ -117,7 +127,8 @@ def safe_exec(code, globals_dict, random_seed=None, python_path=None, cache=None
     if unsafely:
         exec_fn = codejail_not_safe_exec
     else:
-        exec_fn = codejail_safe_exec
+        pool = sandbox_pool.get_pool()
+        exec_fn = codejail_safe_exec if pool is None else pool.safe_exec
 
     # Run the code!  Results are side effects in globals_dict.
     try:
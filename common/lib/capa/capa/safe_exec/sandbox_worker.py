@@ -0,0 +1,195 @@
+"""
+Warm worker for capa.safe_exec.pool, run inside the CodeJail sandbox.
+
+This file is not imported: its source is copied into the sandbox and run with
+the sandboxed Python, like the code CodeJail runs, as::
+
+    python jailed_worker '<json config>'
+
+It imports the modules named in the config once, then reads jobs from stdin,
+one JSON object per line. Each job runs in a forked child, so that every
+execution starts from the same freshly imported state and nothing it does
+survives it. The child runs in the job's own directory, and the worker's
+directory isn't on sys.path, so files an execution writes aren't seen by the
+next one either. The child lowers its own limits before running the code: no
+processes, and the same CPU (and file size) limits CodeJail applies to a new
+sandbox. The memory limit was applied to the whole worker when it started.
+A child still running at the realtime limit is killed, even if it has closed
+its output already.
+
+The result of each job is written to stdout as one JSON object per line::
+
+    {"token": <the job's token>, "globals": {...}}
+    {"token": <the job's token>, "error": "<traceback>"}
+
+The worker exits after `max_executions` jobs, or when stdin is closed.
+"""
+import json
+import os
+import resource
+import select
+import signal
+import sys
+import time
+import traceback
+
+# seconds between checks for the exit of a job's child
+CHILD_POLL_INTERVAL = 0.01
+
+
+class DevNull(object):
+    """Discard everything the sandboxed code prints"""
+    def write(self, *args, **kwargs):
+        pass
+
+
+def jsonable(value):
+    """Can `value` be sent back to the caller?"""
+    ok_types = (type(None), int, long, float, str, unicode, list, tuple, dict)
+    if not isinstance(value, ok_types):
+        return False
+    try:
+        json.dumps(value)
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return True
+
+
+def execute(job, config):
+    """Run the code of `job` in this (child) process, returning the result"""
+    resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+    if config['cpu']:
+        resource.setrlimit(resource.RLIMIT_CPU, (config['cpu'], config['cpu']))
+    if config['fsize'] is not None:
+        resource.setrlimit(resource.RLIMIT_FSIZE, (config['fsize'], config['fsize']))
+
+    sys.stdout = DevNull()
+    os.chdir(job['cwd'])
+    for path in job['python_path']:
+        sys.path.append(path)
+
+    g_dict = job['globals']
+    exec compile(job['code'], 'jailed_code', 'exec') in g_dict  # pylint: disable=exec-used
+
+    return {
+        'globals': dict(
+            (key, value) for key, value in g_dict.iteritems()
+            if key != '__builtins__' and jsonable(value)
+        )
+    }
+
+
+def run_child(job, config, write_fd):
+    """Body of the forked child: run the job and write its result"""
+    try:
+        # Keep the code away from the worker's stdin and stdout.
+        devnull = os.open(os.devnull, os.O_RDWR)
+        os.dup2(devnull, 0)
+        os.dup2(devnull, 1)
+        result = execute(job, config)
+        output = json.dumps(result)
+    except BaseException:  # pylint: disable=broad-except
+        output = json.dumps({'error': traceback.format_exc()})
+    try:
+        while output:
+            written = os.write(write_fd, output)
+            output = output[written:]
+    finally:
+        os._exit(0)  # pylint: disable=protected-access
+
+
+def read_output(read_fd, deadline):
+    """
+    Read everything the child writes to `read_fd`. Returns None if it
+    doesn't finish by `deadline` (None for no limit).
+    """
+    chunks = []
+    while True:
+        timeout = None
+        if deadline is not None:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return None
+        readable, _, _ = select.select([read_fd], [], [], timeout)
+        if not readable:
+            continue
+        chunk = os.read(read_fd, 65536)
+        if not chunk:
+            return ''.join(chunks)
+        chunks.append(chunk)
+
+
+def wait_child(pid, deadline):
+    """
+    Wait for the child `pid` to exit, killing it at `deadline` (None for no
+    limit): it may close its end of the pipe and keep running. Returns its
+    exit status, and whether it had to be killed.
+    """
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            return status, False
+        if deadline is not None and time.time() >= deadline:
+            os.kill(pid, signal.SIGKILL)
+            return os.waitpid(pid, 0)[1], True
+        time.sleep(CHILD_POLL_INTERVAL)
+
+
+def run_job(job, config):
+    """Run `job` in a forked child and return its result"""
+    deadline = time.time() + config['realtime'] if config['realtime'] else None
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        run_child(job, config, write_fd)
+
+    os.close(write_fd)
+    try:
+        output = read_output(read_fd, deadline)
+    finally:
+        os.close(read_fd)
+    status, killed = wait_child(pid, deadline if output is not None else time.time())
+    if killed and not output:
+        output = None
+
+    if output:
+        try:
+            return json.loads(output)
+        except ValueError:
+            pass
+    if output is None:
+        return {'error': 'Timed out after {0} seconds'.format(config['realtime'])}
+    if os.WIFSIGNALED(status):
+        return {'error': 'Killed by signal {0}'.format(os.WTERMSIG(status))}
+    return {'error': 'Exited with status {0} and no result'.format(os.WEXITSTATUS(status))}
+
+
+def main():
+    config = json.loads(sys.argv[1])
+
+    # The directory of this file is the worker's directory, which holds the
+    # directories of all of its jobs: don't import from it.
+    del sys.path[0]
+
+    for modname in config['imports']:
+        try:
+            __import__(modname)
+        except Exception:  # pylint: disable=broad-except
+            # Whatever can't be imported now (e.g. because of the memory
+            # limit) is imported lazily by the code that needs it.
+            pass
+
+    for _ in xrange(config['max_executions']):
+        line = sys.stdin.readline()
+        if not line:
+            break
+        job = json.loads(line)
+        result = run_job(job, config)
+        result['token'] = job['token']
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Test the pool of warm sandbox processes."""
+
+import os.path
+import sys
+import unittest
+
+from mock import patch
+
+from capa.safe_exec import safe_exec
+from capa.safe_exec.pool import SandboxPool
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException
+
+
+class TestSandboxPool(unittest.TestCase):
+    """
+    Run the pool's workers with this Python, without sudo, so that the tests
+    don't depend on CodeJail being configured.
+    """
+    def setUp(self):
+        commands = patch.dict(jail_code.COMMANDS, {
+            'python': {'cmdline_start': [sys.executable, '-E', '-B'], 'user': None},
+        })
+        limits = patch.dict(jail_code.LIMITS, {'CPU': 1, 'REALTIME': 5})
+        for patcher in (commands, limits):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.pool = SandboxPool(['math'], size=1, max_executions=3)
+        self.addCleanup(self.pool.stop)
+
+    def test_set_values(self):
+        g = {'b': 2}
+        self.pool.safe_exec("a = 17 * b", g)
+        self.assertEqual(g['a'], 34)
+
+    def test_raising_exceptions(self):
+        g = {}
+        with self.assertRaises(SafeExecException) as cm:
+            self.pool.safe_exec("1/0", g)
+        self.assertIn("ZeroDivisionError", cm.exception.message)
+        self.assertEqual(g, {})
+
+    def test_executions_are_isolated(self):
+        self.pool.safe_exec("import math; math.pi = 3", {})
+        g = {}
+        self.pool.safe_exec("import math; a = math.pi", g)
+        self.assertAlmostEqual(g['a'], 3.14159, places=4)
+
+    def test_workers_are_reused_then_recycled(self):
+        pids = []
+        for _ in range(4):
+            g = {}
+            self.pool.safe_exec("import os; pid = os.getppid()", g)
+            pids.append(g['pid'])
+        self.assertEqual(len(set(pids[:3])), 1)
+        self.assertNotEqual(pids[2], pids[3])
+
+    def test_written_files_are_not_seen(self):
+        self.pool.safe_exec("open('leftover.py', 'w').write('A = 1')", {})
+        g = {}
+        self.pool.safe_exec(
+            "import os\ntry:\n    import leftover\n    found = True\nexcept ImportError:\n    found = False\n"
+            "listed = os.listdir('.')",
+            g
+        )
+        self.assertFalse(g['found'])
+        self.assertEqual(g['listed'], [])
+
+    def test_executions_wait_for_a_worker(self):
+        pool = SandboxPool(['math'], size=0, max_workers=1, timeout=1)
+        self.addCleanup(pool.stop)
+        worker = pool._checkout()  # pylint: disable=protected-access
+        try:
+            with self.assertRaises(SafeExecException) as cm:
+                pool.safe_exec("a = 1", {})
+            self.assertIn("busy", cm.exception.message)
+        finally:
+            worker.stop()
+            pool._release()  # pylint: disable=protected-access
+        g = {}
+        pool.safe_exec("a = 1", g)
+        self.assertEqual(g['a'], 1)
+
+    def test_cpu_limit(self):
+        with self.assertRaises(SafeExecException):
+            self.pool.safe_exec("while True: pass", {})
+        # the worker survives its child being killed
+        g = {}
+        self.pool.safe_exec("a = 1", g)
+        self.assertEqual(g['a'], 1)
+
+    def test_realtime_limit_after_closing_output(self):
+        with patch.dict(jail_code.LIMITS, {'REALTIME': 1}):
+            pool = SandboxPool(['math'], size=1)
+            self.addCleanup(pool.stop)
+            with self.assertRaises(SafeExecException) as cm:
+                pool.safe_exec("import os, time\nos.closerange(3, 1024)\ntime.sleep(30)", {})
+            self.assertIn("Timed out", cm.exception.message)
+            g = {}
+            pool.safe_exec("a = 1", g)
+            self.assertEqual(g['a'], 1)
+
+    def test_python_lib(self):
+        pylib = os.path.dirname(__file__) + "/test_files/pylib"
+        g = {}
+        self.pool.safe_exec("import constant; a = constant.THE_CONST", g, python_path=[pylib])
+        self.assertEqual(g['a'], 23)
+
+    def test_capa_safe_exec_uses_pool(self):
+        g = {}
+        with patch('capa.safe_exec.safe_exec.sandbox_pool.get_pool', return_value=self.pool):
+            with patch.object(self.pool, 'safe_exec', wraps=self.pool.safe_exec) as pool_exec:
+                safe_exec("a = int(math.pi) + 1/2", g)
+        self.assertTrue(pool_exec.called)
+        self.assertEqual(g['a'], 3.5)
@@ -0,0 +1,190 @@
+"""
+Results of the scripts of capa problems, shared by the LoncapaProblems of a
+process.
+
+A problem's <script> code is deterministic for a given seed, and most
+learners share a few seeds: one with rerandomize="never", one per
+randomization bin with rerandomize="per_student". The globals each script
+leaves are kept by (definition hash, seed) in a local LRU, in front of the
+shared cache of the capa system, so that most LoncapaProblems are built
+without running their scripts at all.
+
+Lookups are counted with the `capa.script_results.lookup` metric, tagged
+`result:local_hit`, `result:shared_hit` or `result:miss`.
+"""
+from copy import deepcopy
+import hashlib
+import logging
+import Queue
+import threading
+
+from calc import LRUCache
+from codejail import jail_code
+from codejail.safe_exec import SafeExecException
+from dogapi import dog_stats_api
+
+from capa.safe_exec import safe_exec
+
+log = logging.getLogger(__name__)
+
+# number of (script, seed) results kept by each process
+LOCAL_RESULTS_SIZE = 4096
+
+# number of scripts whose results each process remembers precomputing
+PRECOMPUTED_SIZE = 1024
+
+# number of scripts each process keeps waiting to be precomputed; more are dropped
+PRECOMPUTE_QUEUE_SIZE = 64
+
+
+class ProblemScript(object):
+    """
+    The code of a problem's scripts, and how to run it.
+    """
+    def __init__(self, code, python_path, unsafely=False, slug=None):
+        self.code = code
+        self.python_path = python_path
+        self.unsafely = unsafely
+        self.slug = slug
+
+        md5er = hashlib.md5()
+        md5er.update(repr((code, python_path, bool(unsafely))))
+        self.definition = md5er.hexdigest()
+
+    def run(self, seed):
+        """
+        Run the code with `seed`, returning the (error message, globals) pair
+        to store: the message is None if the code ran without error.
+        """
+        globals_dict = {'seed': seed}
+        try:
+            safe_exec(
+                self.code,
+                globals_dict,
+                random_seed=seed,
+                python_path=self.python_path,
+                slug=self.slug,
+                unsafely=self.unsafely,
+            )
+        except SafeExecException as err:
+            return err.message, {}
+        return None, globals_dict
+
+
+class ScriptResultStore(object):
+    """
+    Results of ProblemScripts by (definition hash, seed), kept locally and in
+    the shared cache passed to each call.
+    """
+    def __init__(self, size=LOCAL_RESULTS_SIZE):
+        self._results = LRUCache(size)
+        self._precomputed = LRUCache(PRECOMPUTED_SIZE)
+        self._precompute_queue = Queue.Queue(PRECOMPUTE_QUEUE_SIZE)
+        self._precompute_thread = None
+        self._precompute_thread_lock = threading.Lock()
+
+    @staticmethod
+    def shared_key(script, seed):
+        """Key of the result of `script` with `seed` in the shared cache"""
+        return "capa.script_results.{0}.{1!r}".format(script.definition, seed)
+
+    def _result(self, script, seed, cache):
+        """
+        Return the (error message, globals) result of `script` with `seed`,
+        and where it came from: 'local_hit', 'shared_hit' or 'miss'.
+        """
+        key = (script.definition, seed)
+        result = self._results.get(key)
+        if result is not None:
+            return result, 'local_hit'
+
+        source = 'shared_hit'
+        if cache:
+            result = cache.get(self.shared_key(script, seed))
+        if result is None:
+            source = 'miss'
+            result = script.run(seed)
+            if cache:
+                cache.set(self.shared_key(script, seed), result)
+        self._results.set(key, result)
+        return result, source
+
+    def get(self, script, seed, cache=None):
+        """
+        Return the globals `script` leaves when run with `seed`. They are a
+        copy: the caller may change them.
+
+        Raises SafeExecException if the script fails.
+        """
+        (emsg, globals_dict), source = self._result(script, seed, cache)
+        dog_stats_api.increment('capa.script_results.lookup', tags=['result:{0}'.format(source)])
+        if emsg:
+            raise SafeExecException(emsg)
+        return deepcopy(globals_dict)
+
+    def precompute(self, script, seeds, cache=None):
+        """
+        Compute the results of `script` for all of `seeds` in the background,
+        the first time it is asked for in this process.
+
+        Scripts are precomputed one at a time by a single thread per process.
+        When PRECOMPUTE_QUEUE_SIZE scripts are already waiting, `script` is
+        dropped, to be asked for again by a later problem.
+
+        Only sandboxed scripts are precomputed: scripts run without CodeJail
+        run in this process, and can't be run concurrently.
+        """
+        if script.unsafely or not jail_code.is_configured('python'):
+            return
+        if self._precomputed.get(script.definition) is not None:
+            return
+
+        self._start_precompute_thread()
+        try:
+            self._precompute_queue.put_nowait((script, list(seeds), cache))
+        except Queue.Full:
+            dog_stats_api.increment('capa.script_results.precompute_dropped')
+            return
+        self._precomputed.set(script.definition, True)
+
+    def _start_precompute_thread(self):
+        """
+        Start the thread that precomputes the queued scripts, unless it's
+        running. A forked process has to start its own.
+        """
+        with self._precompute_thread_lock:
+            if self._precompute_thread is not None and self._precompute_thread.is_alive():
+                return
+            self._precompute_thread = threading.Thread(target=self._precompute_queued, name='capa-script-results')
+            self._precompute_thread.daemon = True
+            self._precompute_thread.start()
+
+    def _precompute_queued(self):
+        """Body of the precomputing thread"""
+        while True:
+            script, seeds, cache = self._precompute_queue.get()
+            try:
+                self._precompute(script, seeds, cache)
+            finally:
+                self._precompute_queue.task_done()
+
+    def _precompute(self, script, seeds, cache):
+        """Compute the results of `script` for all of `seeds`"""
+        computed = 0
+        for seed in seeds:
+            try:
+                _, source = self._result(script, seed, cache)
+            except Exception:  # pylint: disable=broad-except
+                log.exception("Couldn't precompute the script results of %s", script.slug)
+                return
+            if source == 'miss':
+                computed += 1
+        dog_stats_api.increment('capa.script_results.precomputed', computed)
+
+    def clear(self):
+        """Forget every local result"""
+        self._results.clear()
+        self._precomputed.clear()
+
+
+SCRIPT_RESULTS = ScriptResultStore()
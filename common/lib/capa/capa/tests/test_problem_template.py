@@ -0,0 +1,114 @@
+"""
+Tests of the ProblemTemplate cache shared by LoncapaProblems.
+"""
+import os
+import shutil
+import tempfile
+import textwrap
+import unittest
+
+import fs.osfs
+from lxml import etree
+import mock
+
+from capa.capa_problem import LoncapaProblem, TEMPLATE_CACHE
+from capa.script_results import SCRIPT_RESULTS
+from . import new_loncapa_problem, test_capa_system
+
+
+class ProblemTemplateTest(unittest.TestCase):
+
+    xml_str = textwrap.dedent("""
+        <problem>
+        <script type="loncapa/python">
+        import random
+        x = random.randint(0, 1000)
+        </script>
+        <p>What is $x?</p>
+        <customresponse expect="$x" cfn="check">
+            <textline/>
+        </customresponse>
+        <script type="loncapa/python">
+        def check(expect, ans):
+            return ans == expect
+        </script>
+        </problem>
+    """)
+
+    def setUp(self):
+        super(ProblemTemplateTest, self).setUp()
+        for cache in (TEMPLATE_CACHE, SCRIPT_RESULTS):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+    def test_problem_parsed_once(self):
+        with mock.patch('capa.capa_problem.etree.XML', wraps=etree.XML) as xml:
+            first = new_loncapa_problem(self.xml_str, seed=1)
+            second = new_loncapa_problem(self.xml_str, seed=2)
+        self.assertEqual(xml.call_count, 1)
+        self.assertEqual(len(TEMPLATE_CACHE), 1)
+        self.assertEqual(first.get_answer_ids(), second.get_answer_ids())
+
+    def test_trees_are_copies(self):
+        first = new_loncapa_problem(self.xml_str)
+        second = new_loncapa_problem(self.xml_str)
+        self.assertIsNot(first.tree, second.tree)
+        first.tree.find('p').text = 'Changed'
+        self.assertEqual(second.tree.find('p').text, 'What is $x?')
+
+    def test_script_runs_once_per_seed(self):
+        with mock.patch('capa.script_results.safe_exec') as safe_exec:
+            new_loncapa_problem(self.xml_str, seed=1)
+            new_loncapa_problem(self.xml_str, seed=1)
+            new_loncapa_problem(self.xml_str, seed=2)
+        self.assertEqual([call[1]['random_seed'] for call in safe_exec.call_args_list], [1, 2])
+
+    def test_contexts_are_copies(self):
+        first = new_loncapa_problem(self.xml_str, seed=1)
+        second = new_loncapa_problem(self.xml_str, seed=1)
+        self.assertEqual(first.context['x'], second.context['x'])
+        first.context['x'] = 'changed'
+        self.assertNotEqual(second.context['x'], 'changed')
+
+    def test_grading_with_cached_template(self):
+        for seed in (1, 1, 2):
+            problem = new_loncapa_problem(self.xml_str, seed=seed)
+            correct_map = problem.grade_answers({'1_2_1': str(problem.context['x'])})
+            self.assertEqual(correct_map.get_correctness('1_2_1'), 'correct')
+
+    def test_problem_id_is_part_of_key(self):
+        new_loncapa_problem(self.xml_str)
+        problem = LoncapaProblem(self.xml_str, id='other', seed=1, capa_system=test_capa_system())
+        self.assertEqual(len(TEMPLATE_CACHE), 2)
+        self.assertEqual(problem.tree.find('customresponse').get('id'), 'other_1')
+        self.assertEqual(problem.get_answer_ids(), [['other_2_1']])
+
+    def _include_problem(self, contents):
+        """A capa system whose filestore has an include.xml with `contents`, and a problem including it"""
+        course_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, course_dir)
+        with open(os.path.join(course_dir, 'include.xml'), 'w') as include_file:
+            include_file.write(contents)
+        capa_system = test_capa_system()
+        capa_system.filestore = fs.osfs.OSFS(course_dir)
+        return capa_system, '<problem><include file="include.xml"/></problem>'
+
+    @mock.patch('capa.capa_problem.INCLUDE_CHECK_INTERVAL', 0)
+    def test_changed_include_is_reread(self):
+        capa_system, xml_str = self._include_problem('<p>First</p>')
+        self.assertEqual(new_loncapa_problem(xml_str, capa_system).tree.find('p').text, 'First')
+        self.assertEqual(new_loncapa_problem(xml_str, capa_system).tree.find('p').text, 'First')
+
+        with capa_system.filestore.open('include.xml', 'w') as include_file:
+            include_file.write('<p>Second</p>')
+        self.assertEqual(new_loncapa_problem(xml_str, capa_system).tree.find('p').text, 'Second')
+
+    def test_includes_checked_periodically(self):
+        capa_system, xml_str = self._include_problem('<p>First</p>')
+        new_loncapa_problem(xml_str, capa_system)
+        with mock.patch.object(capa_system.filestore, 'open', wraps=capa_system.filestore.open) as mock_open:
+            new_loncapa_problem(xml_str, capa_system)
+            self.assertFalse(mock_open.called)
+            with mock.patch('capa.capa_problem.INCLUDE_CHECK_INTERVAL', 0):
+                new_loncapa_problem(xml_str, capa_system)
+            self.assertEqual(mock_open.call_count, 1)
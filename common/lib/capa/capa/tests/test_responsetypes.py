@@ -493,6 +493,24 @@ class FormulaResponseTest(ResponseTest):
         input_dict = {'1_2_1': '1/0'}
         self.assertRaises(StudentInputError, problem.grade_answers, input_dict)
 
+    def test_samples_evaluated_at_once(self):
+        """
+        Test that all the samples are evaluated in one pass, falling back to
+        one evaluation per sample to report errors.
+        """
+        sample_dict = {'x': (1, 2)}
+        problem = self.build_problem(sample_dict=sample_dict,
+                                     num_samples=10,
+                                     tolerance="1%",
+                                     answer="x^2")
+        with mock.patch('capa.responsetypes.evaluator') as mock_evaluator:
+            self.assert_grade(problem, 'x*x', 'correct')
+        self.assertFalse(mock_evaluator.called)
+
+        # fact() of non-integers only fails when evaluated sample by sample
+        input_dict = {'1_2_1': 'fact(x)'}
+        self.assertRaises(StudentInputError, problem.grade_answers, input_dict)
+
     def test_validate_answer(self):
         """
         Makes sure that validate_answer works.
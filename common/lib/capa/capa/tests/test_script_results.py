@@ -0,0 +1,126 @@
+"""
+Tests of the store of problem script results.
+"""
+import threading
+import unittest
+
+import mock
+from codejail.safe_exec import SafeExecException
+
+from capa.script_results import ProblemScript, ScriptResultStore
+
+
+class DictCache(object):
+    """A shared cache for the tests"""
+    def __init__(self):
+        self.cache = {}
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache[key] = value
+
+
+class ScriptResultStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        super(ScriptResultStoreTest, self).setUp()
+        self.store = ScriptResultStore()
+        self.script = ProblemScript("import random\nx = random.randint(0, 1000)", [])
+        patcher = mock.patch('capa.script_results.dog_stats_api')
+        self.stats = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lookups(self):
+        """The `result:` tags of the lookups counted so far"""
+        return [call[1]['tags'][0] for call in self.stats.increment.call_args_list]
+
+    def test_local_hit(self):
+        first = self.store.get(self.script, 3)
+        second = self.store.get(self.script, 3)
+        self.assertEqual(first, second)
+        self.assertEqual(first['seed'], 3)
+        self.assertEqual(self.lookups(), ['result:miss', 'result:local_hit'])
+
+    def test_results_are_copies(self):
+        self.store.get(self.script, 3)['x'] = 'changed'
+        self.assertNotEqual(self.store.get(self.script, 3)['x'], 'changed')
+
+    def test_shared_hit(self):
+        cache = DictCache()
+        result = self.store.get(self.script, 3, cache)
+        self.assertIn(ScriptResultStore.shared_key(self.script, 3), cache.cache)
+
+        other_process = ScriptResultStore()
+        with mock.patch.object(ProblemScript, 'run') as run:
+            self.assertEqual(other_process.get(self.script, 3, cache), result)
+        self.assertFalse(run.called)
+        self.assertEqual(self.lookups(), ['result:miss', 'result:shared_hit'])
+
+    def test_scripts_are_told_apart(self):
+        other = ProblemScript("x = 1", [])
+        self.assertNotEqual(self.script.definition, other.definition)
+        self.assertNotEqual(self.script.definition, ProblemScript(self.script.code, [], unsafely=True).definition)
+        self.assertEqual(self.store.get(other, 3)['x'], 1)
+
+    def test_errors_are_stored(self):
+        script = ProblemScript("1/0", [])
+        with mock.patch.object(ProblemScript, 'run', wraps=script.run) as run:
+            for _ in range(2):
+                with self.assertRaisesRegexp(SafeExecException, "ZeroDivisionError"):
+                    self.store.get(script, 3)
+        self.assertEqual(run.call_count, 1)
+
+    def test_precompute_only_sandboxed_scripts(self):
+        with mock.patch.object(ScriptResultStore, '_precompute') as precompute:
+            with mock.patch('capa.script_results.jail_code.is_configured', return_value=False):
+                self.store.precompute(self.script, range(20))
+            self.assertFalse(precompute.called)
+
+            with mock.patch('capa.script_results.jail_code.is_configured', return_value=True):
+                self.store.precompute(ProblemScript(self.script.code, [], unsafely=True), range(20))
+                self.assertFalse(precompute.called)
+                self.store.precompute(self.script, range(20))
+                self.store.precompute(self.script, range(20))
+            self.store._precompute_queue.join()  # pylint: disable=protected-access
+            precompute.assert_called_once_with(self.script, range(20), None)
+
+    def test_precompute_queue_is_bounded(self):
+        with mock.patch('capa.script_results.PRECOMPUTE_QUEUE_SIZE', 1):
+            store = ScriptResultStore()
+        scripts = [ProblemScript('x = {0}'.format(index), []) for index in range(3)]
+        started = threading.Event()
+        release = threading.Event()
+
+        def blocking_precompute(script, seeds, cache):  # pylint: disable=unused-argument
+            """Hold the precomputing thread until released"""
+            started.set()
+            release.wait()
+
+        with mock.patch.object(store, '_precompute', side_effect=blocking_precompute) as precompute:
+            with mock.patch('capa.script_results.jail_code.is_configured', return_value=True):
+                store.precompute(scripts[0], range(5))
+                started.wait()
+                # one script waits while the first is precomputed, the third is dropped
+                store.precompute(scripts[1], range(5))
+                store.precompute(scripts[2], range(5))
+                release.set()
+                store._precompute_queue.join()  # pylint: disable=protected-access
+                self.assertEqual([call[0][0] for call in precompute.call_args_list], scripts[:2])
+
+                # the dropped script is precomputed when asked for again
+                store.precompute(scripts[2], range(5))
+                store._precompute_queue.join()  # pylint: disable=protected-access
+        self.assertEqual([call[0][0] for call in precompute.call_args_list], scripts)
+
+    def test_precompute(self):
+        cache = DictCache()
+        self.store.get(self.script, 0, cache)
+        self.store._precompute(self.script, range(5), cache)  # pylint: disable=protected-access
+        self.assertEqual(len(cache.cache), 5)
+        self.stats.increment.assert_called_with('capa.script_results.precomputed', 4)
+        with mock.patch.object(ProblemScript, 'run') as run:
+            for seed in range(5):
+                self.store.get(self.script, seed, cache)
+        self.assertFalse(run.called)
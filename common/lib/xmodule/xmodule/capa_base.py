@@ -267,6 +267,18 @@ class CapaMixin(CapaFields):
             # number of possibilities, cap the number of different random seeds.
             self.seed %= MAX_RANDOMIZATION_BINS
 
+    def randomization_seeds(self):
+        """
+        The seeds `choose_new_seed` can choose for any learner, if there are few
+        enough of them for the problem's scripts to be run with each in advance,
+        else None.
+        """
+        if self.rerandomize == 'never':
+            return [1]
+        elif self.rerandomize == "per_student" and hasattr(self.runtime, 'seed'):
+            return range(NUM_RANDOMIZATION_BINS)
+        return None
+
     def new_lcp(self, state, text=None):
         """
         Generate a new Loncapa Problem
@@ -294,6 +306,7 @@ class CapaMixin(CapaFields):
             id=self.location.html_id(),
             state=state,
             seed=self.seed,
+            seeds=self.randomization_seeds(),
             capa_system=capa_system,
         )
 
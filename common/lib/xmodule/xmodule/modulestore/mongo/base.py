@@ -15,7 +15,6 @@ structure:
 import pymongo
 import sys
 import logging
-import copy
 
 from bson.son import SON
 from fs.osfs import OSFS
@@ -244,6 +243,11 @@ def metadata_cache_key(location):
     return u"{0.org}/{0.course}".format(location)
 
 
+def block_types_with_children():
+    """The names of all of the block types that can have children"""
+    return set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
+
+
 class MongoModuleStore(ModuleStoreWriteBase):
     """
     A Mongodb backed ModuleStore
@@ -310,18 +314,12 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         self.ignore_write_events_on_courses = []
 
-    def compute_metadata_inheritance_tree(self, location):
-        '''
-        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
-        '''
-        # get all collections in the course, this query should not return any leaf nodes
-        # note this is a bit ugly as when we add new categories of containers, we have to add it here
-
-        block_types_with_children = set(name for name, class_ in XBlock.load_classes() if getattr(class_, 'has_children', False))
-        query = {'_id.org': location.org,
-                 '_id.course': location.course,
-                 '_id.category': {'$in': list(block_types_with_children)}
-                 }
+    def _inheritance_records(self, query):
+        """
+        Return {url: record} for the containers matching `query`, where each record
+        holds only the children and inheritable metadata of the container. Draft and
+        non-draft versions of a container are collated under the non-draft url.
+        """
         # we just want the Location, children, and inheritable metadata
         record_filter = {'_id': 1, 'definition.children': 1}
 
@@ -330,14 +328,8 @@ class MongoModuleStore(ModuleStoreWriteBase):
         for field_name in InheritanceMixin.fields:
             record_filter['metadata.{0}'.format(field_name)] = 1
 
-        # call out to the DB
-        resultset = self.collection.find(query, record_filter)
-
         results_by_url = {}
-        root = None
-
-        # now go through the results and order them by the location url
-        for result in resultset:
+        for result in self.collection.find(query, record_filter):
             location = Location(result['_id'])
             # We need to collate between draft and non-draft
             # i.e. draft verticals will have draft children but will have non-draft parents currently
@@ -346,39 +338,115 @@ class MongoModuleStore(ModuleStoreWriteBase):
             if location_url in results_by_url:
                 existing_children = results_by_url[location_url].get('definition', {}).get('children', [])
                 additional_children = result.get('definition', {}).get('children', [])
-                total_children = existing_children + additional_children
-                results_by_url[location_url].setdefault('definition', {})['children'] = total_children
-            results_by_url[location.url()] = result
-            if location.category == 'course':
-                root = location.url()
+                result.setdefault('definition', {})['children'] = existing_children + additional_children
+            results_by_url[location_url] = result
+        return results_by_url
 
-        # now traverse the tree and compute down the inherited metadata
-        metadata_to_inherit = {}
+    @staticmethod
+    def _inherit_metadata_down(url, results_by_url, metadata_to_inherit):
+        """
+        Record in `metadata_to_inherit` the metadata inherited by every descendent of the
+        container `url`, whose (already inherited) metadata is in `results_by_url`.
 
-        def _compute_inherited_metadata(url):
-            """
-            Helper method for computing inherited metadata for a specific location url
-            """
-            my_metadata = results_by_url[url].get('metadata', {})
-
-            # go through all the children and recurse, but only if we have
-            # in the result set. Remember results will not contain leaf nodes
-            for child in results_by_url[url].get('definition', {}).get('children', []):
-                if child in results_by_url:
-                    new_child_metadata = copy.deepcopy(my_metadata)
-                    new_child_metadata.update(results_by_url[child].get('metadata', {}))
-                    results_by_url[child]['metadata'] = new_child_metadata
-                    metadata_to_inherit[child] = new_child_metadata
-                    _compute_inherited_metadata(child)
+        Children share their parent's values; only the top level dict is copied for a
+        child container that sets inheritable metadata of its own.
+        """
+        my_metadata = results_by_url[url].get('metadata', {})
+
+        # go through all the children and recurse, but only if we have
+        # in the result set. Remember results will not contain leaf nodes
+        for child in results_by_url[url].get('definition', {}).get('children', []):
+            if child in results_by_url:
+                child_metadata = results_by_url[child].get('metadata')
+                if child_metadata:
+                    new_child_metadata = dict(my_metadata)
+                    new_child_metadata.update(child_metadata)
                 else:
-                    # this is likely a leaf node, so let's record what metadata we need to inherit
-                    metadata_to_inherit[child] = my_metadata
+                    new_child_metadata = my_metadata
+                results_by_url[child]['metadata'] = new_child_metadata
+                metadata_to_inherit[child] = new_child_metadata
+                MongoModuleStore._inherit_metadata_down(child, results_by_url, metadata_to_inherit)
+            else:
+                # this is likely a leaf node, so let's record what metadata we need to inherit
+                metadata_to_inherit[child] = my_metadata
 
-        if root is not None:
-            _compute_inherited_metadata(root)
+    def compute_metadata_inheritance_tree(self, location):
+        '''
+        TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
+        '''
+        # get all collections in the course, this query should not return any leaf nodes
+        # note this is a bit ugly as when we add new categories of containers, we have to add it here
+        query = {'_id.org': location.org,
+                 '_id.course': location.course,
+                 '_id.category': {'$in': list(block_types_with_children())}
+                 }
+        results_by_url = self._inheritance_records(query)
+
+        # now traverse the tree and compute down the inherited metadata
+        metadata_to_inherit = {}
+        for url in results_by_url:
+            if Location(url).category == 'course':
+                self._inherit_metadata_down(url, results_by_url, metadata_to_inherit)
 
         return metadata_to_inherit
 
+    def _get_stored_metadata_inheritance_tree(self, key):
+        """
+        Return the inheritance tree for `key` from the request cache or the caching
+        subsystem, or None if neither has it. Never computes the tree.
+        """
+        if self.request_cache is not None and key in self.request_cache.data.get('metadata_inheritance', {}):
+            return self.request_cache.data['metadata_inheritance'][key]
+        if self.metadata_inheritance_cache_subsystem is not None:
+            return self.metadata_inheritance_cache_subsystem.get(key)
+        return None
+
+    def _get_metadata_inheritance_tree_version(self, key):
+        """
+        Return the version of the tree cached at `key` in the caching subsystem, which goes
+        up with every write of the tree, or None if there's no caching subsystem.
+        """
+        if self.metadata_inheritance_cache_subsystem is None:
+            return None
+        version_key = key + '.version'
+        self.metadata_inheritance_cache_subsystem.add(version_key, 0)
+        return self.metadata_inheritance_cache_subsystem.get(version_key)
+
+    def _store_metadata_inheritance_tree(self, key, tree, request_cache_only=False, version=None):
+        """
+        Save `tree` to the caching subsystem (unless `request_cache_only`) and the request cache.
+
+        `version` is the version of the cached tree (from `_get_metadata_inheritance_tree_version`)
+        read before `tree` was read or computed. If any other process wrote the cached tree since
+        then, one of the two writes may have been lost, so the cached tree is dropped instead,
+        to be recomputed on its next read.
+        """
+        # now write out computed tree to caching subsystem (e.g. memcached), if available
+        if not request_cache_only and self.metadata_inheritance_cache_subsystem is not None:
+            cache = self.metadata_inheritance_cache_subsystem
+            version_key = key + '.version'
+            cache.set(key, tree)
+            try:
+                stored_version = cache.incr(version_key)
+            except ValueError:
+                # the version was evicted, so there's no telling who else wrote the tree
+                stored_version = None
+            if version is None or stored_version != version + 1:
+                cache.delete(key)
+                try:
+                    # anyone who read the tree before it was dropped must not store it either
+                    cache.incr(version_key)
+                except ValueError:
+                    pass
+
+        # now populate a request_cache, if available.
+        if self.request_cache is not None:
+            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
+            # defined
+            if 'metadata_inheritance' not in self.request_cache.data:
+                self.request_cache.data['metadata_inheritance'] = {}
+            self.request_cache.data['metadata_inheritance'][key] = tree
+
     def get_cached_metadata_inheritance_tree(self, location, force_refresh=False):
         '''
         TODO (cdodge) This method can be deleted when the 'split module store' work has been completed
@@ -399,21 +467,12 @@ class MongoModuleStore(ModuleStoreWriteBase):
 
         if not tree:
             # if not in subsystem, or we are on force refresh, then we have to compute
+            version = self._get_metadata_inheritance_tree_version(key)
             tree = self.compute_metadata_inheritance_tree(location)
-
-            # now write out computed tree to caching subsystem (e.g. memcached), if available
-            if self.metadata_inheritance_cache_subsystem is not None:
-                self.metadata_inheritance_cache_subsystem.set(key, tree)
-
-        # now populate a request_cache, if available. NOTE, we are outside of the
-        # scope of the above if: statement so that after a memcache hit, it'll get
-        # put into the request_cache
-        if self.request_cache is not None:
-            # we can't assume the 'metadatat_inheritance' part of the request cache dict has been
-            # defined
-            if 'metadata_inheritance' not in self.request_cache.data:
-                self.request_cache.data['metadata_inheritance'] = {}
-            self.request_cache.data['metadata_inheritance'][key] = tree
+            self._store_metadata_inheritance_tree(key, tree, version=version)
+        else:
+            # NOTE: after a memcache hit, it'll get put into the request_cache
+            self._store_metadata_inheritance_tree(key, tree, request_cache_only=True)
 
         return tree
 
@@ -426,6 +485,76 @@ class MongoModuleStore(ModuleStoreWriteBase):
         if pseudo_course_id not in self.ignore_write_events_on_courses:
             self.get_cached_metadata_inheritance_tree(location, force_refresh=True)
 
+    def update_cached_metadata_inheritance_subtree(self, location, deleted=False):
+        """
+        Patch the cached metadata inheritance tree after the container at `location`
+        has been written (or deleted, if `deleted`), recomputing only the entries of
+        its descendents. If no tree is cached yet, the whole tree is computed.
+        """
+        # drafts share the entries of their published versions
+        location = Location(location).replace(revision=None)
+        pseudo_course_id = '/'.join([location.org, location.course])
+        if pseudo_course_id in self.ignore_write_events_on_courses:
+            return
+
+        key = metadata_cache_key(location)
+        version = self._get_metadata_inheritance_tree_version(key)
+        tree = self._get_stored_metadata_inheritance_tree(key)
+        if not tree:
+            self.refresh_cached_metadata_inheritance_tree(location)
+            return
+
+        url = location.url()
+        # fetch the container and its descendent containers, one level at a time
+        results_by_url = {}
+        urls = set([url])
+        while urls:
+            results_by_url.update(
+                (result_url, result)
+                for result_url, result in self._inheritance_records({
+                    '_id.org': location.org,
+                    '_id.course': location.course,
+                    '_id.category': {'$in': list(block_types_with_children())},
+                    '_id.name': {'$in': list(set(Location(child).name for child in urls))},
+                }).iteritems()
+                if result_url in urls
+            )
+            urls = set(
+                child
+                for result_url in urls if result_url in results_by_url
+                for child in results_by_url[result_url].get('definition', {}).get('children', [])
+            ) - set(results_by_url)
+
+        if url not in results_by_url:
+            if deleted and url in tree:
+                # neither a draft nor a published version of the container is left, so its
+                # descendents are no longer reachable from the course
+                del tree[url]
+                self._store_metadata_inheritance_tree(key, tree, version=version)
+            # otherwise, not a container
+            return
+
+        if location.category == 'course':
+            self._inherit_metadata_down(url, results_by_url, tree)
+        else:
+            parents = self.get_parent_locations(location, None)
+            if not parents:
+                # orphaned containers don't inherit anything, and aren't in the tree
+                return
+            parent_url = Location(parents[0]).replace(revision=None).url()
+            if parent_url in tree:
+                parent_metadata = tree[parent_url]
+            else:
+                # top level containers inherit directly from the course, which isn't in the tree
+                parent_records = self._inheritance_records(location_to_query(Location(parents[0]), wildcard=False))
+                parent_metadata = parent_records[parent_url].get('metadata', {}) if parent_url in parent_records else {}
+            tree[url] = dict(parent_metadata)
+            tree[url].update(results_by_url[url].get('metadata', {}))
+            results_by_url[url]['metadata'] = tree[url]
+            self._inherit_metadata_down(url, results_by_url, tree)
+
+        self._store_metadata_inheritance_tree(key, tree, version=version)
+
     def _clean_item_data(self, item):
         """
         Renames the '_id' field in item to 'location'
@@ -803,9 +932,10 @@ class MongoModuleStore(ModuleStoreWriteBase):
                     static_tab['name'] = xblock.display_name
                     self.update_item(course, user)
 
-            # recompute (and update) the metadata inheritance tree which is cached
-            # was conditional on children or metadata having changed before dhm made one update to rule them all
-            self.refresh_cached_metadata_inheritance_tree(xblock.location)
+            # update the cached metadata inheritance tree below this item. Leaves have nothing
+            # below them, and what they inherit only depends on their ancestors
+            if xblock.has_children:
+                self.update_cached_metadata_inheritance_subtree(xblock.location)
             # fire signal that we've written to DB
             self.fire_updated_modulestore_signal(get_course_id_no_run(xblock.location), xblock.location)
         except ItemNotFoundError:
@@ -833,8 +963,9 @@ class MongoModuleStore(ModuleStoreWriteBase):
         # Must include this to avoid the django debug toolbar (which defines the deprecated "safe=False")
         # from overriding our default value set in the init method.
         self.collection.remove({'_id': Location(location).dict()}, safe=self.collection.safe)
-        # recompute (and update) the metadata inheritance tree which is cached
-        self.refresh_cached_metadata_inheritance_tree(Location(location))
+        # update the metadata inheritance tree which is cached
+        if Location(location).category in block_types_with_children():
+            self.update_cached_metadata_inheritance_subtree(Location(location), deleted=True)
         self.fire_updated_modulestore_signal(get_course_id_no_run(Location(location)), Location(location))
 
     def get_parent_locations(self, location, course_id):
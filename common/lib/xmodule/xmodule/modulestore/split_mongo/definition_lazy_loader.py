@@ -8,18 +8,54 @@ class DefinitionLazyLoader(object):
     object doesn't force access during init but waits until client wants the
     definition. Only works if the modulestore is a split mongo store.
     """
-    def __init__(self, modulestore, definition_id):
+    def __init__(self, modulestore, definition_id, batch=None):
         """
         Simple placeholder for yet-to-be-fetched data
         :param modulestore: the pymongo db connection with the definitions
         :param definition_locator: the id of the record in the above to fetch
+        :param batch: an optional DefinitionBatch this loader's definition is fetched with
         """
         self.modulestore = modulestore
         self.definition_locator = DefinitionLocator(definition_id)
+        self.batch = batch
+        if batch is not None:
+            batch.add(definition_id)
 
     def fetch(self):
         """
         Fetch the definition. Note, the caller should replace this lazy
         loader pointer with the result so as not to fetch more than once
         """
+        if self.batch is not None:
+            return self.batch.fetch(self.definition_locator.definition_id)
         return self.modulestore.db_connection.get_definition(self.definition_locator.definition_id)
+
+
+class DefinitionBatch(object):
+    """
+    The definitions of a group of lazy loaders created together (e.g. for the blocks
+    of a subtree). The first fetch of any of them fetches all of them in one query.
+    """
+    def __init__(self, modulestore):
+        self.modulestore = modulestore
+        self.definition_ids = set()
+        self.definitions = None
+
+    def add(self, definition_id):
+        """
+        Add a definition to be fetched with the batch
+        """
+        self.definition_ids.add(definition_id)
+
+    def fetch(self, definition_id):
+        """
+        Return the definition with the given id, fetching the whole batch if needed
+        """
+        if self.definitions is None:
+            self.definitions = self.modulestore.db_connection.get_definitions(self.definition_ids)
+        # Each prefetched definition is handed out once, so the batch doesn't keep them
+        # alive; later fetches are served by the db_connection's definition cache.
+        definition = self.definitions.pop(definition_id, None)
+        if definition is None:
+            definition = self.modulestore.db_connection.get_definition(definition_id)
+        return definition
@@ -1,17 +1,114 @@
 """
 Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
 """
+import threading
+from collections import OrderedDict
+
+import bson
 import pymongo
 
+# Default upper bounds on the (BSON encoded) size of the documents kept in a DocumentCache
+DEFAULT_STRUCTURE_CACHE_BYTES = 64 * 1024 * 1024
+DEFAULT_DEFINITION_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class DocumentCache(object):
+    """
+    A process wide, thread safe LRU cache of immutable documents (course structures,
+    definitions) keyed by _id.
+
+    Structures and definitions are versioned: a new version gets a new _id, so an entry
+    never goes stale unless its record is rewritten in place (see
+    MongoConnection.update_structure). Entries are kept BSON encoded. That bounds the
+    cache by an exact byte size, and every `get` returns a fresh copy that the caller
+    may modify freely.
+    """
+    def __init__(self, max_bytes=DEFAULT_STRUCTURE_CACHE_BYTES, tz_aware=True):
+        self.max_bytes = max_bytes
+        self.tz_aware = tz_aware
+        self.hits = 0
+        self.misses = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Return a copy of the document whose _id is `key`, or None if it isn't cached
+        """
+        with self._lock:
+            encoded = self._entries.pop(key, None)
+            if encoded is None:
+                self.misses += 1
+                return None
+            # re-insert to mark as most recently used
+            self._entries[key] = encoded
+            self.hits += 1
+        return encoded.decode(tz_aware=self.tz_aware)
+
+    def set(self, document):
+        """
+        Cache `document`, evicting the least recently used entries to stay within max_bytes
+        """
+        encoded = bson.BSON.encode(document)
+        if len(encoded) > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(document['_id'])
+            self._entries[document['_id']] = encoded
+            self.size += len(encoded)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+    def evict(self, key):
+        """
+        Drop the document whose _id is `key`, if cached
+        """
+        with self._lock:
+            self._remove(key)
+
+    def clear(self):
+        """
+        Drop all cached documents
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _remove(self, key):
+        """
+        Drop `key` and account for its size. Must be called with the lock held.
+        """
+        encoded = self._entries.pop(key, None)
+        if encoded is not None:
+            self.size -= len(encoded)
+
+    def stats(self):
+        """
+        Return a dict of the cache's hit and miss counts, number of entries and size in bytes
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+            'bytes': self.size,
+        }
+
+
 class MongoConnection(object):
     """
     Segregation of pymongo functions from the data modeling mechanisms for split modulestore.
     """
     def __init__(
-        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None, **kwargs
+        self, db, collection, host, port=27017, tz_aware=True, user=None, password=None,
+        structure_cache_bytes=DEFAULT_STRUCTURE_CACHE_BYTES,
+        definition_cache_bytes=DEFAULT_DEFINITION_CACHE_BYTES, **kwargs
     ):
         """
         Create & open the connection, authenticate, and provide pointers to the collections
+
+        structure_cache_bytes: the maximum size of the structures cached by get_structure
+        definition_cache_bytes: the maximum size of the definitions cached by get_definition(s)
         """
         self.database = pymongo.database.Database(
             pymongo.MongoClient(
@@ -38,11 +135,20 @@ class MongoConnection(object):
         self.structures.write_concern = {'w': 1}
         self.definitions.write_concern = {'w': 1}
 
+        # shared by all threads using this connection
+        self.structure_cache = DocumentCache(structure_cache_bytes, tz_aware)
+        self.definition_cache = DocumentCache(definition_cache_bytes, tz_aware)
+
     def get_structure(self, key):
         """
         Get the structure from the persistence mechanism whose id is the given key
         """
-        return self.structures.find_one({'_id': key})
+        structure = self.structure_cache.get(key)
+        if structure is None:
+            structure = self.structures.find_one({'_id': key})
+            if structure is not None:
+                self.structure_cache.set(structure)
+        return structure
 
     def find_matching_structures(self, query):
         """
@@ -56,12 +162,16 @@ class MongoConnection(object):
         Create the structure in the db
         """
         self.structures.insert(structure)
+        # new versions are usually read right after being written
+        self.structure_cache.set(structure)
 
     def update_structure(self, structure):
         """
         Update the db record for structure
         """
         self.structures.update({'_id': structure['_id']}, structure)
+        # the only case in which a structure changes without getting a new _id
+        self.structure_cache.evict(structure['_id'])
 
     def get_course_index(self, key):
         """
@@ -98,7 +208,31 @@ class MongoConnection(object):
         """
         Get the definition from the persistence mechanism whose id is the given key
         """
-        return self.definitions.find_one({'_id': key})
+        definition = self.definition_cache.get(key)
+        if definition is None:
+            definition = self.definitions.find_one({'_id': key})
+            if definition is not None:
+                self.definition_cache.set(definition)
+        return definition
+
+    def get_definitions(self, keys):
+        """
+        Get the definitions whose ids are in keys as a dict of id -> definition, with
+        a single query for those which aren't cached. Missing definitions are left out.
+        """
+        definitions = {}
+        missing = []
+        for key in set(keys):
+            definition = self.definition_cache.get(key)
+            if definition is None:
+                missing.append(key)
+            else:
+                definitions[key] = definition
+        if missing:
+            for definition in self.find_matching_definitions({'_id': {'$in': missing}}):
+                self.definition_cache.set(definition)
+                definitions[definition['_id']] = definition
+        return definitions
 
     def find_matching_definitions(self, query):
         """
@@ -51,6 +51,7 @@ import re
 from importlib import import_module
 from path import path
 import copy
+from collections import OrderedDict
 from pytz import UTC
 
 from xmodule.errortracker import null_error_tracker
@@ -63,11 +64,13 @@ from xmodule.modulestore.exceptions import InsufficientSpecificationError, Versi
 from xmodule.modulestore import inheritance, ModuleStoreWriteBase, Location, SPLIT_MONGO_MODULESTORE_TYPE
 
 from ..exceptions import ItemNotFoundError
-from .definition_lazy_loader import DefinitionLazyLoader
+from .definition_lazy_loader import DefinitionLazyLoader, DefinitionBatch
 from .caching_descriptor_system import CachingDescriptorSystem
 from xblock.fields import Scope
 from bson.objectid import ObjectId
-from xmodule.modulestore.split_mongo.mongo_connection import MongoConnection
+from xmodule.modulestore.split_mongo.mongo_connection import (
+    MongoConnection, DEFAULT_STRUCTURE_CACHE_BYTES, DEFAULT_DEFINITION_CACHE_BYTES
+)
 from xblock.core import XBlock
 from xmodule.modulestore.loc_mapper_store import LocMapperStore
 
@@ -100,25 +103,36 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
     """
 
     SCHEMA_VERSION = 1
+    # number of CachingDescriptorSystems kept per thread
+    THREAD_CACHE_SIZE = 10
     reference_type = Locator
     def __init__(self, doc_store_config, fs_root, render_template,
                  default_class=None,
                  error_tracker=null_error_tracker,
                  loc_mapper=None,
                  i18n_service=None,
+                 structure_cache_bytes=DEFAULT_STRUCTURE_CACHE_BYTES,
+                 definition_cache_bytes=DEFAULT_DEFINITION_CACHE_BYTES,
                  **kwargs):
         """
         :param doc_store_config: must have a host, db, and collection entries. Other common entries: port, tz_aware.
+        :param structure_cache_bytes: the maximum size of the course structures cached for the whole process
+        :param definition_cache_bytes: the maximum size of the definitions cached for the whole process
         """
 
         super(SplitMongoModuleStore, self).__init__(**kwargs)
         self.loc_mapper = loc_mapper
 
-        self.db_connection = MongoConnection(**doc_store_config)
+        self.db_connection = MongoConnection(
+            structure_cache_bytes=structure_cache_bytes,
+            definition_cache_bytes=definition_cache_bytes,
+            **doc_store_config
+        )
         self.db = self.db_connection.database
 
-        # Code review question: How should I expire entries?
-        # _add_cache could use a lru mechanism to control the cache size?
+        # Course structures are cached for the whole process by the db_connection. The
+        # descriptor systems built from them are per thread, and only the most recently
+        # used THREAD_CACHE_SIZE of them are kept.
         self.thread_cache = threading.local()
 
         if default_class is not None:
@@ -151,16 +165,16 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
             )
 
         if lazy:
+            # the definitions of the subtree are fetched together when the first is needed
+            batch = DefinitionBatch(self)
             for block in new_module_data.itervalues():
-                block['definition'] = DefinitionLazyLoader(self, block['definition'])
+                if not isinstance(block['definition'], DefinitionLazyLoader):
+                    block['definition'] = DefinitionLazyLoader(self, block['definition'], batch)
         else:
             # Load all descendants by id
-            descendent_definitions = self.db_connection.find_matching_definitions({
-                '_id': {'$in': [block['definition']
-                                for block in new_module_data.itervalues()]}})
-            # turn into a map
-            definitions = {definition['_id']: definition
-                           for definition in descendent_definitions}
+            definitions = self.db_connection.get_definitions(
+                block['definition'] for block in new_module_data.itervalues()
+            )
 
             for block in new_module_data.itervalues():
                 if block['definition'] in definitions:
@@ -204,9 +218,12 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
-        system = self.thread_cache.course_cache
-        return system.get(course_version_guid)
+            self.thread_cache.course_cache = OrderedDict()
+        system = self.thread_cache.course_cache.pop(course_version_guid, None)
+        if system is not None:
+            # re-insert to mark as most recently used
+            self.thread_cache.course_cache[course_version_guid] = system
+        return system
 
     def _add_cache(self, course_version_guid, system):
         """
@@ -215,8 +232,10 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param system:
         """
         if not hasattr(self.thread_cache, 'course_cache'):
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
         self.thread_cache.course_cache[course_version_guid] = system
+        while len(self.thread_cache.course_cache) > self.THREAD_CACHE_SIZE:
+            self.thread_cache.course_cache.popitem(last=False)
         return system
 
     def _clear_cache(self, course_version_guid=None):
@@ -225,9 +244,13 @@ class SplitMongoModuleStore(ModuleStoreWriteBase):
         :param course_version_guid: if provided, clear only this entry
         """
         if course_version_guid:
-            del self.thread_cache.course_cache[course_version_guid]
+            self.db_connection.structure_cache.evict(course_version_guid)
+            # the entry may have been evicted already to keep the cache to THREAD_CACHE_SIZE
+            if hasattr(self.thread_cache, 'course_cache'):
+                self.thread_cache.course_cache.pop(course_version_guid, None)
         else:
-            self.thread_cache.course_cache = {}
+            self.thread_cache.course_cache = OrderedDict()
+            self.db_connection.structure_cache.clear()
 
     def _lookup_course(self, course_locator):
         '''
@@ -0,0 +1,138 @@
+"""
+Tests for the process wide structure and definition cache of the split modulestore.
+"""
+import datetime
+import threading
+import unittest
+
+from bson.objectid import ObjectId
+from mock import Mock
+from pytz import UTC
+
+from xmodule.modulestore.split_mongo.definition_lazy_loader import DefinitionLazyLoader, DefinitionBatch
+from xmodule.modulestore.split_mongo.mongo_connection import DocumentCache
+
+
+def make_structure(num_blocks=1):
+    """A minimal structure document with `num_blocks` blocks"""
+    return {
+        '_id': ObjectId(),
+        'root': 'course',
+        'edited_on': datetime.datetime(2014, 1, 1, tzinfo=UTC),
+        'blocks': {
+            'block{}'.format(index): {'category': 'html', 'fields': {'children': []}}
+            for index in range(num_blocks)
+        },
+    }
+
+
+class TestDocumentCache(unittest.TestCase):
+    """
+    Test DocumentCache hits, misses and eviction
+    """
+    def test_get_returns_copy(self):
+        cache = DocumentCache()
+        structure = make_structure()
+        cache.set(structure)
+
+        cached = cache.get(structure['_id'])
+        self.assertEqual(structure, cached)
+        self.assertEqual(UTC.utcoffset(None), cached['edited_on'].utcoffset())
+
+        # changes to a returned structure don't leak into the cache
+        cached['blocks']['block0']['fields']['children'].append('new')
+        self.assertEqual([], cache.get(structure['_id'])['blocks']['block0']['fields']['children'])
+
+    def test_hits_and_misses(self):
+        cache = DocumentCache()
+        structure = make_structure()
+        self.assertIsNone(cache.get(structure['_id']))
+        cache.set(structure)
+        cache.get(structure['_id'])
+        cache.get(structure['_id'])
+        stats = cache.stats()
+        self.assertEqual(2, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(1, stats['entries'])
+        self.assertGreater(stats['bytes'], 0)
+
+    def test_lru_eviction_by_size(self):
+        structures = [make_structure(10) for _ in range(3)]
+        probe = DocumentCache()
+        probe.set(structures[0])
+        # room for exactly two structures
+        cache = DocumentCache(max_bytes=probe.size * 2)
+
+        cache.set(structures[0])
+        cache.set(structures[1])
+        # touch the first one so that the second is least recently used
+        cache.get(structures[0]['_id'])
+        cache.set(structures[2])
+
+        self.assertIsNotNone(cache.get(structures[0]['_id']))
+        self.assertIsNone(cache.get(structures[1]['_id']))
+        self.assertIsNotNone(cache.get(structures[2]['_id']))
+        self.assertLessEqual(cache.size, cache.max_bytes)
+
+    def test_oversized_structure_not_cached(self):
+        cache = DocumentCache(max_bytes=10)
+        structure = make_structure()
+        cache.set(structure)
+        self.assertIsNone(cache.get(structure['_id']))
+        self.assertEqual(0, cache.size)
+
+    def test_evict_and_clear(self):
+        cache = DocumentCache()
+        first, second = make_structure(), make_structure()
+        cache.set(first)
+        cache.set(second)
+        cache.evict(first['_id'])
+        self.assertIsNone(cache.get(first['_id']))
+        self.assertIsNotNone(cache.get(second['_id']))
+        cache.clear()
+        self.assertIsNone(cache.get(second['_id']))
+        self.assertEqual(0, cache.size)
+
+    def test_shared_across_threads(self):
+        cache = DocumentCache()
+        structure = make_structure()
+        cache.set(structure)
+        results = []
+        thread = threading.Thread(target=lambda: results.append(cache.get(structure['_id'])))
+        thread.start()
+        thread.join()
+        self.assertEqual([structure], results)
+
+
+class TestDefinitionBatch(unittest.TestCase):
+    """
+    Test that lazy definitions created together are fetched together
+    """
+    def setUp(self):
+        self.definitions = {ObjectId(): {'fields': {'data': index}} for index in range(5)}
+        self.modulestore = Mock()
+        self.modulestore.db_connection.get_definitions.side_effect = lambda ids: {
+            definition_id: self.definitions[definition_id] for definition_id in ids
+        }
+        self.modulestore.db_connection.get_definition.side_effect = lambda definition_id: self.definitions[definition_id]
+
+    def test_one_query_per_batch(self):
+        batch = DefinitionBatch(self.modulestore)
+        loaders = [DefinitionLazyLoader(self.modulestore, definition_id, batch) for definition_id in self.definitions]
+
+        for loader in loaders:
+            self.assertEqual(self.definitions[loader.definition_locator.definition_id], loader.fetch())
+
+        self.assertEqual(1, self.modulestore.db_connection.get_definitions.call_count)
+        self.assertEqual(set(self.definitions), set(self.modulestore.db_connection.get_definitions.call_args[0][0]))
+        self.assertFalse(self.modulestore.db_connection.get_definition.called)
+
+        # refetching falls back to the (cached) single definition lookup
+        loaders[0].fetch()
+        self.assertEqual(1, self.modulestore.db_connection.get_definition.call_count)
+
+    def test_without_batch(self):
+        definition_id = next(iter(self.definitions))
+        DefinitionLazyLoader(self.modulestore, definition_id).fetch()
+        self.modulestore.db_connection.get_definition.assert_called_once_with(definition_id)
+        self.assertFalse(self.modulestore.db_connection.get_definitions.called)
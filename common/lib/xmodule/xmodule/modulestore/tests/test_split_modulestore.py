@@ -612,6 +612,18 @@ class SplitModuleCourseTests(SplitModuleTest):
         self.assertIn('chapter1', block_map)
         self.assertIn('problem3_2', block_map)
 
+    def test_clear_evicted_cache_entry(self):
+        """
+        Test that clearing an entry the per thread cache already evicted is harmless.
+        """
+        store = modulestore()
+        guids = [ObjectId() for _ in range(store.THREAD_CACHE_SIZE + 1)]
+        for guid in guids:
+            store._add_cache(guid, None)  # pylint: disable=protected-access
+        self.assertNotIn(guids[0], store.thread_cache.course_cache)
+        store._clear_cache(guids[0])  # pylint: disable=protected-access
+        self.assertIn(guids[-1], store.thread_cache.course_cache)
+
     def test_course_successors(self):
         """
         get_course_successors(course_locator, version_history_depth=1)
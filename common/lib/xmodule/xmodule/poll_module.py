@@ -19,6 +19,7 @@ from xmodule.x_module import XModule
 from xmodule.stringify import stringify_children
 from xmodule.mako_module import MakoModuleDescriptor
 from xmodule.xml_module import XmlDescriptor
+from xblock.core import XBlock
 from xblock.fields import Scope, String, Dict, Boolean, List
 
 log = logging.getLogger(__name__)
@@ -38,6 +39,7 @@ class PollFields(object):
     question = String(help="Poll question", scope=Scope.content, default='')
 
 
+@XBlock.wants('counters')
 class PollModule(PollFields, XModule):
     """Poll Module"""
     js = {
@@ -58,39 +60,62 @@ class PollModule(PollFields, XModule):
         Returns:
             json string
         """
-        if dispatch in self.poll_answers and not self.voted:
-            # FIXME: fix this, when xblock will support mutable types.
-            # Now we use this hack.
-            temp_poll_answers = self.poll_answers
-            temp_poll_answers[dispatch] += 1
-            self.poll_answers = temp_poll_answers
+        if dispatch in self.all_poll_answers() and not self.voted:
+            self.add_vote(dispatch, 1)
 
             self.voted = True
             self.poll_answer = dispatch
-            return json.dumps({'poll_answers': self.poll_answers,
-                               'total': sum(self.poll_answers.values()),
+            poll_answers = self.all_poll_answers()
+            return json.dumps({'poll_answers': poll_answers,
+                               'total': sum(poll_answers.values()),
                                'callback': {'objectName': 'Conditional'}
                                })
         elif dispatch == 'get_state':
+            poll_answers = self.all_poll_answers()
             return json.dumps({'poll_answer': self.poll_answer,
-                               'poll_answers': self.poll_answers,
-                               'total': sum(self.poll_answers.values())
+                               'poll_answers': poll_answers,
+                               'total': sum(poll_answers.values())
                                })
         elif dispatch == 'reset_poll' and self.voted and \
                 self.descriptor.xml_attributes.get('reset', 'True').lower() != 'false':
             self.voted = False
-
-            # FIXME: fix this, when xblock will support mutable types.
-            # Now we use this hack.
-            temp_poll_answers = self.poll_answers
-            temp_poll_answers[self.poll_answer] -= 1
-            self.poll_answers = temp_poll_answers
-
+            self.add_vote(self.poll_answer, -1)
             self.poll_answer = ''
             return json.dumps({'status': 'success'})
         else:  # return error message
             return json.dumps({'error': 'Unknown Command!'})
 
+    def all_poll_answers(self):
+        """Count the votes for each answer.
+
+        With the runtime's counters service, the votes are kept there, and
+        added to those stored in poll_answers before it was used.
+
+        Returns:
+            dict - answer id to number of votes.
+        """
+        all_poll_answers = dict((answer['id'], 0) for answer in self.answers)
+        all_poll_answers.update(self.poll_answers or {})
+
+        counters = self.runtime.service(self, 'counters')
+        if counters is not None:
+            for answer, count in counters.get_counts(self, 'poll_answers').iteritems():
+                all_poll_answers[answer] = all_poll_answers.get(answer, 0) + count
+        return all_poll_answers
+
+    def add_vote(self, answer, delta):
+        """Add `delta` votes for `answer`."""
+        counters = self.runtime.service(self, 'counters')
+        if counters is not None:
+            counters.increment(self, 'poll_answers', [answer], delta)
+            return
+
+        # FIXME: fix this, when xblock will support mutable types.
+        # Now we use this hack.
+        temp_poll_answers = self.poll_answers
+        temp_poll_answers[answer] = temp_poll_answers.get(answer, 0) + delta
+        self.poll_answers = temp_poll_answers
+
     def get_html(self):
         """Renders parameters to template."""
         params = {
@@ -108,34 +133,24 @@ class PollModule(PollFields, XModule):
         Returns:
             string - Serialize json.
         """
-        # FIXME: hack for resolving caching `default={}` during definition
-        # poll_answers field
-        if self.poll_answers is None:
-            self.poll_answers = {}
-
         answers_to_json = OrderedDict()
 
-        # FIXME: fix this, when xblock support mutable types.
-        # Now we use this hack.
-        temp_poll_answers = self.poll_answers
-
-         # Fill self.poll_answers, prepare data for template context.
+        # Prepare data for template context.
         for answer in self.answers:
-            # Set default count for answer = 0.
-            if answer['id'] not in temp_poll_answers:
-                temp_poll_answers[answer['id']] = 0
             answers_to_json[answer['id']] = cgi.escape(answer['text'])
-        self.poll_answers = temp_poll_answers
+
+        poll_answers = self.all_poll_answers() if self.voted else {}
 
         return json.dumps({'answers': answers_to_json,
             'question': cgi.escape(self.question),
             # to show answered poll after reload:
             'poll_answer': self.poll_answer,
-            'poll_answers': self.poll_answers if self.voted else {},
-            'total': sum(self.poll_answers.values()) if self.voted else 0,
+            'poll_answers': poll_answers,
+            'total': sum(poll_answers.values()),
             'reset': str(self.descriptor.xml_attributes.get('reset', 'true')).lower()})
 
 
+@XBlock.wants('counters')
 class PollDescriptor(PollFields, MakoModuleDescriptor, XmlDescriptor):
     _tag_name = 'poll_question'
     _child_tag_name = 'answer'
@@ -21,6 +21,22 @@ log = logging.getLogger(__name__)
 class_priority = ['video', 'problem']
 
 
+def descriptor_icon_class(descriptor):
+    '''
+    Return the css icon class of the module of `descriptor`, as
+    get_icon_class does, but found from the descriptors of its descendents
+    only, so that none of their modules are created.
+    '''
+    if not descriptor.has_children:
+        return getattr(getattr(descriptor, 'module_class', None), 'icon_class', 'other')
+    child_classes = set(descriptor_icon_class(child) for child in descriptor.get_children())
+    new_class = 'other'
+    for c in class_priority:
+        if c in child_classes:
+            new_class = c
+    return new_class
+
+
 class SequenceFields(object):
     has_children = True
 
@@ -70,6 +86,16 @@ class SequenceModule(SequenceFields, XModule):
         if dispatch == 'goto_position':
             self.position = int(data['position'])
             return json.dumps({'success': True})
+        elif dispatch == 'render_child':
+            # The content of a tab not rendered by a lazy student_view
+            items = self.get_display_items()
+            position = int(data['position'])
+            if not 1 <= position <= len(items):
+                raise NotFoundError('No item at position {0}'.format(position))
+            rendered_child = items[position - 1].render('student_view', {})
+            return json.dumps({
+                'html': rendered_child.head_html() + rendered_child.content + rendered_child.foot_html(),
+            })
         raise NotFoundError('Unexpected dispatch type')
 
     def student_view(self, context):
@@ -78,26 +104,42 @@ class SequenceModule(SequenceFields, XModule):
         if self.position is None:
             self.position = 1
 
+        # Render only the item at the current position: the browser fetches
+        # the others (with the render_child dispatch) when they are opened.
+        lazy = getattr(self.system, 'render_sequence_lazily', False)
+
         ## Returns a set of all types of all sub-children
         contents = []
 
         fragment = Fragment()
 
-        for child in self.get_display_items():
-            progress = child.get_progress()
-            rendered_child = child.render('student_view', context)
-            fragment.add_frag_resources(rendered_child)
-
+        for position, child in enumerate(self.get_display_items(), start=1):
             titles = child.get_content_titles()
             childinfo = {
-                'content': rendered_child.content,
                 'title': "\n".join(titles),
                 'page_title': titles[0] if titles else '',
-                'progress_status': Progress.to_js_status_str(progress),
-                'progress_detail': Progress.to_js_detail_str(progress),
-                'type': child.get_icon_class(),
                 'id': child.id,
+                'lazy': lazy and position != self.position,
             }
+            if childinfo['lazy']:
+                # Don't create the modules of the child's descendents: their
+                # progress is shown when the child is opened.
+                childinfo.update({
+                    'content': '',
+                    'progress_status': Progress.to_js_status_str(None),
+                    'progress_detail': Progress.to_js_detail_str(None),
+                    'type': descriptor_icon_class(child),
+                })
+            else:
+                progress = child.get_progress()
+                rendered_child = child.render('student_view', context)
+                fragment.add_frag_resources(rendered_child)
+                childinfo.update({
+                    'content': rendered_child.content,
+                    'progress_status': Progress.to_js_status_str(progress),
+                    'progress_detail': Progress.to_js_detail_str(progress),
+                    'type': child.get_icon_class(),
+                })
             if childinfo['title'] == '':
                 childinfo['title'] = child.display_name_with_default
             contents.append(childinfo)
@@ -47,3 +47,13 @@ class WordCloudModuleTest(LogicTest):
             100.0,
             sum(i['percent'] for i in response['top_words']))
 
+
+    def test_top_words_updated(self):
+        "Make sure that top words are updated for the new counts of submitted words only"
+        all_words = {'cat': 10, 'dog': 5, 'mom': 1, 'dad': 2, 'sun': 2}
+        top_words = self.xmodule.update_top_dict({'cat': 10, 'dog': 4, 'dad': 2}, all_words, ['sun', 'dog'], 3)
+        self.assertIn(top_words, [{'cat': 10, 'dog': 5, 'dad': 2}, {'cat': 10, 'dog': 5, 'sun': 2}])
+
+        all_words['mom'] = 6
+        top_words = self.xmodule.update_top_dict(top_words, all_words, ['mom'], 3)
+        self.assertDictEqual(top_words, {'cat': 10, 'mom': 6, 'dog': 5})
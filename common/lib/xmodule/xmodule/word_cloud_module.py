@@ -6,14 +6,17 @@ If student does not yet answered - `num_inputs` numbers of text inputs.
 If student have answered - words he entered and cloud.
 """
 
+import heapq
 import json
 import logging
+from operator import itemgetter
 
 from pkg_resources import resource_string
 from xmodule.raw_module import EmptyDataRawDescriptor
 from xmodule.editing_module import MetadataOnlyEditingDescriptor
 from xmodule.x_module import XModule
 
+from xblock.core import XBlock
 from xblock.fields import Scope, Dict, Boolean, List, Integer, String
 
 log = logging.getLogger(__name__)
@@ -79,6 +82,7 @@ class WordCloudFields(object):
     )
 
 
+@XBlock.wants('counters')
 class WordCloudModule(WordCloudFields, XModule):
     """WordCloud Xmodule"""
     js = {
@@ -94,7 +98,14 @@ class WordCloudModule(WordCloudFields, XModule):
     def get_state(self):
         """Return success json answer for client."""
         if self.submitted:
-            total_count = sum(self.all_words.itervalues())
+            counters = self.runtime.service(self, 'counters')
+            if counters is None:
+                all_words = self.all_words
+                top_words = self.top_words
+            else:
+                all_words = self.counted_words(counters)
+                top_words = self.top_dict(all_words, self.num_top_words)
+            total_count = sum(all_words.itervalues())
             return json.dumps({
                 'status': 'success',
                 'submitted': True,
@@ -102,10 +113,10 @@ class WordCloudModule(WordCloudFields, XModule):
                     self.display_student_percents
                 ),
                 'student_words': {
-                    word: self.all_words[word] for word in self.student_words
+                    word: all_words.get(word, 0) for word in self.student_words
                 },
                 'total_count': total_count,
-                'top_words': self.prepare_words(self.top_words, total_count)
+                'top_words': self.prepare_words(top_words, total_count)
             })
         else:
             return json.dumps({
@@ -155,6 +166,18 @@ class WordCloudModule(WordCloudFields, XModule):
             )
         return list_to_return
 
+    def counted_words(self, counters):
+        """Return all words with their counts, from the counters service
+        and from all_words, where they were kept before it was used.
+
+        :param counters: the runtime's counters service
+        :rtype: dict
+        """
+        all_words = dict(self.all_words)
+        for word, count in counters.get_counts(self, 'all_words').iteritems():
+            all_words[word] = all_words.get(word, 0) + count
+        return all_words
+
     def top_dict(self, dict_obj, amount):
         """Return top words from all words, filtered by number of
         occurences
@@ -165,13 +188,35 @@ class WordCloudModule(WordCloudFields, XModule):
         :type amount: int
         :rtype: dict
         """
-        return dict(
-            sorted(
-                dict_obj.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:amount]
-        )
+        return dict(heapq.nlargest(amount, dict_obj.iteritems(), key=itemgetter(1)))
+
+    def update_top_dict(self, top_dict, dict_obj, words, amount):
+        """Return top words updated for the new counts of `words`,
+        without sorting all words again.
+
+        Counts only grow, so a word can only enter the top by passing
+        the least counted word in it.
+
+        :param top_dict: top words before the counts of `words` grew
+        :type top_dict: dict
+        :param dict_obj: all words
+        :type dict_obj: dict
+        :param words: words whose counts grew
+        :type words: list
+        :param amount: number of words to be in top dict
+        :type amount: int
+        :rtype: dict
+        """
+        top_dict = dict(top_dict)
+        for word in set(words):
+            top_dict[word] = dict_obj[word]
+            if len(top_dict) > amount:
+                del top_dict[min(top_dict, key=top_dict.get)]
+
+        # num_top_words was changed since top_dict was stored
+        if len(top_dict) != min(amount, len(dict_obj)):
+            return self.top_dict(dict_obj, amount)
+        return top_dict
 
     def handle_ajax(self, dispatch, data):
         """Ajax handler.
@@ -197,20 +242,28 @@ class WordCloudModule(WordCloudFields, XModule):
 
             self.student_words = student_words
 
+            self.submitted = True
+
+            counters = self.runtime.service(self, 'counters')
+            if counters is not None:
+                # Top words are found from the counts when they are read.
+                counters.increment(self, 'all_words', student_words)
+                return self.get_state()
+
             # FIXME: fix this, when xblock will support mutable types.
             # Now we use this hack.
             # speed issues
             temp_all_words = self.all_words
 
-            self.submitted = True
-
             # Save in all_words.
-            for word in self.student_words:
+            for word in student_words:
                 temp_all_words[word] = temp_all_words.get(word, 0) + 1
 
             # Update top_words.
-            self.top_words = self.top_dict(
+            self.top_words = self.update_top_dict(
+                self.top_words,
                 temp_all_words,
+                student_words,
                 self.num_top_words
             )
 
@@ -239,6 +292,7 @@ class WordCloudModule(WordCloudFields, XModule):
         return self.content
 
 
+@XBlock.wants('counters')
 class WordCloudDescriptor(WordCloudFields, MetadataOnlyEditingDescriptor, EmptyDataRawDescriptor):
     """Descriptor for WordCloud Xmodule."""
     module_class = WordCloudModule
@@ -0,0 +1,214 @@
+"""
+Compare the time bulk email takes to render and send a course email to
+--recipients made-up recipients, against a local SMTP sink: rendering the
+templates for every recipient (per recipient) and once per task (compiled),
+and sending over one connection and over --connections at once.
+
+    ./manage.py lms benchmark_bulk_email edX/DemoX/Demo_Course staff --connections 4 --latency 20 --settings=devstack
+
+The sink takes --latency milliseconds to accept each email, to stand in for a
+mail server on another host.  With --rate, the sends are held to that many
+per second by the rate limit shared through the cache.
+"""
+import threading
+import time
+from optparse import make_option
+from SocketServer import StreamRequestHandler, TCPServer, ThreadingMixIn
+from textwrap import dedent
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from bulk_email.models import CourseEmail, CourseEmailTemplate, SEND_TO_MYSELF
+from bulk_email.tasks import _get_course_email_context, _send_course_email
+from courseware.courses import get_course
+from instructor_task.subtasks import SubtaskStatus
+
+HTML_MESSAGE = u''.join(
+    u'<p>Paragraph {0} of the benchmark email, with a <a href="https://example.com/{0}">link</a>.</p>\n'.format(index)
+    for index in range(100)
+)
+
+
+class SMTPSinkHandler(StreamRequestHandler):
+    """
+    Accept every email sent over the connection, after the server's latency,
+    and throw it away.
+    """
+    def reply(self, line):
+        """Send a reply line to the client"""
+        self.wfile.write(line + '\r\n')
+
+    def handle(self):
+        self.reply('220 localhost benchmark SMTP sink')
+        while True:
+            command = self.rfile.readline()[:4].upper()
+            if not command:
+                return
+            if command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in ('.\r\n', ''):
+                    pass
+                time.sleep(self.server.latency)
+                self.server.count()
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPSink(ThreadingMixIn, TCPServer):
+    """
+    SMTP server on a free local port that serves each connection on its own
+    thread, and counts the emails it accepts.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency):
+        TCPServer.__init__(self, ('localhost', 0), SMTPSinkHandler)
+        self.port = self.server_address[1]
+        self.latency = latency
+        self.emails = 0
+        self._lock = threading.Lock()
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def count(self):
+        """Add one to the emails accepted"""
+        with self._lock:
+            self.emails += 1
+
+
+class Command(BaseCommand):
+    """
+    Render the email for every recipient both ways, then send it to all of them
+    over one and over several connections, and report the time each took.
+    """
+    args = '<course_id> <username>'
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--recipients',
+                    action='store',
+                    type='int',
+                    dest='recipients',
+                    default=500,
+                    help='Number of recipients to email'),
+        make_option('--connections',
+                    action='store',
+                    type='int',
+                    dest='connections',
+                    default=4,
+                    help='Number of SMTP connections to send over at once'),
+        make_option('--latency',
+                    action='store',
+                    type='float',
+                    dest='latency',
+                    default=20,
+                    help='Milliseconds the SMTP sink takes to accept an email'),
+        make_option('--rate',
+                    action='store',
+                    type='int',
+                    dest='rate',
+                    default=None,
+                    help='Most emails to send per second'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError("Usage: {0}".format(self.args))
+        course_id, username = args
+        try:
+            sender = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError("No user {0}".format(username))
+        try:
+            course = get_course(course_id)
+        except ValueError:
+            raise CommandError("No course {0}".format(course_id))
+
+        global_email_context = _get_course_email_context(course)
+        to_list = [
+            {'pk': 0, 'profile__name': u'Benchmark {0}'.format(index), 'email': u'benchmark{0}@example.com'.format(index)}
+            for index in range(options['recipients'])
+        ]
+        course_email = CourseEmail.create(course_id, sender, SEND_TO_MYSELF, 'Benchmark email', HTML_MESSAGE)
+
+        try:
+            self.stdout.write("{0:<15} {1:>10.1f}ms\n".format(
+                'per recipient', self.time_rendering(course_email, global_email_context, to_list, compiled=False)
+            ))
+            self.stdout.write("{0:<15} {1:>10.1f}ms\n".format(
+                'compiled', self.time_rendering(course_email, global_email_context, to_list, compiled=True)
+            ))
+
+            sink = SMTPSink(options['latency'] / 1000)
+            try:
+                for connections in (1, options['connections']):
+                    emails_before = sink.emails
+                    seconds = self.time_sending(
+                        sink, connections, options['rate'], course_email, global_email_context, to_list
+                    )
+                    if sink.emails - emails_before != len(to_list):
+                        raise CommandError("The sink accepted {0} of {1} emails".format(
+                            sink.emails - emails_before, len(to_list)
+                        ))
+                    self.stdout.write("{0:>2} connections {1:>10.1f}ms  {2:>8.1f} emails/s\n".format(
+                        connections, seconds * 1000, len(to_list) / seconds
+                    ))
+            finally:
+                sink.shutdown()
+        finally:
+            course_email.delete()
+
+    def time_rendering(self, course_email, global_email_context, to_list, compiled):
+        """Render the email for every recipient, returning the time taken in ms"""
+        template = CourseEmailTemplate.get_template()
+        start = time.time()
+        if compiled:
+            plaintext = template.compile_plaintext(course_email.text_message, global_email_context)
+            htmltext = template.compile_htmltext(course_email.html_message, global_email_context)
+        for recipient in to_list:
+            context = dict(global_email_context, name=recipient['profile__name'], email=recipient['email'])
+            if compiled:
+                plaintext.render(context)
+                htmltext.render(context)
+            else:
+                template.render_plaintext(course_email.text_message, context)
+                template.render_htmltext(course_email.html_message, context)
+        return (time.time() - start) * 1000
+
+    def time_sending(self, sink, connections, rate, course_email, global_email_context, to_list):
+        """
+        Send the email to every recipient over `connections` connections to
+        the `sink`, returning the time taken in seconds.
+        """
+        overrides = {
+            'EMAIL_BACKEND': 'django.core.mail.backends.smtp.EmailBackend',
+            'EMAIL_HOST': 'localhost',
+            'EMAIL_PORT': sink.port,
+            'EMAIL_HOST_USER': '',
+            'EMAIL_HOST_PASSWORD': '',
+            'EMAIL_USE_TLS': False,
+            'BULK_EMAIL_CONNECTIONS_PER_TASK': connections,
+            'BULK_EMAIL_MAX_SENDS_PER_SECOND': rate,
+        }
+        saved = dict((name, getattr(settings, name, None)) for name in overrides)
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        try:
+            start = time.time()
+            subtask_status, exception = _send_course_email(
+                None, course_email.id, list(to_list), global_email_context, SubtaskStatus.create('benchmark')
+            )
+            seconds = time.time() - start
+        finally:
+            for name, value in saved.items():
+                setattr(settings, name, value)
+        if exception is not None or subtask_status.failed:
+            raise CommandError("Sending failed: {0}".format(exception))
+        return seconds
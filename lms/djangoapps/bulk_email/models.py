@@ -12,6 +12,8 @@ file and check it in at the same time as your model changes. To do that,
 
 """
 import logging
+from uuid import uuid4
+
 from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import models, transaction
@@ -214,6 +216,76 @@ class CourseEmailTemplate(models.Model):
         """
         return CourseEmailTemplate._render(self.html_template, htmltext, context)
 
+    def compile_plaintext(self, plaintext, context):
+        """
+        Create a plain text message to be rendered for each recipient.
+
+        As `render_plaintext`, but `context` holds everything but the 'name' and
+        'email' of the recipient, which are given to `render` of the result.
+        """
+        return CompiledEmailMessage(self.plain_template, plaintext, context)
+
+    def compile_htmltext(self, htmltext, context):
+        """
+        Create an HTML message to be rendered for each recipient.
+
+        As `render_htmltext`, but `context` holds everything but the 'name' and
+        'email' of the recipient, which are given to `render` of the result.
+        """
+        return CompiledEmailMessage(self.html_template, htmltext, context)
+
+
+class CompiledEmailMessage(object):
+    """
+    An email message made from a template, message body and the context
+    shared by all its recipients, with only the 'name' and 'email' of each
+    recipient left to fill in.
+
+    `render` returns what `CourseEmailTemplate._render` would for the context
+    with the recipient's name and email, but only formats and wraps the lines
+    they appear in.
+    """
+    RECIPIENT_FIELDS = ('name', 'email')
+
+    def __init__(self, format_string, message_body, context):
+        # Markers stand in for the recipient's values, so the template is only
+        # formatted once. They can't be in the message body, which is inserted
+        # after formatting, as they are made up here.
+        self.markers = dict((field, u'\x00{0}\x00'.format(uuid4().hex)) for field in self.RECIPIENT_FIELDS)
+        context = dict(context, **self.markers)
+        self.unwrapped = format_string.format(**context).replace(
+            COURSE_EMAIL_MESSAGE_BODY_TAG.format(), message_body, 1
+        )
+
+        # Lines without a marker are the same for every recipient: wrap them now.
+        self.lines = []
+        for line in self.unwrapped.split('\n'):
+            if any(marker in line for marker in self.markers.values()):
+                self.lines.append((False, line))
+            else:
+                self.lines.append((True, wrap_message(line)))
+
+    def _fill(self, text, values):
+        """Replace the markers in `text` with the recipient's `values`"""
+        for field, marker in self.markers.items():
+            text = text.replace(marker, values[field])
+        return text
+
+    def render(self, recipient_context):
+        """
+        Render the message for the recipient with the 'name' and 'email' in
+        `recipient_context`.
+        """
+        # as format() would show them
+        values = dict((field, u'{0}'.format(recipient_context[field])) for field in self.RECIPIENT_FIELDS)
+        if any('\n' in value for value in values.values()):
+            # the lines would be split differently
+            return wrap_message(self._fill(self.unwrapped, values))
+        return u'\n'.join(
+            line if wrapped else wrap_message(self._fill(line, values))
+            for wrapped, line in self.lines
+        )
+
 
 class CourseAuthorization(models.Model):
     """
@@ -5,7 +5,8 @@ to a course.
 import re
 import random
 import json
-from time import sleep
+from multiprocessing.pool import ThreadPool
+from time import sleep, time
 
 from dogapi import dog_stats_api
 from smtplib import SMTPServerDisconnected, SMTPDataError, SMTPConnectError, SMTPException
@@ -29,6 +30,7 @@ from celery.exceptions import RetryTaskError
 
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.mail import EmailMultiAlternatives, get_connection
 from django.core.urlresolvers import reverse
 
@@ -45,10 +47,15 @@ from instructor_task.subtasks import (
     check_subtask_is_valid,
     update_subtask_status,
 )
+from xmodule.course_module import CourseDescriptor
 from xmodule.modulestore import Location
 
 log = get_task_logger(__name__)
 
+# Key in the cache of the number of emails sent by all workers in a second.
+SEND_TOKENS_KEY = 'bulk_email.send_tokens.{0}'
+SEND_TOKENS_EXPIRE = 10
+
 
 # Errors that an individual email is failing to be sent, and should just
 # be treated as a fail.
@@ -203,24 +210,31 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
     to_option = email_obj.to_option
     global_email_context = _get_course_email_context(course)
 
-    def _create_send_email_subtask(to_list, initial_subtask_status):
-        """Creates a subtask to send email to a given recipient list."""
+    def _create_send_email_subtask(recipient_pks, initial_subtask_status):
+        """Creates a subtask to send email to the recipients in a range of primary keys."""
         subtask_id = initial_subtask_status.task_id
         new_subtask = send_course_email.subtask(
             (
                 entry_id,
                 email_id,
-                to_list,
+                None,
                 global_email_context,
                 initial_subtask_status.to_dict(),
+                {
+                    'first_pk': recipient_pks[0]['pk'],
+                    'last_pk': recipient_pks[-1]['pk'],
+                    'count': len(recipient_pks),
+                },
             ),
             task_id=subtask_id,
             routing_key=settings.BULK_EMAIL_ROUTING_KEY,
         )
         return new_subtask
 
+    # Only the primary keys of the recipients are read here, a query at a time, to
+    # divide them into ranges.  Each subtask reads the recipients in its range.
     recipient_qset = _get_recipient_queryset(user_id, to_option, course_id, course.location)
-    recipient_fields = ['profile__name', 'email']
+    recipient_fields = []
 
     log.info(u"Task %s: Preparing to queue subtasks for sending emails for course %s, email %s, to_option %s",
              task_id, course_id, email_id, to_option)
@@ -244,17 +258,20 @@ def perform_delegate_email_batches(entry_id, course_id, task_input, action_name)
 
 
 @task(default_retry_delay=settings.BULK_EMAIL_DEFAULT_RETRY_DELAY, max_retries=settings.BULK_EMAIL_MAX_RETRIES)  # pylint: disable=E1102
-def send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status_dict):
+def send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status_dict, recipient_range=None):
     """
     Sends an email to a list of recipients.
 
     Inputs are:
       * `entry_id`: id of the InstructorTask object to which progress should be recorded.
       * `email_id`: id of the CourseEmail model that is to be emailed.
-      * `to_list`: list of recipients.  Each is represented as a dict with the following keys:
+      * `to_list`: list of recipients, or None if they are given by `recipient_range`.
+        Each is represented as a dict with the following keys:
         - 'profile__name': full name of User.
         - 'email': email address of User.
         - 'pk': primary key of User model.
+        Subtasks are queued with a `recipient_range`, and retried with a `to_list` of the
+        recipients not yet emailed.
       * `global_email_context`: dict containing values that are unique for this email but the same
         for all recipients of this email.  This dict is to be used to fill in slots in email
         template.  It does not include 'name' and 'email', which will be provided by the to_list.
@@ -273,6 +290,8 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
 
         Most values will be zero on initial call, but may be different when the task is
         invoked as part of a retry.
+      * `recipient_range`: dict of the 'first_pk' and 'last_pk' of the Users to email (of
+        those the email is sent to), and the 'count' of them when the subtask was queued.
 
     Sends to all addresses contained in to_list that are not also in the Optout table.
     Emails are sent multi-part, in both plain text and html.  Updates InstructorTask object
@@ -280,7 +299,10 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
     """
     subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
     current_task_id = subtask_status.task_id
-    num_to_send = len(to_list)
+    if to_list is None:
+        num_to_send = recipient_range['count']
+    else:
+        num_to_send = len(to_list)
     log.info("Preparing to send email %s to %d recipients as subtask %s for instructor task %d: context = %s, status=%s",
              email_id, num_to_send, current_task_id, entry_id, global_email_context, subtask_status)
 
@@ -306,6 +328,7 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
                 to_list,
                 global_email_context,
                 subtask_status,
+                recipient_range,
             )
     except Exception:
         # Unexpected exception. Try to write out the failure to the entry before failing.
@@ -338,10 +361,48 @@ def send_course_email(entry_id, email_id, to_list, global_email_context, subtask
     return new_subtask_status.to_dict()
 
 
+def _get_recipients_in_range(course_email, recipient_range):
+    """
+    Reads the recipients of `course_email` whose primary keys are from the 'first_pk'
+    to the 'last_pk' of `recipient_range` and who haven't opted out of email from the course.
+
+    Recipients are read when the email is sent, not when it was queued: a user who stopped
+    being a recipient in between (e.g. by unenrolling) isn't emailed, and one who became a
+    recipient with a primary key in the range is. The opt-outs in the range are read with a
+    separate query on Optout's (user, course_id) index, rather than a NOT IN subquery, which
+    MySQL 5.5 and 5.6 run as a dependent subquery per recipient.
+
+    Returns the recipient list, as well as the number of recipients queued in the range that
+    are skipped, either because they opted out or because they are no longer recipients, so
+    that the emails attempted and skipped add up to the 'count' queued. Recipients added to
+    the range since aren't part of that count.
+    """
+    course_id = course_email.course_id
+    first_pk, last_pk = recipient_range['first_pk'], recipient_range['last_pk']
+    recipient_qset = _get_recipient_queryset(
+        course_email.sender_id,
+        course_email.to_option,
+        course_id,
+        CourseDescriptor.id_to_location(course_id),
+    ).filter(pk__gte=first_pk, pk__lte=last_pk)
+    optouts = set(
+        Optout.objects.filter(course_id=course_id, user__gte=first_pk, user__lte=last_pk).values_list('user', flat=True)
+    )
+
+    to_list = [
+        recipient for recipient in recipient_qset.values('profile__name', 'email', 'pk')
+        if recipient['pk'] not in optouts
+    ]
+    num_skipped = max(0, recipient_range['count'] - len(to_list))
+    return to_list, num_skipped
+
+
 def _filter_optouts_from_recipients(to_list, course_id):
     """
     Filters a recipient list based on student opt-outs for a given course.
 
+    This is for subtasks queued with a list of recipients, rather than a range.
+
     Returns the filtered recipient list, as well as the number of optouts
     removed from the list.
     """
@@ -381,7 +442,7 @@ def _get_source_address(course_id, course_title):
     return from_addr
 
 
-def _send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status):
+def _send_course_email(entry_id, email_id, to_list, global_email_context, subtask_status, recipient_range=None):
     """
     Performs the email sending task.
 
@@ -398,6 +459,7 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
         for all recipients of this email.  This dict is to be used to fill in slots in email
         template.  It does not include 'name' and 'email', which will be provided by the to_list.
       * `subtask_status` : object of class SubtaskStatus representing current status.
+      * `recipient_range`: the range of primary keys of the recipients, if `to_list` is None.
 
     Sends to all addresses contained in to_list that are not also in the Optout table.
     Emails are sent multi-part, in both plain text and html.
@@ -424,7 +486,10 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
     # attempt.  Anyone on the to_list on a retry has already passed the filter
     # that existed at that time, and we don't need to keep checking for changes
     # in the Optout list.
-    if subtask_status.get_retry_count() == 0:
+    if to_list is None:
+        to_list, num_skipped = _get_recipients_in_range(course_email, recipient_range)
+        subtask_status.increment(skipped=num_skipped)
+    elif subtask_status.get_retry_count() == 0:
         to_list, num_optout = _filter_optouts_from_recipients(to_list, course_email.course_id)
         subtask_status.increment(skipped=num_optout)
 
@@ -433,82 +498,91 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
     from_addr = _get_source_address(course_email.course_id, course_title)
 
     course_email_template = CourseEmailTemplate.get_template()
+    connections = []
+    pool = None
     try:
-        connection = get_connection()
-        connection.open()
-
-        # Define context values to use in all course emails:
-        email_context = {'name': '', 'email': ''}
-        email_context.update(global_email_context)
+        # Render the templates with the context shared by all recipients once,
+        # leaving only the name and email of each to fill in.
+        plaintext_template = course_email_template.compile_plaintext(course_email.text_message, global_email_context)
+        html_template = course_email_template.compile_htmltext(course_email.html_message, global_email_context)
+
+        # Send over several connections at once, if so configured, so that the
+        # time spent waiting on the mail server for one email is used to send others.
+        num_connections = max(1, min(settings.BULK_EMAIL_CONNECTIONS_PER_TASK, len(to_list)))
+        for _ in range(num_connections):
+            connection = get_connection()
+            connections.append(connection)
+            connection.open()
+        if num_connections > 1:
+            pool = ThreadPool(num_connections)
 
         while to_list:
-            # Update context with user-specific values from the user at the end of the list.
-            # At the end of processing this user, they will be popped off of the to_list.
+            # Send to the recipients at the end of the list, one per connection.
+            # At the end of processing them, they will be removed from the to_list.
             # That way, the to_list will always contain the recipients remaining to be emailed.
             # This is convenient for retries, which will need to send to those who haven't
             # yet been emailed, but not send to those who have already been sent to.
-            current_recipient = to_list[-1]
-            email = current_recipient['email']
-            email_context['email'] = email
-            email_context['name'] = current_recipient['profile__name']
-
-            # Construct message content using templates and context:
-            plaintext_msg = course_email_template.render_plaintext(course_email.text_message, email_context)
-            html_msg = course_email_template.render_htmltext(course_email.html_message, email_context)
-
-            # Create email:
-            email_msg = EmailMultiAlternatives(
-                subject,
-                plaintext_msg,
-                from_addr,
-                [email],
-                connection=connection
-            )
-            email_msg.attach_alternative(html_msg, 'text/html')
-
-            # Throttle if we have gotten the rate limiter.  This is not very high-tech,
-            # but if a task has been retried for rate-limiting reasons, then we sleep
-            # for a period of time between all emails within this task.  Choice of
-            # the value depends on the number of workers that might be sending email in
-            # parallel, and what the SES throttle rate is.
-            if subtask_status.retried_nomax > 0:
-                sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS)
-
-            try:
-                log.debug('Email with id %s to be sent to %s', email_id, email)
-
-                with dog_stats_api.timer('course_email.single_send.time.overall', tags=[_statsd_tag(course_title)]):
-                    connection.send_messages([email_msg])
-
-            except SMTPDataError as exc:
-                # According to SMTP spec, we'll retry error codes in the 4xx range.  5xx range indicates hard failure.
-                if exc.smtp_code >= 400 and exc.smtp_code < 500:
-                    # This will cause the outer handler to catch the exception and retry the entire task.
-                    raise exc
-                else:
-                    # This will fall through and not retry the message.
+            recipients = list(reversed(to_list[-num_connections:]))
+
+            send_args = []
+            for recipient, connection in zip(recipients, connections):
+                # Construct message content using templates and user-specific values:
+                recipient_context = {'name': recipient['profile__name'], 'email': recipient['email']}
+                email_msg = EmailMultiAlternatives(
+                    subject,
+                    plaintext_template.render(recipient_context),
+                    from_addr,
+                    [recipient['email']],
+                    connection=connection
+                )
+                email_msg.attach_alternative(html_template.render(recipient_context), 'text/html')
+                send_args.append((connection, email_msg, email_id, subtask_status, course_title))
+
+            if pool is None:
+                send_errors = map(_send_email_message, send_args)
+            else:
+                send_errors = pool.map(_send_email_message, send_args)
+
+            # The first error that ends the sending of this task, if any.
+            task_exception = None
+            unprocessed = []
+            for recipient, exc in zip(recipients, send_errors):
+                email = recipient['email']
+                if exc is None:
+                    dog_stats_api.increment('course_email.sent', tags=[_statsd_tag(course_title)])
+                    if settings.BULK_EMAIL_LOG_SENT_EMAILS:
+                        log.info('Email with id %s sent to %s', email_id, email)
+                    else:
+                        log.debug('Email with id %s sent to %s', email_id, email)
+                    subtask_status.increment(succeeded=1)
+
+                elif isinstance(exc, SMTPDataError) and not 400 <= exc.smtp_code < 500:
+                    # According to SMTP spec, error codes in the 5xx range indicate hard failure,
+                    # so don't retry the message.
                     log.warning('Task %s: email with id %s not delivered to %s due to error %s', task_id, email_id, email, exc.smtp_error)
                     dog_stats_api.increment('course_email.error', tags=[_statsd_tag(course_title)])
                     subtask_status.increment(failed=1)
 
-            except SINGLE_EMAIL_FAILURE_ERRORS as exc:
-                # This will fall through and not retry the message.
-                log.warning('Task %s: email with id %s not delivered to %s due to error %s', task_id, email_id, email, exc)
-                dog_stats_api.increment('course_email.error', tags=[_statsd_tag(course_title)])
-                subtask_status.increment(failed=1)
+                elif isinstance(exc, SINGLE_EMAIL_FAILURE_ERRORS):
+                    # Don't retry the message.
+                    log.warning('Task %s: email with id %s not delivered to %s due to error %s', task_id, email_id, email, exc)
+                    dog_stats_api.increment('course_email.error', tags=[_statsd_tag(course_title)])
+                    subtask_status.increment(failed=1)
 
-            else:
-                dog_stats_api.increment('course_email.sent', tags=[_statsd_tag(course_title)])
-                if settings.BULK_EMAIL_LOG_SENT_EMAILS:
-                    log.info('Email with id %s sent to %s', email_id, email)
                 else:
-                    log.debug('Email with id %s sent to %s', email_id, email)
-                subtask_status.increment(succeeded=1)
+                    # The outer handler will catch the exception, and retry or fail the entire task.
+                    # The user is left on the list, as they haven't been processed.
+                    if task_exception is None:
+                        task_exception = exc
+                    unprocessed.append(recipient)
 
-            # Pop the user that was emailed off the end of the list only once they have
-            # successfully been processed.  (That way, if there were a failure that
-            # needed to be retried, the user is still on the list.)
-            to_list.pop()
+            # Remove the users that were processed from the end of the list only once they
+            # have successfully been processed, keeping any others in their place.
+            del to_list[-len(recipients):]
+            to_list.extend(reversed(unprocessed))
+
+            if task_exception is not None:
+                raise task_exception  # pylint: disable=E0702
 
     except INFINITE_RETRY_ERRORS as exc:
         dog_stats_api.increment('course_email.infinite_retry', tags=[_statsd_tag(course_title)])
@@ -564,7 +638,81 @@ def _send_course_email(entry_id, email_id, to_list, global_email_context, subtas
         return subtask_status, None
     finally:
         # Clean up at the end.
-        connection.close()
+        if pool is not None:
+            pool.close()
+            pool.join()
+        for connection in connections:
+            connection.close()
+
+
+def _throttle_send(subtask_status):
+    """
+    Wait until an email may be sent.
+
+    If settings.BULK_EMAIL_MAX_SENDS_PER_SECOND is set, this waits for a token
+    of the rate shared by all workers. Otherwise, it only slows down a task
+    that has been retried for rate-related reasons, by sleeping for a period of
+    time before each of its emails.
+    """
+    if settings.BULK_EMAIL_MAX_SENDS_PER_SECOND:
+        _wait_for_send_token(settings.BULK_EMAIL_MAX_SENDS_PER_SECOND)
+    elif subtask_status.retried_nomax > 0:
+        sleep(settings.BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS)
+
+
+def _wait_for_send_token(max_sends_per_second):
+    """
+    Wait until sending another email keeps the emails sent by all workers to
+    no more than `max_sends_per_second`.
+
+    This is a token bucket kept in the cache, so that it is shared by all
+    workers, and refilled at the start of each second of the clock.  The
+    tokens are counted out with `cache.incr`, which is atomic, and the n-th
+    token of a second is only good (n - 1) / `max_sends_per_second` seconds
+    into it, to spread the emails over the second rather than send them all
+    at its start.  Workers that get no token wait for the next second.
+    """
+    while True:
+        second = int(time())
+        key = SEND_TOKENS_KEY.format(second)
+        cache.add(key, 0, SEND_TOKENS_EXPIRE)
+        try:
+            token = cache.incr(key)
+        except ValueError:
+            # The count expired between adding and incrementing it.
+            continue
+        if token <= max_sends_per_second:
+            break
+        sleep(max(0, second + 1 - time()))
+
+    delay = second + float(token - 1) / max_sends_per_second - time()
+    if delay > 0:
+        sleep(delay)
+
+
+def _send_email_message(send_args):
+    """
+    Send an email once the send rate allows it.
+
+    `send_args` is a tuple of the connection to send over, the EmailMessage,
+    and the email id, SubtaskStatus and course title of the task, so that this
+    can be mapped over a pool of threads.  Each thread must be given its own
+    connection.
+
+    Returns the exception raised in sending, or None if the email was sent.
+    """
+    connection, email_msg, email_id, subtask_status, course_title = send_args
+    _throttle_send(subtask_status)
+    try:
+        log.debug('Email with id %s to be sent to %s', email_id, email_msg.to[0])
+
+        with dog_stats_api.timer('course_email.single_send.time.overall', tags=[_statsd_tag(course_title)]):
+            connection.send_messages([email_msg])
+
+    except Exception as exc:  # pylint: disable=broad-except
+        # Handled by the task, with the other results of the round.
+        return exc
+    return None
 
 
 def _get_current_task():
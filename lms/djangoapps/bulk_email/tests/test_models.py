@@ -103,6 +103,17 @@ class CourseEmailTemplateTest(TestCase):
         context = self._get_sample_plain_context()
         template.render_plaintext("My new plain text.", context)
 
+    def test_compiled_render(self):
+        template = CourseEmailTemplate.get_template()
+        context = self._get_sample_html_context()
+        del context['email']
+        plaintext = template.compile_plaintext("My new {plain} text.", context)
+        htmltext = template.compile_htmltext("My new {html} text.", context)
+        for name, email in (("Robot", "robot@test.com"), ("Robot\nNewline", "newline@test.com")):
+            context.update({'name': name, 'email': email})
+            self.assertEquals(plaintext.render(context), template.render_plaintext("My new {plain} text.", context))
+            self.assertEquals(htmltext.render(context), template.render_htmltext("My new {html} text.", context))
+
 
 class CourseAuthorizationTest(TestCase):
     """Test the CourseAuthorization model."""
@@ -27,14 +27,18 @@ from celery.states import SUCCESS, FAILURE
 
 from django.conf import settings
 from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
 
 from bulk_email.models import CourseEmail, Optout, SEND_TO_ALL
+from bulk_email.tasks import _get_recipients_in_range, _wait_for_send_token
 
 from instructor_task.tasks import send_bulk_course_email
 from instructor_task.subtasks import update_subtask_status, SubtaskStatus
 from instructor_task.models import InstructorTask
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase
 from instructor_task.tests.factories import InstructorTaskFactory
+from student.models import CourseEnrollment
 
 
 class TestTaskFailure(Exception):
@@ -239,6 +243,43 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
             get_conn.return_value.send_messages.side_effect = cycle([None])
             self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, expected_succeeds, skipped=expected_skipped)
 
+    def test_recipients_in_range(self):
+        students = self._create_students(4)
+        Optout.objects.create(user=students[1], course_id=self.course.id)
+        course_email = CourseEmail.create(self.course.id, self.instructor, SEND_TO_ALL, "Test Subject", "<p>Test message</p>")
+        recipient_range = {'first_pk': students[1].pk, 'last_pk': students[2].pk, 'count': 2}
+        to_list, num_skipped = _get_recipients_in_range(course_email, recipient_range)
+        self.assertEquals([recipient['pk'] for recipient in to_list], [students[2].pk])
+        self.assertEquals(to_list[0]['email'], students[2].email)
+        self.assertEquals(num_skipped, 1)
+
+    def test_unenrolled_recipients_skipped(self):
+        students = self._create_students(3)
+        course_email = CourseEmail.create(self.course.id, self.instructor, SEND_TO_ALL, "Test Subject", "<p>Test message</p>")
+        recipient_range = {'first_pk': students[0].pk, 'last_pk': students[2].pk, 'count': 3}
+        # a student unenrolls between the queuing and the sending of the email
+        CourseEnrollment.unenroll(students[1], self.course.id)
+        to_list, num_skipped = _get_recipients_in_range(course_email, recipient_range)
+        self.assertEquals([recipient['pk'] for recipient in to_list], [students[0].pk, students[2].pk])
+        self.assertEquals(num_skipped, 1)
+
+    @override_settings(BULK_EMAIL_CONNECTIONS_PER_TASK=4, BULK_EMAIL_MAX_SENDS_PER_SECOND=10000)
+    def test_several_connections(self):
+        # Select number of emails to fit into a single subtask.
+        num_emails = settings.BULK_EMAIL_EMAILS_PER_TASK
+        # We also send email to the instructor:
+        self._create_students(num_emails - 1)
+        expected_fails = int((num_emails + 3) / 4.0)
+        expected_succeeds = num_emails - expected_fails
+        with patch('bulk_email.tasks.get_connection', autospec=True) as get_conn:
+            # have every fourth email fail due to blacklisting:
+            get_conn.return_value.send_messages.side_effect = cycle(
+                [SMTPDataError(554, "Email address is blacklisted"), None, None, None]
+            )
+            self._test_run_with_task(send_bulk_course_email, 'emailed', num_emails, expected_succeeds, failed=expected_fails)
+        self.assertEquals(get_conn.call_count, 4)
+        self.assertEquals(get_conn.return_value.send_messages.call_count, num_emails)
+
     def _test_email_address_failures(self, exception):
         """Test that celery handles bad address errors by failing and not retrying."""
         # Select number of emails to fit into a single subtask.
@@ -406,3 +447,22 @@ class TestBulkEmailInstructorTask(InstructorTaskCourseTestCase):
 
     def test_failure_on_ses_domain_not_confirmed(self):
         self._test_immediate_failure(SESDomainNotConfirmedError(403, "You're out of bounds!"))
+
+
+class SendTokenTestCase(TestCase):
+    """Tests of the send rate shared by all workers."""
+
+    def test_sends_spread_over_seconds(self):
+        clock = [1000000.0]
+
+        def fake_sleep(seconds):
+            """Move the clock on rather than wait"""
+            clock[0] += seconds
+
+        sent_at = []
+        with patch('bulk_email.tasks.time', lambda: clock[0]):
+            with patch('bulk_email.tasks.sleep', fake_sleep):
+                for _ in range(5):
+                    _wait_for_send_token(2)
+                    sent_at.append(clock[0])
+        self.assertEquals(sent_at, [1000000.0, 1000000.5, 1000001.0, 1000001.5, 1000002.0])
@@ -0,0 +1,29 @@
+"""
+Recompute the grade and subsection open counts of the Metrics tab from
+StudentModule, for the given courses or every course.
+
+    ./manage.py lms rebuild_class_dashboard_counts edX/DemoX/Demo_Course --settings=aws
+
+The counts are kept up to date as students work; rebuild them once after
+deploying, and after changing StudentModule rows with SQL.
+"""
+from textwrap import dedent
+
+from django.core.management.base import BaseCommand
+
+from class_dashboard.models import rebuild_counts
+from xmodule.modulestore.django import modulestore
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the class dashboard counts of courses.
+    """
+    args = '[<course_id> ...]'
+    help = dedent(__doc__).strip()
+
+    def handle(self, *args, **options):
+        course_ids = args or [course.id for course in modulestore().get_courses()]
+        for course_id in course_ids:
+            self.stdout.write("Rebuilding counts for {0}\n".format(course_id))
+            rebuild_counts(course_id)
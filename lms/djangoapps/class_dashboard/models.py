@@ -0,0 +1,223 @@
+"""
+Per-course summaries of StudentModule for the Metrics tab of the instructor
+dashboard.
+
+The grade distribution and subsection open charts used to run GROUP BY queries
+over the whole of courseware_studentmodule for the course on every page load.
+Instead, these tables hold the counts, kept up to date as StudentModules are
+saved and deleted, so a chart reads one row per (problem, grade) or per
+subsection.
+
+Each count is split over SHARDS rows, as XModuleUserStateSummaryCounter is, so
+that students saving the same problem at once don't wait on each other's row
+lock for the rest of their request's transaction. A count is the sum of its
+shards.
+
+Rows changed without signals (queryset updates, raw SQL) aren't counted: run
+
+    ./manage.py lms rebuild_class_dashboard_counts <course_id> --settings=aws
+
+to recompute a course's counts from StudentModule, e.g. after deploying.
+"""
+import random
+
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from courseware.models import StudentModule
+
+SHARDS = 8
+
+
+class ProblemGradeCount(models.Model):
+    """
+    The number of students with a given grade out of a given max_grade on a
+    problem in a course.
+    """
+    class Meta:
+        unique_together = (('course_id', 'module_state_key', 'grade', 'max_grade', 'shard'),)
+
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    grade = models.FloatField()
+    max_grade = models.FloatField(null=True, blank=True)
+    shard = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    @classmethod
+    def rebuild(cls, course_id):
+        """Recompute the counts of `course_id` from StudentModule"""
+        grades = StudentModule.objects.filter(
+            course_id=course_id,
+            grade__isnull=False,
+            module_type='problem',
+        ).values('module_state_key', 'grade', 'max_grade').annotate(count=Count('grade'))
+
+        cls.objects.filter(course_id=course_id).delete()
+        cls.objects.bulk_create([cls(course_id=course_id, **row) for row in grades])
+
+    @classmethod
+    def totals(cls, **kwargs):
+        """
+        The non-zero counts matching `kwargs`, summed over their shards, as dicts
+        of 'module_state_key', 'grade', 'max_grade' and 'count'
+        """
+        rows = cls.objects.filter(**kwargs).values('module_state_key', 'grade', 'max_grade').annotate(
+            total=Sum('count')
+        ).filter(total__gt=0)
+        for row in rows:
+            row['count'] = row.pop('total')
+            yield row
+
+    def __unicode__(self):
+        return u'{0} {1}/{2} ({3}): {4}'.format(
+            self.module_state_key, self.grade, self.max_grade, self.shard, self.count
+        )
+
+
+class SequentialOpenCount(models.Model):
+    """
+    The number of students who have opened a subsection (sequential) of a
+    course.
+    """
+    class Meta:
+        unique_together = (('course_id', 'module_state_key', 'shard'),)
+
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    shard = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    @classmethod
+    def rebuild(cls, course_id):
+        """Recompute the counts of `course_id` from StudentModule"""
+        opens = StudentModule.objects.filter(
+            course_id=course_id,
+            module_type='sequential',
+        ).values('module_state_key').annotate(count=Count('module_state_key'))
+
+        cls.objects.filter(course_id=course_id).delete()
+        cls.objects.bulk_create([cls(course_id=course_id, **row) for row in opens])
+
+    @classmethod
+    def totals(cls, **kwargs):
+        """
+        The non-zero counts matching `kwargs`, summed over their shards, as dicts
+        of 'module_state_key' and 'count'
+        """
+        rows = cls.objects.filter(**kwargs).values('module_state_key').annotate(
+            total=Sum('count')
+        ).filter(total__gt=0)
+        for row in rows:
+            row['count'] = row.pop('total')
+            yield row
+
+    def __unicode__(self):
+        return u'{0} ({1}): {2}'.format(self.module_state_key, self.shard, self.count)
+
+
+@transaction.commit_on_success
+def rebuild_counts(course_id):
+    """Recompute all the class dashboard counts of `course_id` from StudentModule"""
+    ProblemGradeCount.rebuild(course_id)
+    SequentialOpenCount.rebuild(course_id)
+
+
+def _counted_values(student_module):
+    """The fields of `student_module` that decide which count it is part of"""
+    return (
+        student_module.course_id,
+        student_module.module_type,
+        student_module.module_state_key,
+        student_module.grade,
+        student_module.max_grade,
+    )
+
+
+def _count_for(values):
+    """
+    The model and lookup of the count a StudentModule with the `values` of
+    `_counted_values` is part of, or None if it isn't counted.
+    """
+    course_id, module_type, module_state_key, grade, max_grade = values
+    if module_type == 'problem' and grade is not None:
+        return ProblemGradeCount, {
+            'course_id': course_id,
+            'module_state_key': module_state_key,
+            'grade': grade,
+            'max_grade': max_grade,
+        }
+    if module_type == 'sequential':
+        return SequentialOpenCount, {
+            'course_id': course_id,
+            'module_state_key': module_state_key,
+        }
+    return None
+
+
+def _add_to_counts(deltas):
+    """
+    Add each delta of `deltas`, a list of (values, delta) pairs, to the count the
+    StudentModule `values` are part of, adding to a random shard of each.
+
+    The row locks are taken in the same order whatever the deltas, so that saves
+    moving modules between the same two counts in opposite directions can't
+    deadlock.
+    """
+    updates = []
+    for values, delta in deltas:
+        count = _count_for(values)
+        if count is None:
+            continue
+        model, lookup = count
+        lookup['shard'] = random.randrange(SHARDS)
+        updates.append((model.__name__, sorted(lookup.items()), model, lookup, delta))
+
+    for _, _, model, lookup, delta in sorted(updates):
+        if model.objects.filter(**lookup).update(count=F('count') + delta):
+            continue
+        try:
+            # a shard may go below zero, as long as the sum of the shards doesn't
+            model.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # another save created the row first
+            model.objects.filter(**lookup).update(count=F('count') + delta)
+
+
+@receiver(post_init, sender=StudentModule)
+def remember_counted_values(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """
+    Remember which count the StudentModule is part of as loaded, to tell on
+    save whether it has moved to another one.
+    """
+    instance._class_dashboard_values = _counted_values(instance)  # pylint: disable=protected-access
+
+
+@receiver(post_save, sender=StudentModule)
+def count_saved_student_module(sender, instance, created, **kwargs):  # pylint: disable=unused-argument
+    """
+    Move the StudentModule to the count of its new grade. Most saves only
+    change the state, and cost nothing more.
+    """
+    new_values = _counted_values(instance)
+    if created:
+        old_values = None
+    else:
+        # Instances loaded with deferred fields aren't seen by post_init,
+        # so what they were counted as isn't known.
+        old_values = getattr(instance, '_class_dashboard_values', new_values)
+    if old_values == new_values:
+        return
+    deltas = [(new_values, 1)]
+    if old_values is not None:
+        deltas.append((old_values, -1))
+    _add_to_counts(deltas)
+    instance._class_dashboard_values = new_values  # pylint: disable=protected-access
+
+
+@receiver(post_delete, sender=StudentModule)
+def uncount_deleted_student_module(sender, instance, **kwargs):  # pylint: disable=unused-argument
+    """Take the deleted StudentModule out of its count"""
+    _add_to_counts([(getattr(instance, '_class_dashboard_values', _counted_values(instance)), -1)])
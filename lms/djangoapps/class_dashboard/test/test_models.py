@@ -0,0 +1,107 @@
+"""
+Tests of the class dashboard counts kept from StudentModule
+"""
+from django.test import TestCase
+from mock import patch
+
+from courseware.models import StudentModule
+from courseware.tests.factories import StudentModuleFactory
+from class_dashboard.models import ProblemGradeCount, SequentialOpenCount, rebuild_counts
+
+COURSE_ID = 'edX/counts/2014'
+PROBLEM = 'i4x://edX/counts/problem/p1'
+SEQUENTIAL = 'i4x://edX/counts/sequential/s1'
+
+
+class TestCounts(TestCase):
+    """
+    Tests that the counts follow StudentModule saves and deletes.
+    """
+
+    def grade_counts(self):
+        """The non-zero grade counts of the course as {(grade, max_grade): count}"""
+        return dict(
+            ((count['grade'], count['max_grade']), count['count'])
+            for count in ProblemGradeCount.totals(course_id=COURSE_ID, module_state_key=PROBLEM)
+        )
+
+    def create_problem_module(self, grade, max_grade=2):
+        """A StudentModule of PROBLEM with `grade`"""
+        return StudentModuleFactory.create(
+            course_id=COURSE_ID,
+            module_state_key=PROBLEM,
+            grade=grade,
+            max_grade=max_grade,
+        )
+
+    def test_created_modules_are_counted(self):
+        for grade in (0, 1, 1, None):
+            self.create_problem_module(grade)
+        self.assertEqual(self.grade_counts(), {(0, 2): 1, (1, 2): 2})
+
+    def test_regrade_moves_count(self):
+        self.create_problem_module(1)
+        module = StudentModule.objects.get(id=self.create_problem_module(1).id)
+        module.grade = 2
+        module.save()
+        self.assertEqual(self.grade_counts(), {(1, 2): 1, (2, 2): 1})
+
+        module.state = '{"attempts": 2}'
+        module.save()
+        self.assertEqual(self.grade_counts(), {(1, 2): 1, (2, 2): 1})
+
+    def test_deleted_module_is_uncounted(self):
+        self.create_problem_module(1)
+        StudentModule.objects.get(id=self.create_problem_module(1).id).delete()
+        self.assertEqual(self.grade_counts(), {(1, 2): 1})
+
+    def test_sequential_opens(self):
+        for __ in range(3):
+            module = StudentModuleFactory.create(
+                course_id=COURSE_ID,
+                module_type='sequential',
+                module_state_key=SEQUENTIAL,
+            )
+        module.state = '{"position": 2}'
+        module.save()
+        self.assertEqual(
+            [count['count'] for count in SequentialOpenCount.totals(course_id=COURSE_ID, module_state_key=SEQUENTIAL)],
+            [3]
+        )
+
+    def test_counts_are_sharded(self):
+        for __ in range(20):
+            self.create_problem_module(1)
+        shards = ProblemGradeCount.objects.filter(course_id=COURSE_ID, module_state_key=PROBLEM, grade=1)
+        self.assertGreater(shards.count(), 1)
+        self.assertEqual(self.grade_counts(), {(1, 2): 20})
+
+    def test_count_locks_are_ordered(self):
+        first = self.create_problem_module(1)
+        second = self.create_problem_module(2)
+        updated = []
+        real_filter = ProblemGradeCount.objects.filter
+
+        def recording_filter(**kwargs):
+            """Record which grade's row each update goes to"""
+            updated.append(kwargs['grade'])
+            return real_filter(**kwargs)
+
+        with patch.object(ProblemGradeCount.objects, 'filter', side_effect=recording_filter):
+            # opposite moves between the same two counts lock their rows in the same order
+            first.grade = 2
+            first.save()
+            second.grade = 1
+            second.save()
+        self.assertEqual(updated, [1, 2, 1, 2])
+        self.assertEqual(self.grade_counts(), {(1, 2): 1, (2, 2): 1})
+
+    def test_rebuild(self):
+        self.create_problem_module(1)
+        self.create_problem_module(0)
+        # updates through the queryset aren't seen by the signals
+        StudentModule.objects.filter(course_id=COURSE_ID, grade=0).update(grade=2)
+        self.assertEqual(self.grade_counts(), {(0, 2): 1, (1, 2): 1})
+
+        rebuild_counts(COURSE_ID)
+        self.assertEqual(self.grade_counts(), {(1, 2): 1, (2, 2): 1})
@@ -0,0 +1,242 @@
+"""
+Bulk, course-wide grading.
+
+`courseware.grades.grade()` walks the course tree and instantiates modules for
+every student it grades. For course-wide reports that is far more work than
+necessary: most courses are graded purely from the `grade` and `max_grade`
+columns of StudentModule. `BulkCourseGrader` loads the grading context of a
+course once, streams the StudentModule rows of all students in chunks and runs
+`course.grader.grade()` for each student in a tight loop.
+
+Courses whose grades depend on something other than StudentModule rows (problems
+that always recalculate their grades, content with dynamic children such as
+randomize or A/B test modules) are not supported; use `supports_course()` and
+fall back to `courseware.grades.iterate_grades_for` for those.
+"""
+# Compute grades using real division, with no integer truncation
+from __future__ import division
+
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Max
+from django.test.client import RequestFactory
+
+from courseware import courses
+from courseware.access import has_access
+from courseware.model_data import FieldDataCache
+from courseware.models import StudentModule
+from courseware.module_render import get_module_for_descriptor
+from student.models import anonymous_id_for_user
+from submissions import api as sub_api
+from xmodule import graders
+from xmodule.graders import Score
+
+from .grades import grade_for_percentage, iterate_grades_for
+
+log = logging.getLogger("edx.courseware")
+
+# Number of students whose StudentModule rows are fetched in one query
+DEFAULT_CHUNK_SIZE = 500
+
+
+class BulkCourseGrader(object):
+    """
+    Grades many students of one course from StudentModule rows only.
+    """
+    def __init__(self, course, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.course = course
+        self.chunk_size = chunk_size
+
+        # [(section_format, section_name, [descriptor, ...]), ...]
+        self.sections = []
+        for section_format, sections in course.grading_context['graded_sections'].iteritems():
+            for section in sections:
+                self.sections.append((
+                    section_format,
+                    section['section_descriptor'].display_name_with_default,
+                    section['xmoduledescriptors'],
+                ))
+
+        self.locations = set(
+            descriptor.location.url()
+            for _, _, descriptors in self.sections
+            for descriptor in descriptors
+        )
+
+        # Problems the student has no graded StudentModule row for still count
+        # towards the section total, if the student can load them. Rather than
+        # instantiating the problem for every student, use the max_grade
+        # recorded for anybody else: it only depends on the problem.
+        self._max_scores = {}
+        if self.locations:
+            self._max_scores = dict(
+                StudentModule.objects.filter(
+                    course_id=course.id,
+                    module_state_key__in=list(self.locations),
+                    max_grade__isnull=False,
+                ).values('module_state_key').annotate(
+                    max_score=Max('max_grade')
+                ).values_list('module_state_key', 'max_score')
+            )
+
+    @classmethod
+    def supports_course(cls, course):
+        """
+        Return True if every graded section of `course` can be graded from
+        StudentModule rows alone.
+        """
+        if settings.GENERATE_PROFILE_SCORES:
+            return False
+
+        def unsupported(descriptor):
+            """Content that needs a module instance to be graded"""
+            if descriptor.always_recalculate_grades or descriptor.has_dynamic_children():
+                return True
+            return any(unsupported(child) for child in descriptor.get_children())
+
+        for sections in course.grading_context['graded_sections'].itervalues():
+            for section in sections:
+                if unsupported(section['section_descriptor']):
+                    return False
+        return True
+
+    def iter_student_chunks(self, students):
+        """
+        Yield lists of at most `chunk_size` students from the `students`
+        queryset, paginating by primary key so that the whole queryset is
+        never held in memory.
+        """
+        last_id = 0
+        while True:
+            chunk = list(students.filter(id__gt=last_id).order_by('id')[:self.chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_id = chunk[-1].id
+
+    def scores_for_chunk(self, students):
+        """
+        Return {student_id: {location: (grade, max_grade)}} for the given
+        students, fetched in a single query.
+        """
+        student_scores = defaultdict(dict)
+        rows = StudentModule.objects.filter(
+            course_id=self.course.id,
+            student__in=[student.id for student in students],
+        ).values_list('student_id', 'module_state_key', 'grade', 'max_grade')
+        for student_id, location, grade, max_grade in rows.iterator():
+            if location in self.locations:
+                student_scores[student_id][location] = (grade, max_grade)
+        return student_scores
+
+    def max_score(self, descriptor, student):
+        """
+        Return the maximum score of `descriptor`, creating the module for
+        `student` only if no other student has a recorded max_grade for it.
+
+        Returns None if `student` can't load `descriptor` (e.g. it isn't
+        released to them yet), since `courseware.grades.grade()` skips the
+        problems whose module can't be created for the student.
+        """
+        if not has_access(student, descriptor, 'load', self.course.id):
+            return None
+        location = descriptor.location.url()
+        if location not in self._max_scores:
+            request = RequestFactory().get('/')
+            request.user = student
+            request.session = {}
+            field_data_cache = FieldDataCache([descriptor], self.course.id, student)
+            problem = get_module_for_descriptor(student, request, descriptor, field_data_cache, self.course.id)
+            if problem is None:
+                return None
+            self._max_scores[location] = problem.max_score()
+        return self._max_scores[location]
+
+    def grade_student(self, student, module_scores, submissions_scores):
+        """
+        Return the gradeset for `student`, in the same format as
+        `courseware.grades.grade()`, from `module_scores`, a dict of
+        {location: (grade, max_grade)}.
+        """
+        totaled_scores = defaultdict(list)
+        for section_format, section_name, descriptors in self.sections:
+            locations = [descriptor.location.url() for descriptor in descriptors]
+            if not any(location in module_scores or location in submissions_scores for location in locations):
+                # Nothing attempted in this section: 0%
+                totaled_scores[section_format].append(Score(0.0, 1.0, True, section_name))
+                continue
+
+            scores = []
+            for descriptor, location in zip(descriptors, locations):
+                if location in submissions_scores:
+                    correct, total = submissions_scores[location]
+                elif not descriptor.has_score:
+                    # as in grades.get_score: never costs a has_access() in max_score
+                    continue
+                else:
+                    correct, total = module_scores.get(location, (None, None))
+                    if total is None:
+                        correct, total = 0.0, self.max_score(descriptor, student)
+                        if total is None:
+                            continue
+                    elif correct is None:
+                        correct = 0
+
+                    weight = descriptor.weight
+                    if weight is not None and total != 0:
+                        correct = correct * weight / total
+                        total = weight
+
+                graded = descriptor.graded and total > 0
+                scores.append(Score(correct, total, graded, descriptor.display_name_with_default))
+
+            _, graded_total = graders.aggregate_scores(scores, section_name)
+            if graded_total.possible > 0:
+                totaled_scores[section_format].append(graded_total)
+            else:
+                log.error("Unable to grade a section with a total possible score of zero: %s", section_name)
+
+        grade_summary = self.course.grader.grade(totaled_scores)
+        grade_summary['percent'] = round(grade_summary['percent'] * 100 + 0.05) / 100
+        grade_summary['grade'] = grade_for_percentage(self.course.grade_cutoffs, grade_summary['percent'])
+        grade_summary['totaled_scores'] = dict(totaled_scores)
+        return grade_summary
+
+    def iterate_grades(self, students):
+        """
+        Yield (student, gradeset, err_msg) for every student in the `students`
+        queryset, like `courseware.grades.iterate_grades_for`.
+        """
+        for chunk in self.iter_student_chunks(students):
+            student_scores = self.scores_for_chunk(chunk)
+            for student in chunk:
+                try:
+                    submissions_scores = sub_api.get_scores(
+                        self.course.id, anonymous_id_for_user(student, self.course.id)
+                    )
+                    gradeset = self.grade_student(student, student_scores.get(student.id, {}), submissions_scores)
+                    yield student, gradeset, ""
+                except Exception as exc:  # pylint: disable=broad-except
+                    log.exception(
+                        'Cannot grade student %s (%s) in course %s because of exception: %s',
+                        student.username,
+                        student.id,
+                        self.course.id,
+                        exc.message
+                    )
+                    yield student, {}, exc.message
+
+
+def iterate_grades_for_bulk(course_id, students, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Bulk counterpart of `courseware.grades.iterate_grades_for`. `students` must
+    be a queryset of User. Falls back to per-student grading if the course
+    cannot be graded from StudentModule rows alone.
+    """
+    course = courses.get_course_by_id(course_id)
+    if not BulkCourseGrader.supports_course(course):
+        log.info("Course %s cannot be graded in bulk; grading students one at a time", course_id)
+        return iterate_grades_for(course_id, students)
+    return BulkCourseGrader(course, chunk_size=chunk_size).iterate_grades(students)
@@ -1,16 +1,20 @@
 # Compute grades using real division, with no integer truncation
 from __future__ import division
 from collections import defaultdict
+import hashlib
 import json
 import random
 import logging
 
 from contextlib import contextmanager
+from datetime import datetime, timedelta
 from django.conf import settings
 from django.db import transaction
+from django.db.models import Count
 from django.test.client import RequestFactory
 
 from dogapi import dog_stats_api
+from pytz import UTC
 
 from courseware import courses
 from courseware.model_data import FieldDataCache
@@ -21,11 +25,16 @@ from xmodule.graders import Score
 from xmodule.modulestore.django import modulestore
 from xmodule.modulestore.exceptions import ItemNotFoundError
 from xmodule.util.duedate import get_extended_due_date
-from .models import StudentModule
+from .models import StudentModule, StudentSectionGrade, StudentModuleAnswer, AnswerDistributionLog
 from .module_render import get_module_for_descriptor
 
 log = logging.getLogger("edx.courseware")
 
+# StudentModule rows modified shortly before an answer distribution update
+# started are read again by the next one: rows saved by transactions that
+# committed late, or by servers with slower clocks, are not missed.
+ANSWER_DISTRIBUTION_OVERLAP = timedelta(minutes=5)
+
 
 def yield_dynamic_descriptor_descendents(descriptor, module_creator):
     """
@@ -79,16 +88,45 @@ def answer_distributions(course_id):
 
     This method will try to use a read-replica database if one is available.
     """
+    url_and_display_name = _problem_info_lookup(course_id)
+
+    # Iterate through all problems submitted for this course in no particular
+    # order, and build up our answer_counts dict that we will eventually return
+    answer_counts = defaultdict(lambda: defaultdict(int))
+    for module in StudentModule.all_submitted_problems_read_only(course_id):
+        # Each problem part has an ID that is derived from the
+        # module.module_state_key (with some suffix appended)
+        for problem_part_id, answer in _student_answers(module.id, course_id, module.state):
+            try:
+                url, display_name = url_and_display_name(module.module_state_key)
+            except ItemNotFoundError:
+                msg = "Answer Distribution: Item {} referenced in StudentModule {} " + \
+                      "for user {} in course {} not found; " + \
+                      "This can happen if a student answered a question that " + \
+                      "was later deleted from the course. This answer will be " + \
+                      "omitted from the answer distribution CSV."
+                log.warning(
+                    msg.format(module.module_state_key, module.id, module.student_id, course_id)
+                )
+                continue
+
+            answer_counts[(url, display_name, problem_part_id)][answer] += 1
+
+    return answer_counts
+
+
+def _problem_info_lookup(course_id):
+    """
+    Return a function that, for a given module_state_key, returns the problem's
+    url and display_name. It handles modulestore access and caching, and
+    ignores permissions. It may throw an ItemNotFoundError if there is no
+    content that corresponds to this module_state_key.
+    """
     # dict: { module.module_state_key : (url_name, display_name) }
-    state_keys_to_problem_info = {}  # For caching, used by url_and_display_name
+    state_keys_to_problem_info = {}
 
     def url_and_display_name(module_state_key):
-        """
-        For a given module_state_key, return the problem's url and display_name.
-        Handle modulestore access and caching. This method ignores permissions.
-        May throw an ItemNotFoundError if there is no content that corresponds
-        to this module_state_key.
-        """
+        """Return the url and display_name of the problem `module_state_key`"""
         problem_store = modulestore()
         if module_state_key not in state_keys_to_problem_info:
             problems = problem_store.get_items(module_state_key, course_id=course_id, depth=1)
@@ -106,45 +144,293 @@ def answer_distributions(course_id):
 
         return state_keys_to_problem_info[module_state_key]
 
-    # Iterate through all problems submitted for this course in no particular
-    # order, and build up our answer_counts dict that we will eventually return
-    answer_counts = defaultdict(lambda: defaultdict(int))
-    for module in StudentModule.all_submitted_problems_read_only(course_id):
+    return url_and_display_name
+
+
+def _student_answers(module_id, course_id, state):
+    """
+    Return a list of the (problem part id, answer) pairs in the JSON `state` of
+    the StudentModule `module_id`. Broken state is logged and has no answers.
+    """
+    try:
+        state_dict = json.loads(state) if state else {}
+        raw_answers = state_dict.get("student_answers", {})
+    except ValueError:
+        log.error(
+            "Answer Distribution: Could not parse module state for " +
+            "StudentModule id={}, course={}".format(module_id, course_id)
+        )
+        return []
+
+    # Convert whatever raw answers we have (numbers, unicode, None, etc.)
+    # to be unicode values. Note that if we get a string, it's always
+    # unicode and not str -- state comes from the json decoder, and that
+    # always returns unicode for strings.
+    return [(problem_part_id, unicode(raw_answer)) for problem_part_id, raw_answer in raw_answers.items()]
+
+
+def answer_distribution_modified_since(course_id):
+    """
+    Return the time since which StudentModule rows must be read to bring the
+    StudentModuleAnswer rows of `course_id` up to date, or None if all of
+    them must be.
+    """
+    try:
+        last_update = AnswerDistributionLog.objects.filter(course_id=course_id).latest()
+    except AnswerDistributionLog.DoesNotExist:
+        return None
+    return last_update.started - ANSWER_DISTRIBUTION_OVERLAP
+
+
+def answer_distribution_modules(course_id, modified_since=None):
+    """
+    Return the StudentModule rows of `course_id` whose stored answers must be
+    replaced: all submitted problems, or every problem modified since
+    `modified_since`, including those whose grade was reset since, so that
+    their answers are removed.
+
+    Unlike all_submitted_problems_read_only, they are read from the default
+    database: a row the read replica hadn't caught up with would be older
+    than ANSWER_DISTRIBUTION_OVERLAP by the next update, and never be read.
+    """
+    modules = StudentModule.objects.filter(course_id=course_id, module_type='problem')
+    if modified_since is None:
+        return modules.filter(grade__isnull=False)
+    return modules.filter(modified__gte=modified_since)
+
+
+def submitted_problem_id_batches(course_id, modified_since, batch_size):
+    """
+    Yield the ids of the answer_distribution_modules of `course_id` for
+    `modified_since`, in lists of at most `batch_size` in primary key order.
+    Each list is read with its own query, so that the result set of the whole
+    course is never held by the database client.
+    """
+    modules = answer_distribution_modules(course_id, modified_since).order_by('id')
+    last_id = 0
+    while True:
+        module_ids = list(modules.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not module_ids:
+            return
+        yield module_ids
+        last_id = module_ids[-1]
+
+
+def update_answer_distribution(course_id, module_ids):
+    """
+    Replace the StudentModuleAnswer rows of the StudentModule rows with ids
+    `module_ids` by the answers in their current state; rows without a grade
+    have none. Returns the number of answers stored.
+    """
+    modules = StudentModule.objects.filter(course_id=course_id, id__in=module_ids, grade__isnull=False)
+    answers = [
+        StudentModuleAnswer(
+            student_module_id=module_id,
+            course_id=course_id,
+            module_state_key=module_state_key,
+            answer_id=answer_id,
+            answer=answer,
+        )
+        for module_id, module_state_key, state in modules.values_list('id', 'module_state_key', 'state')
+        for answer_id, answer in _student_answers(module_id, course_id, state)
+    ]
+    with transaction.commit_on_success():
+        StudentModuleAnswer.objects.filter(student_module_id__in=module_ids).delete()
+        StudentModuleAnswer.objects.bulk_create(answers)
+    return len(answers)
+
+
+def log_answer_distribution_update(course_id, started, num_modules):
+    """
+    Record that every StudentModule row of `course_id` modified before
+    `started` is reflected in its StudentModuleAnswer rows.
+    """
+    AnswerDistributionLog.objects.create(course_id=course_id, started=started, nmodules=num_modules)
+
+
+def answer_distribution_rows(course_id):
+    """
+    Yield the rows of the answer distribution report of `course_id`, header
+    first, from its StudentModuleAnswer rows as counted by the database. Rows
+    are utf-8 encoded for the csv module.
+
+    Answers to problems that are no longer in the course are left out.
+    """
+    url_and_display_name = _problem_info_lookup(course_id)
+    missing_state_keys = set()
+
+    yield ['url_name', 'display name', 'answer id', 'answer', 'count']
+    counts = StudentModuleAnswer.objects.filter(course_id=course_id).values(
+        'module_state_key', 'answer_id', 'answer'
+    ).annotate(count=Count('id')).order_by('module_state_key', 'answer_id', 'answer')
+    for row in counts.iterator():
+        module_state_key = row['module_state_key']
+        if module_state_key in missing_state_keys:
+            continue
         try:
-            state_dict = json.loads(module.state) if module.state else {}
-            raw_answers = state_dict.get("student_answers", {})
-        except ValueError:
-            log.error(
-                "Answer Distribution: Could not parse module state for " +
-                "StudentModule id={}, course={}".format(module.id, course_id)
+            url, display_name = url_and_display_name(module_state_key)
+        except ItemNotFoundError:
+            log.warning(
+                "Answer Distribution: Item %s in course %s not found; its answers are "
+                "omitted from the answer distribution CSV.", module_state_key, course_id
             )
+            missing_state_keys.add(module_state_key)
             continue
+        yield [
+            unicode(value).encode('utf-8')
+            for value in (url, display_name, row['answer_id'], row['answer'], row['count'])
+        ]
 
-        # Each problem part has an ID that is derived from the
-        # module.module_state_key (with some suffix appended)
-        for problem_part_id, raw_answer in raw_answers.items():
-            # Convert whatever raw answers we have (numbers, unicode, None, etc.)
-            # to be unicode values. Note that if we get a string, it's always
-            # unicode and not str -- state comes from the json decoder, and that
-            # always returns unicode for strings.
-            answer = unicode(raw_answer)
 
-            try:
-                url, display_name = url_and_display_name(module.module_state_key)
-            except ItemNotFoundError:
-                msg = "Answer Distribution: Item {} referenced in StudentModule {} " + \
-                      "for user {} in course {} not found; " + \
-                      "This can happen if a student answered a question that " + \
-                      "was later deleted from the course. This answer will be " + \
-                      "omitted from the answer distribution CSV."
-                log.warning(
-                    msg.format(module.module_state_key, module.id, module.student_id, course_id)
+class SectionGradeStore(object):
+    """
+    Read-through access to the persisted section scores (StudentSectionGrade)
+    of a single student in a single course.
+
+    A stored section is only reused while the student state it was computed
+    from was read after the last save of every StudentModule row of the
+    problems in that section, so any save of student state -- for
+    example the one done by module_render's grade event handler -- implicitly
+    invalidates just the section that contains the problem. A single query
+    fetches the modification times of all of the student's StudentModule rows,
+    which also replaces the per-section exists() query. Unreleased content is
+    left out of the scores, so a stored section is also recomputed once
+    content of the section that wasn't released yet is released.
+
+    The store is a no-op unless FEATURES['ENABLE_PERSISTENT_SECTION_GRADES']
+    is set. It is also disabled when GENERATE_PROFILE_SCORES is on, since
+    those scores are random.
+    """
+    def __init__(self, student, course_id):
+        self.student = student
+        self.course_id = course_id
+        self.enabled = (
+            settings.FEATURES.get('ENABLE_PERSISTENT_SECTION_GRADES', False) and
+            not settings.GENERATE_PROFILE_SCORES and
+            student.is_authenticated()
+        )
+        self._section_grades = {}
+        self._module_modified = {}
+        if self.enabled:
+            with manual_transaction():
+                self._section_grades = StudentSectionGrade.grades_for_student(student, course_id)
+                self._module_modified = dict(
+                    StudentModule.objects.filter(
+                        student=student, course_id=course_id
+                    ).values_list('module_state_key', 'modified')
                 )
+
+    @staticmethod
+    def content_version(descriptor):
+        """
+        The version of the content of `descriptor`, which decides its max score:
+        the version it was last updated in if the modulestore keeps versions,
+        otherwise a hash of its content.
+        """
+        update_version = getattr(descriptor, 'update_version', None)
+        if update_version is not None:
+            return unicode(update_version)
+        return hashlib.md5(unicode(getattr(descriptor, 'data', '')).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def fingerprint(cls, descriptors):
+        """
+        Hash of the content of a section that affects its scores, so that
+        course edits (added, removed, reweighted or rewritten problems) are
+        noticed.
+        """
+        content = [
+            (descriptor.location.url(), descriptor.weight, descriptor.graded, cls.content_version(descriptor))
+            for descriptor in descriptors
+        ]
+        return hashlib.md5(json.dumps(content)).hexdigest()
+
+    @staticmethod
+    def next_release(descriptors, now):
+        """
+        The earliest start date of `descriptors` that is after `now`, or None.
+        Starts are moved earlier by days_early_for_beta, since beta testers
+        see the content that much earlier.
+        """
+        starts = []
+        for descriptor in descriptors:
+            start = getattr(descriptor, 'start', None)
+            if start is None:
                 continue
+            days_early = getattr(descriptor, 'days_early_for_beta', None)
+            if days_early is not None:
+                start -= timedelta(days=days_early)
+            if start > now:
+                starts.append(start)
+        return min(starts) if starts else None
+
+    def has_state(self, descriptors):
+        """
+        Return True if the student has StudentModule state for any of
+        `descriptors`.
+        """
+        if self.enabled:
+            return any(descriptor.location.url() in self._module_modified for descriptor in descriptors)
 
-            answer_counts[(url, display_name, problem_part_id)][answer] += 1
+        with manual_transaction():
+            return StudentModule.objects.filter(
+                student=self.student,
+                module_state_key__in=[descriptor.location for descriptor in descriptors]
+            ).exists()
+
+    def get(self, section_descriptor, descriptors):
+        """
+        Return the list of stored Scores for `section_descriptor`, or None if
+        there is no stored value or it is out of date. `descriptors` are all
+        of the scorable descriptors that can appear in the section.
+        """
+        if not self.enabled:
+            return None
+
+        section_grade = self._section_grades.get(section_descriptor.location.url())
+        if section_grade is None or section_grade.computed is None:
+            return None
+        if section_grade.fingerprint != self.fingerprint(descriptors):
+            return None
+        if section_grade.valid_until is not None and section_grade.valid_until <= datetime.now(UTC):
+            return None
+
+        last_modified = [
+            self._module_modified[descriptor.location.url()]
+            for descriptor in descriptors
+            if descriptor.location.url() in self._module_modified
+        ]
+        # Timestamps may only have a resolution of one second, so a module
+        # saved in the same second the state was read forces a recompute.
+        if last_modified and max(last_modified) >= section_grade.computed:
+            return None
+
+        return [Score(*score) for score in json.loads(section_grade.scores)]
+
+    def set(self, section_descriptor, descriptors, scores, computed):
+        """
+        Persist `scores` (a list of Score tuples) for `section_descriptor`,
+        computed from student state read at `computed`, which must be taken
+        before the state is read. The scores are kept until the next release of
+        the section or of any of `descriptors`.
+        """
+        if not self.enabled:
+            return
+
+        section_key = section_descriptor.location.url()
+        with manual_transaction():
+            section_grade, _ = StudentSectionGrade.objects.get_or_create(
+                student=self.student,
+                course_id=self.course_id,
+                section_state_key=section_key,
+            )
+            section_grade.fingerprint = self.fingerprint(descriptors)
+            section_grade.scores = json.dumps([list(score) for score in scores])
+            section_grade.computed = computed
+            section_grade.valid_until = self.next_release([section_descriptor] + list(descriptors), computed)
+            section_grade.save()
+        self._section_grades[section_key] = section_grade
 
-    return answer_counts
 
 @transaction.commit_manually
 def grade(student, request, course, keep_raw_scores=False):
@@ -184,6 +470,7 @@ def _grade(student, request, course, keep_raw_scores):
     # scores that were registered with the submissions API, which for the moment
     # means only openassessment (edx-ora2)
     submissions_scores = sub_api.get_scores(course.id, anonymous_id_for_user(student, course.id))
+    section_grades = SectionGradeStore(student, course.id)
 
     totaled_scores = {}
     # This next complicated loop is just to collect the totaled_scores, which is
@@ -210,48 +497,27 @@ def _grade(student, request, course, keep_raw_scores):
                     for descriptor in section['xmoduledescriptors']
                 )
 
+            # Sections whose scores only depend on StudentModule rows can be
+            # served from, and saved to, the persistent section grade store.
+            use_stored_scores = not should_grade_section
+
             if not should_grade_section:
-                with manual_transaction():
-                    should_grade_section = StudentModule.objects.filter(
-                        student=student,
-                        module_state_key__in=[
-                            descriptor.location for descriptor in section['xmoduledescriptors']
-                        ]
-                    ).exists()
+                should_grade_section = section_grades.has_state(section['xmoduledescriptors'])
 
             # If we haven't seen a single problem in the section, we don't have
             # to grade it at all! We can assume 0%
             if should_grade_section:
-                scores = []
-
-                def create_module(descriptor):
-                    '''creates an XModule instance given a descriptor'''
-                    # TODO: We need the request to pass into here. If we could forego that, our arguments
-                    # would be simpler
-                    with manual_transaction():
-                        field_data_cache = FieldDataCache([descriptor], course.id, student)
-                    return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
-
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
-
-                    (correct, total) = get_score(
-                        course.id, student, module_descriptor, create_module, scores_cache=submissions_scores
+                scores = None
+                if use_stored_scores:
+                    scores = section_grades.get(section_descriptor, section['xmoduledescriptors'])
+
+                if scores is None:
+                    computed = datetime.now(UTC)
+                    scores = _compute_section_scores(
+                        student, request, course, section_descriptor, submissions_scores
                     )
-                    if correct is None and total is None:
-                        continue
-
-                    if settings.GENERATE_PROFILE_SCORES:  	# for debugging!
-                        if total > 1:
-                            correct = random.randrange(max(total - 2, 1), total + 1)
-                        else:
-                            correct = total
-
-                    graded = module_descriptor.graded
-                    if not total > 0:
-                        #We simply cannot grade a problem that is 12/0, because we might need it as a percentage
-                        graded = False
-
-                    scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                    if use_stored_scores:
+                        section_grades.set(section_descriptor, section['xmoduledescriptors'], scores, computed)
 
                 _, graded_total = graders.aggregate_scores(scores, section_name)
                 if keep_raw_scores:
@@ -283,6 +549,54 @@ def _grade(student, request, course, keep_raw_scores):
     return grade_summary
 
 
+def _compute_section_scores(student, request, course, section_descriptor, submissions_scores):
+    """
+    Walk the (dynamic) descendents of `section_descriptor` and return the list
+    of Scores `student` earned on them, in traversal order.
+    """
+    scores = []
+
+    # One cache for the whole section, so that its student state is fetched
+    # with one query per scope rather than once per problem
+    with manual_transaction():
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
+            course.id, student, section_descriptor, depth=None
+        )
+
+    def create_module(descriptor):
+        '''creates an XModule instance given a descriptor'''
+        # TODO: We need the request to pass into here. If we could forego that, our arguments
+        # would be simpler
+        with manual_transaction():
+            # Dynamic children (e.g. randomize) aren't known until their parent is created
+            field_data_cache.add_descriptors([descriptor])
+        return get_module_for_descriptor(student, request, descriptor, field_data_cache, course.id)
+
+    for module_descriptor in yield_dynamic_descriptor_descendents(section_descriptor, create_module):
+
+        (correct, total) = get_score(
+            course.id, student, module_descriptor, create_module, scores_cache=submissions_scores,
+            field_data_cache=field_data_cache
+        )
+        if correct is None and total is None:
+            continue
+
+        if settings.GENERATE_PROFILE_SCORES:  	# for debugging!
+            if total > 1:
+                correct = random.randrange(max(total - 2, 1), total + 1)
+            else:
+                correct = total
+
+        graded = module_descriptor.graded
+        if not total > 0:
+            #We simply cannot grade a problem that is 12/0, because we might need it as a percentage
+            graded = False
+
+        scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+
+    return scores
+
+
 def grade_for_percentage(grade_cutoffs, percentage):
     """
     Returns a letter grade as defined in grading_policy (e.g. 'A' 'B' 'C' for 6.002x) or None.
@@ -339,6 +653,8 @@ def _progress_summary(student, request, course):
     will return None.
 
     """
+    # scores stored below are computed from the state read into this cache
+    state_read = datetime.now(UTC)
     with manual_transaction():
         field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
             course.id, student, course, depth=None
@@ -351,6 +667,12 @@ def _progress_summary(student, request, course):
             return None
 
     submissions_scores = sub_api.get_scores(course.id, anonymous_id_for_user(student, course.id))
+    section_grades = SectionGradeStore(student, course.id)
+    graded_sections = {
+        section['section_descriptor'].location.url(): section
+        for sections in course.grading_context['graded_sections'].itervalues()
+        for section in sections
+    }
 
     chapters = []
     # Don't include chapters that aren't displayable (e.g. due to error)
@@ -370,17 +692,48 @@ def _progress_summary(student, request, course):
                 graded = section_module.graded
                 scores = []
 
-                module_creator = section_module.xmodule_runtime.get_module
-
-                for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
-                    course_id = course.id
-                    (correct, total) = get_score(
-                        course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores
-                    )
-                    if correct is None and total is None:
-                        continue
-
-                    scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                # Graded sections whose scores only depend on StudentModule
+                # rows may be served from the persistent section grade store.
+                descriptors = None
+                if section_module.location.url() in graded_sections:
+                    descriptors = graded_sections[section_module.location.url()]['xmoduledescriptors']
+                    if any(
+                            descriptor.always_recalculate_grades or descriptor.location.url() in submissions_scores
+                            for descriptor in descriptors
+                    ):
+                        descriptors = None
+
+                stored_scores = None
+                if descriptors is not None:
+                    stored_scores = section_grades.get(section_module, descriptors)
+
+                if stored_scores is not None:
+                    scores = [
+                        Score(score.earned, score.possible, graded, score.section)
+                        for score in stored_scores
+                    ]
+                else:
+                    module_creator = section_module.xmodule_runtime.get_module
+                    section_scores = []
+
+                    for module_descriptor in yield_dynamic_descriptor_descendents(section_module, module_creator):
+                        course_id = course.id
+                        (correct, total) = get_score(
+                            course_id, student, module_descriptor, module_creator, scores_cache=submissions_scores,
+                            field_data_cache=field_data_cache
+                        )
+                        if correct is None and total is None:
+                            continue
+
+                        scores.append(Score(correct, total, graded, module_descriptor.display_name_with_default))
+                        # Stored scores use the per-problem graded flag, as in _grade
+                        section_scores.append(Score(
+                            correct, total, module_descriptor.graded and total > 0,
+                            module_descriptor.display_name_with_default
+                        ))
+
+                    if descriptors is not None:
+                        section_grades.set(section_module, descriptors, section_scores, state_read)
 
                 scores.reverse()
                 section_total, _ = graders.aggregate_scores(
@@ -407,7 +760,7 @@ def _progress_summary(student, request, course):
     return chapters
 
 
-def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None):
+def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=None, field_data_cache=None):
     """
     Return the score for a user on a problem, as a tuple (correct, total).
     e.g. (5,7) if you got 5 out of 7 points.
@@ -421,6 +774,8 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
            Can return None if user doesn't have access, or if something else went wrong.
     scores_cache: A dict of location names to (earned, possible) point tuples.
            If an entry is found in this cache, it takes precedence.
+    field_data_cache: An optional FieldDataCache. If it holds the student state
+           of `problem_descriptor`, that is used instead of querying StudentModule.
     """
     scores_cache = scores_cache or {}
 
@@ -447,14 +802,17 @@ def get_score(course_id, user, problem_descriptor, module_creator, scores_cache=
         # These are not problems, and do not have a score
         return (None, None)
 
-    try:
-        student_module = StudentModule.objects.get(
-            student=user,
-            course_id=course_id,
-            module_state_key=problem_descriptor.location
-        )
-    except StudentModule.DoesNotExist:
-        student_module = None
+    if field_data_cache is not None and field_data_cache.has_descriptor(problem_descriptor):
+        student_module = field_data_cache.find_student_module(problem_descriptor)
+    else:
+        try:
+            student_module = StudentModule.objects.get(
+                student=user,
+                course_id=course_id,
+                module_state_key=problem_descriptor.location
+            )
+        except StudentModule.DoesNotExist:
+            student_module = None
 
     if student_module is not None and student_module.max_grade is not None:
         correct = student_module.grade if student_module.grade is not None else 0
@@ -0,0 +1,88 @@
+"""
+Compare the time the courseware view of a section takes to respond when all
+the units of its sequence are rendered with the page (eager) and when only the
+current unit is (lazy, FEATURES['ENABLE_LAZY_SEQUENCE_RENDERING']).
+
+    ./manage.py lms benchmark_courseware_index MITx/6.002x/2012_Fall Week_1 Circuit_Sandbox staff --settings=aws
+
+The whole page is rendered before the view returns, so this is the time to
+first byte less the network.
+"""
+import time
+from optparse import make_option
+from textwrap import dedent
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+
+from courseware import views
+from request_cache.middleware import RequestCache
+from util.benchmark import percentile
+
+
+class Command(BaseCommand):
+    """
+    Load the section N times in each mode, and report the median and 95th
+    percentile latency.
+    """
+    args = '<course_id> <chapter> <section> <username>'
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--views',
+                    action='store',
+                    type='int',
+                    dest='views',
+                    default=20,
+                    help='Number of times to load the section in each mode'),
+        make_option('--position',
+                    action='store',
+                    dest='position',
+                    default=None,
+                    help='Unit of the sequence to show'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 4:
+            raise CommandError("Usage: {0}".format(self.args))
+        course_id, chapter, section, username = args
+        try:
+            user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError("No user {0}".format(username))
+
+        lazy_setting = settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_RENDERING', False)
+        results = []
+        try:
+            for name, lazy in (('eager', False), ('lazy', True)):
+                settings.FEATURES['ENABLE_LAZY_SEQUENCE_RENDERING'] = lazy
+                latencies = self.time_views(
+                    user, options['views'], course_id, chapter, section, options['position']
+                )
+                results.append((name, latencies))
+        finally:
+            settings.FEATURES['ENABLE_LAZY_SEQUENCE_RENDERING'] = lazy_setting
+
+        for name, latencies in results:
+            self.stdout.write("{0:<6} {1:>5} views  p50 {2:>8.1f}ms  p95 {3:>8.1f}ms\n".format(
+                name, len(latencies), percentile(latencies, 50), percentile(latencies, 95)
+            ))
+
+    def time_views(self, user, num_views, *view_args):
+        """Load the section `num_views` times, returning the latencies in ms"""
+        factory = RequestFactory()
+        latencies = []
+        for _ in range(num_views):
+            request = factory.get('/')
+            request.user = user
+            request.session = {}
+            request_cache = RequestCache()
+            request_cache.process_request(request)
+            start = time.time()
+            response = views.index(request, *view_args)
+            latencies.append((time.time() - start) * 1000)
+            request_cache.process_response(request, response)
+            if response.status_code != 200:
+                raise CommandError("The section returned {0}".format(response.status_code))
+        return latencies
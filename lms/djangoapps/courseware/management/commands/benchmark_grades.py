@@ -0,0 +1,70 @@
+"""
+Compare the throughput of per-student grading (courseware.grades) and bulk
+grading (courseware.bulk_grades) for the students enrolled in a course.
+
+    ./manage.py lms benchmark_grades MITx/6.002x/2012_Fall --limit 1000 --settings=aws
+"""
+import time
+from optparse import make_option
+from textwrap import dedent
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from courseware.bulk_grades import BulkCourseGrader
+from courseware.courses import get_course_by_id
+from courseware.grades import iterate_grades_for
+from student.models import CourseEnrollment
+
+
+class Command(BaseCommand):
+    """
+    Grade the first N enrolled students of a course both ways and report
+    students/second for each.
+    """
+    args = "<course_id>"
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--limit',
+                    action='store',
+                    type='int',
+                    dest='limit',
+                    default=500,
+                    help='Number of enrolled students to grade'),
+        make_option('--chunk-size',
+                    action='store',
+                    type='int',
+                    dest='chunk_size',
+                    default=500,
+                    help='Number of students per StudentModule query in bulk mode'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("benchmark_grades requires a course_id")
+        course_id = args[0]
+
+        course = get_course_by_id(course_id)
+        if not BulkCourseGrader.supports_course(course):
+            raise CommandError("Course {} cannot be graded in bulk".format(course_id))
+
+        student_ids = list(
+            CourseEnrollment.users_enrolled_in(course_id).order_by('id').values_list('id', flat=True)[:options['limit']]
+        )
+        students = User.objects.filter(id__in=student_ids)
+
+        per_student = self.time_grading(iterate_grades_for(course_id, students.order_by('id')))
+        bulk = self.time_grading(
+            BulkCourseGrader(course, chunk_size=options['chunk_size']).iterate_grades(students)
+        )
+
+        for name, (count, elapsed) in (('per-student', per_student), ('bulk', bulk)):
+            self.stdout.write("{:<12} {:>7} students {:>9.2f}s {:>9.1f} students/s\n".format(
+                name, count, elapsed, count / elapsed if elapsed else 0
+            ))
+
+    def time_grading(self, gradesets):
+        """Consume `gradesets`, returning (number of students, seconds)"""
+        start = time.time()
+        count = sum(1 for _ in gradesets)
+        return count, time.time() - start
@@ -0,0 +1,120 @@
+"""
+Compare the latency of checking a Python-scripted problem with a new CodeJail
+sandbox per execution (cold) and with a pool of warm sandbox workers (warm).
+
+    ./manage.py lms benchmark_sandbox --checks 50 --settings=aws
+
+Each check builds the LoncapaProblem, which runs its script, and grades an
+answer, which runs its check function: the capa part of `check_problem`.
+"""
+import gettext
+import shutil
+import tempfile
+import time
+from optparse import make_option
+from textwrap import dedent
+
+import fs.osfs
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management.base import BaseCommand, CommandError
+
+from capa.capa_problem import LoncapaProblem, LoncapaSystem, TEMPLATE_CACHE
+from capa.safe_exec import configure_pool
+from capa.script_results import SCRIPT_RESULTS
+from codejail import jail_code
+from codejail.django_integration import ConfigureCodeJailMiddleware
+from util.benchmark import percentile
+
+PROBLEM_XML = dedent("""\
+    <problem>
+    <script type="loncapa/python">
+    import random
+    a = random.randint(2, 9)
+    b = random.randint(2, 9)
+    expected = numpy.sqrt(a ** 2 + b ** 2)
+
+    def check_hypotenuse(expect, ans):
+        return abs(float(ans) - expected) &lt; 1e-3
+    </script>
+    <p>What is the hypotenuse of a right triangle with sides $a and $b?</p>
+    <customresponse cfn="check_hypotenuse">
+        <textline size="10"/>
+    </customresponse>
+    </problem>
+""")
+
+
+class Command(BaseCommand):
+    """
+    Check the same problem N times without, then with, the sandbox pool and
+    report the median and 95th percentile latency of each.
+    """
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--checks',
+                    action='store',
+                    type='int',
+                    dest='checks',
+                    default=50,
+                    help='Number of problem checks to time in each mode'),
+        make_option('--pool-size',
+                    action='store',
+                    type='int',
+                    dest='pool_size',
+                    default=1,
+                    help='Number of warm sandbox workers'),
+    )
+
+    def handle(self, *args, **options):
+        try:
+            ConfigureCodeJailMiddleware()
+        except MiddlewareNotUsed:
+            pass
+        if not jail_code.is_configured('python'):
+            raise CommandError("CodeJail isn't configured for Python: set CODE_JAIL['python_bin']")
+
+        self.filestore_dir = tempfile.mkdtemp()
+        try:
+            cold = self.time_checks(options['checks'])
+            configure_pool(**dict(settings.CODE_JAIL.get('pool') or {}, size=options['pool_size']))
+            warm = self.time_checks(options['checks'])
+        finally:
+            shutil.rmtree(self.filestore_dir, ignore_errors=True)
+
+        for name, latencies in (('cold', cold), ('warm', warm)):
+            self.stdout.write("{:<6} {:>5} checks  p50 {:>8.1f}ms  p95 {:>8.1f}ms\n".format(
+                name, len(latencies), percentile(latencies, 50), percentile(latencies, 95)
+            ))
+
+    def capa_system(self, seed):
+        """A LoncapaSystem that doesn't cache sandbox results"""
+        return LoncapaSystem(
+            ajax_url='/benchmark',
+            anonymous_student_id='benchmark',
+            cache=None,
+            can_execute_unsafe_code=lambda: False,
+            DEBUG=False,
+            filestore=fs.osfs.OSFS(self.filestore_dir),
+            i18n=gettext.NullTranslations(),
+            node_path=None,
+            render_template=lambda template, context: '<div/>',
+            seed=seed,
+            STATIC_URL='/static/',
+            xqueue=None,
+        )
+
+    def time_checks(self, checks):
+        """Build and grade the problem `checks` times, returning the latencies in ms"""
+        latencies = []
+        for seed in range(checks):
+            # make every check parse the problem and run its script
+            TEMPLATE_CACHE.clear()
+            SCRIPT_RESULTS.clear()
+            start = time.time()
+            problem = LoncapaProblem(PROBLEM_XML, id='1', seed=seed, capa_system=self.capa_system(seed))
+            correct_map = problem.grade_answers({'1_2_1': '5'})
+            latencies.append((time.time() - start) * 1000)
+            if correct_map.get_correctness('1_2_1') is None:
+                raise CommandError("The problem wasn't graded")
+        return latencies
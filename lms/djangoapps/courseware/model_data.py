@@ -3,7 +3,7 @@ Classes to provide the LMS runtime data storage to XBlocks
 """
 
 import json
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from itertools import chain
 from .models import (
     StudentModule,
@@ -13,7 +13,7 @@ from .models import (
 )
 import logging
 
-from django.db import DatabaseError
+from django.db import DatabaseError, transaction
 from django.contrib.auth.models import User
 
 from xblock.runtime import KeyValueStore
@@ -38,12 +38,36 @@ def chunks(items, chunk_size):
     return (items[i:i + chunk_size] for i in xrange(0, len(items), chunk_size))
 
 
+def _get_child_descriptors(descriptor, depth, descriptor_filter):
+    """
+    Return a list of all child descriptors down to the specified depth
+    that match the descriptor filter. Includes `descriptor`
+
+    descriptor: The parent to search inside
+    depth: The number of levels to descend, or None for infinite depth
+    descriptor_filter(descriptor): A function that returns True
+        if descriptor should be included in the results
+    """
+    if descriptor_filter(descriptor):
+        descriptors = [descriptor]
+    else:
+        descriptors = []
+
+    if depth is None or depth > 0:
+        new_depth = depth - 1 if depth is not None else depth
+
+        for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
+            descriptors.extend(_get_child_descriptors(child, new_depth, descriptor_filter))
+
+    return descriptors
+
+
 class FieldDataCache(object):
     """
     A cache of django model objects needed to supply the data
     for a module and its decendants
     """
-    def __init__(self, descriptors, course_id, user, select_for_update=False):
+    def __init__(self, descriptors, course_id, user, select_for_update=False, defer_writes=False):
         '''
         Find any courseware.models objects that are needed by any descriptor
         in descriptors. Attempts to minimize the number of queries to the database.
@@ -55,22 +79,80 @@ class FieldDataCache(object):
         course_id: The id of the current course
         user: The user for which to cache data
         select_for_update: True if rows should be locked until end of transaction
+        defer_writes: True if DjangoKeyValueStore writes should be held until
+            flush() is called, rather than saved immediately
         '''
         self.cache = {}
-        self.descriptors = descriptors
+        self.descriptors = []
         self.select_for_update = select_for_update
+        self.defer_writes = defer_writes
         self.course_id = course_id
         self.user = user
 
-        if user.is_authenticated():
-            for scope, fields in self._fields_to_cache().items():
-                for field_object in self._retrieve_fields(scope, fields):
+        # What has already been queried for, so that add_descriptors only
+        # fetches data for new descriptors
+        self._usage_ids = set()
+        self._block_types = set()
+        self._user_info_fields = set()
+
+        # field objects with unsaved changes, in the order they were first
+        # modified, by id(): unsaved model instances all compare equal
+        self._dirty = OrderedDict()
+
+        self.add_descriptors(descriptors)
+
+    def add_descriptors(self, descriptors):
+        """
+        Extend the cache with the data needed by `descriptors`, using one
+        (chunked) query per scope for all of the descriptors that aren't
+        already cached.
+        """
+        new_descriptors = []
+        for descriptor in descriptors:
+            usage_id = str(descriptor.scope_ids.usage_id)
+            if usage_id not in self._usage_ids:
+                self._usage_ids.add(usage_id)
+                new_descriptors.append(descriptor)
+
+        if not new_descriptors:
+            return
+
+        self.descriptors.extend(new_descriptors)
+        if self.user.is_authenticated():
+            for scope, fields in self._fields_to_cache(new_descriptors).items():
+                for field_object in self._retrieve_fields(scope, fields, new_descriptors):
                     self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
 
+    def add_student_module(self, descriptor, student_module):
+        """
+        Extend the cache with the data needed by `descriptor`, whose
+        StudentModule for this cache's user, `student_module`, has already
+        been fetched. Only the other scopes are queried.
+        """
+        usage_id = str(descriptor.scope_ids.usage_id)
+        if usage_id in self._usage_ids:
+            return
+        self._usage_ids.add(usage_id)
+        self.descriptors.append(descriptor)
+
+        for scope, fields in self._fields_to_cache([descriptor]).items():
+            if scope == Scope.user_state:
+                self.cache[self._cache_key_from_field_object(scope, student_module)] = student_module
+                continue
+            for field_object in self._retrieve_fields(scope, fields, [descriptor]):
+                self.cache[self._cache_key_from_field_object(scope, field_object)] = field_object
+
+    def add_descriptor_descendents(self, descriptor, depth=None, descriptor_filter=lambda descriptor: True):
+        """
+        Extend the cache with the data for `descriptor` and its descendents.
+        Arguments are as for `cache_for_descriptor_descendents`.
+        """
+        self.add_descriptors(_get_child_descriptors(descriptor, depth, descriptor_filter))
+
     @classmethod
     def cache_for_descriptor_descendents(cls, course_id, user, descriptor, depth=None,
                                          descriptor_filter=lambda descriptor: True,
-                                         select_for_update=False):
+                                         select_for_update=False, defer_writes=False):
         """
         course_id: the course in the context of which we want StudentModules.
         user: the django user for whom to load modules.
@@ -80,34 +162,12 @@ class FieldDataCache(object):
         descriptor_filter is a function that accepts a descriptor and return wether the StudentModule
             should be cached
         select_for_update: Flag indicating whether the rows should be locked until end of transaction
+        defer_writes: Flag indicating whether writes should be held until flush() is called
         """
 
-        def get_child_descriptors(descriptor, depth, descriptor_filter):
-            """
-            Return a list of all child descriptors down to the specified depth
-            that match the descriptor filter. Includes `descriptor`
-
-            descriptor: The parent to search inside
-            depth: The number of levels to descend, or None for infinite depth
-            descriptor_filter(descriptor): A function that returns True
-                if descriptor should be included in the results
-            """
-            if descriptor_filter(descriptor):
-                descriptors = [descriptor]
-            else:
-                descriptors = []
-
-            if depth is None or depth > 0:
-                new_depth = depth - 1 if depth is not None else depth
-
-                for child in descriptor.get_children() + descriptor.get_required_module_descriptors():
-                    descriptors.extend(get_child_descriptors(child, new_depth, descriptor_filter))
+        descriptors = _get_child_descriptors(descriptor, depth, descriptor_filter)
 
-            return descriptors
-
-        descriptors = get_child_descriptors(descriptor, depth, descriptor_filter)
-
-        return FieldDataCache(descriptors, course_id, user, select_for_update)
+        return FieldDataCache(descriptors, course_id, user, select_for_update, defer_writes)
 
     def _query(self, model_class, **kwargs):
         """
@@ -134,15 +194,16 @@ class FieldDataCache(object):
         )
         return res
 
-    def _retrieve_fields(self, scope, fields):
+    def _retrieve_fields(self, scope, fields, descriptors):
         """
         Queries the database for all of the fields in the specified scope
+        that are used by `descriptors`
         """
         if scope == Scope.user_state:
             return self._chunked_query(
                 StudentModule,
                 'module_state_key__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                (str(descriptor.scope_ids.usage_id) for descriptor in descriptors),
                 course_id=self.course_id,
                 student=self.user.pk,
             )
@@ -150,32 +211,41 @@ class FieldDataCache(object):
             return self._chunked_query(
                 XModuleUserStateSummaryField,
                 'usage_id__in',
-                (str(descriptor.scope_ids.usage_id) for descriptor in self.descriptors),
+                (str(descriptor.scope_ids.usage_id) for descriptor in descriptors),
                 field_name__in=set(field.name for field in fields),
             )
         elif scope == Scope.preferences:
+            block_types = set(descriptor.scope_ids.block_type for descriptor in descriptors) - self._block_types
+            if not block_types:
+                return []
+            self._block_types.update(block_types)
             return self._chunked_query(
                 XModuleStudentPrefsField,
                 'module_type__in',
-                set(descriptor.scope_ids.block_type for descriptor in self.descriptors),
+                block_types,
                 student=self.user.pk,
                 field_name__in=set(field.name for field in fields),
             )
         elif scope == Scope.user_info:
+            field_names = set(field.name for field in fields) - self._user_info_fields
+            if not field_names:
+                return []
+            self._user_info_fields.update(field_names)
             return self._query(
                 XModuleStudentInfoField,
                 student=self.user.pk,
-                field_name__in=set(field.name for field in fields),
+                field_name__in=field_names,
             )
         else:
             return []
 
-    def _fields_to_cache(self):
+    def _fields_to_cache(self, descriptors):
         """
         Returns a map of scopes to fields in that scope that should be cached
+        for `descriptors`
         """
         scope_map = defaultdict(set)
-        for descriptor in self.descriptors:
+        for descriptor in descriptors:
             for field in descriptor.fields.values():
                 scope_map[field.scope].add(field)
         return scope_map
@@ -222,6 +292,19 @@ class FieldDataCache(object):
 
         return self.cache.get(self._cache_key_from_kvs_key(key))
 
+    def has_descriptor(self, descriptor):
+        """
+        Return True if the data for `descriptor` has been fetched into this cache
+        """
+        return str(descriptor.scope_ids.usage_id) in self._usage_ids
+
+    def find_student_module(self, descriptor):
+        """
+        Return the cached StudentModule of `descriptor` for this cache's user,
+        or None if the user has no state for it
+        """
+        return self.cache.get((Scope.user_state, str(descriptor.scope_ids.usage_id)))
+
     def find_or_create(self, key):
         '''
         Find a model data object in this cache, or create it if it doesn't
@@ -263,6 +346,29 @@ class FieldDataCache(object):
         self.cache[cache_key] = field_object
         return field_object
 
+    def mark_dirty(self, field_object):
+        """
+        Record that `field_object` has unsaved changes, to be written by flush()
+        """
+        self._dirty[id(field_object)] = field_object
+
+    @transaction.commit_on_success
+    def flush(self):
+        """
+        Save every field object changed since the last flush.
+
+        Each row is written once, however many times it was changed, and all
+        of them are written in a single transaction. Rows are saved
+        individually (rather than with a queryset update) so that post_save
+        handlers such as StudentModuleHistory still run.
+
+        Returns the number of objects saved.
+        """
+        dirty, self._dirty = self._dirty, OrderedDict()
+        for field_object in dirty.itervalues():
+            field_object.save()
+        return len(dirty)
+
 
 class DjangoKeyValueStore(KeyValueStore):
     """
@@ -345,6 +451,11 @@ class DjangoKeyValueStore(KeyValueStore):
             # we don't have to worry about conflicts
                 field_object.value = json.dumps(kv_dict[field])
 
+        if self._field_data_cache.defer_writes:
+            for field_object in field_objects:
+                self._field_data_cache.mark_dirty(field_object)
+            return
+
         for field_object in field_objects:
             try:
                 # Save the field object that we made above
@@ -368,7 +479,10 @@ class DjangoKeyValueStore(KeyValueStore):
             state = json.loads(field_object.state)
             del state[key.field_name]
             field_object.state = json.dumps(state)
-            field_object.save()
+            if self._field_data_cache.defer_writes:
+                self._field_data_cache.mark_dirty(field_object)
+            else:
+                field_object.save()
         else:
             field_object.delete()
 
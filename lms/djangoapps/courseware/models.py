@@ -12,10 +12,13 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
+import random
+
 from django.contrib.auth.models import User
 from django.conf import settings
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import IntegrityError, models
+from django.db.models import F, Sum
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
 
@@ -61,17 +64,21 @@ class StudentModule(models.Model):
     modified = models.DateTimeField(auto_now=True, db_index=True)
 
     @classmethod
-    def all_submitted_problems_read_only(cls, course_id):
+    def all_submitted_problems_read_only(cls, course_id, modified_since=None):
         """
         Return all model instances that correspond to problems that have been
         submitted for a given course. So module_type='problem' and a non-null
         grade. Use a read replica if one exists for this environment.
+
+        If `modified_since` is given, only return the ones modified since then.
         """
         queryset = cls.objects.filter(
             course_id=course_id,
             module_type='problem',
             grade__isnull=False
         )
+        if modified_since is not None:
+            queryset = queryset.filter(modified__gte=modified_since)
         if "read_replica" in settings.DATABASES:
             return queryset.using("read_replica")
         else:
@@ -152,6 +159,75 @@ class XModuleUserStateSummaryField(models.Model):
         return unicode(repr(self))
 
 
+class XModuleUserStateSummaryCounter(models.Model):
+    """
+    One shard of the count of a key of a dict field in the
+    Scope.user_state_summary scope, like the votes for one answer of a poll.
+
+    Each increment goes to a random one of SHARDS rows, so that students
+    adding to the same count at once don't wait on each other's row lock.
+    The count is the sum of its shards.
+    """
+    SHARDS = 8
+
+    class Meta:
+        unique_together = (('usage_id', 'field_name', 'key', 'shard'),)
+
+    # The name of the field
+    field_name = models.CharField(max_length=64, db_index=True)
+
+    # The definition id for the module
+    usage_id = models.CharField(max_length=255, db_index=True)
+
+    # The key of the field counted
+    key = models.CharField(max_length=255)
+
+    shard = models.IntegerField(default=0)
+    count = models.IntegerField(default=0)
+
+    @classmethod
+    def increment(cls, usage_id, field_name, key, delta=1):
+        """
+        Add `delta` to the count of `key` of the field
+        """
+        lookup = {
+            'usage_id': usage_id,
+            'field_name': field_name,
+            'key': key,
+            'shard': random.randrange(cls.SHARDS),
+        }
+        if cls.objects.filter(**lookup).update(count=F('count') + delta):
+            return
+        try:
+            cls.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # another increment created the shard first
+            cls.objects.filter(**lookup).update(count=F('count') + delta)
+
+    @classmethod
+    def counts(cls, usage_id, field_name):
+        """
+        Return a dict mapping each key of the field to its count
+        """
+        rows = cls.objects.filter(
+            usage_id=usage_id,
+            field_name=field_name,
+        ).values('key').annotate(total=Sum('count'))
+        return dict((row['key'], row['total']) for row in rows)
+
+    def __repr__(self):
+        return 'XModuleUserStateSummaryCounter<%r>' % ({
+            'field_name': self.field_name,
+            'usage_id': self.usage_id,
+            'key': self.key,
+            'shard': self.shard,
+            'count': self.count,
+        },)
+
+    def __unicode__(self):
+        return unicode(repr(self))
+
+
 class XModuleStudentPrefsField(models.Model):
     """
     Stores data set in the Scope.preferences scope by an xmodule field
@@ -216,6 +292,122 @@ class XModuleStudentInfoField(models.Model):
         return unicode(repr(self))
 
 
+class StudentSectionGrade(models.Model):
+    """
+    Persistent cache of the scores a student earned in one graded section
+    (sequential) of a course.
+
+    `scores` holds the JSON-encoded list of per-problem (earned, possible,
+    graded, display_name) tuples, in course traversal order, exactly as they
+    were fed to `graders.aggregate_scores`. A row is only trusted while the
+    student state it was `computed` from is newer than every StudentModule row
+    of the problems in the section, its `fingerprint` still matches the
+    section's content and no content of the section has been released since;
+    see courseware.grades.
+    """
+    class Meta:
+        unique_together = (('student', 'course_id', 'section_state_key'),)
+
+    student = models.ForeignKey(User, db_index=True)
+    course_id = models.CharField(max_length=255, db_index=True)
+    section_state_key = models.CharField(max_length=255, db_index=True)
+
+    # Hash of the scorable content of the section (locations, weights, content
+    # versions), so that course edits invalidate previously computed scores.
+    fingerprint = models.CharField(max_length=32)
+    scores = models.TextField(default='[]')
+
+    # When the student state the scores were computed from was read. Saves
+    # during the computation are later than this, unlike `modified`.
+    computed = models.DateTimeField(null=True, blank=True)
+
+    # When the first content of the section that wasn't released at `computed`
+    # is released: content the student couldn't access isn't in `scores`.
+    valid_until = models.DateTimeField(null=True, blank=True)
+
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+    modified = models.DateTimeField(auto_now=True, db_index=True)
+
+    @classmethod
+    def grades_for_student(cls, student, course_id):
+        """
+        Return a dict mapping section_state_key -> StudentSectionGrade for
+        every cached section of `student` in `course_id`.
+        """
+        return {
+            section_grade.section_state_key: section_grade
+            for section_grade in cls.objects.filter(student=student, course_id=course_id)
+        }
+
+    @receiver(post_delete, sender=StudentModule)
+    def invalidate_on_state_delete(sender, instance, **kwargs):
+        """
+        Deleting student state (e.g. resetting attempts) can lower a section's
+        score without touching any modification time, so drop the student's
+        stored section grades for the course.
+        """
+        StudentSectionGrade.objects.filter(
+            student_id=instance.student_id,
+            course_id=instance.course_id,
+        ).delete()
+
+    def __repr__(self):
+        return 'StudentSectionGrade<%r>' % ({
+            'course_id': self.course_id,
+            'student': self.student.username,
+            'section_state_key': self.section_state_key,
+            'scores': str(self.scores)[:20],
+        },)
+
+    def __unicode__(self):
+        return unicode(repr(self))
+
+
+class StudentModuleAnswer(models.Model):
+    """
+    The answer to one part of a problem found in the `student_answers` of a
+    StudentModule row when the course's answers were last updated (see
+    courseware.grades.update_answer_distribution). The answer distribution of a
+    problem part is the count of its rows by answer, so it can be computed by
+    the database, and only the answers of modified StudentModule rows need to
+    be replaced to keep it up to date.
+    """
+    # Deleting a StudentModule deletes its answers.
+    student_module = models.ForeignKey(StudentModule, db_index=True)
+    course_id = models.CharField(max_length=255, db_index=True)
+    module_state_key = models.CharField(max_length=255, db_column='module_id')
+    answer_id = models.CharField(max_length=255)
+    answer = models.TextField()
+
+    def __repr__(self):
+        return 'StudentModuleAnswer<%r>' % ({
+            'course_id': self.course_id,
+            'answer_id': self.answer_id,
+            'answer': self.answer[:20],
+        },)
+
+    def __unicode__(self):
+        return unicode(repr(self))
+
+
+class AnswerDistributionLog(models.Model):
+    """
+    Log of the updates of the StudentModuleAnswer rows of a course. An update
+    only reads the StudentModule rows modified since the previous one started.
+    """
+    class Meta:
+        get_latest_by = "started"
+
+    course_id = models.CharField(max_length=255, db_index=True)
+    # StudentModule rows modified before this time are reflected in the answers
+    started = models.DateTimeField(db_index=True)
+    created = models.DateTimeField(auto_now_add=True)
+    nmodules = models.IntegerField(default=0)   # StudentModule rows read
+
+    def __unicode__(self):
+        return "[AnswerDistributionLog] %s: %s (%s modules)" % (self.course_id, self.started, self.nmodules)
+
+
 class OfflineComputedGrade(models.Model):
     """
     Table of grades computed offline for a given user and course.
@@ -239,6 +431,10 @@ class OfflineComputedGradeLog(models.Model):
     """
     Log of when offline grades are computed.
     Use this to be able to show instructor when the last computed grades were done.
+
+    A run in progress, or interrupted, has complete=False, and last_user_id is
+    the id of the last student whose grades it stored: resuming it grades the
+    students after them.
     """
     class Meta:
         ordering = ["-created"]
@@ -248,6 +444,11 @@ class OfflineComputedGradeLog(models.Model):
     created = models.DateTimeField(auto_now_add=True, null=True, db_index=True)
     seconds = models.IntegerField(default=0)  	# seconds elapsed for computation
     nstudents = models.IntegerField(default=0)
+    # when the run started: students with state modified since are graded by the next run
+    started = models.DateTimeField(null=True, db_index=True)
+    complete = models.BooleanField(default=True)
+    last_user_id = models.IntegerField(default=0)
+    students_per_second = models.FloatField(default=0)
 
     def __unicode__(self):
         return "[OCGLog] %s: %s" % (self.course_id, self.created)
@@ -287,6 +287,8 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
         """
         # TODO: fix this so that make_xqueue_callback uses the descriptor passed into
         # inner_get_module, not the parent's callback.  Add it as an argument....
+        # Children created on demand (e.g. by randomize) may not be in the cache yet
+        field_data_cache.add_descriptors([descriptor])
         return get_module_for_descriptor_internal(user, descriptor, field_data_cache, course_id,
                                                   track_function, make_xqueue_callback,
                                                   position, wrap_xmodule_display, grade_bucket_type,
@@ -437,6 +439,7 @@ def get_module_for_descriptor_internal(user, descriptor, field_data_cache, cours
 
     # pass position specified in URL to module through ModuleSystem
     system.set('position', position)
+    system.set('render_sequence_lazily', settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_RENDERING', False))
     if settings.FEATURES.get('ENABLE_PSYCHOMETRICS'):
         system.set(
             'psychometrics_handler',  # set callback for updating PsychometricsData
@@ -0,0 +1,140 @@
+"""
+Test bulk, course-wide grade calculation.
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.test.client import RequestFactory
+from django.test.utils import override_settings
+from mock import patch
+from pytz import UTC
+
+from capa.tests.response_xml_factory import OptionResponseXMLFactory
+from courseware.bulk_grades import BulkCourseGrader, iterate_grades_for_bulk
+from courseware.grades import grade
+from courseware.tests.factories import StudentModuleFactory
+from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+from student.tests.factories import UserFactory
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestBulkCourseGrader(ModuleStoreTestCase):
+    """
+    Check that bulk grading gives the same results as grading students one
+    at a time.
+    """
+    def setUp(self):
+        course = CourseFactory.create(display_name="bulk_grading_course", number="1002")
+        chapter = ItemFactory.create(parent_location=course.location, category='chapter')
+        problem_xml = OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            options=['Incorrect', 'Correct'],
+            correct_option='Correct'
+        )
+        self.problems = []
+        for index in range(2):
+            section = ItemFactory.create(
+                parent_location=chapter.location,
+                category='sequential',
+                display_name='Homework {}'.format(index),
+                metadata={'graded': True, 'format': 'Homework'}
+            )
+            for part in range(2):
+                self.problems.append(ItemFactory.create(
+                    parent_location=section.location,
+                    category='problem',
+                    data=problem_xml,
+                    display_name='Problem {}.{}'.format(index, part)
+                ))
+
+        # re-fetch the course from the database so the object is up to date
+        self.course = modulestore().get_instance(course.id, course.location)
+        self.students = [UserFactory.create() for _ in range(5)]
+
+        # student 0 has nothing, student 1 answered one problem correctly,
+        # student 2 one incorrectly, students 3 and 4 answered everything.
+        answers = [[], [(0, 1)], [(2, 0)], [(0, 1), (1, 1), (2, 0), (3, 1)], [(0, 1), (1, 1), (2, 1), (3, 1)]]
+        for student, student_answers in zip(self.students, answers):
+            for problem_index, score in student_answers:
+                StudentModuleFactory.create(
+                    student=student,
+                    course_id=self.course.id,
+                    module_state_key=self.problems[problem_index].location.url(),
+                    grade=score,
+                    max_grade=1,
+                )
+
+    def _students(self):
+        """The test students, as a queryset"""
+        return User.objects.filter(id__in=[student.id for student in self.students])
+
+    def _grade_one_at_a_time(self, student):
+        """Grade `student` with courseware.grades.grade"""
+        request = RequestFactory().get('/')
+        request.user = student
+        request.session = {}
+        return grade(student, request, self.course)
+
+    def test_supports_course(self):
+        self.assertTrue(BulkCourseGrader.supports_course(self.course))
+
+    def test_matches_per_student_grading(self):
+        grader = BulkCourseGrader(self.course, chunk_size=2)
+        results = list(grader.iterate_grades(self._students()))
+        self.assertEqual([student for student, _, _ in results], self.students)
+
+        for student, gradeset, err_msg in results:
+            self.assertEqual(err_msg, "")
+            expected = self._grade_one_at_a_time(student)
+            self.assertEqual(gradeset['percent'], expected['percent'])
+            self.assertEqual(gradeset['grade'], expected['grade'])
+            self.assertEqual(gradeset['section_breakdown'], expected['section_breakdown'])
+
+    @patch.dict('django.conf.settings.FEATURES', {'DISABLE_START_DATES': False})
+    def test_unreleased_problem_skipped(self):
+        store = modulestore()
+        course = store.get_item(self.course.location)
+        course.start = datetime.datetime(2000, 1, 1, tzinfo=UTC)
+        store.update_item(course, '**replace_user**')
+        # students 3 and 4 answered problem 1 before its release was postponed
+        problem = store.get_item(self.problems[1].location)
+        problem.start = datetime.datetime(2100, 1, 1, tzinfo=UTC)
+        store.update_item(problem, '**replace_user**')
+        self.course = store.get_instance(self.course.id, self.course.location)
+
+        # student 1 answered problem 0 only, so problem 1 doesn't count for them
+        student = self.students[1]
+        gradeset = BulkCourseGrader(self.course).grade_student(
+            student, {self.problems[0].location.url(): (1, 1)}, {}
+        )
+        expected = self._grade_one_at_a_time(student)
+        self.assertEqual(gradeset['percent'], expected['percent'])
+        self.assertEqual(gradeset['section_breakdown'], expected['section_breakdown'])
+
+    def test_unscored_descriptors_skipped(self):
+        grader = BulkCourseGrader(self.course)
+        student = self.students[1]
+        with patch.object(BulkCourseGrader, 'max_score', wraps=grader.max_score) as max_score:
+            grader.grade_student(student, {self.problems[0].location.url(): (1, 1)}, {})
+        # only the unanswered problem of the attempted section
+        self.assertEqual(
+            [call[0][0].location for call in max_score.call_args_list], [self.problems[1].location]
+        )
+
+    def test_one_query_per_chunk(self):
+        grader = BulkCourseGrader(self.course, chunk_size=5)
+        # One query for the students and one for their StudentModule rows,
+        # plus the submissions API and anonymous id lookups per student.
+        with patch('courseware.bulk_grades.sub_api.get_scores', return_value={}):
+            with patch('courseware.bulk_grades.anonymous_id_for_user', return_value='anon'):
+                with self.assertNumQueries(3):
+                    list(grader.iterate_grades(self._students()))
+
+    def test_unsupported_course_falls_back(self):
+        with patch('courseware.bulk_grades.BulkCourseGrader.supports_course', return_value=False):
+            with patch('courseware.bulk_grades.iterate_grades_for') as mock_iterate:
+                iterate_grades_for_bulk(self.course.id, self._students())
+        self.assertTrue(mock_iterate.called)
@@ -1,15 +1,25 @@
 """
 Test grade calculation.
 """
+import datetime
+
+from django.conf import settings
 from django.http import Http404
+from django.test.client import RequestFactory
 from django.test.utils import override_settings
 from mock import patch
+from pytz import UTC
 
+from capa.tests.response_xml_factory import OptionResponseXMLFactory
+from courseware.models import StudentModule, StudentSectionGrade
+from courseware.tests.factories import StudentModuleFactory
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from student.tests.factories import UserFactory
-from xmodule.modulestore.tests.factories import CourseFactory
+from xmodule.modulestore.django import modulestore
+from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
+from courseware import grades
 from courseware.grades import grade, iterate_grades_for
 
 
@@ -120,3 +130,156 @@ class TestGradeIteration(ModuleStoreTestCase):
                 students_to_errors[student] = err_msg
 
         return students_to_gradesets, students_to_errors
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+@patch.dict(settings.FEATURES, {'ENABLE_PERSISTENT_SECTION_GRADES': True})
+class TestSectionGradeStore(ModuleStoreTestCase):
+    """
+    Test that section scores are persisted and only recomputed when the
+    student state of the section changes.
+    """
+    def setUp(self):
+        course = CourseFactory.create(display_name="section_grade_course", number="1001")
+        chapter = ItemFactory.create(parent_location=course.location, category='chapter')
+        self.sections = []
+        self.problems = []
+        for index in range(2):
+            section = ItemFactory.create(
+                parent_location=chapter.location,
+                category='sequential',
+                display_name='Homework {}'.format(index),
+                metadata={'graded': True, 'format': 'Homework'}
+            )
+            problem = ItemFactory.create(
+                parent_location=section.location,
+                category='problem',
+                data=OptionResponseXMLFactory().build_xml(
+                    question_text='The correct answer is Correct',
+                    options=['Incorrect', 'Correct'],
+                    correct_option='Correct'
+                ),
+                display_name='Problem {}'.format(index)
+            )
+            self.sections.append(section)
+            self.problems.append(problem)
+
+        # re-fetch the course from the database so the object is up to date
+        self.course = modulestore().get_instance(course.id, course.location)
+        self.student = UserFactory.create()
+        self.request = RequestFactory().get('/')
+        self.request.user = self.student
+        self.request.session = {}
+
+        for problem in self.problems:
+            StudentModuleFactory.create(
+                student=self.student,
+                course_id=self.course.id,
+                module_state_key=problem.location.url(),
+                grade=1,
+                max_grade=1,
+            )
+
+    def _computed_sections(self):
+        """
+        Grade the student and return the names of the sections whose scores
+        had to be recomputed.
+        """
+        with patch('courseware.grades._compute_section_scores', wraps=grades._compute_section_scores) as compute:
+            grade(self.student, self.request, self.course)
+        return sorted(call[0][3].display_name for call in compute.call_args_list)
+
+    def test_scores_are_stored(self):
+        self.assertEqual(self._computed_sections(), ['Homework 0', 'Homework 1'])
+        self.assertEqual(
+            StudentSectionGrade.objects.filter(student=self.student, course_id=self.course.id).count(), 2
+        )
+        self.assertEqual(self._computed_sections(), [])
+
+    def test_stored_scores_match_computed(self):
+        computed = grade(self.student, self.request, self.course, keep_raw_scores=True)
+        stored = grade(self.student, self.request, self.course, keep_raw_scores=True)
+        self.assertEqual(computed['percent'], stored['percent'])
+        self.assertEqual(computed['raw_scores'], stored['raw_scores'])
+
+    def test_only_changed_section_recomputed(self):
+        self._computed_sections()
+
+        # Move the stored scores into the past, as if they were computed
+        # before the student answered again.
+        StudentSectionGrade.objects.all().update(computed=datetime.datetime(2000, 1, 1, tzinfo=UTC))
+        StudentModule.objects.exclude(module_state_key=self.problems[0].location.url()).update(
+            modified=datetime.datetime(1999, 1, 1, tzinfo=UTC)
+        )
+        student_module = StudentModule.objects.get(module_state_key=self.problems[0].location.url())
+        student_module.grade = 0
+        student_module.save()
+
+        self.assertEqual(self._computed_sections(), ['Homework 0'])
+
+    def test_save_during_computation_recomputed(self):
+        student_module = StudentModule.objects.get(module_state_key=self.problems[0].location.url())
+
+        def compute_and_answer(*args):
+            """Compute the section's scores while the student answers again"""
+            scores = grades._compute_section_scores(*args)  # pylint: disable=protected-access
+            if args[3].location == self.sections[0].location:
+                student_module.grade = 0
+                student_module.save()
+            return scores
+
+        with patch('courseware.grades._compute_section_scores', side_effect=compute_and_answer):
+            grade(self.student, self.request, self.course)
+        # the stored scores predate the answer, however late they were stored
+        self.assertEqual(self._computed_sections(), ['Homework 0'])
+
+    def test_content_change_recomputed(self):
+        self._computed_sections()
+        problem = modulestore().get_item(self.problems[1].location)
+        problem.data = OptionResponseXMLFactory().build_xml(
+            question_text='The correct answer is Correct',
+            options=['Incorrect', 'Correct'],
+            correct_option='Correct',
+            num_responses=2,
+        )
+        modulestore().update_item(problem, '**replace_user**')
+        self.course = modulestore().get_instance(self.course.id, self.course.location)
+        self.assertEqual(self._computed_sections(), ['Homework 1'])
+
+    def test_release_recomputed(self):
+        release = (datetime.datetime.now(UTC) + datetime.timedelta(days=1)).replace(microsecond=0)
+        ItemFactory.create(
+            parent_location=self.sections[1].location,
+            category='problem',
+            data=OptionResponseXMLFactory().build_xml(
+                question_text='The correct answer is Correct',
+                options=['Incorrect', 'Correct'],
+                correct_option='Correct'
+            ),
+            display_name='Unreleased problem',
+            metadata={'start': release},
+        )
+        self.course = modulestore().get_instance(self.course.id, self.course.location)
+        self._computed_sections()
+
+        valid_until = dict(StudentSectionGrade.objects.values_list('section_state_key', 'valid_until'))
+        self.assertIsNone(valid_until[self.sections[0].location.url()])
+        self.assertEqual(valid_until[self.sections[1].location.url()], release)
+        self.assertEqual(self._computed_sections(), [])
+
+        # once the problem is released, the section must count it
+        StudentSectionGrade.objects.filter(valid_until__isnull=False).update(
+            valid_until=datetime.datetime.now(UTC) - datetime.timedelta(seconds=1)
+        )
+        self.assertEqual(self._computed_sections(), ['Homework 1'])
+
+    def test_state_delete_invalidates(self):
+        self._computed_sections()
+        StudentModule.objects.get(module_state_key=self.problems[1].location.url()).delete()
+        self.assertFalse(StudentSectionGrade.objects.filter(student=self.student).exists())
+        self.assertEqual(self._computed_sections(), ['Homework 0'])
+
+    @patch.dict(settings.FEATURES, {'ENABLE_PERSISTENT_SECTION_GRADES': False})
+    def test_disabled(self):
+        self.assertEqual(self._computed_sections(), ['Homework 0', 'Homework 1'])
+        self.assertFalse(StudentSectionGrade.objects.exists())
@@ -7,7 +7,7 @@ from functools import partial
 
 from courseware.model_data import DjangoKeyValueStore
 from courseware.model_data import InvalidScopeError, FieldDataCache
-from courseware.models import StudentModule, XModuleUserStateSummaryField
+from courseware.models import StudentModule, StudentModuleHistory, XModuleUserStateSummaryField
 from courseware.models import XModuleStudentInfoField, XModuleStudentPrefsField
 
 from student.tests.factories import UserFactory
@@ -343,3 +343,88 @@ class TestStudentInfoStorage(OtherUserFailureTestMixin, StorageTestBase, TestCas
     storage_class = XModuleStudentInfoField
     other_key_factory = partial(DjangoKeyValueStore.Key, Scope.user_info, 2, 'mock_problem')  # user_id=2, not 1
     existing_field_name = "existing_field"
+
+
+class TestFieldDataCacheBatching(TestCase):
+    """Tests for extending a FieldDataCache and deferring its writes"""
+    fields = [
+        mock_field(Scope.user_state, 'a_field'),
+        mock_field(Scope.user_state_summary, 'summary_field'),
+        mock_field(Scope.preferences, 'pref_field'),
+        mock_field(Scope.user_info, 'info_field'),
+    ]
+
+    def setUp(self):
+        student_module = StudentModuleFactory(state=json.dumps({'a_field': 'a_value'}))
+        self.user = student_module.student
+        self.assertEqual(self.user.id, 1)   # check our assumption hard-coded in the key functions above.
+
+    def descriptors(self, start, stop):
+        """Mock descriptors with distinct usage ids"""
+        descriptors = []
+        for index in range(start, stop):
+            descriptor = mock_descriptor(self.fields)
+            descriptor.scope_ids = ScopeIds(
+                'user1', 'mock_problem', location('def_id'), location('usage_id' if index == 0 else 'usage_{}'.format(index))
+            )
+            descriptors.append(descriptor)
+        return descriptors
+
+    def test_one_query_per_scope(self):
+        with self.assertNumQueries(4):
+            field_data_cache = FieldDataCache(self.descriptors(0, 40), course_id, self.user)
+        self.assertTrue(field_data_cache.has_descriptor(self.descriptors(0, 1)[0]))
+        self.assertEquals(StudentModule.objects.get(), field_data_cache.find_student_module(self.descriptors(0, 1)[0]))
+        self.assertIsNone(field_data_cache.find_student_module(self.descriptors(1, 2)[0]))
+
+    def test_add_descriptors(self):
+        field_data_cache = FieldDataCache(self.descriptors(0, 10), course_id, self.user)
+
+        # Nothing new to fetch
+        with self.assertNumQueries(0):
+            field_data_cache.add_descriptors(self.descriptors(0, 10))
+
+        # Preferences for this block type and user info were already fetched
+        with self.assertNumQueries(2):
+            field_data_cache.add_descriptors(self.descriptors(5, 40))
+        self.assertEquals(40, len(field_data_cache.descriptors))
+        self.assertTrue(field_data_cache.has_descriptor(self.descriptors(39, 40)[0]))
+
+    def test_deferred_writes(self):
+        field_data_cache = FieldDataCache(self.descriptors(0, 1), course_id, self.user, defer_writes=True)
+        kvs = DjangoKeyValueStore(field_data_cache)
+
+        with self.assertNumQueries(0):
+            kvs.set(user_state_key('a_field'), 'new_value')
+            kvs.set(user_state_key('b_field'), 'b_value')
+        self.assertEquals({'a_field': 'a_value'}, json.loads(StudentModule.objects.get().state))
+        self.assertEquals('new_value', kvs.get(user_state_key('a_field')))
+
+        # Both changes are written with a single save
+        history_count = StudentModuleHistory.objects.count()
+        self.assertEquals(1, field_data_cache.flush())
+        self.assertEquals(history_count + 1, StudentModuleHistory.objects.count())
+        self.assertEquals(
+            {'a_field': 'new_value', 'b_field': 'b_value'},
+            json.loads(StudentModule.objects.get().state)
+        )
+        self.assertEquals(0, field_data_cache.flush())
+
+    def test_deferred_writes_to_several_modules(self):
+        field_data_cache = FieldDataCache(self.descriptors(1, 3), course_id, self.user, defer_writes=True)
+        kvs = DjangoKeyValueStore(field_data_cache)
+
+        for _ in range(2):
+            for index in range(1, 3):
+                kvs.set(
+                    DjangoKeyValueStore.Key(Scope.user_state, 1, location('usage_{}'.format(index)), 'a_field'),
+                    'value_{}'.format(index)
+                )
+
+        # Each module is saved once, however often it was changed
+        self.assertEquals(2, field_data_cache.flush())
+        for index in range(1, 3):
+            self.assertEquals(
+                {'a_field': 'value_{}'.format(index)},
+                json.loads(StudentModule.objects.get(module_state_key=location('usage_{}'.format(index)).url()).state)
+            )
@@ -1,11 +1,13 @@
 """
 This test file will run through some LMS test scenarios regarding access and navigation of the LMS
 """
+import json
 import time
 from django.conf import settings
 
 from django.core.urlresolvers import reverse
 from django.test.utils import override_settings
+from mock import patch
 
 from xmodule.modulestore.tests.factories import CourseFactory, ItemFactory
 
@@ -13,6 +15,7 @@ from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 
 from courseware.tests.helpers import LoginEnrollmentTestCase, check_for_get_code
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
+from lms.lib.xblock.runtime import quote_slashes
 
 
 @override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
@@ -125,3 +128,55 @@ class TestNavigation(ModuleStoreTestCase, LoginEnrollmentTestCase):
         self.assertRedirects(resp, reverse('courseware_chapter',
                                            kwargs={'course_id': self.course.id,
                                                    'chapter': 'factory_chapter'}))
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class TestLazySequence(ModuleStoreTestCase, LoginEnrollmentTestCase):
+    """
+    Check that only the current unit of a sequence is rendered with the page
+    when sequences are rendered lazily.
+    """
+
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.chapter = ItemFactory.create(parent_location=self.course.location, display_name='Lazy chapter')
+        self.section = ItemFactory.create(
+            parent_location=self.chapter.location,
+            category='sequential',
+            display_name='Lazy section',
+        )
+        for name in ('first', 'second'):
+            unit = ItemFactory.create(parent_location=self.section.location, category='vertical')
+            ItemFactory.create(parent_location=unit.location, category='html', data='<p>The {0} unit</p>'.format(name))
+
+        self.create_account('lazy', 'lazy@test.com', 'foo')
+        self.activate_user('lazy@test.com')
+        self.login('lazy@test.com', 'foo')
+        self.enroll(self.course, True)
+
+    def get_section(self):
+        """Get the page of the section"""
+        return self.client.get(reverse('courseware_section', kwargs={
+            'course_id': self.course.id,
+            'chapter': self.chapter.location.name,
+            'section': self.section.location.name,
+        }))
+
+    def test_all_units_rendered(self):
+        response = self.get_section()
+        self.assertContains(response, 'The first unit')
+        self.assertContains(response, 'The second unit')
+
+    @patch.dict(settings.FEATURES, {'ENABLE_LAZY_SEQUENCE_RENDERING': True})
+    def test_current_unit_rendered(self):
+        response = self.get_section()
+        self.assertContains(response, 'The first unit')
+        self.assertNotContains(response, 'The second unit')
+        self.assertContains(response, 'data-lazy="true"', count=1)
+
+        response = self.client.post(reverse(
+            'xblock_handler',
+            args=(self.course.id, quote_slashes(self.section.location.url()), 'xmodule_handler', 'render_child')
+        ), {'position': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('The second unit', json.loads(response.content)['html'])
@@ -5,9 +5,11 @@ Integration tests for submitting problem responses and getting grades.
 # text processing dependencies
 import json
 import os
+from datetime import datetime, timedelta
 from textwrap import dedent
 
 from mock import patch
+from pytz import UTC
 
 from django.conf import settings
 from django.contrib.auth.models import User
@@ -1046,3 +1048,63 @@ class TestAnswerDistributions(TestSubmittingProblems):
                     },
                 }
             )
+
+    def _update_answer_distribution(self):
+        """Update the stored answers as the answer distribution report does, two rows at a time"""
+        modified_since = grades.answer_distribution_modified_since(self.course.id)
+        for module_ids in grades.submitted_problem_id_batches(self.course.id, modified_since, 2):
+            grades.update_answer_distribution(self.course.id, module_ids)
+        grades.log_answer_distribution_update(self.course.id, datetime.now(UTC), 0)
+
+    def test_report_rows(self):
+        self.submit_question_answer('p1', {'2_1': u'ⓤⓝⓘⓒⓞⓓⓔ'})
+        self.submit_question_answer('p2', {'2_1': 'Correct'})
+        self.submit_question_answer('p3', {'2_1': 'Incorrect'})
+        self._update_answer_distribution()
+
+        self.assertEqual(
+            list(grades.answer_distribution_rows(self.course.id)),
+            [
+                ['url_name', 'display name', 'answer id', 'answer', 'count'],
+                ['p1', 'p1', 'i4x-MITx-100-problem-p1_2_1', u'ⓤⓝⓘⓒⓞⓓⓔ'.encode('utf-8'), '1'],
+                ['p2', 'p2', 'i4x-MITx-100-problem-p2_2_1', 'Correct', '1'],
+                ['p3', 'p3', 'i4x-MITx-100-problem-p3_2_1', 'Incorrect', '1'],
+            ]
+        )
+
+    def test_update_reads_modified_rows(self):
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self.submit_question_answer('p2', {'2_1': 'Correct'})
+        self._update_answer_distribution()
+
+        # p1 was answered long before the last update; p2's answer changes
+        StudentModule.objects.filter(module_state_key__endswith='p1').update(
+            modified=datetime.now(UTC) - timedelta(days=1)
+        )
+        p2_module = StudentModule.objects.get(module_state_key__endswith='p2')
+        state = json.loads(p2_module.state)
+        state['student_answers']['i4x-MITx-100-problem-p2_2_1'] = 'Incorrect'
+        p2_module.state = json.dumps(state)
+        p2_module.save()
+
+        with patch('courseware.grades.update_answer_distribution', wraps=grades.update_answer_distribution) as update:
+            self._update_answer_distribution()
+        self.assertEqual([call[0][1] for call in update.call_args_list], [[p2_module.id]])
+
+        rows = list(grades.answer_distribution_rows(self.course.id))
+        self.assertEqual([row[3] for row in rows[1:]], ['Correct', 'Incorrect'])
+
+    def test_reset_grade_has_no_answers(self):
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self._update_answer_distribution()
+        module = StudentModule.objects.get(course_id=self.course.id)
+        module.grade = None
+        module.save()
+        self._update_answer_distribution()
+        self.assertEqual(len(list(grades.answer_distribution_rows(self.course.id))), 1)
+
+    def test_deleted_state_has_no_answers(self):
+        self.submit_question_answer('p1', {'2_1': 'Correct'})
+        self._update_answer_distribution()
+        StudentModule.objects.filter(course_id=self.course.id).delete()
+        self.assertEqual(len(list(grades.answer_distribution_rows(self.course.id))), 1)
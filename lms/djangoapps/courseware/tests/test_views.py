@@ -1,6 +1,7 @@
 """
 Tests courseware views.py
 """
+import json
 import unittest
 from datetime import datetime
 
@@ -14,6 +15,7 @@ from django.contrib.auth.models import User, AnonymousUser
 from django.test.client import RequestFactory
 
 from django.conf import settings
+from django.db import connection
 from django.core.urlresolvers import reverse
 
 from student.models import CourseEnrollment
@@ -27,6 +29,7 @@ from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
 from student.tests.factories import UserFactory
 
 import courseware.views as views
+from courseware.tests.factories import StudentModuleFactory
 from courseware.tests.modulestore_config import TEST_DATA_MIXED_MODULESTORE
 from course_modes.models import CourseMode
 import shoppingcart
@@ -453,3 +456,77 @@ class ProgressPageTests(ModuleStoreTestCase):
         resp = views.progress(self.request, self.course.id)
         self.assertEquals(resp.status_code, 200)
 
+
+
+@override_settings(MODULESTORE=TEST_DATA_MIXED_MODULESTORE)
+class SectionQueryCountTests(ModuleStoreTestCase):
+    """
+    Verify that the number of database queries made by the courseware and
+    progress pages doesn't grow with the number of problems in a section.
+    """
+
+    def setUp(self):
+        self.request_factory = RequestFactory()
+        self.user = UserFactory.create()
+        self.request = self.request_factory.get("foo")
+        self.request.user = self.user
+        self.request.session = {}
+
+        MakoMiddleware().process_request(self.request)
+
+    def set_up_course(self, num_problems):
+        """
+        Create a course with one graded section containing `num_problems`
+        problems, all of which the user has answered.
+        """
+        course = CourseFactory(start=datetime(2013, 9, 16, 7, 17, 28))
+        chapter = ItemFactory(category='chapter', parent_location=course.location)  # pylint: disable=no-member
+        section = ItemFactory(
+            category='sequential',
+            parent_location=chapter.location,
+            metadata={'graded': True, 'format': 'Homework'}
+        )
+        vertical = ItemFactory(category='vertical', parent_location=section.location)
+        for _ in range(num_problems):
+            problem = ItemFactory(category='problem', parent_location=vertical.location)
+            StudentModuleFactory(
+                student=self.user,
+                course_id=course.id,  # pylint: disable=no-member
+                module_state_key=problem.location.url(),
+                state=json.dumps({'seed': 1, 'attempts': 1}),
+                grade=1,
+                max_grade=1,
+            )
+
+        CourseEnrollment.enroll(self.user, course.id)  # pylint: disable=no-member
+        course = modulestore().get_instance(course.id, course.location)  # pylint: disable=no-member
+        return course, chapter, section
+
+    def count_queries(self, func, *args):
+        """Return the number of database queries made by func(*args)"""
+        connection.use_debug_cursor = True
+        try:
+            start = len(connection.queries)
+            func(*args)
+            return len(connection.queries) - start
+        finally:
+            connection.use_debug_cursor = None
+
+    def index_queries(self, num_problems):
+        """Number of queries made rendering a section with `num_problems` problems"""
+        course, chapter, section = self.set_up_course(num_problems)
+        # Visit once first, so that position and other per-user state is
+        # created before counting
+        views.index(self.request, course.id, chapter.url_name, section.url_name)
+        return self.count_queries(views.index, self.request, course.id, chapter.url_name, section.url_name)
+
+    def progress_queries(self, num_problems):
+        """Number of queries made by the progress page for `num_problems` problems"""
+        course, _, _ = self.set_up_course(num_problems)
+        return self.count_queries(views.progress, self.request, course.id)
+
+    def test_index_queries(self):
+        self.assertEqual(self.index_queries(1), self.index_queries(6))
+
+    def test_progress_queries(self):
+        self.assertEqual(self.progress_queries(1), self.progress_queries(6))
@@ -214,6 +214,22 @@ def chat_settings(course, user):
     }
 
 
+def _current_unit_descriptor(section_descriptor, section_module, position):
+    """
+    Return the descriptor of the unit of the section that will be shown, or
+    None. Units hidden from the student aren't accounted for, so this is only
+    a guess to prefetch data by: the modules load what's missing themselves.
+    """
+    if position is None:
+        position = section_module.position or 1
+    try:
+        index = int(position) - 1
+    except ValueError:
+        return None
+    units = section_descriptor.get_children()
+    return units[index] if 0 <= index < len(units) else None
+
+
 @login_required
 @ensure_csrf_cookie
 @cache_control(no_cache=True, no_store=True, must_revalidate=True)
@@ -253,9 +269,12 @@ def index(request, course_id, chapter=None, section=None,
 
     masq = setup_masquerade(request, staff_access)
 
+    field_data_cache = None
     try:
+        # Writes (e.g. saved positions) are held by the cache and flushed
+        # once, at the end of the view
         field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-            course.id, user, course, depth=2)
+            course.id, user, course, depth=2, defer_writes=True)
 
         course_module = get_module_for_descriptor(user, request, course, field_data_cache, course.id)
         if course_module is None:
@@ -321,16 +340,22 @@ def index(request, course_id, chapter=None, section=None,
             # which will prefetch the children more efficiently than doing a recursive load
             section_descriptor = modulestore().get_instance(course.id, section_descriptor.location, depth=None)
 
-            # Load all descendants of the section, because we're going to display its
-            # html, which in general will need all of its children
-            section_field_data_cache = FieldDataCache.cache_for_descriptor_descendents(
-                course_id, user, section_descriptor, depth=None)
+            lazy = settings.FEATURES.get('ENABLE_LAZY_SEQUENCE_RENDERING', False)
+            if lazy:
+                # Only the current unit of the section is rendered with the page:
+                # load the section and its units, and the descendants of that unit
+                # once the section's position is known
+                field_data_cache.add_descriptor_descendents(section_descriptor, depth=1)
+            else:
+                # Load all descendants of the section, because we're going to display its
+                # html, which in general will need all of its children
+                field_data_cache.add_descriptor_descendents(section_descriptor, depth=None)
 
             section_module = get_module_for_descriptor(
                 request.user,
                 request,
                 section_descriptor,
-                section_field_data_cache,
+                field_data_cache,
                 course_id,
                 position
             )
@@ -340,6 +365,11 @@ def index(request, course_id, chapter=None, section=None,
                 # they don't have access to.
                 raise Http404
 
+            if lazy:
+                current_unit = _current_unit_descriptor(section_descriptor, section_module, position)
+                if current_unit is not None:
+                    field_data_cache.add_descriptor_descendents(current_unit, depth=None)
+
             # Save where we are in the chapter
             save_child_position(chapter_module, section)
             context['fragment'] = section_module.render('student_view')
@@ -394,6 +424,14 @@ def index(request, course_id, chapter=None, section=None,
                 # at least return a nice error message
                 log.exception("Error while rendering courseware-error page")
                 raise
+    finally:
+        if field_data_cache is not None:
+            try:
+                field_data_cache.flush()
+            except Exception:  # pylint: disable=broad-except
+                # Don't replace the view's own exception, if any: losing a
+                # saved position isn't worth failing the page for.
+                log.exception(u"Error saving the courseware state of %s in course %s", user, course_id)
 
     return result
 
@@ -0,0 +1,142 @@
+"""
+Compare the latency of the forum views with a new connection to the comments
+service per call (unpooled) and with the shared, pooled session and the
+per-request memo of GETs (pooled), against a local stub comments service.
+
+    ./manage.py lms benchmark_forum_views edX/DemoX/Demo_Course staff --settings=devstack
+
+The stub answers after --latency milliseconds, to stand in for a service on
+another host.
+"""
+from datetime import datetime
+import time
+from optparse import make_option
+from textwrap import dedent
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test.client import RequestFactory
+import requests
+
+from django_comment_client.forum import views
+from lms.lib.comment_client import settings as cc_settings
+from lms.lib.comment_client import utils as cc_utils
+from request_cache.middleware import RequestCache
+from terrain.stubs.comments import StubBenchmarkCommentsService
+from util.benchmark import percentile
+
+THREAD_ID = 'benchmarkthread'
+
+
+class Command(BaseCommand):
+    """
+    Load the discussion home page and a thread N times in each mode, and report
+    the median and 95th percentile latency and the connections opened to the
+    comments service.
+    """
+    args = '<course_id> <username>'
+    help = dedent(__doc__).strip()
+    option_list = BaseCommand.option_list + (
+        make_option('--views',
+                    action='store',
+                    type='int',
+                    dest='views',
+                    default=50,
+                    help='Number of times to load each view in each mode'),
+        make_option('--latency',
+                    action='store',
+                    type='float',
+                    dest='latency',
+                    default=5,
+                    help='Milliseconds the stub comments service takes to answer'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError("Usage: {0}".format(self.args))
+        course_id, username = args
+        try:
+            self.user = User.objects.get(username=username)
+        except User.DoesNotExist:
+            raise CommandError("No user {0}".format(username))
+        self.course_id = course_id
+
+        server = StubBenchmarkCommentsService()
+        server.config['latency'] = options['latency']
+        server.config['threads'] = {THREAD_ID: self.thread_data()}
+        prefix, session = cc_settings.PREFIX, cc_utils.SESSION
+        cc_settings.PREFIX = 'http://localhost:{0}/api/v1'.format(server.port)
+        try:
+            # The requests module has the interface of a session, but opens
+            # a new connection for each request.
+            cc_utils.SESSION = requests
+            unpooled = self.time_views(server, options['views'], memo=False)
+            cc_utils.SESSION = session
+            pooled = self.time_views(server, options['views'], memo=True)
+        finally:
+            cc_settings.PREFIX, cc_utils.SESSION = prefix, session
+            server.shutdown()
+
+        for name, (latencies, stats) in (('unpooled', unpooled), ('pooled', pooled)):
+            self.stdout.write(
+                "{0:<9} {1:>5} views  p50 {2:>8.1f}ms  p95 {3:>8.1f}ms  "
+                "{4:>5} connections  {5:>5} service requests\n".format(
+                    name, len(latencies), percentile(latencies, 50), percentile(latencies, 95),
+                    stats['connections'], stats['requests'],
+                )
+            )
+
+    def thread_data(self):
+        """A thread for the stub comments service to return"""
+        now = datetime.utcnow().isoformat()
+        return {
+            'id': THREAD_ID,
+            'type': 'thread',
+            'title': 'Benchmark thread',
+            'body': 'Benchmark thread body',
+            'course_id': self.course_id,
+            'commentable_id': 'general',
+            'user_id': str(self.user.id),
+            'username': self.user.username,
+            'children': [],
+            'votes': {'up_count': 0, 'down_count': 0, 'count': 0, 'point': 0},
+            'abuse_flaggers': [],
+            'closed': False,
+            'pinned': False,
+            'endorsed': False,
+            'anonymous': False,
+            'anonymous_to_peers': False,
+            'comments_count': 0,
+            'unread_comments_count': 0,
+            'read': False,
+            'created_at': now,
+            'updated_at': now,
+        }
+
+    def time_views(self, server, num_views, memo):
+        """
+        Load the views `num_views` times each, returning the latencies in ms
+        and the connections and requests the stub service saw.
+        """
+        before = dict(server.stats)
+        factory = RequestFactory()
+        latencies = []
+        for _ in range(num_views):
+            for view, view_args in (
+                (views.forum_form_discussion, (self.course_id,)),
+                (views.single_thread, (self.course_id, 'general', THREAD_ID)),
+            ):
+                request = factory.get('/', HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+                request.user = self.user
+                request_cache = RequestCache()
+                request_cache.process_request(request)
+                if memo:
+                    cc_utils.enable_request_memo()
+                start = time.time()
+                response = view(request, *view_args)
+                latencies.append((time.time() - start) * 1000)
+                request_cache.process_response(request, response)
+                if response.status_code != 200:
+                    raise CommandError("{0} returned {1}".format(view.__name__, response.status_code))
+        stats = dict((key, server.stats[key] - before[key]) for key in before)
+        return latencies, stats
@@ -1,4 +1,5 @@
 from lms.lib.comment_client import CommentClientRequestError
+from lms.lib.comment_client.utils import enable_request_memo
 from django_comment_client.utils import JsonError
 import json
 import logging
@@ -22,3 +23,17 @@ class AjaxExceptionMiddleware(object):
             except ValueError:
                 return JsonError(exception.message, exception.status_code)
         return None
+
+
+class CommentClientRequestMemoMiddleware(object):
+    """
+    Middleware that lets the comment client memoize the results of GETs to
+    the comments service while a request is handled. It must come after
+    RequestCache, which clears them at the end of the request.
+    """
+    def process_request(self, request):
+        """
+        Start memoizing comment client GETs for `request`
+        """
+        enable_request_memo()
+        return None
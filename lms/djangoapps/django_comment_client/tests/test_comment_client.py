@@ -0,0 +1,82 @@
+"""
+Tests of how the comment client talks to the comments service.
+"""
+from django.test import TestCase
+from mock import Mock, patch
+import requests
+
+from request_cache.middleware import RequestCache
+from lms.lib.comment_client.utils import perform_request, RetryReadsAdapter
+import django_comment_client.middleware as middleware
+
+THREAD_URL = 'http://localhost:4567/api/v1/threads/dummy'
+
+
+class RequestMemoTestCase(TestCase):
+    """
+    Tests that GETs are only sent once within a request.
+    """
+    def setUp(self):
+        patcher = patch('lms.lib.comment_client.utils.SESSION.request')
+        self.mock_request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_request.return_value = Mock(status_code=200, json=Mock(return_value={'id': 'dummy'}))
+        self.addCleanup(RequestCache().clear_request_cache)
+
+    def _start_request(self):
+        """Run the middleware as it is run for a new request"""
+        RequestCache().process_request(None)
+        middleware.CommentClientRequestMemoMiddleware().process_request(None)
+
+    def test_get_is_memoized(self):
+        self._start_request()
+        first = perform_request('get', THREAD_URL, {'recursive': True})
+        first['id'] = 'changed'
+        second = perform_request('get', THREAD_URL, {'recursive': True})
+        self.assertEqual(self.mock_request.call_count, 1)
+        self.assertEqual(second, {'id': 'dummy'})
+
+        perform_request('get', THREAD_URL, {'recursive': False})
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_write_forgets_results(self):
+        self._start_request()
+        perform_request('get', THREAD_URL)
+        perform_request('put', THREAD_URL, {'body': 'new body'})
+        perform_request('get', THREAD_URL)
+        self.assertEqual(self.mock_request.call_count, 3)
+
+    def test_results_forgotten_after_request(self):
+        self._start_request()
+        perform_request('get', THREAD_URL)
+        RequestCache().process_response(None, None)
+        self._start_request()
+        perform_request('get', THREAD_URL)
+        self.assertEqual(self.mock_request.call_count, 2)
+
+    def test_not_memoized_outside_request(self):
+        perform_request('get', THREAD_URL)
+        perform_request('get', THREAD_URL)
+        self.assertEqual(self.mock_request.call_count, 2)
+
+
+class RetryReadsAdapterTestCase(TestCase):
+    """
+    Tests that only GETs are retried.
+    """
+    def setUp(self):
+        patcher = patch('requests.adapters.HTTPAdapter.send')
+        self.mock_send = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mock_send.side_effect = [requests.exceptions.ConnectionError(), Mock(status_code=200)]
+        self.adapter = RetryReadsAdapter(max_retries=2)
+
+    def test_get_is_retried(self):
+        response = self.adapter.send(Mock(method='GET'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.mock_send.call_count, 2)
+
+    def test_post_is_not_retried(self):
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.adapter.send(Mock(method='POST'))
+        self.assertEqual(self.mock_send.call_count, 1)
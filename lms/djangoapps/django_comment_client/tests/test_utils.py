@@ -2,7 +2,7 @@
 
 import json
 import mock
-from datetime import datetime
+from datetime import datetime, timedelta
 from pytz import UTC
 from django.core.urlresolvers import reverse
 from django.test import TestCase
@@ -503,6 +503,54 @@ class CategoryMapTestCase(ModuleStoreTestCase):
             }
         )
 
+    def test_map_is_cached(self):
+        self.create_discussion("Chapter", "Discussion")
+        with mock.patch(
+            'django_comment_client.utils._get_discussion_modules', wraps=utils._get_discussion_modules
+        ) as get_modules:
+            first = utils.get_discussion_category_map(self.course)
+            second = utils.get_discussion_category_map(self.course)
+            utils._get_discussion_id_map(self.course)
+        self.assertEqual(first, second)
+        self.assertEqual(get_modules.call_count, 1)
+
+    def test_new_discussion_invalidates_map(self):
+        self.create_discussion("Chapter", "Discussion 1")
+        utils.get_discussion_category_map(self.course)
+        self.create_discussion("Chapter", "Discussion 2")
+        self.assertEqual(
+            utils.get_discussion_category_map(self.course)["subcategories"]["Chapter"]["children"],
+            ["Discussion 1", "Discussion 2"]
+        )
+
+    def test_start_date_filtered_on_cached_map(self):
+        start = datetime(2030, 1, 1, tzinfo=UTC)
+        self.create_discussion("Chapter", "Discussion", start=start)
+        self.assertCategoryMapEquals({"entries": {}, "subcategories": {}, "children": []})
+
+        with mock.patch('django_comment_client.utils.datetime') as mock_datetime, \
+                mock.patch('django_comment_client.utils._get_discussion_modules') as get_modules:
+            mock_datetime.now.return_value = start + timedelta(days=1)
+            self.assertCategoryMapEquals(
+                {
+                    "entries": {},
+                    "subcategories": {
+                        "Chapter": {
+                            "entries": {
+                                "Discussion": {
+                                    "id": "discussion1",
+                                    "sort_key": None
+                                }
+                            },
+                            "subcategories": {},
+                            "children": ["Discussion"]
+                        }
+                    },
+                    "children": ["Chapter"]
+                }
+            )
+        self.assertFalse(get_modules.called)
+
 
 class JsonResponseTestCase(TestCase, UnicodeTestMixin):
     def _test_unicode_data(self, text):
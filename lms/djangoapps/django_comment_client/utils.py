@@ -1,14 +1,19 @@
 import pytz
 from collections import defaultdict
+import hashlib
+import json
 import logging
 from datetime import datetime
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 from django.db import connection
 from django.http import HttpResponse
 from django.utils import simplejson
-from django_comment_common.models import Role, FORUM_ROLE_STUDENT
+from django_comment_common.models import (
+    Role, FORUM_ROLE_STUDENT, DISCUSSION_MAP_CACHE_TIMEOUT, discussion_map_generation
+)
 from django_comment_client.permissions import check_permissions_by_view
 
 from edxmako import lookup_template
@@ -70,14 +75,41 @@ def _get_discussion_modules(course):
     return filter(has_required_keys, all_modules)
 
 
-def _get_discussion_id_map(course):
+def _get_discussion_maps(course):
+    """
+    Return the course's category map, sorted but not filtered by start date, and
+    its discussion id map.
+
+    They are cached until one of the course's modules changes, or a field of the
+    course they are built from does.
+    """
+    course_fields = json.dumps([course.discussion_topics, course.discussion_sort_alpha], sort_keys=True)
+    cache_key = u"django_comment_client.discussion_maps.{0}.{1}.{2}".format(
+        course.id, discussion_map_generation(course.location), hashlib.md5(course_fields).hexdigest()
+    )
+    maps = cache.get(cache_key)
+    if maps is None:
+        modules = _get_discussion_modules(course)
+        maps = {
+            "category_map": _build_category_map(course, modules),
+            "id_map": _build_discussion_id_map(modules),
+        }
+        cache.set(cache_key, maps, DISCUSSION_MAP_CACHE_TIMEOUT)
+    return maps
+
+
+def _build_discussion_id_map(modules):
     def get_entry(module):
         discussion_id = module.discussion_id
         title = module.discussion_target
         last_category = module.discussion_category.split("/")[-1].strip()
         return (discussion_id, {"location": module.location, "title": last_category + " / " + title})
 
-    return dict(map(get_entry, _get_discussion_modules(course)))
+    return dict(map(get_entry, modules))
+
+
+def _get_discussion_id_map(course):
+    return _get_discussion_maps(course)["id_map"]
 
 
 def _filter_unstarted_categories(category_map):
@@ -130,13 +162,9 @@ def _sort_map_entries(category_map, sort_alpha):
     category_map["children"] = [x[0] for x in sorted(things, key=lambda x: x[1]["sort_key"])]
 
 
-def get_discussion_category_map(course):
-    course_id = course.id
-
+def _build_category_map(course, modules):
     unexpanded_category_map = defaultdict(list)
 
-    modules = _get_discussion_modules(course)
-
     for module in modules:
         id = module.discussion_id
         title = module.discussion_target
@@ -193,7 +221,13 @@ def get_discussion_category_map(course):
 
     _sort_map_entries(category_map, course.discussion_sort_alpha)
 
-    return _filter_unstarted_categories(category_map)
+    return category_map
+
+
+def get_discussion_category_map(course):
+    # The cached map is shared by every request: only which categories have
+    # started depends on when it is read.
+    return _filter_unstarted_categories(_get_discussion_maps(course)["category_map"])
 
 
 class JsonResponse(HttpResponse):
@@ -3,6 +3,8 @@
 # django management command: dump grades to csv files
 # for use by batch processes
 
+from optparse import make_option
+
 from instructor.offline_gradecalc import offline_grade_calculation
 from courseware.courses import get_course_by_id
 from xmodule.modulestore.django import modulestore
@@ -14,7 +16,28 @@ class Command(BaseCommand):
     help = "Compute grades for all students in a course, and store result in DB.\n"
     help += "Usage: compute_grades course_id_or_dir \n"
     help += "   course_id_or_dir: either course_id or course_dir\n"
-    help += 'Example course_id: MITx/8.01rq_MW/Classical_Mechanics_Reading_Questions_Fall_2012_MW_Section'
+    help += 'Example course_id: MITx/8.01rq_MW/Classical_Mechanics_Reading_Questions_Fall_2012_MW_Section\n'
+    help += 'An interrupted run is resumed by running the command again.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--processes',
+                    action='store',
+                    type='int',
+                    dest='processes',
+                    default=1,
+                    help='Number of processes to grade students in'),
+        make_option('--batch-size',
+                    action='store',
+                    type='int',
+                    dest='batch_size',
+                    default=100,
+                    help='Number of students graded and saved together'),
+        make_option('--only-changed',
+                    action='store_true',
+                    dest='only_changed',
+                    default=False,
+                    help='Only grade students whose state changed since the last run'),
+    )
 
     def handle(self, *args, **options):
 
@@ -40,4 +63,9 @@ class Command(BaseCommand):
         print "-----------------------------------------------------------------------------"
         print "Computing grades for %s" % (course.id)
 
-        offline_grade_calculation(course.id)
+        offline_grade_calculation(
+            course.id,
+            processes=options['processes'],
+            only_changed=options['only_changed'],
+            batch_size=options['batch_size'],
+        )
@@ -5,16 +5,26 @@
 #
 # The grades are stored in the OfflineComputedGrade table of the courseware model.
 
+import itertools
 import json
+import multiprocessing
 import time
+from datetime import datetime, timedelta
 
 from json import JSONEncoder
 from courseware import grades, models
 from courseware.courses import get_course_by_id
 from django.contrib.auth.models import User
+from django.db import connection, transaction
+from pytz import UTC
+from xmodule.modulestore.django import clear_existing_modulestores
 
 from instructor.utils import DummyRequest
 
+# Students whose state was modified this long before the last run started are
+# graded again, in case the transaction modifying it was still open.
+OFFLINE_GRADE_OVERLAP = timedelta(minutes=5)
+
 class MyEncoder(JSONEncoder):
 
     def _iterencode(self, obj, markers=None):
@@ -26,41 +36,162 @@ class MyEncoder(JSONEncoder):
             yield chunk
 
 
-def offline_grade_calculation(course_id):
+def offline_grade_calculation(course_id, processes=1, only_changed=False, batch_size=100):
     '''
     Compute grades for all students for a specified course, and save results to the DB.
+
+    Students are graded in batches of `batch_size` by `processes` worker processes. The
+    grades of each batch are saved together, along with the progress of the run in its
+    OfflineComputedGradeLog, so that running this again after an interruption resumes
+    the run.
+
+    With `only_changed`, only students whose state changed since the last complete run,
+    or who have no computed grades yet, are graded.
     '''
 
     tstart = time.time()
+    ocgl = _unfinished_log(course_id)
+    if ocgl is None:
+        ocgl = models.OfflineComputedGradeLog(course_id=course_id, started=datetime.now(UTC), complete=False)
+        ocgl.save()
+    else:
+        print "Resuming the run started %s, after student id %d" % (ocgl.started, ocgl.last_user_id)
+    seconds_before = ocgl.seconds
+
+    modified_since = _modified_since(course_id) if only_changed else None
+    tasks = (
+        (course_id, student_ids[-1], _students_to_grade(course_id, student_ids, modified_since))
+        for student_ids in _student_id_batches(course_id, ocgl.last_user_id, batch_size)
+    )
+
+    if processes > 1:
+        # the workers must open their own database and modulestore connections
+        connection.close()
+        pool = multiprocessing.Pool(processes, initializer=clear_existing_modulestores)
+        results = pool.imap(_grade_students, tasks)
+    else:
+        pool = None
+        results = itertools.imap(_grade_students, tasks)
+
+    try:
+        for last_user_id, gradesets in results:
+            _save_gradesets(ocgl, last_user_id, gradesets, seconds_before + time.time() - tstart)
+            # print statement used because this is run by a management command
+            print "%d students graded" % ocgl.nstudents
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+    ocgl.complete = True
+    ocgl.save()
+    print ocgl
+    print "%d students graded in %d seconds, %.1f students/sec" % (
+        ocgl.nstudents, ocgl.seconds, ocgl.students_per_second
+    )
+    print "All Done!"
+
+
+def _unfinished_log(course_id):
+    '''
+    Returns the log of the interrupted run of grade calculation for the course, or None.
+    '''
+    try:
+        ocgl = models.OfflineComputedGradeLog.objects.filter(course_id=course_id).latest('created')
+    except models.OfflineComputedGradeLog.DoesNotExist:
+        return None
+    return None if ocgl.complete else ocgl
+
+
+def _modified_since(course_id):
+    '''
+    Returns the time since which students with modified state must be graded again, or
+    None if there has been no complete run to compute grades for the course.
+    '''
+    try:
+        ocgl = models.OfflineComputedGradeLog.objects.filter(
+            course_id=course_id,
+            complete=True,
+            started__isnull=False,
+        ).latest('created')
+    except models.OfflineComputedGradeLog.DoesNotExist:
+        return None
+    return ocgl.started - OFFLINE_GRADE_OVERLAP
+
+
+def _student_id_batches(course_id, after_id, batch_size):
+    '''
+    Yields the ids of the students enrolled in the course with ids greater than `after_id`,
+    in order, in lists of up to `batch_size`.
+    '''
     enrolled_students = User.objects.filter(
         courseenrollment__course_id=course_id,
         courseenrollment__is_active=1
-    ).prefetch_related("groups").order_by('username')
+    ).order_by('id')
+    while True:
+        student_ids = list(enrolled_students.filter(id__gt=after_id).values_list('id', flat=True)[:batch_size])
+        if not student_ids:
+            return
+        yield student_ids
+        after_id = student_ids[-1]
 
-    enc = MyEncoder()
 
-    print "%d enrolled students" % len(enrolled_students)
-    course = get_course_by_id(course_id)
+def _students_to_grade(course_id, student_ids, modified_since):
+    '''
+    Returns the ids of the students in `student_ids` who have no computed grades or whose
+    state was modified since `modified_since`: all of them if it is None.
+    '''
+    if modified_since is None:
+        return student_ids
+    modified = set(models.StudentModule.objects.filter(
+        course_id=course_id,
+        student__in=student_ids,
+        modified__gte=modified_since,
+    ).values_list('student', flat=True))
+    graded = set(models.OfflineComputedGrade.objects.filter(
+        course_id=course_id,
+        user__in=student_ids,
+    ).values_list('user', flat=True))
+    return [student_id for student_id in student_ids if student_id in modified or student_id not in graded]
+
+
+def _grade_students(task):
+    '''
+    Grades the students with the given ids, returning the last id of the batch and a
+    list of (user id, gradeset as JSON).
 
-    for student in enrolled_students:
+    Runs in the worker processes: `task` is (course_id, last_user_id, student_ids).
+    '''
+    course_id, last_user_id, student_ids = task
+    course = get_course_by_id(course_id)
+    enc = MyEncoder()
+    gradesets = []
+    for student in User.objects.filter(id__in=student_ids).prefetch_related("groups"):
         request = DummyRequest()
         request.user = student
         request.session = {}
 
         gradeset = grades.grade(student, request, course, keep_raw_scores=True)
-        gs = enc.encode(gradeset)
-        ocg, created = models.OfflineComputedGrade.objects.get_or_create(user=student, course_id=course_id)
-        ocg.gradeset = gs
-        ocg.save()
-        print "%s done" % student  	# print statement used because this is run by a management command
+        gradesets.append((student.id, enc.encode(gradeset)))
+    return last_user_id, gradesets
 
-    tend = time.time()
-    dt = tend - tstart
 
-    ocgl = models.OfflineComputedGradeLog(course_id=course_id, seconds=dt, nstudents=len(enrolled_students))
+@transaction.commit_on_success
+def _save_gradesets(ocgl, last_user_id, gradesets, seconds):
+    '''
+    Saves the computed grades of a batch of students, and the progress of the run to `ocgl`.
+    '''
+    user_ids = [user_id for user_id, __ in gradesets]
+    models.OfflineComputedGrade.objects.filter(course_id=ocgl.course_id, user__in=user_ids).delete()
+    models.OfflineComputedGrade.objects.bulk_create([
+        models.OfflineComputedGrade(user_id=user_id, course_id=ocgl.course_id, gradeset=gradeset)
+        for user_id, gradeset in gradesets
+    ])
+
+    ocgl.last_user_id = last_user_id
+    ocgl.nstudents += len(gradesets)
+    ocgl.seconds = seconds
+    ocgl.students_per_second = ocgl.nstudents / seconds if seconds else 0
     ocgl.save()
-    print ocgl
-    print "All Done!"
 
 
 def offline_grades_available(course_id):
@@ -68,7 +199,7 @@ def offline_grades_available(course_id):
     Returns False if no offline grades available for specified course.
     Otherwise returns latest log field entry about the available pre-computed grades.
     '''
-    ocgl = models.OfflineComputedGradeLog.objects.filter(course_id=course_id)
+    ocgl = models.OfflineComputedGradeLog.objects.filter(course_id=course_id, complete=True)
     if not ocgl:
         return False
     return ocgl.latest('created')
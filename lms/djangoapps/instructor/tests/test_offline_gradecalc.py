@@ -0,0 +1,62 @@
+"""
+Tests of computing grades offline
+"""
+from django.test.utils import override_settings
+
+from courseware.models import OfflineComputedGrade, OfflineComputedGradeLog
+from courseware.tests.factories import StudentModuleFactory
+from courseware.tests.tests import TEST_DATA_MONGO_MODULESTORE
+from instructor.offline_gradecalc import offline_grade_calculation, offline_grades_available
+from student.tests.factories import UserFactory, CourseEnrollmentFactory
+from xmodule.modulestore.tests.django_utils import ModuleStoreTestCase
+from xmodule.modulestore.tests.factories import CourseFactory
+
+USER_COUNT = 5
+
+
+@override_settings(MODULESTORE=TEST_DATA_MONGO_MODULESTORE)
+class TestOfflineGradeCalculation(ModuleStoreTestCase):
+    """
+    Tests of offline_grade_calculation
+    """
+
+    def setUp(self):
+        self.course = CourseFactory.create()
+        self.users = [UserFactory.create() for __ in xrange(USER_COUNT)]
+        for user in self.users:
+            CourseEnrollmentFactory.create(user=user, course_id=self.course.id)
+
+    def latest_log(self):
+        """The latest OfflineComputedGradeLog of the course"""
+        return OfflineComputedGradeLog.objects.filter(course_id=self.course.id).latest('created')
+
+    def test_all_students_graded(self):
+        offline_grade_calculation(self.course.id, batch_size=2)
+        graded = OfflineComputedGrade.objects.filter(course_id=self.course.id).values_list('user', flat=True)
+        self.assertItemsEqual(graded, [user.id for user in self.users])
+        log = self.latest_log()
+        self.assertTrue(log.complete)
+        self.assertEqual(log.nstudents, USER_COUNT)
+        self.assertEqual(log.last_user_id, max(user.id for user in self.users))
+        self.assertEqual(offline_grades_available(self.course.id), log)
+
+    def test_only_changed(self):
+        offline_grade_calculation(self.course.id)
+        offline_grade_calculation(self.course.id, only_changed=True)
+        self.assertEqual(self.latest_log().nstudents, 0)
+
+        StudentModuleFactory.create(student=self.users[2], course_id=self.course.id, module_state_key='i4x://x/y/z')
+        offline_grade_calculation(self.course.id, only_changed=True)
+        self.assertEqual(self.latest_log().nstudents, 1)
+        self.assertEqual(OfflineComputedGrade.objects.filter(course_id=self.course.id).count(), USER_COUNT)
+
+    def test_interrupted_run_resumed(self):
+        user_ids = sorted(user.id for user in self.users)
+        OfflineComputedGradeLog.objects.create(course_id=self.course.id, complete=False, last_user_id=user_ids[1])
+        self.assertFalse(offline_grades_available(self.course.id))
+
+        offline_grade_calculation(self.course.id)
+        graded = OfflineComputedGrade.objects.filter(course_id=self.course.id).values_list('user', flat=True)
+        self.assertItemsEqual(graded, user_ids[2:])
+        self.assertEqual(OfflineComputedGradeLog.objects.filter(course_id=self.course.id).count(), 1)
+        self.assertTrue(self.latest_log().complete)
@@ -196,6 +196,9 @@ def _section_data_download(course_id, access):
         'list_instructor_tasks_url': reverse('list_instructor_tasks', kwargs={'course_id': course_id}),
         'list_report_downloads_url': reverse('list_report_downloads', kwargs={'course_id': course_id}),
         'calculate_grades_csv_url': reverse('calculate_grades_csv', kwargs={'course_id': course_id}),
+        'calculate_answer_distribution_csv_url': reverse(
+            'calculate_answer_distribution_csv', kwargs={'course_id': course_id}
+        ),
     }
     return section_data
 
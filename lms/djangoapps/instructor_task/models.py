@@ -12,7 +12,6 @@ file and check it in at the same time as your model changes. To do that,
 ASSUMPTIONS: modules have unique IDs, even across different module_types
 
 """
-from cStringIO import StringIO
 from gzip import GzipFile
 from uuid import uuid4
 import csv
@@ -20,6 +19,8 @@ import json
 import hashlib
 import os
 import os.path
+import shutil
+import tempfile
 import urllib
 
 from boto.s3.connection import S3Connection
@@ -196,6 +197,10 @@ class ReportStore(object):
     can simply be appended to for the sake of memory efficiency, rather than
     passing in the whole dataset. Doing that for now just because it's simpler.
     """
+    # Partial reports written by subtasks are stored under this directory,
+    # and are not listed by `links_for()`.
+    SHARD_DIRECTORY = "shards"
+
     @classmethod
     def from_config(cls):
         """
@@ -208,6 +213,13 @@ class ReportStore(object):
         elif storage_type.lower() == "localfs":
             return LocalFSReportStore.from_config()
 
+    def shard_filename(self, task_id, shard_name):
+        """
+        Return the filename under which the partial report `shard_name` of the
+        task `task_id` is stored with `store_rows()`.
+        """
+        return "{}/{}/{}".format(self.SHARD_DIRECTORY, task_id, shard_name)
+
 
 class S3ReportStore(ReportStore):
     """
@@ -294,21 +306,64 @@ class S3ReportStore(ReportStore):
             }
         )
 
+    def store_file(self, course_id, filename, output_file):
+        """
+        Like `store()`, but upload the gzip-encoded contents of the open file
+        object `output_file` without reading it into memory.
+        """
+        key = self.key_for(course_id, filename)
+
+        output_file.seek(0, os.SEEK_END)
+        size = output_file.tell()
+        output_file.seek(0)
+
+        key.set_contents_from_file(
+            output_file,
+            headers={
+                "Content-Encoding": "gzip",
+                "Content-Length": size,
+                "Content-Type": "text/csv",
+            }
+        )
+
     def store_rows(self, course_id, filename, rows):
         """
         Given a `course_id`, `filename`, and `rows` (each row is an iterable of
-        strings), create a buffer that is a gzip'd csv file, and then `store()`
-        that buffer.
+        strings), create a gzip'd csv file, and then store it.
+
+        `rows` may be a generator. The compressed file is spooled to a
+        temporary file on disk, so memory use does not grow with the number of
+        rows.
 
         Even though we store it in gzip format, browsers will transparently
         download and decompress it. Filenames should end in `.csv`, not `.gz`.
         """
-        output_buffer = StringIO()
-        gzip_file = GzipFile(fileobj=output_buffer, mode="wb")
-        csv.writer(gzip_file).writerows(rows)
-        gzip_file.close()
+        with tempfile.TemporaryFile() as output_file:
+            gzip_file = GzipFile(fileobj=output_file, mode="wb")
+            csv.writer(gzip_file).writerows(rows)
+            gzip_file.close()
 
-        self.store(course_id, filename, output_buffer)
+            self.store_file(course_id, filename, output_file)
+
+    def iter_rows(self, course_id, filename):
+        """
+        Yield the rows of a csv file previously stored with `store_rows()`.
+        Yields nothing if there is no such file.
+        """
+        key = self.key_for(course_id, filename)
+        if not key.exists():
+            return
+
+        with tempfile.TemporaryFile() as input_file:
+            key.get_contents_to_file(input_file)
+            input_file.seek(0)
+            for row in csv.reader(GzipFile(fileobj=input_file, mode="rb")):
+                yield row
+
+    def delete_shards(self, course_id, task_id):
+        """Delete all of the partial reports stored for `task_id`."""
+        shard_dir = self.key_for(course_id, self.shard_filename(task_id, ''))
+        self.bucket.delete_keys([key.key for key in self.bucket.list(prefix=shard_dir.key)])
 
     def links_for(self, course_id):
         """
@@ -319,7 +374,9 @@ class S3ReportStore(ReportStore):
         return sorted(
             [
                 (key.key.split("/")[-1], key.generate_url(expires_in=300))
-                for key in self.bucket.list(prefix=course_dir.key)
+                for key in self.bucket.list(prefix=course_dir.key, delimiter="/")
+                # Subdirectories (such as the shards directory) are listed as prefixes
+                if isinstance(key, Key)
             ],
             reverse=True
         )
@@ -380,11 +437,38 @@ class LocalFSReportStore(ReportStore):
     def store_rows(self, course_id, filename, rows):
         """
         Given a course_id, filename, and rows (each row is an iterable of strings),
-        write this data out.
+        write this data out. `rows` may be a generator; rows are written as they
+        are produced, to a temporary file that is renamed into place once
+        complete.
+        """
+        full_path = self.path_to(course_id, filename)
+        directory = os.path.dirname(full_path)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+        temp_path = full_path + ".tmp"
+        with open(temp_path, "wb") as f:
+            csv.writer(f).writerows(rows)
+        os.rename(temp_path, full_path)
+
+    def iter_rows(self, course_id, filename):
         """
-        output_buffer = StringIO()
-        csv.writer(output_buffer).writerows(rows)
-        self.store(course_id, filename, output_buffer)
+        Yield the rows of a csv file previously stored with `store_rows()`.
+        Yields nothing if there is no such file.
+        """
+        full_path = self.path_to(course_id, filename)
+        if not os.path.exists(full_path):
+            return
+
+        with open(full_path, "rb") as f:
+            for row in csv.reader(f):
+                yield row
+
+    def delete_shards(self, course_id, task_id):
+        """Delete all of the partial reports stored for `task_id`."""
+        shard_dir = self.path_to(course_id, self.shard_filename(task_id, ''))
+        if os.path.exists(shard_dir):
+            shutil.rmtree(shard_dir)
 
     def links_for(self, course_id):
         """
@@ -401,6 +485,7 @@ class LocalFSReportStore(ReportStore):
             [
                 (filename, ("file://" + urllib.quote(os.path.join(course_dir, filename))))
                 for filename in os.listdir(course_dir)
+                if os.path.isfile(os.path.join(course_dir, filename)) and not filename.endswith(".tmp")
             ],
             reverse=True
         )
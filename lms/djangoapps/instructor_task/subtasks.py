@@ -122,6 +122,9 @@ class SubtaskStatus(object):
       'retried_withmax' : number of times the subtask has been retried for conditions that
           should have a maximum count applied
       'state' : celery state of the subtask (e.g. QUEUING, PROGRESS, RETRY, FAILURE, SUCCESS)
+      'checkpoint' : for subtasks that process their items in order and record their progress
+          as they go, the last item processed (e.g. its primary key), or None.  A retried subtask
+          continues after it.
 
     Object is not JSON-serializable, so to_dict and from_dict methods are provided so that
     it can be passed as a serializable argument to tasks (and be reconstituted within such tasks).
@@ -131,7 +134,7 @@ class SubtaskStatus(object):
     Also, we should count up "not attempted" separately from attempted/failed.
     """
 
-    def __init__(self, task_id, attempted=None, succeeded=0, failed=0, skipped=0, retried_nomax=0, retried_withmax=0, state=None):
+    def __init__(self, task_id, attempted=None, succeeded=0, failed=0, skipped=0, retried_nomax=0, retried_withmax=0, state=None, checkpoint=None):
         """Construct a SubtaskStatus object."""
         self.task_id = task_id
         if attempted is not None:
@@ -144,6 +147,7 @@ class SubtaskStatus(object):
         self.retried_nomax = retried_nomax
         self.retried_withmax = retried_withmax
         self.state = state if state is not None else QUEUING
+        self.checkpoint = checkpoint
 
     @classmethod
     def from_dict(self, d):
@@ -256,6 +260,21 @@ def initialize_subtask_info(entry, action_name, total_num, subtask_id_list):
     return task_progress
 
 
+def previously_queued_progress(entry):
+    """
+    Return the task progress of the InstructorTask `entry` if its subtasks were
+    already queued, or None.
+
+    A task whose worker dies after it queued its subtasks is requeued, and
+    runs again: it must then not queue a second set of subtasks, but return
+    the progress recorded when it first queued them.
+    """
+    if len(entry.subtasks) > 0 and len(entry.task_output) > 0:
+        TASK_LOG.warning("Task %s has already queued its subtasks!  InstructorTask = %s", entry.task_id, entry)
+        return json.loads(entry.task_output)
+    return None
+
+
 def queue_subtasks_for_query(entry, action_name, create_subtask_fcn, item_queryset, item_fields, items_per_query, items_per_task):
     """
     Generates and queues subtasks to each execute a chunk of "items" generated by a queryset.
@@ -435,9 +454,13 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
 
     The subtask lock acquired in the call to check_subtask_is_valid() is released here, only when
     the attempting of retries has concluded.
+
+    Returns True if this update completed the last outstanding subtask of the InstructorTask.
+    Exactly one subtask sees True, so it can be used to start a final step (e.g. merging the
+    partial results of all subtasks).
     """
     try:
-        _update_subtask_status(entry_id, current_task_id, new_subtask_status)
+        return _update_subtask_status(entry_id, current_task_id, new_subtask_status)
     except DatabaseError:
         # If we fail, try again recursively.
         retry_count += 1
@@ -445,7 +468,7 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
             TASK_LOG.info("Retrying to update status for subtask %s of instructor task %d with status %s:  retry %d",
                           current_task_id, entry_id, new_subtask_status, retry_count)
             dog_stats_api.increment('instructor_task.subtask.retry_after_failed_update')
-            update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count)
+            return update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_count)
         else:
             TASK_LOG.info("Failed to update status after %d retries for subtask %s of instructor task %d with status %s",
                           retry_count, current_task_id, entry_id, new_subtask_status)
@@ -458,6 +481,46 @@ def update_subtask_status(entry_id, current_task_id, new_subtask_status, retry_c
         _release_subtask_lock(current_task_id)
 
 
+def checkpoint_subtask_status(entry_id, current_task_id, subtask_status):
+    """
+    Record the progress of a running subtask in the parent InstructorTask, so that the subtask
+    can continue from `subtask_status.checkpoint` if it is retried or requeued.
+
+    Unlike update_subtask_status(), the subtask lock is kept, and failing to record the
+    checkpoint isn't an error: the subtask just has more to redo if it has to start again.
+    """
+    try:
+        _update_subtask_status(entry_id, current_task_id, subtask_status)
+    except DatabaseError:
+        TASK_LOG.warning("Failed to record checkpoint %s for subtask %s of instructor task %d",
+                         subtask_status.checkpoint, current_task_id, entry_id)
+        dog_stats_api.increment('instructor_task.subtask.failed_checkpoint')
+
+
+def get_latest_subtask_status(entry_id, subtask_status):
+    """
+    Return the status of the subtask recorded in the InstructorTask if it has a later checkpoint
+    than `subtask_status`, and `subtask_status` otherwise.
+
+    A subtask whose worker died is run again with the status it was first queued with; the
+    recorded status tells it how far it had got.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    subtask_status_info = json.loads(entry.subtasks)['status']
+    stored = subtask_status_info.get(subtask_status.task_id)
+    if stored is None:
+        return subtask_status
+    stored_status = SubtaskStatus.from_dict(stored)
+    if stored_status.checkpoint is None:
+        return subtask_status
+    if subtask_status.checkpoint is not None and subtask_status.checkpoint >= stored_status.checkpoint:
+        return subtask_status
+    # Keep the retry counts of the current run, which may be ahead of the recorded ones.
+    stored_status.retried_nomax = max(stored_status.retried_nomax, subtask_status.retried_nomax)
+    stored_status.retried_withmax = max(stored_status.retried_withmax, subtask_status.retried_withmax)
+    return stored_status
+
+
 @transaction.commit_manually
 def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
     """
@@ -485,6 +548,8 @@ def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
     information for each subtask.  At the moment, the value for each subtask (keyed by its task_id)
     is the value of the SubtaskStatus.to_dict(), but could be expanded in future to store information
     about failure messages, progress made, etc.
+
+    Returns True if this update brought the number of remaining subtasks to zero.
     """
     TASK_LOG.info("Preparing to update status for subtask %s for instructor task %d with status %s",
                   current_task_id, entry_id, new_subtask_status)
@@ -535,6 +600,7 @@ def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
         # At present, we mark the task as having succeeded.  In future, we should see
         # if there was a catastrophic failure that occurred, and figure out how to
         # report that here.
+        all_subtasks_done = num_remaining <= 0 and new_state in READY_STATES
         if num_remaining <= 0:
             entry.task_state = SUCCESS
         entry.subtasks = json.dumps(subtask_dict)
@@ -552,3 +618,4 @@ def _update_subtask_status(entry_id, current_task_id, new_subtask_status):
     else:
         TASK_LOG.debug("about to commit....")
         transaction.commit()
+        return all_subtasks_done
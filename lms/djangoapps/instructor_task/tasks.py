@@ -19,20 +19,55 @@ a problem URL and optionally a student.  These are used to set up the initial va
 of the query for traversing StudentModule objects.
 
 """
+import json
+import random
+from datetime import datetime
+
 from django.conf import settings
 from django.utils.translation import ugettext_noop
 from celery import task
+from celery.exceptions import RetryTaskError
+from celery.states import SUCCESS, FAILURE, RETRY
+from celery.utils.log import get_task_logger
 from functools import partial
+from pytz import UTC
+
+from courseware.grades import (
+    answer_distribution_modified_since,
+    answer_distribution_modules,
+    update_answer_distribution,
+)
+from courseware.models import StudentModule
+from instructor_task.models import InstructorTask
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    queue_subtasks_for_query,
+    check_subtask_is_valid,
+    checkpoint_subtask_status,
+    get_latest_subtask_status,
+    previously_queued_progress,
+    update_subtask_status,
+)
 from instructor_task.tasks_helper import (
     run_main_task,
     BaseInstructorTask,
+    UpdateProblemModuleStateError,
     perform_module_state_update,
     rescore_problem_module_state,
+    rescore_module_batch,
     reset_attempts_module_state,
     delete_problem_module_state,
     push_grades_to_s3,
+    push_grade_shard_to_report_store,
+    push_failed_grade_shard_to_report_store,
+    merge_grade_shards,
+    push_answer_distribution_to_s3,
+    push_answer_distribution_to_report_store,
 )
 from bulk_email.tasks import perform_delegate_email_batches
+from student.models import CourseEnrollment
+
+TASK_LOG = get_task_logger(__name__)
 
 
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
@@ -56,14 +91,126 @@ def rescore_problem(entry_id, xmodule_instance_args):
     """
     # Translators: This is a past-tense verb that is inserted into task progress messages as {action}.
     action_name = ugettext_noop('rescored')
-    update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+    if settings.FEATURES.get('ENABLE_RESCORE_SUBTASKS'):
+        visit_fcn = partial(perform_delegate_rescore_batches, xmodule_instance_args)
+    else:
+        update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+        visit_fcn = partial(perform_module_state_update, update_fcn, _filter_done_problems)
+    return run_main_task(entry_id, visit_fcn, action_name)
 
-    def filter_fcn(modules_to_update):
-        """Filter that matches problems which are marked as being done"""
-        return modules_to_update.filter(state__contains='"done": true')
 
-    visit_fcn = partial(perform_module_state_update, update_fcn, filter_fcn)
-    return run_main_task(entry_id, visit_fcn, action_name)
+def _filter_done_problems(modules_to_update):
+    """Filter that matches problems which are marked as being done"""
+    return modules_to_update.filter(state__contains='"done": true')
+
+
+def perform_delegate_rescore_batches(xmodule_instance_args, entry_id, course_id, task_input, action_name):
+    """
+    Splits the StudentModules of the problem to rescore into ranges of at most
+    settings.RESCORE_MODULES_PER_TASK modules (in primary key order) and queues a
+    `rescore_problem_subtask` for each.
+
+    Rescoring a single student, or few enough students, is done directly by this task.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_id = entry.task_id
+
+    progress = previously_queued_progress(entry)
+    if progress is not None:
+        return progress
+
+    problem_url = task_input.get('problem_url')
+    modules_to_update = _filter_done_problems(
+        StudentModule.objects.filter(course_id=course_id, module_state_key=problem_url)
+    )
+    if task_input.get('student') is not None or modules_to_update.count() <= settings.RESCORE_MODULES_PER_TASK:
+        update_fcn = partial(rescore_problem_module_state, xmodule_instance_args)
+        return perform_module_state_update(update_fcn, _filter_done_problems, entry_id, course_id, task_input, action_name)
+
+    def _create_rescore_subtask(module_list, initial_subtask_status):
+        """Creates a subtask to rescore a range of StudentModules."""
+        return rescore_problem_subtask.subtask(
+            (
+                entry_id,
+                course_id,
+                problem_url,
+                [module['pk'] for module in module_list],
+                xmodule_instance_args,
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+        )
+
+    TASK_LOG.info(u"Task %s: Preparing to queue subtasks for rescoring problem %s", task_id, problem_url)
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_rescore_subtask,
+        modules_to_update,
+        [],
+        settings.RESCORE_MODULES_PER_QUERY,
+        settings.RESCORE_MODULES_PER_TASK,
+    )
+
+
+@task(default_retry_delay=settings.RESCORE_DEFAULT_RETRY_DELAY, max_retries=settings.RESCORE_MAX_RETRIES)  # pylint: disable=E1102
+def rescore_problem_subtask(entry_id, course_id, problem_url, module_pks, xmodule_instance_args, subtask_status_dict):
+    """
+    Rescores the StudentModules with primary keys `module_pks` for InstructorTask `entry_id`.
+
+    Progress is checkpointed into the InstructorTask after each batch of modules is committed.
+    If the subtask fails unexpectedly, it is retried (with an increasing delay, up to
+    settings.RESCORE_MAX_RETRIES times) and continues after the last checkpoint, as it does
+    when it is requeued after its worker died.  A problem that can't be rescored at all fails
+    the subtask without retrying.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+    subtask_status = get_latest_subtask_status(entry_id, subtask_status)
+
+    def _num_remaining():
+        """The number of modules after the checkpoint"""
+        if subtask_status.checkpoint is None:
+            return len(module_pks)
+        return len([pk for pk in module_pks if pk > subtask_status.checkpoint])
+
+    checkpoint_fcn = partial(checkpoint_subtask_status, entry_id, current_task_id)
+    try:
+        rescore_module_batch(
+            xmodule_instance_args, course_id, problem_url, module_pks, subtask_status,
+            _filter_done_problems, checkpoint_fcn,
+        )
+    except UpdateProblemModuleStateError:
+        TASK_LOG.exception("Rescore subtask %s for instructor task %d: failed", current_task_id, entry_id)
+        subtask_status.increment(failed=_num_remaining(), state=FAILURE)
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        raise
+    except Exception as exc:  # pylint: disable=broad-except
+        TASK_LOG.exception("Rescore subtask %s for instructor task %d: failed after checkpoint %s, retrying",
+                           current_task_id, entry_id, subtask_status.checkpoint)
+        countdown = ((2 ** subtask_status.retried_withmax) * rescore_problem_subtask.default_retry_delay) * random.uniform(.75, 1.25)
+        subtask_status.increment(retried_withmax=1, state=RETRY)
+        # Record the status before retrying, so that the retried subtask isn't taken for a duplicate.
+        update_subtask_status(entry_id, current_task_id, subtask_status)
+        try:
+            rescore_problem_subtask.retry(
+                args=[entry_id, course_id, problem_url, module_pks, xmodule_instance_args, subtask_status.to_dict()],
+                exc=exc,
+                countdown=countdown,
+                throw=True,
+            )
+        except RetryTaskError:
+            raise
+        except Exception:
+            # No retries left: count the modules that weren't rescored as failed.
+            subtask_status.increment(failed=_num_remaining(), state=FAILURE)
+            update_subtask_status(entry_id, current_task_id, subtask_status)
+            raise
+
+    subtask_status.state = SUCCESS
+    update_subtask_status(entry_id, current_task_id, subtask_status)
+    return subtask_status.to_dict()
 
 
 @task(base=BaseInstructorTask)  # pylint: disable=E1102
@@ -137,5 +284,234 @@ def calculate_grades_csv(entry_id, xmodule_instance_args):
     Grade a course and push the results to an S3 bucket for download.
     """
     action_name = ugettext_noop('graded')
-    task_fn = partial(push_grades_to_s3, xmodule_instance_args)
+    if settings.FEATURES.get('ENABLE_GRADE_REPORT_SUBTASKS'):
+        task_fn = partial(perform_delegate_grade_batches, xmodule_instance_args)
+    else:
+        task_fn = partial(push_grades_to_s3, xmodule_instance_args)
+    return run_main_task(entry_id, task_fn, action_name)
+
+
+def perform_delegate_grade_batches(xmodule_instance_args, entry_id, course_id, task_input, action_name):
+    """
+    Splits the students enrolled in a course into ranges of at most
+    settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK students (in primary key order)
+    and queues a `calculate_grades_csv_shard` subtask for each. The subtask that
+    finishes last queues `merge_grades_csv_shards`, which concatenates the
+    partial reports in order.
+
+    Small enrollments are graded directly by this task.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_id = entry.task_id
+
+    progress = previously_queued_progress(entry)
+    if progress is not None:
+        return progress
+
+    enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
+    if enrolled_students.count() <= settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK:
+        return push_grades_to_s3(xmodule_instance_args, entry_id, course_id, task_input, action_name)
+
+    timestamp_str = datetime.now(UTC).strftime("%Y-%m-%d-%H%M")
+    # queue_subtasks_for_query creates subtasks in primary key order, so the
+    # order of creation is the order of the shards in the final report.
+    shard_counter = {'next': 0}
+
+    def _create_grade_shard_subtask(student_list, initial_subtask_status):
+        """Creates a subtask to grade a range of students."""
+        shard_index = shard_counter['next']
+        shard_counter['next'] += 1
+        return calculate_grades_csv_shard.subtask(
+            (
+                entry_id,
+                course_id,
+                shard_index,
+                [student['pk'] for student in student_list],
+                timestamp_str,
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+        )
+
+    TASK_LOG.info(u"Task %s: Preparing to queue subtasks for grading course %s", task_id, course_id)
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_grade_shard_subtask,
+        enrolled_students,
+        [],
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_QUERY,
+        settings.GRADES_DOWNLOAD_STUDENTS_PER_TASK,
+    )
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def calculate_grades_csv_shard(entry_id, course_id, shard_index, student_ids, timestamp_str, subtask_status_dict):
+    """
+    Grades the students with ids `student_ids` and stores their rows as
+    partial report number `shard_index` of the grade report for InstructorTask
+    `entry_id`. Progress is aggregated into the InstructorTask with
+    `update_subtask_status`; the subtask that completes the InstructorTask
+    queues the final merge.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    entry = InstructorTask.objects.get(pk=entry_id)
+    try:
+        counts = push_grade_shard_to_report_store(course_id, entry.task_id, shard_index, student_ids)
+    except Exception as exc:
+        TASK_LOG.exception("Grade report subtask %s for instructor task %d: failed unexpectedly!", current_task_id, entry_id)
+        try:
+            push_failed_grade_shard_to_report_store(
+                course_id, entry.task_id, shard_index, student_ids, u"Grade report subtask failed: {}".format(exc)
+            )
+        except Exception:  # pylint: disable=broad-except
+            TASK_LOG.exception("Grade report subtask %s for instructor task %d: failed to store its error rows",
+                               current_task_id, entry_id)
+        subtask_status.increment(failed=len(student_ids), state=FAILURE)
+        # the report is still merged if this was the last shard, with its students as errors
+        if update_subtask_status(entry_id, current_task_id, subtask_status):
+            _queue_merge_grades_csv_shards(entry_id, course_id, timestamp_str)
+        raise
+
+    subtask_status.increment(succeeded=counts['succeeded'], failed=counts['failed'], state=SUCCESS)
+    if update_subtask_status(entry_id, current_task_id, subtask_status):
+        _queue_merge_grades_csv_shards(entry_id, course_id, timestamp_str)
+    return subtask_status.to_dict()
+
+
+def _queue_merge_grades_csv_shards(entry_id, course_id, timestamp_str):
+    """Queues the merge of the partial reports of all subtasks of InstructorTask `entry_id`."""
+    num_shards = json.loads(InstructorTask.objects.get(pk=entry_id).subtasks)['total']
+    merge_grades_csv_shards.apply_async(
+        (entry_id, course_id, num_shards, timestamp_str),
+        routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+    )
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def merge_grades_csv_shards(entry_id, course_id, num_shards, timestamp_str):
+    """
+    Concatenates the partial reports of all `calculate_grades_csv_shard`
+    subtasks of InstructorTask `entry_id` into the final grade report.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_progress = json.loads(entry.task_output)
+    merge_grade_shards(course_id, entry.task_id, num_shards, timestamp_str, task_progress.get('failed', 0) > 0)
+
+
+@task(base=BaseInstructorTask, routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def calculate_answer_distribution_csv(entry_id, xmodule_instance_args):
+    """
+    Update the answers stored for a course and push its answer distribution
+    report to an S3 bucket for download.
+    """
+    action_name = ugettext_noop('counted')
+    task_fn = partial(perform_delegate_answer_distribution_batches, xmodule_instance_args)
     return run_main_task(entry_id, task_fn, action_name)
+
+
+def perform_delegate_answer_distribution_batches(xmodule_instance_args, entry_id, course_id, task_input, action_name):
+    """
+    Splits the submitted problems of a course modified since the last update of
+    its answers into ranges of at most settings.ANSWER_DISTRIBUTION_MODULES_PER_TASK
+    StudentModule rows (in primary key order) and queues an
+    `update_answer_distribution_subtask` for each, so that their states are
+    decoded by several workers at once. The subtask that finishes last queues
+    `write_answer_distribution_csv`.
+
+    Updates of fewer rows are done directly by this task.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_id = entry.task_id
+
+    progress = previously_queued_progress(entry)
+    if progress is not None:
+        return progress
+
+    modules = answer_distribution_modules(course_id, answer_distribution_modified_since(course_id))
+    if modules.count() <= settings.ANSWER_DISTRIBUTION_MODULES_PER_TASK:
+        return push_answer_distribution_to_s3(xmodule_instance_args, entry_id, course_id, task_input, action_name)
+
+    def _create_answer_distribution_subtask(module_list, initial_subtask_status):
+        """Creates a subtask to update the answers of a range of StudentModule rows."""
+        return update_answer_distribution_subtask.subtask(
+            (
+                entry_id,
+                course_id,
+                [module['pk'] for module in module_list],
+                initial_subtask_status.to_dict(),
+            ),
+            task_id=initial_subtask_status.task_id,
+            routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+        )
+
+    TASK_LOG.info(u"Task %s: Preparing to queue subtasks for answer distribution of course %s", task_id, course_id)
+    return queue_subtasks_for_query(
+        entry,
+        action_name,
+        _create_answer_distribution_subtask,
+        modules,
+        [],
+        settings.ANSWER_DISTRIBUTION_MODULES_PER_QUERY,
+        settings.ANSWER_DISTRIBUTION_MODULES_PER_TASK,
+    )
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def update_answer_distribution_subtask(entry_id, course_id, module_ids, subtask_status_dict):
+    """
+    Replaces the stored answers of the StudentModule rows with ids `module_ids`
+    for InstructorTask `entry_id`. Progress is aggregated into the
+    InstructorTask with `update_subtask_status`; the subtask that completes
+    the InstructorTask queues the report.
+    """
+    subtask_status = SubtaskStatus.from_dict(subtask_status_dict)
+    current_task_id = subtask_status.task_id
+    check_subtask_is_valid(entry_id, current_task_id, subtask_status)
+
+    try:
+        update_answer_distribution(course_id, module_ids)
+    except Exception:
+        TASK_LOG.exception(
+            "Answer distribution subtask %s for instructor task %d: failed unexpectedly!", current_task_id, entry_id
+        )
+        subtask_status.increment(failed=len(module_ids), state=FAILURE)
+        # the report is still written if this was the last subtask, but the update isn't logged
+        if update_subtask_status(entry_id, current_task_id, subtask_status):
+            _queue_write_answer_distribution_csv(entry_id, course_id)
+        raise
+
+    subtask_status.increment(succeeded=len(module_ids), state=SUCCESS)
+    if update_subtask_status(entry_id, current_task_id, subtask_status):
+        _queue_write_answer_distribution_csv(entry_id, course_id)
+    return subtask_status.to_dict()
+
+
+def _queue_write_answer_distribution_csv(entry_id, course_id):
+    """Queues the answer distribution report once all subtasks of InstructorTask `entry_id` are done."""
+    write_answer_distribution_csv.apply_async(
+        (entry_id, course_id),
+        routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY,
+    )
+
+
+@task(routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY)  # pylint: disable=E1102
+def write_answer_distribution_csv(entry_id, course_id):
+    """
+    Writes the answer distribution report once all of the
+    `update_answer_distribution_subtask`s of InstructorTask `entry_id` are
+    done. The update is only logged if none of them failed, so that the rows
+    of a failed subtask are read again by the next update.
+    """
+    entry = InstructorTask.objects.get(pk=entry_id)
+    task_progress = json.loads(entry.task_output)
+    push_answer_distribution_to_report_store(
+        course_id,
+        entry.created,
+        task_progress.get('succeeded', 0),
+        complete=task_progress.get('failed', 0) == 0,
+    )
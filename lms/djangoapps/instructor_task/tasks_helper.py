@@ -11,6 +11,7 @@ from time import time
 from celery import Task, current_task
 from celery.utils.log import get_task_logger
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.db import transaction, reset_queries
 from dogapi import dog_stats_api
@@ -19,9 +20,18 @@ from pytz import UTC
 from xmodule.modulestore.django import modulestore
 from track.views import task_track
 
-from courseware.grades import iterate_grades_for
+from courseware.bulk_grades import iterate_grades_for_bulk
+from courseware.grades import (
+    iterate_grades_for,
+    answer_distribution_modified_since,
+    answer_distribution_modules,
+    answer_distribution_rows,
+    log_answer_distribution_update,
+    submitted_problem_id_batches,
+    update_answer_distribution,
+)
 from courseware.models import StudentModule
-from courseware.model_data import FieldDataCache
+from courseware.model_data import FieldDataCache, chunks
 from courseware.module_render import get_module_for_descriptor_internal
 from instructor_task.models import ReportStore, InstructorTask, PROGRESS
 from student.models import CourseEnrollment
@@ -344,16 +354,20 @@ def _get_track_function_for_task(student, xmodule_instance_args=None, source_pag
 
 
 def _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args=None,
-                                  grade_bucket_type=None):
+                                  grade_bucket_type=None, field_data_cache=None):
     """
     Fetches a StudentModule instance for a given `course_id`, `student` object, and `module_descriptor`.
 
     `xmodule_instance_args` is used to provide information for creating a track function and an XQueue callback.
     These are passed, along with `grade_bucket_type`, to get_module_for_descriptor_internal, which sidesteps
     the need for a Request object when instantiating an xmodule instance.
+
+    If `field_data_cache` is None, one is created for the student's data for `module_descriptor`
+    and its descendents.
     """
     # reconstitute the problem's corresponding XModule:
-    field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
+    if field_data_cache is None:
+        field_data_cache = FieldDataCache.cache_for_descriptor_descendents(course_id, student, module_descriptor)
 
     # get request-related tracking information from args passthrough, and supplement with task-specific
     # information:
@@ -391,11 +405,20 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
     Returns True if problem was successfully rescored for the given student, and False
     if problem encountered some kind of error in rescoring.
     '''
+    return _rescore_problem_module_state(xmodule_instance_args, module_descriptor, student_module)
+
+
+def _rescore_problem_module_state(xmodule_instance_args, module_descriptor, student_module, field_data_cache=None):
+    '''
+    Rescores `student_module` as rescore_problem_module_state does, within the caller's
+    transaction.  `field_data_cache` is passed to _get_module_instance_for_task.
+    '''
     # unpack the StudentModule:
     course_id = student_module.course_id
     student = student_module.student
     module_state_key = student_module.module_state_key
-    instance = _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args, grade_bucket_type='rescore')
+    instance = _get_module_instance_for_task(course_id, student, module_descriptor, xmodule_instance_args,
+                                             grade_bucket_type='rescore', field_data_cache=field_data_cache)
 
     if instance is None:
         # Either permissions just changed, or someone is trying to be clever
@@ -428,6 +451,67 @@ def rescore_problem_module_state(xmodule_instance_args, module_descriptor, stude
         return UPDATE_STATUS_SUCCEEDED
 
 
+def rescore_module_batch(xmodule_instance_args, course_id, problem_url, module_pks, subtask_status,
+                         filter_fcn=None, checkpoint_fcn=None):
+    """
+    Rescores the StudentModules of `problem_url` with primary keys in `module_pks`, updating the
+    counts of `subtask_status` (a SubtaskStatus).
+
+    The problem's descriptor is loaded once for all of the modules.  Modules are rescored in order
+    of primary key, RESCORE_SAVE_BATCH_SIZE at a time, each batch in one transaction.  After each
+    batch is committed, `subtask_status.checkpoint` is set to the last primary key of the batch
+    and `checkpoint_fcn(subtask_status)` is called, so that it can be recorded.  Modules up to an
+    existing checkpoint are not rescored again.
+
+    If `filter_fcn` is not None, it is applied to the query for each batch, as in
+    perform_module_state_update.  Modules it excludes, or which no longer exist, are skipped.
+
+    Raises UpdateProblemModuleStateError if the problem can't be rescored at all; other exceptions
+    roll back the current batch only.
+    """
+    module_descriptor = modulestore().get_instance(course_id, problem_url)
+
+    module_pks = sorted(module_pks)
+    if subtask_status.checkpoint is not None:
+        module_pks = [pk for pk in module_pks if pk > subtask_status.checkpoint]
+
+    for batch in chunks(module_pks, settings.RESCORE_SAVE_BATCH_SIZE):
+        num_succeeded = 0
+        num_failed = 0
+        with transaction.commit_on_success():
+            modules_to_update = StudentModule.objects.filter(pk__in=batch).select_related('student').order_by('pk')
+            if filter_fcn is not None:
+                modules_to_update = filter_fcn(modules_to_update)
+            modules_to_update = list(modules_to_update)
+
+            for student_module in modules_to_update:
+                with dog_stats_api.timer('instructor_tasks.module.time.step', tags=['action:rescored']):
+                    # The module's state has already been fetched: only the other scopes are queried.
+                    field_data_cache = FieldDataCache([], course_id, student_module.student)
+                    field_data_cache.add_student_module(module_descriptor, student_module)
+                    update_status = _rescore_problem_module_state(
+                        xmodule_instance_args, module_descriptor, student_module, field_data_cache
+                    )
+                if update_status == UPDATE_STATUS_SUCCEEDED:
+                    num_succeeded += 1
+                elif update_status == UPDATE_STATUS_FAILED:
+                    num_failed += 1
+                else:
+                    raise UpdateProblemModuleStateError("Unexpected update_status returned: {}".format(update_status))
+
+        subtask_status.increment(
+            succeeded=num_succeeded,
+            failed=num_failed,
+            skipped=len(batch) - len(modules_to_update),
+            state=PROGRESS,
+        )
+        subtask_status.checkpoint = batch[-1]
+        if checkpoint_fcn is not None:
+            checkpoint_fcn(subtask_status)
+
+    return subtask_status
+
+
 @transaction.autocommit
 def reset_attempts_module_state(xmodule_instance_args, _module_descriptor, student_module):
     """
@@ -470,6 +554,67 @@ def delete_problem_module_state(xmodule_instance_args, _module_descriptor, stude
     return UPDATE_STATUS_SUCCEEDED
 
 
+def _iterate_grades(course_id, students):
+    """
+    Grade `students` (a queryset of User) with the bulk or the per-student
+    grading engine, depending on FEATURES['ENABLE_BULK_GRADE_REPORTS'].
+    """
+    if settings.FEATURES.get('ENABLE_BULK_GRADE_REPORTS'):
+        return iterate_grades_for_bulk(course_id, students)
+    return iterate_grades_for(course_id, students)
+
+
+def generate_grade_rows(gradesets, err_rows, counts, progress_fcn=None, status_interval=100):
+    """
+    Yield grade report CSV rows, header first, for the (student, gradeset,
+    err_msg) tuples of `gradesets`.
+
+    Students that could not be graded are appended to `err_rows` instead.
+    `counts` is a dict whose 'attempted', 'succeeded' and 'failed' values are
+    incremented as students are processed, and `progress_fcn` (if given) is
+    called every `status_interval` students.
+    """
+    header = None
+    for student, gradeset, err_msg in gradesets:
+        # Periodically update task status (this is a cache write)
+        if progress_fcn is not None and counts['attempted'] % status_interval == 0:
+            progress_fcn()
+        counts['attempted'] += 1
+
+        if gradeset:
+            # We were able to successfully grade this student for this course.
+            counts['succeeded'] += 1
+            if not header:
+                # Encode the header row in utf-8 encoding in case there are unicode characters
+                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
+                yield ["id", "email", "username", "grade"] + header
+
+            percents = {
+                section['label']: section.get('percent', 0.0)
+                for section in gradeset[u'section_breakdown']
+                if 'label' in section
+            }
+
+            # Not everybody has the same gradable items. If the item is not
+            # found in the user's gradeset, just assume it's a 0. The aggregated
+            # grades for their sections and overall course will be calculated
+            # without regard for the item they didn't have access to, so it's
+            # possible for a student to have a 0.0 show up in their row but
+            # still have 100% for the course.
+            row_percents = [percents.get(label, 0.0) for label in header]
+            yield [student.id, student.email, student.username, gradeset['percent']] + row_percents
+        else:
+            # An empty gradeset means we failed to grade a student.
+            counts['failed'] += 1
+            err_rows.append([student.id, student.username, err_msg])
+
+
+def grade_report_filename(course_id, timestamp_str, suffix=""):
+    """Return the filename of the grade report for `course_id`"""
+    course_id_prefix = urllib.quote(course_id.replace("/", "_"))
+    return u"{}_grade_report_{}{}.csv".format(course_id_prefix, timestamp_str, suffix)
+
+
 def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input, action_name):
     """
     For a given `course_id`, generate a grades CSV file for all students that
@@ -479,96 +624,229 @@ def push_grades_to_s3(_xmodule_instance_args, _entry_id, course_id, _task_input,
     buffered, so we'll never write part of a CSV file to S3 -- i.e. any files
     that are visible in ReportStore will be complete ones.
 
+    Rows are generated lazily and streamed into the `ReportStore` as students
+    are graded, so memory use does not grow with enrollment. If
+    FEATURES['ENABLE_BULK_GRADE_REPORTS'] is set, students are graded with
+    `courseware.bulk_grades` instead of one `grade()` call per student.
+
     As we start to add more CSV downloads, it will probably be worthwhile to
     make a more general CSVDoc class instead of building out the rows like we
     do here.
     """
     start_time = datetime.now(UTC)
-    status_interval = 100
 
     enrolled_students = CourseEnrollment.users_enrolled_in(course_id)
     num_total = enrolled_students.count()
-    num_attempted = 0
-    num_succeeded = 0
-    num_failed = 0
-    curr_step = "Calculating Grades"
+    counts = {'attempted': 0, 'succeeded': 0, 'failed': 0}
+    steps = {'current': "Calculating Grades"}
 
     def update_task_progress():
         """Return a dict containing info about current task"""
         current_time = datetime.now(UTC)
         progress = {
             'action_name': action_name,
-            'attempted': num_attempted,
-            'succeeded': num_succeeded,
-            'failed': num_failed,
+            'attempted': counts['attempted'],
+            'succeeded': counts['succeeded'],
+            'failed': counts['failed'],
             'total': num_total,
             'duration_ms': int((current_time - start_time).total_seconds() * 1000),
-            'step': curr_step,
+            'step': steps['current'],
         }
         _get_current_task().update_state(state=PROGRESS, meta=progress)
 
         return progress
 
-    # Loop over all our students and build our CSV lists in memory
-    header = None
-    rows = []
+    # Error rows are expected to be rare, so they are kept in memory and
+    # written out once all students have been graded.
     err_rows = [["id", "username", "error_msg"]]
-    for student, gradeset, err_msg in iterate_grades_for(course_id, enrolled_students):
-        # Periodically update task status (this is a cache write)
-        if num_attempted % status_interval == 0:
-            update_task_progress()
-        num_attempted += 1
+    rows = generate_grade_rows(
+        _iterate_grades(course_id, enrolled_students), err_rows, counts, progress_fcn=update_task_progress
+    )
 
-        if gradeset:
-            # We were able to successfully grade this student for this course.
-            num_succeeded += 1
-            if not header:
-                # Encode the header row in utf-8 encoding in case there are unicode characters
-                header = [section['label'].encode('utf-8') for section in gradeset[u'section_breakdown']]
-                rows.append(["id", "email", "username", "grade"] + header)
+    # Grade and upload at the same time
+    timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
+    report_store = ReportStore.from_config()
+    report_store.store_rows(course_id, grade_report_filename(course_id, timestamp_str), rows)
 
-            percents = {
-                section['label']: section.get('percent', 0.0)
-                for section in gradeset[u'section_breakdown']
-                if 'label' in section
-            }
+    steps['current'] = "Uploading CSVs"
+    update_task_progress()
 
-            # Not everybody has the same gradable items. If the item is not
-            # found in the user's gradeset, just assume it's a 0. The aggregated
-            # grades for their sections and overall course will be calculated
-            # without regard for the item they didn't have access to, so it's
-            # possible for a student to have a 0.0 show up in their row but
-            # still have 100% for the course.
-            row_percents = [percents.get(label, 0.0) for label in header]
-            rows.append([student.id, student.email, student.username, gradeset['percent']] + row_percents)
-        else:
-            # An empty gradeset means we failed to grade a student.
-            num_failed += 1
-            err_rows.append([student.id, student.username, err_msg])
+    # If there are any error rows (don't count the header), write them out as well
+    if len(err_rows) > 1:
+        report_store.store_rows(course_id, grade_report_filename(course_id, timestamp_str, "_err"), err_rows)
 
-    # By this point, we've got the rows we're going to stuff into our CSV files.
-    curr_step = "Uploading CSVs"
-    update_task_progress()
+    # One last update before we close out...
+    return update_task_progress()
 
-    # Generate parts of the file name
-    timestamp_str = start_time.strftime("%Y-%m-%d-%H%M")
-    course_id_prefix = urllib.quote(course_id.replace("/", "_"))
 
-    # Perform the actual upload
+def push_grade_shard_to_report_store(course_id, parent_task_id, shard_index, student_ids):
+    """
+    Grade the students with ids `student_ids` and store their grade report
+    rows, and any error rows, as partial reports ("shards") of the task
+    `parent_task_id`. Shards are later put together by `merge_grade_shards`.
+
+    Returns a dict of 'attempted', 'succeeded' and 'failed' counts.
+    """
+    students = User.objects.filter(id__in=student_ids)
+    counts = {'attempted': 0, 'succeeded': 0, 'failed': 0}
+    err_rows = []
+
     report_store = ReportStore.from_config()
     report_store.store_rows(
         course_id,
-        u"{}_grade_report_{}.csv".format(course_id_prefix, timestamp_str),
-        rows
+        report_store.shard_filename(parent_task_id, "{:06d}.csv".format(shard_index)),
+        generate_grade_rows(_iterate_grades(course_id, students), err_rows, counts)
     )
-
-    # If there are any error rows (don't count the header), write them out as well
-    if len(err_rows) > 1:
+    if err_rows:
         report_store.store_rows(
             course_id,
-            u"{}_grade_report_{}_err.csv".format(course_id_prefix, timestamp_str),
+            report_store.shard_filename(parent_task_id, "{:06d}_err.csv".format(shard_index)),
             err_rows
         )
+    return counts
+
+
+def push_failed_grade_shard_to_report_store(course_id, parent_task_id, shard_index, student_ids, err_msg):
+    """
+    Store every student of `student_ids` as an error row of shard
+    `shard_index` of the task `parent_task_id`, after grading the shard failed
+    as a whole. The shard's grade rows, if any were stored, are emptied, so
+    that its students are reported once, as errors.
+    """
+    usernames = dict(User.objects.filter(id__in=student_ids).values_list('id', 'username'))
+    report_store = ReportStore.from_config()
+    report_store.store_rows(
+        course_id, report_store.shard_filename(parent_task_id, "{:06d}.csv".format(shard_index)), []
+    )
+    report_store.store_rows(
+        course_id,
+        report_store.shard_filename(parent_task_id, "{:06d}_err.csv".format(shard_index)),
+        [[student_id, usernames.get(student_id, ''), err_msg] for student_id in student_ids]
+    )
+
+
+def merge_grade_shards(course_id, parent_task_id, num_shards, timestamp_str, include_errors):
+    """
+    Concatenate, in order, the `num_shards` partial grade reports stored by
+    `push_grade_shard_to_report_store` for `parent_task_id` into the final grade
+    report (and the error report, if `include_errors`), then delete the shards.
+
+    Each shard starts with its own header row. The header of the first shard
+    is used for the whole report, and the columns of later shards are matched
+    to it by name.
+    """
+    report_store = ReportStore.from_config()
+
+    def shard_rows():
+        """Yield the rows of all shards, with a single header row"""
+        header = None
+        for shard_index in range(num_shards):
+            rows = report_store.iter_rows(
+                course_id, report_store.shard_filename(parent_task_id, "{:06d}.csv".format(shard_index))
+            )
+            shard_header = next(rows, None)
+            if shard_header is None:
+                continue
+            if header is None:
+                header = shard_header
+                yield header
+            for row in rows:
+                if shard_header == header:
+                    yield row
+                else:
+                    values = dict(zip(shard_header, row))
+                    yield [values.get(label, 0.0) for label in header]
+
+    def err_rows():
+        """Yield the error rows of all shards, with a single header row"""
+        yield ["id", "username", "error_msg"]
+        for shard_index in range(num_shards):
+            for row in report_store.iter_rows(
+                course_id, report_store.shard_filename(parent_task_id, "{:06d}_err.csv".format(shard_index))
+            ):
+                yield row
+
+    report_store.store_rows(course_id, grade_report_filename(course_id, timestamp_str), shard_rows())
+
+    if include_errors:
+        report_store.store_rows(course_id, grade_report_filename(course_id, timestamp_str, "_err"), err_rows())
+
+    report_store.delete_shards(course_id, parent_task_id)
+
+
+def answer_distribution_filename(course_id, timestamp_str):
+    """Return the filename of the answer distribution report for `course_id`"""
+    course_id_prefix = urllib.quote(course_id.replace("/", "_"))
+    return u"{}_answer_distribution_{}.csv".format(course_id_prefix, timestamp_str)
+
+
+def push_answer_distribution_to_report_store(course_id, start_time, num_modules, complete=True):
+    """
+    Write the answer distribution report of `course_id` from its
+    StudentModuleAnswer rows to the `ReportStore`, as they are read from the
+    database.
+
+    If `complete`, every StudentModule row modified since the previous update
+    was read, and the update that started at `start_time` is logged so that
+    the next one starts from there.
+    """
+    report_store = ReportStore.from_config()
+    report_store.store_rows(
+        course_id,
+        answer_distribution_filename(course_id, start_time.strftime("%Y-%m-%d-%H%M")),
+        answer_distribution_rows(course_id)
+    )
+    if complete:
+        log_answer_distribution_update(course_id, start_time, num_modules)
+
+
+def push_answer_distribution_to_s3(_xmodule_instance_args, entry_id, course_id, _task_input, action_name):
+    """
+    For a given `course_id`, replace the stored answers of the StudentModule
+    rows modified since the last update, in batches of
+    settings.ANSWER_DISTRIBUTION_MODULES_PER_TASK rows in primary key order,
+    then write the answer distribution report counted from all of the stored
+    answers to the `ReportStore`.
+
+    Only the rows modified since the previous update are decoded, so the cost
+    of an update grows with the activity in the course since then rather than
+    with all of its submissions.
+    """
+    start_time = datetime.now(UTC)
+    # Rows modified after the task was submitted are read again next time.
+    update_start = InstructorTask.objects.get(pk=entry_id).created or start_time
+    modified_since = answer_distribution_modified_since(course_id)
+
+    num_total = answer_distribution_modules(course_id, modified_since).count()
+    counts = {'attempted': 0, 'succeeded': 0, 'failed': 0}
+    steps = {'current': "Updating Answers"}
+
+    def update_task_progress():
+        """Return a dict containing info about current task"""
+        current_time = datetime.now(UTC)
+        progress = {
+            'action_name': action_name,
+            'attempted': counts['attempted'],
+            'succeeded': counts['succeeded'],
+            'failed': counts['failed'],
+            'total': num_total,
+            'duration_ms': int((current_time - start_time).total_seconds() * 1000),
+            'step': steps['current'],
+        }
+        _get_current_task().update_state(state=PROGRESS, meta=progress)
+
+        return progress
+
+    for module_ids in submitted_problem_id_batches(
+        course_id, modified_since, settings.ANSWER_DISTRIBUTION_MODULES_PER_TASK
+    ):
+        update_answer_distribution(course_id, module_ids)
+        counts['attempted'] += len(module_ids)
+        counts['succeeded'] += len(module_ids)
+        update_task_progress()
+
+    steps['current'] = "Uploading CSV"
+    update_task_progress()
+    push_answer_distribution_to_report_store(course_id, update_start, counts['succeeded'])
 
-    # One last update before we close out...
     return update_task_progress()
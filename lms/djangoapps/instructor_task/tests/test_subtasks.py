@@ -1,13 +1,30 @@
 """
 Unit tests for instructor_task subtasks.
 """
+import json
+import os
+from shutil import rmtree
+from tempfile import mkdtemp
 from uuid import uuid4
 
+from celery.states import SUCCESS
+from django.test import TestCase
+from django.test.utils import override_settings
 from mock import Mock, patch
 
 from student.models import CourseEnrollment
 
-from instructor_task.subtasks import queue_subtasks_for_query
+from instructor_task.models import InstructorTask, ReportStore, PROGRESS
+from instructor_task.subtasks import (
+    SubtaskStatus,
+    checkpoint_subtask_status,
+    get_latest_subtask_status,
+    initialize_subtask_info,
+    previously_queued_progress,
+    queue_subtasks_for_query,
+    update_subtask_status,
+)
+from instructor_task.tasks_helper import merge_grade_shards
 from instructor_task.tests.factories import InstructorTaskFactory
 from instructor_task.tests.test_base import InstructorTaskCourseTestCase
 
@@ -93,3 +110,141 @@ class TestSubtasks(InstructorTaskCourseTestCase):
         self.assertEqual(len(mock_create_subtask_fcn_args[1][0][0]), 3)
         self.assertEqual(len(mock_create_subtask_fcn_args[2][0][0]), 4)
         self.assertEqual(len(mock_create_subtask_fcn_args[3][0][0]), 4)
+
+    def test_previously_queued_progress(self):
+        """A requeued task gets back the progress recorded when it first queued its subtasks."""
+        instructor_task = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='grade_course',
+        )
+        self.assertIsNone(previously_queued_progress(instructor_task))
+
+        progress = {'action_name': 'graded', 'total': 3}
+        instructor_task.subtasks = json.dumps({'total': 1, 'status': {}})
+        instructor_task.task_output = json.dumps(progress)
+        self.assertEqual(previously_queued_progress(instructor_task), progress)
+
+
+class TestUpdateSubtaskStatus(InstructorTaskCourseTestCase):
+    """Tests for update_subtask_status()."""
+
+    def setUp(self):
+        super(TestUpdateSubtaskStatus, self).setUp()
+        self.initialize_course()
+
+    def test_last_subtask_reports_done(self):
+        entry = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='grade_course',
+        )
+        subtask_ids = [str(uuid4()) for _ in range(3)]
+        initialize_subtask_info(entry, 'graded', 30, subtask_ids)
+
+        results = []
+        for subtask_id in subtask_ids:
+            subtask_status = SubtaskStatus.create(subtask_id)
+            subtask_status.increment(succeeded=10, state=SUCCESS)
+            results.append(update_subtask_status(entry.id, subtask_id, subtask_status))
+
+        self.assertEqual(results, [False, False, True])
+        self.assertEqual(json.loads(InstructorTask.objects.get(id=entry.id).task_output)['succeeded'], 30)
+
+    def _create_entry_with_subtask(self):
+        """Create an InstructorTask with one subtask, returning the entry and the subtask's status"""
+        entry = InstructorTaskFactory.create(
+            course_id=self.course.id,
+            task_id=str(uuid4()),
+            task_key='dummy_task_key',
+            task_type='rescore_problem',
+        )
+        subtask_id = str(uuid4())
+        initialize_subtask_info(entry, 'rescored', 10, [subtask_id])
+        return entry, SubtaskStatus.create(subtask_id)
+
+    def test_checkpoint_is_recorded(self):
+        entry, subtask_status = self._create_entry_with_subtask()
+        subtask_status.increment(succeeded=5, state=PROGRESS)
+        subtask_status.checkpoint = 42
+        checkpoint_subtask_status(entry.id, subtask_status.task_id, subtask_status)
+
+        entry = InstructorTask.objects.get(id=entry.id)
+        stored = json.loads(entry.subtasks)['status'][subtask_status.task_id]
+        self.assertEqual(stored['checkpoint'], 42)
+        # counts are only added to the InstructorTask once the subtask is done
+        self.assertEqual(json.loads(entry.task_output)['succeeded'], 0)
+
+    def test_latest_subtask_status(self):
+        entry, subtask_status = self._create_entry_with_subtask()
+        queued_status = SubtaskStatus.from_dict(subtask_status.to_dict())
+        subtask_status.increment(succeeded=5, state=PROGRESS)
+        subtask_status.checkpoint = 42
+        checkpoint_subtask_status(entry.id, subtask_status.task_id, subtask_status)
+
+        latest = get_latest_subtask_status(entry.id, queued_status)
+        self.assertEqual(latest.checkpoint, 42)
+        self.assertEqual(latest.succeeded, 5)
+
+        # a status that is further along is kept
+        subtask_status.checkpoint = 50
+        self.assertIs(get_latest_subtask_status(entry.id, subtask_status), subtask_status)
+
+
+class TestGradeReportShards(TestCase):
+    """Tests for merging the partial grade reports written by grade report subtasks."""
+
+    def setUp(self):
+        self.root_path = mkdtemp()
+        self.addCleanup(rmtree, self.root_path)
+        self.course_id = 'edx/1.23x/test_course'
+        self.task_id = str(uuid4())
+
+    def _store_shard(self, report_store, name, rows):
+        """Store `rows` as the shard `name`."""
+        report_store.store_rows(self.course_id, report_store.shard_filename(self.task_id, name), rows)
+
+    def test_merge_in_order(self):
+        grades_download = {'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.root_path}
+        with override_settings(GRADES_DOWNLOAD=grades_download):
+            report_store = ReportStore.from_config()
+            self._store_shard(report_store, '000000.csv', [
+                ['id', 'email', 'username', 'grade', 'HW 01', 'HW 02'],
+                ['1', 'a@example.com', 'a', '0.5', '1.0', '0.0'],
+            ])
+            # Columns of later shards are matched to the first shard's header
+            self._store_shard(report_store, '000001.csv', [
+                ['id', 'email', 'username', 'grade', 'HW 02', 'HW 01'],
+                ['2', 'b@example.com', 'b', '0.25', '0.5', '0.0'],
+            ])
+            self._store_shard(report_store, '000001_err.csv', [['3', 'c', 'broken']])
+
+            # The shards are never listed for download
+            self.assertEqual(report_store.links_for(self.course_id), [])
+
+            merge_grade_shards(self.course_id, self.task_id, 2, '2014-01-01-0000', True)
+
+            links = report_store.links_for(self.course_id)
+            self.assertEqual(
+                [filename for filename, _ in links],
+                [
+                    'edx_1.23x_test_course_grade_report_2014-01-01-0000_err.csv',
+                    'edx_1.23x_test_course_grade_report_2014-01-01-0000.csv',
+                ]
+            )
+            self.assertEqual(
+                list(report_store.iter_rows(self.course_id, links[1][0])),
+                [
+                    ['id', 'email', 'username', 'grade', 'HW 01', 'HW 02'],
+                    ['1', 'a@example.com', 'a', '0.5', '1.0', '0.0'],
+                    ['2', 'b@example.com', 'b', '0.25', '0.0', '0.5'],
+                ]
+            )
+            self.assertEqual(
+                list(report_store.iter_rows(self.course_id, links[0][0])),
+                [['id', 'username', 'error_msg'], ['3', 'c', 'broken']]
+            )
+            shard_dir = report_store.path_to(self.course_id, report_store.shard_filename(self.task_id, ''))
+            self.assertFalse(os.path.exists(shard_dir))
@@ -6,23 +6,36 @@ paths actually work.
 
 """
 import json
+from shutil import rmtree
+from tempfile import mkdtemp
 from uuid import uuid4
 
 from mock import Mock, MagicMock, patch
 
 from celery.states import SUCCESS, FAILURE
+from django.conf import settings
+from django.test.utils import override_settings
 
 from xmodule.modulestore.exceptions import ItemNotFoundError
 
-from courseware.models import StudentModule
+from courseware.models import StudentModule, AnswerDistributionLog
 from courseware.tests.factories import StudentModuleFactory
 from student.tests.factories import UserFactory, CourseEnrollmentFactory
 
-from instructor_task.models import InstructorTask
+from instructor_task.models import InstructorTask, ReportStore
+from instructor_task.subtasks import SubtaskStatus, initialize_subtask_info
 from instructor_task.tests.test_base import InstructorTaskModuleTestCase
 from instructor_task.tests.factories import InstructorTaskFactory
-from instructor_task.tasks import rescore_problem, reset_problem_attempts, delete_problem_state
-from instructor_task.tasks_helper import UpdateProblemModuleStateError
+from instructor_task.tasks import (
+    rescore_problem,
+    reset_problem_attempts,
+    delete_problem_state,
+    calculate_answer_distribution_csv,
+    calculate_grades_csv_shard,
+    merge_grades_csv_shards,
+    update_answer_distribution_subtask,
+)
+from instructor_task.tasks_helper import UpdateProblemModuleStateError, rescore_module_batch
 
 PROBLEM_URL_NAME = "test_urlname"
 
@@ -298,6 +311,77 @@ class TestRescoreInstructorTask(TestInstructorTasks):
         self.assertGreater(output.get('duration_ms'), 0)
 
 
+class TestRescoreSubtasks(TestInstructorTasks):
+    """Tests rescoring in subtasks that commit in batches and resume from checkpoints."""
+
+    def _mock_instance(self):
+        """A module that rescores correctly"""
+        mock_instance = Mock()
+        mock_instance.rescore_problem = Mock(return_value={'success': 'correct'})
+        return mock_instance
+
+    def _module_pks(self):
+        """Primary keys of the problem's StudentModules, in order"""
+        modules = StudentModule.objects.filter(module_state_key=self.problem_url).order_by('pk')
+        return list(modules.values_list('pk', flat=True))
+
+    @override_settings(RESCORE_MODULES_PER_TASK=4, RESCORE_MODULES_PER_QUERY=8, RESCORE_SAVE_BATCH_SIZE=3)
+    def test_rescoring_with_subtasks(self):
+        num_students = 10
+        self._create_students_with_state(num_students, json.dumps({'done': True}))
+        task_entry = self._create_input_entry()
+        with patch.dict(settings.FEATURES, {'ENABLE_RESCORE_SUBTASKS': True}):
+            with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+                mock_get_module.return_value = self._mock_instance()
+                self._run_task_with_mock_celery(rescore_problem, task_entry.id, task_entry.task_id)
+        self.assertEquals(mock_get_module.call_count, num_students)
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        output = json.loads(entry.task_output)
+        self.assertEquals(output.get('attempted'), num_students)
+        self.assertEquals(output.get('succeeded'), num_students)
+        self.assertEquals(output.get('total'), num_students)
+        subtasks = json.loads(entry.subtasks)
+        self.assertEquals(subtasks['total'], 3)
+        self.assertEquals(subtasks['succeeded'], 3)
+        self.assertEquals(entry.task_state, SUCCESS)
+
+    @override_settings(RESCORE_SAVE_BATCH_SIZE=3)
+    def test_resume_from_checkpoint(self):
+        num_students = 7
+        self._create_students_with_state(num_students, json.dumps({'done': True}))
+        module_pks = self._module_pks()
+        subtask_status = SubtaskStatus.create(str(uuid4()), succeeded=3, checkpoint=module_pks[2])
+        checkpoints = []
+        with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+            mock_get_module.return_value = self._mock_instance()
+            rescore_module_batch(
+                self._get_xmodule_instance_args(), self.course.id, self.problem_url, module_pks, subtask_status,
+                checkpoint_fcn=lambda status: checkpoints.append(status.checkpoint),
+            )
+        rescored = [call[0][0] for call in mock_get_module.call_args_list]
+        self.assertEquals(rescored, [StudentModule.objects.get(pk=pk).student for pk in module_pks[3:]])
+        self.assertEquals(checkpoints, [module_pks[5], module_pks[6]])
+        self.assertEquals(subtask_status.succeeded, num_students)
+
+    @override_settings(RESCORE_SAVE_BATCH_SIZE=2)
+    def test_failed_batch_is_not_checkpointed(self):
+        self._create_students_with_state(4, json.dumps({'done': True}))
+        module_pks = self._module_pks()
+        subtask_status = SubtaskStatus.create(str(uuid4()))
+        mock_instance = self._mock_instance()
+        mock_instance.rescore_problem.side_effect = [
+            {'success': 'correct'}, {'success': 'correct'}, {'success': 'correct'}, TestTaskFailure("failed"),
+        ]
+        with patch('instructor_task.tasks_helper.get_module_for_descriptor_internal') as mock_get_module:
+            mock_get_module.return_value = mock_instance
+            with self.assertRaises(TestTaskFailure):
+                rescore_module_batch(
+                    self._get_xmodule_instance_args(), self.course.id, self.problem_url, module_pks, subtask_status,
+                )
+        self.assertEquals(subtask_status.checkpoint, module_pks[1])
+        self.assertEquals(subtask_status.succeeded, 2)
+
+
 class TestResetAttemptsInstructorTask(TestInstructorTasks):
     """Tests instructor task that resets problem attempts."""
 
@@ -437,3 +521,186 @@ class TestDeleteStateInstructorTask(TestInstructorTasks):
                 StudentModule.objects.get(course_id=self.course.id,
                                           student=student,
                                           module_state_key=self.problem_url)
+
+
+class TestAnswerDistributionInstructorTask(TestInstructorTasks):
+    """Tests the answer distribution report, computed directly and in subtasks."""
+
+    answer_id = 'i4x-edx-1_23x-problem-test_urlname_2_1'
+
+    def setUp(self):
+        super(TestAnswerDistributionInstructorTask, self).setUp()
+        self.root_path = mkdtemp()
+        self.addCleanup(rmtree, self.root_path)
+
+    def _state(self, answer):
+        """StudentModule state with `answer` submitted"""
+        return json.dumps({'student_answers': {self.answer_id: answer}})
+
+    def _run_report(self):
+        """Run the report task and return the rows of the report it stored"""
+        task_entry = self._create_input_entry(use_problem_url=False)
+        with override_settings(GRADES_DOWNLOAD={'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.root_path}):
+            self._run_task_with_mock_celery(calculate_answer_distribution_csv, task_entry.id, task_entry.task_id)
+            report_store = ReportStore.from_config()
+            links = report_store.links_for(self.course.id)
+            self.assertEquals(len(links), 1)
+            return task_entry, list(report_store.iter_rows(self.course.id, links[0][0]))
+
+    def _assert_report(self, rows, counts):
+        """Check that the report has the header and `counts` ((answer, count) pairs)."""
+        self.assertEquals(
+            rows,
+            [['url_name', 'display name', 'answer id', 'answer', 'count']] + [
+                [PROBLEM_URL_NAME, PROBLEM_URL_NAME, self.answer_id, answer, str(count)]
+                for answer, count in counts
+            ]
+        )
+
+    def test_report(self):
+        self._create_students_with_state(3, self._state('Correct'))
+        task_entry, rows = self._run_report()
+        self._assert_report(rows, [('Correct', 3)])
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        self.assertEquals(entry.task_state, SUCCESS)
+        self.assertEquals(AnswerDistributionLog.objects.get(course_id=self.course.id).nmodules, 3)
+
+    @override_settings(ANSWER_DISTRIBUTION_MODULES_PER_TASK=2, ANSWER_DISTRIBUTION_MODULES_PER_QUERY=4)
+    def test_report_with_subtasks(self):
+        self._create_students_with_state(5, self._state('Correct'))
+        module = StudentModule.objects.filter(module_state_key=self.problem_url).order_by('pk')[0]
+        module.state = self._state('Incorrect')
+        module.save()
+
+        task_entry, rows = self._run_report()
+        self._assert_report(rows, [('Correct', 4), ('Incorrect', 1)])
+        entry = InstructorTask.objects.get(id=task_entry.id)
+        subtasks = json.loads(entry.subtasks)
+        self.assertEquals(subtasks['total'], 3)
+        self.assertEquals(subtasks['succeeded'], 3)
+        self.assertEquals(AnswerDistributionLog.objects.get(course_id=self.course.id).nmodules, 5)
+
+    def test_failing_last_subtask_writes_report(self):
+        task_entry = self._create_input_entry(use_problem_url=False)
+        subtask_ids = [str(uuid4()) for _ in range(2)]
+        initialize_subtask_info(task_entry, 'counted', 2, subtask_ids)
+        with patch('instructor_task.tasks.update_answer_distribution') as mock_update:
+            mock_update.side_effect = [None, TestTaskFailure("failed")]
+            with patch('instructor_task.tasks.write_answer_distribution_csv') as mock_write:
+                update_answer_distribution_subtask(
+                    task_entry.id, self.course.id, [1], SubtaskStatus.create(subtask_ids[0]).to_dict()
+                )
+                self.assertFalse(mock_write.apply_async.called)
+                with self.assertRaises(TestTaskFailure):
+                    update_answer_distribution_subtask(
+                        task_entry.id, self.course.id, [2], SubtaskStatus.create(subtask_ids[1]).to_dict()
+                    )
+        mock_write.apply_async.assert_called_once_with(
+            (task_entry.id, self.course.id), routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY
+        )
+
+
+class TestGradeReportSubtasks(TestInstructorTasks):
+    """Tests the grade report subtasks, and the merge of their partial reports."""
+
+    timestamp_str = '2014-01-01-0000'
+
+    def setUp(self):
+        super(TestGradeReportSubtasks, self).setUp()
+        self.root_path = mkdtemp()
+        self.addCleanup(rmtree, self.root_path)
+
+    def _create_entry_with_subtasks(self, num_subtasks):
+        """Create an InstructorTask with `num_subtasks` grade report subtasks, returning it and their ids"""
+        task_entry = self._create_input_entry(use_problem_url=False)
+        subtask_ids = [str(uuid4()) for _ in range(num_subtasks)]
+        initialize_subtask_info(task_entry, 'graded', num_subtasks, subtask_ids)
+        return task_entry, subtask_ids
+
+    def _run_shards(self, task_entry, subtask_ids):
+        """Run a shard subtask for each of `subtask_ids`, of one student each"""
+        for shard_index, subtask_id in enumerate(subtask_ids):
+            calculate_grades_csv_shard(
+                task_entry.id, self.course.id, shard_index, [shard_index], self.timestamp_str,
+                SubtaskStatus.create(subtask_id).to_dict(),
+            )
+
+    def test_last_shard_queues_merge(self):
+        task_entry, subtask_ids = self._create_entry_with_subtasks(2)
+        with patch('instructor_task.tasks.push_grade_shard_to_report_store') as mock_push_shard:
+            mock_push_shard.return_value = {'attempted': 1, 'succeeded': 1, 'failed': 0}
+            with patch('instructor_task.tasks.merge_grades_csv_shards') as mock_merge:
+                self._run_shards(task_entry, subtask_ids)
+        mock_merge.apply_async.assert_called_once_with(
+            (task_entry.id, self.course.id, 2, self.timestamp_str), routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY
+        )
+
+    def test_failing_last_shard_queues_merge(self):
+        task_entry, subtask_ids = self._create_entry_with_subtasks(2)
+        with patch('instructor_task.tasks.push_grade_shard_to_report_store') as mock_push_shard:
+            mock_push_shard.side_effect = [{'attempted': 1, 'succeeded': 1, 'failed': 0}, TestTaskFailure("failed")]
+            with patch('instructor_task.tasks.merge_grades_csv_shards') as mock_merge:
+                with patch('instructor_task.tasks.push_failed_grade_shard_to_report_store') as mock_push_failed:
+                    with self.assertRaises(TestTaskFailure):
+                        self._run_shards(task_entry, subtask_ids)
+        mock_push_failed.assert_called_once_with(
+            self.course.id, task_entry.task_id, 1, [1], u"Grade report subtask failed: failed"
+        )
+        mock_merge.apply_async.assert_called_once_with(
+            (task_entry.id, self.course.id, 2, self.timestamp_str), routing_key=settings.GRADES_DOWNLOAD_ROUTING_KEY
+        )
+        output = json.loads(InstructorTask.objects.get(id=task_entry.id).task_output)
+        self.assertEquals(output.get('succeeded'), 1)
+        self.assertEquals(output.get('failed'), 1)
+
+    def test_failing_shard_stores_error_rows(self):
+        task_entry, subtask_ids = self._create_entry_with_subtasks(1)
+        student = UserFactory.create()
+        with override_settings(GRADES_DOWNLOAD={'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.root_path}):
+            with patch('instructor_task.tasks.push_grade_shard_to_report_store') as mock_push_shard:
+                mock_push_shard.side_effect = TestTaskFailure("failed")
+                with patch('instructor_task.tasks.merge_grades_csv_shards'):
+                    with self.assertRaises(TestTaskFailure):
+                        calculate_grades_csv_shard(
+                            task_entry.id, self.course.id, 0, [student.id], self.timestamp_str,
+                            SubtaskStatus.create(subtask_ids[0]).to_dict(),
+                        )
+            report_store = ReportStore.from_config()
+            self.assertEquals(
+                list(report_store.iter_rows(
+                    self.course.id, report_store.shard_filename(task_entry.task_id, '000000_err.csv')
+                )),
+                [[str(student.id), student.username, 'Grade report subtask failed: failed']],
+            )
+
+    def test_merge(self):
+        task_entry, _ = self._create_entry_with_subtasks(2)
+        task_entry.task_output = json.dumps({'succeeded': 1, 'failed': 1})
+        task_entry.save()
+        with override_settings(GRADES_DOWNLOAD={'STORAGE_TYPE': 'localfs', 'ROOT_PATH': self.root_path}):
+            report_store = ReportStore.from_config()
+            # the first shard was graded, the second failed as a whole
+            report_store.store_rows(
+                self.course.id, report_store.shard_filename(task_entry.task_id, '000000.csv'),
+                [['id', 'email', 'username', 'grade'], ['1', 'a@example.com', 'a', '0.5']],
+            )
+            report_store.store_rows(
+                self.course.id, report_store.shard_filename(task_entry.task_id, '000001.csv'), []
+            )
+            report_store.store_rows(
+                self.course.id, report_store.shard_filename(task_entry.task_id, '000001_err.csv'),
+                [['2', 'b', 'Grade report subtask failed: failed']],
+            )
+            merge_grades_csv_shards(task_entry.id, self.course.id, 2, self.timestamp_str)
+            filenames = [filename for filename, _url in report_store.links_for(self.course.id)]
+            report_filename = [filename for filename in filenames if not filename.endswith('_err.csv')][0]
+            err_filename = [filename for filename in filenames if filename.endswith('_err.csv')][0]
+            self.assertEquals(
+                list(report_store.iter_rows(self.course.id, report_filename)),
+                [['id', 'email', 'username', 'grade'], ['1', 'a@example.com', 'a', '0.5']],
+            )
+            # the students of the failed shard are in the error report
+            self.assertEquals(
+                list(report_store.iter_rows(self.course.id, err_filename)),
+                [['id', 'username', 'error_msg'], ['2', 'b', 'Grade report subtask failed: failed']],
+            )
@@ -45,8 +45,15 @@ ENABLE_JASMINE = False
 
 DISCUSSION_SETTINGS = {
     'MAX_COMMENT_DEPTH': 2,
+    # Seconds a course's discussion category map is cached for
+    'MAP_CACHE_TIMEOUT': 60 * 60,
 }
 
+# Connections kept open to the comments service by each process, and the
+# number of times a GET to it is retried when the connection fails.
+COMMENTS_SERVICE_POOL_SIZE = 10
+COMMENTS_SERVICE_MAX_RETRIES = 2
+
 
 # Features
 FEATURES = {
@@ -205,6 +212,31 @@ FEATURES = {
     # grades CSV files to S3 and give links for downloads.
     'ENABLE_S3_GRADE_DOWNLOADS': False,
 
+    # Persist per-student section scores (StudentSectionGrade) so that grading
+    # only recomputes the sections whose student state changed.
+    'ENABLE_PERSISTENT_SECTION_GRADES': False,
+
+    # Grade reports grade all students from StudentModule rows in bulk
+    # (courseware.bulk_grades) instead of running grade() per student.
+    'ENABLE_BULK_GRADE_REPORTS': False,
+
+    # Split grade report generation into Celery subtasks over ranges of
+    # students, whose partial reports are merged by a final task.
+    'ENABLE_GRADE_REPORT_SUBTASKS': False,
+
+    # Split rescoring a problem for all students into Celery subtasks over
+    # ranges of StudentModules, which commit their work in batches and
+    # continue from their last checkpoint when retried.
+    'ENABLE_RESCORE_SUBTASKS': False,
+
+    # Generate answer distribution reports with an instructor task on the
+    # instructor dashboard, instead of synchronously on the legacy dashboard.
+    'ENABLE_ASYNC_ANSWER_DISTRIBUTION': False,
+
+    # Render only the current unit of a sequence with the page, and fetch the
+    # other units when the student opens them.
+    'ENABLE_LAZY_SEQUENCE_RENDERING': False,
+
     # whether to use password policy enforcement or not
     'ENFORCE_PASSWORD_POLICY': False,
 
@@ -419,6 +451,11 @@ if FEATURES.get('ENABLE_SQL_TRACKING_LOGS'):
 # We're already logging events, and we don't want to capture user
 # names/passwords.  Heartbeat events are likely not interesting.
 TRACKING_IGNORE_URL_PATTERNS = [r'^/event', r'^/login', r'^/heartbeat']
+
+# Options for track.backends.buffered.BufferedBackend. When set, every
+# tracking backend is sent events from its own worker thread instead of
+# the request thread; see track.tracker.
+TRACKING_ASYNC_DISPATCH = None
 TRACKING_ENABLED = True
 
 ######################## subdomain specific settings ###########################
@@ -437,6 +474,10 @@ MODULESTORE = {
     }
 }
 CONTENTSTORE = None
+
+# Local directory in which contentserver keeps assets too large for
+# memcached, e.g. {'DIRECTORY': '/tmp/edx-assets', 'MAX_BYTES': 2 * 1024 ** 3}
+CONTENTSERVER_DISK_CACHE = None
 DOC_STORE_CONFIG = {
     'host': 'localhost',
     'db': 'xmodule',
@@ -470,6 +511,11 @@ CODE_JAIL = {
         # How many CPU seconds can jailed code use?
         'CPU': 1,
     },
+
+    # Options of the pool of warm sandbox processes, e.g.
+    # {'size': 1, 'max_executions': 100, 'max_workers': 4}. None starts a new sandbox for every
+    # execution. See common/lib/capa/capa/safe_exec/README.rst.
+    'pool': None,
 }
 
 # Some courses are allowed to run unsafe code. This is a list of regexes, one
@@ -721,6 +767,7 @@ MIDDLEWARE_CLASSES = (
     'request_cache.middleware.RequestCache',
     'microsite_configuration.middleware.MicrositeMiddleware',
     'django_comment_client.middleware.AjaxExceptionMiddleware',
+    'django_comment_client.middleware.CommentClientRequestMemoMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
 
@@ -1089,6 +1136,14 @@ BULK_EMAIL_LOG_SENT_EMAILS = False
 # parallel, and what the SES rate is.
 BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS = 0.02
 
+# Most bulk emails to send per second, across all workers, e.g. the SES
+# maximum send rate.  The workers share it through the cache.  If None,
+# sends are only slowed by BULK_EMAIL_RETRY_DELAY_BETWEEN_SENDS, as above.
+BULK_EMAIL_MAX_SENDS_PER_SECOND = None
+
+# Number of SMTP connections each bulk email task sends over at once.
+BULK_EMAIL_CONNECTIONS_PER_TASK = 1
+
 
 ############################## Video ##########################################
 
@@ -1293,6 +1348,30 @@ GRADES_DOWNLOAD = {
     'ROOT_PATH': '/tmp/edx-s3/grades',
 }
 
+# When FEATURES['ENABLE_GRADE_REPORT_SUBTASKS'] is set, grade reports are
+# split into subtasks that each grade this many students.
+GRADES_DOWNLOAD_STUDENTS_PER_TASK = 500
+GRADES_DOWNLOAD_STUDENTS_PER_QUERY = 5000
+
+###################### Rescoring ######################
+# When FEATURES['ENABLE_RESCORE_SUBTASKS'] is set, rescoring a problem is
+# split into subtasks that each rescore this many StudentModules, committing
+# and recording a checkpoint every RESCORE_SAVE_BATCH_SIZE of them.
+RESCORE_MODULES_PER_TASK = 1000
+RESCORE_MODULES_PER_QUERY = 10000
+RESCORE_SAVE_BATCH_SIZE = 100
+
+# Initial delay, in seconds, before a failed rescoring subtask is retried
+# from its checkpoint (later retries wait longer), and the number of retries.
+RESCORE_DEFAULT_RETRY_DELAY = 30
+RESCORE_MAX_RETRIES = 5
+
+###################### Answer distribution ######################
+# Answer distribution reports decode the state of the StudentModules modified
+# since the last report this many at a time, in subtasks when there are more.
+ANSWER_DISTRIBUTION_MODULES_PER_TASK = 1000
+ANSWER_DISTRIBUTION_MODULES_PER_QUERY = 10000
+
 ######################## PROGRESS SUCCESS BUTTON ##############################
 # The following fields are available in the URL: {course_id} {student_id}
 PROGRESS_SUCCESS_BUTTON_URL = 'http://<domain>/<path>/{course_id}'
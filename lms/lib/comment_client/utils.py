@@ -1,15 +1,83 @@
 from contextlib import contextmanager
+from copy import deepcopy
+import cookielib
 from dogapi import dog_stats_api
 import json
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 from django.conf import settings
 from time import time
 from uuid import uuid4
 from django.utils.translation import get_language
+from request_cache.middleware import RequestCache
+
+import settings as cc_settings
 
 log = logging.getLogger(__name__)
 
+# Key of the GET results memoized in the request cache for the current request
+REQUEST_MEMO_KEY = 'comment_client.responses'
+
+
+class RetryReadsAdapter(HTTPAdapter):
+    """
+    Sends GETs up to `max_retries` more times when the connection fails.
+    Other requests are sent once, since they may have been applied.
+    """
+    def __init__(self, max_retries=0, **kwargs):
+        super(RetryReadsAdapter, self).__init__(**kwargs)
+        self.read_retries = max_retries
+
+    def send(self, request, **kwargs):
+        retries = self.read_retries if request.method == 'GET' else 0
+        for attempt in xrange(retries + 1):
+            try:
+                return super(RetryReadsAdapter, self).send(request, **kwargs)
+            except requests.exceptions.ConnectionError:
+                if attempt == retries:
+                    raise
+                dog_stats_api.increment('comment_client.request.retry')
+
+
+class RejectCookiesPolicy(cookielib.DefaultCookiePolicy):
+    """The session is shared by all users, so it must not keep cookies"""
+    def set_ok(self, cookie, request):
+        return False
+
+
+def create_session():
+    """
+    Create a session that keeps up to COMMENTS_SERVICE_POOL_SIZE connections
+    to the comments service open between requests.
+    """
+    session = requests.Session()
+    session.cookies.set_policy(RejectCookiesPolicy())
+    adapter = RetryReadsAdapter(
+        max_retries=cc_settings.MAX_RETRIES,
+        pool_connections=1,
+        pool_maxsize=cc_settings.POOL_SIZE,
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+SESSION = create_session()
+
+
+def enable_request_memo():
+    """
+    Memoize the results of GETs until the end of the current request, when
+    the request cache is cleared.
+    """
+    RequestCache.get_request_cache().data[REQUEST_MEMO_KEY] = {}
+
+
+def _get_request_memo():
+    """The memoized GET results of the current request, or None if there are none"""
+    return getattr(RequestCache.get_request_cache(), 'data', {}).get(REQUEST_MEMO_KEY)
+
 
 def strip_none(dic):
     return dict([(k, v) for k, v in dic.iteritems() if v is not None])
@@ -70,6 +138,19 @@ def perform_request(method, url, data_or_params=None, raw=False,
     request_id = uuid4()
     request_id_dict = {'request_id': request_id}
 
+    # Within a request, identical GETs are only sent once, until something is
+    # changed: the view then sees the comments service as it changed it.
+    memo = _get_request_memo()
+    memo_key = None
+    if memo is not None:
+        if method == 'get':
+            memo_key = repr((url, sorted(data_or_params.items()), raw))
+            if memo_key in memo:
+                dog_stats_api.increment('comment_client.request.memoized', tags=metric_tags)
+                return deepcopy(memo[memo_key])
+        else:
+            memo.clear()
+
     if method in ['post', 'put', 'patch']:
         data = data_or_params
         params = request_id_dict
@@ -77,7 +158,7 @@ def perform_request(method, url, data_or_params=None, raw=False,
         data = None
         params = merge_dict(data_or_params, request_id_dict)
     with request_timer(request_id, method, url, metric_tags):
-        response = requests.request(
+        response = SESSION.request(
             method,
             url,
             data=data,
@@ -103,9 +184,13 @@ def perform_request(method, url, data_or_params=None, raw=False,
         raise CommentClient500Error(response.text)
     else:
         if raw:
+            if memo_key is not None:
+                memo[memo_key] = response.text
             return response.text
         else:
             data = response.json()
+            if memo_key is not None:
+                memo[memo_key] = deepcopy(data)
             if paged_results:
                 dog_stats_api.histogram(
                     'comment_client.request.paged.result_count',
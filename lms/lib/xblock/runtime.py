@@ -3,9 +3,12 @@ Module implementing `xblock.runtime.Runtime` functionality for the LMS
 """
 
 import re
+import time
 
+from django.core.cache import cache
 from django.core.urlresolvers import reverse
 
+from courseware.models import XModuleUserStateSummaryCounter
 from user_api import user_service
 from xmodule.modulestore.django import modulestore
 from xmodule.x_module import ModuleSystem
@@ -172,6 +175,63 @@ class UserTagsService(object):
                                            self.runtime.course_id, key, value)
 
 
+class UserStateSummaryCounterService(object):
+    """
+    A runtime class that stores counts for the keys of dict fields in the
+    user_state_summary scope, like the votes of a poll, in sharded counters
+    rather than in the field itself, so that many students can add to them at
+    once.
+
+    The counts are cached for CACHE_TIMEOUT seconds: they may be that stale,
+    except for the increments made in this process.
+    """
+
+    CACHE_TIMEOUT = 5
+
+    # Longer keys are cut to fit the database column
+    MAX_KEY_LENGTH = 255
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+
+    def _cache_key(self, block, field_name):
+        """The key of the cached counts of the field"""
+        return u'user_state_summary_counts.{0}.{1}'.format(block.scope_ids.usage_id, field_name)
+
+    def get_counts(self, block, field_name):
+        """
+        Return a dict mapping the keys of field `field_name` of `block` to their counts
+        """
+        cache_key = self._cache_key(block, field_name)
+        cached = cache.get(cache_key)
+        if cached is None:
+            counts = XModuleUserStateSummaryCounter.counts(str(block.scope_ids.usage_id), field_name)
+            cached = (time.time(), counts)
+            cache.set(cache_key, cached, self.CACHE_TIMEOUT)
+        return dict(cached[1])
+
+    def increment(self, block, field_name, keys, delta=1):
+        """
+        Add `delta` to the count of each key in `keys` of field `field_name` of `block`
+        """
+        keys = [key[:self.MAX_KEY_LENGTH] for key in keys]
+        for key in keys:
+            XModuleUserStateSummaryCounter.increment(str(block.scope_ids.usage_id), field_name, key, delta)
+
+        # Add the increments to the cached counts too, leaving them to expire
+        # when they would have, so that lost updates to the cache don't last.
+        cache_key = self._cache_key(block, field_name)
+        cached = cache.get(cache_key)
+        if cached is None:
+            return
+        cached_at, counts = cached
+        for key in keys:
+            counts[key] = counts.get(key, 0) + delta
+        remaining = int(cached_at + self.CACHE_TIMEOUT - time.time())
+        if remaining > 0:
+            cache.set(cache_key, (cached_at, counts), remaining)
+
+
 class LmsModuleSystem(LmsHandlerUrls, ModuleSystem):  # pylint: disable=abstract-method
     """
     ModuleSystem specialized to the LMS
@@ -179,6 +239,7 @@ class LmsModuleSystem(LmsHandlerUrls, ModuleSystem):  # pylint: disable=abstract
     def __init__(self, **kwargs):
         services = kwargs.setdefault('services', {})
         services['user_tags'] = UserTagsService(self)
+        services['counters'] = UserStateSummaryCounterService(self)
         services['partitions'] = LmsPartitionService(
             user_tags_service=services['user_tags'],
             course_id=kwargs.get('course_id', None),
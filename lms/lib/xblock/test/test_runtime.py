@@ -3,10 +3,13 @@ Tests of the LMS XBlock Runtime and associated utilities
 """
 
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase as DatabaseTestCase
 from ddt import ddt, data
 from mock import Mock
 from unittest import TestCase
 from urlparse import urlparse
+from courseware.models import XModuleUserStateSummaryCounter
 from lms.lib.xblock.runtime import quote_slashes, unquote_slashes, LmsModuleSystem
 
 TEST_STRINGS = [
@@ -136,3 +139,52 @@ class TestUserServiceAPI(TestCase):
         # Try to get tag in wrong scope
         with self.assertRaises(ValueError):
             self.runtime.service(self.mock_block, 'user_tags').get_tag('fake_scope', self.key)
+
+
+class TestUserStateSummaryCounterService(DatabaseTestCase):
+    """Test the counters service"""
+
+    def setUp(self):
+        self.runtime = LmsModuleSystem(
+            static_url='/static',
+            track_function=Mock(),
+            get_module=Mock(),
+            render_template=Mock(),
+            replace_urls=str,
+            course_id='org/course/run',
+            descriptor_runtime=Mock(),
+        )
+        self.mock_block = Mock()
+        self.mock_block.service_declaration.return_value = 'wants'
+        self.mock_block.scope_ids.usage_id = 'i4x://org/course/poll_question/poll'
+        self.counters = self.runtime.service(self.mock_block, 'counters')
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_increment(self):
+        self.counters.increment(self.mock_block, 'poll_answers', ['yes', 'no'])
+        self.counters.increment(self.mock_block, 'poll_answers', ['yes'], 2)
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'poll_answers'), {'yes': 3, 'no': 1})
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'all_words'), {})
+
+    def test_increments_spread_over_shards(self):
+        for __ in range(50):
+            self.counters.increment(self.mock_block, 'poll_answers', ['yes'])
+        self.assertGreater(XModuleUserStateSummaryCounter.objects.filter(key='yes').count(), 1)
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'poll_answers'), {'yes': 50})
+
+    def test_cached_counts_include_increments(self):
+        self.counters.increment(self.mock_block, 'poll_answers', ['yes'])
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'poll_answers'), {'yes': 1})
+
+        # increments by other processes aren't seen until the cache expires
+        XModuleUserStateSummaryCounter.increment(str(self.mock_block.scope_ids.usage_id), 'poll_answers', 'no')
+        self.counters.increment(self.mock_block, 'poll_answers', ['yes'])
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'poll_answers'), {'yes': 2})
+
+        cache.clear()
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'poll_answers'), {'yes': 2, 'no': 1})
+
+    def test_long_keys_cut(self):
+        self.counters.increment(self.mock_block, 'all_words', ['a' * 300])
+        self.assertEqual(self.counters.get_counts(self.mock_block, 'all_words'), {'a' * 255: 1})
@@ -29,6 +29,9 @@ def run():
     if settings.FEATURES.get('ENABLE_THIRD_PARTY_AUTH', False):
         enable_third_party_auth()
 
+    if settings.CODE_JAIL.get('pool'):
+        enable_sandbox_pool()
+
 
 def enable_theme():
     """
@@ -111,3 +114,12 @@ def enable_third_party_auth():
 
     from third_party_auth import settings as auth_settings
     auth_settings.apply_settings(settings.THIRD_PARTY_AUTH, settings)
+
+
+def enable_sandbox_pool():
+    """
+    Run the Python code of capa problems in a pool of warm sandbox
+    processes. See common/lib/capa/capa/safe_exec/README.rst.
+    """
+    from capa.safe_exec import configure_pool
+    configure_pool(**settings.CODE_JAIL['pool'])